@@ -0,0 +1,85 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import math
+
+import torch
+
+from wan.modules.model import WanModel, rope_apply
+from wan.modules.tome import TokenMerging
+
+from .common import benchmark
+from .configs import TINY_DIT, TINY_LATENT
+
+
+def _model(device):
+    torch.manual_seed(0)
+    return WanModel(**TINY_DIT).eval().requires_grad_(False).to(device)
+
+
+def _block_inputs(model, device):
+    f, h, w = (
+        u // p for u, p in zip(TINY_LATENT[1:], TINY_DIT.patch_size))
+    seq_len = f * h * w
+    return seq_len, dict(
+        x=torch.randn(1, seq_len, model.dim, device=device),
+        e=torch.randn(1, seq_len, 6, model.dim, device=device),
+        seq_lens=torch.tensor([seq_len], dtype=torch.long),
+        grid_sizes=torch.tensor([[f, h, w]], dtype=torch.long),
+        freqs=model.freqs.to(device),
+        context=torch.randn(
+            1, model.text_len, model.dim, device=device),
+        context_lens=None)
+
+
+@benchmark('dit.block')
+def dit_block(device):
+    model = _model(device)
+    _, kwargs = _block_inputs(model, device)
+    block = model.blocks[0]
+    return lambda: block(**kwargs)
+
+
+@benchmark('dit.forward')
+def dit_forward(device):
+    model = _model(device)
+    x = [torch.randn(TINY_LATENT, device=device)]
+    context = [torch.randn(TINY_DIT.text_len, TINY_DIT.text_dim, device=device)]
+    t = torch.tensor([500.], device=device)
+    seq_len = math.prod(
+        u // p for u, p in zip(TINY_LATENT[1:], TINY_DIT.patch_size))
+    return lambda: model(x, t=t, context=context, seq_len=seq_len)
+
+
+@benchmark('dit.forward_packed')
+def dit_forward_packed(device):
+    model = _model(device)
+    x = [
+        torch.randn(TINY_LATENT, device=device),
+        torch.randn(TINY_LATENT[:2] + (8, 24), device=device)
+    ]
+    context = [
+        torch.randn(TINY_DIT.text_len, TINY_DIT.text_dim, device=device)
+    ] * 2
+    t = torch.tensor([500., 500.], device=device)
+    return lambda: model(x, t=t, context=context, seq_len=None, packed=True)
+
+
+@benchmark('dit.rope_apply')
+def dit_rope_apply(device):
+    model = _model(device)
+    _, kwargs = _block_inputs(model, device)
+    n, d = model.num_heads, model.dim // model.num_heads
+    q = kwargs['x'].view(1, -1, n, d)
+    return lambda: rope_apply(q, kwargs['grid_sizes'], kwargs['freqs'])
+
+
+@benchmark('dit.forward_tome')
+def dit_forward_tome(device):
+    model = _model(device)
+    model.token_merging = TokenMerging(ratio=0.5, layers=(None, None))
+    x = [torch.randn(TINY_LATENT, device=device)]
+    context = [torch.randn(TINY_DIT.text_len, TINY_DIT.text_dim, device=device)]
+    t = torch.tensor([500.], device=device)
+    seq_len = math.prod(
+        u // p for u, p in zip(TINY_LATENT[1:], TINY_DIT.patch_size))
+    return lambda: model(
+        x, t=t, context=context, seq_len=seq_len, timestep=500.)
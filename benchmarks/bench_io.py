@@ -0,0 +1,28 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import os
+import tempfile
+
+import torch
+
+from wan.utils.utils import save_video
+
+from .common import benchmark
+
+# 33 frames of 256 x 256 pixels
+_VIDEO = (1, 3, 33, 256, 256)
+
+
+@benchmark('io.save_video')
+def io_save_video(device):
+    video = torch.rand(_VIDEO, device=device).mul_(2).sub_(1)
+    save_file = os.path.join(tempfile.mkdtemp(), 'video.mp4')
+
+    def run():
+        save_video(
+            video, save_file=save_file, fps=16, nrow=1, value_range=(-1, 1))
+
+    # save_video logs failures instead of raising
+    run()
+    if not os.path.exists(save_file):
+        raise RuntimeError("save_video did not write the video.")
+    return run
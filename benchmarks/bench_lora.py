@@ -0,0 +1,64 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+from wan.modules.lora import (
+    lora_delta_bgmv,
+    lora_delta_reference,
+    lora_delta_sgmv,
+)
+
+from .common import benchmark
+from .configs import TINY_DIT
+
+# 4 samples of 320 tokens, each with its own rank 16 adapter of the FFN
+_BATCH = 4
+_TOKENS = 320
+_RANK = 16
+
+
+def _inputs(device):
+    torch.manual_seed(0)
+    dim, ffn_dim = TINY_DIT.dim, TINY_DIT.ffn_dim
+    x = torch.randn(_BATCH, _TOKENS, dim, device=device)
+    # last slot is the zero adapter of the base model
+    downs = torch.randn(_BATCH + 1, _RANK, dim, device=device) / dim**0.5
+    ups = torch.randn(_BATCH + 1, ffn_dim, _RANK, device=device) / _RANK
+    downs[-1], ups[-1] = 0, 0
+    ids = [2, 0, 4, 1]
+    return x, ids, downs, ups
+
+
+def _check(fn, x, ids, downs, ups):
+    # the fast paths must match the reference before they are timed
+    ref = lora_delta_reference(
+        x.flatten(0, 1), [_TOKENS] * _BATCH, ids, downs, ups)
+    out = fn().reshape(ref.shape)
+    if not torch.allclose(out, ref, rtol=1e-4, atol=1e-4):
+        raise RuntimeError(
+            f"Multi-LoRA delta differs from the reference by {(out - ref).abs().max():.2e}."
+        )
+
+
+@benchmark('lora.reference')
+def lora_reference(device):
+    x, ids, downs, ups = _inputs(device)
+    return lambda: lora_delta_reference(
+        x.flatten(0, 1), [_TOKENS] * _BATCH, ids, downs, ups)
+
+
+@benchmark('lora.bgmv')
+def lora_bgmv(device):
+    x, ids, downs, ups = _inputs(device)
+    index = torch.tensor(ids, device=device)
+    fn = lambda: lora_delta_bgmv(x, index, downs, ups)
+    _check(fn, x, ids, downs, ups)
+    return fn
+
+
+@benchmark('lora.sgmv')
+def lora_sgmv(device):
+    x, ids, downs, ups = _inputs(device)
+    fn = lambda: lora_delta_sgmv(
+        x.flatten(0, 1), [_TOKENS] * _BATCH, ids, downs, ups)
+    _check(fn, x, ids, downs, ups)
+    return fn
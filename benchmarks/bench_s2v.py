@@ -0,0 +1,32 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+from .common import benchmark
+from .configs import TINY_LATENT, TINY_S2V
+
+
+@benchmark('s2v.block')
+def s2v_block(device):
+    # imported here, the S2V model pulls in its optional dependencies
+    from wan.modules.s2v.model_s2v import WanModel_S2V
+
+    torch.manual_seed(0)
+    model = WanModel_S2V(**TINY_S2V).eval().requires_grad_(False).to(device)
+    f, h, w = (
+        u // p for u, p in zip(TINY_LATENT[1:], TINY_S2V.patch_size))
+    seq_len = f * h * w
+    # the modulation of the noisy and the reference tokens, split at the
+    # last frame
+    kwargs = dict(
+        x=torch.randn(1, seq_len, model.dim, device=device),
+        e=[
+            torch.randn(1, 6, 2, model.dim, device=device),
+            torch.tensor(seq_len - h * w)
+        ],
+        seq_lens=torch.tensor([seq_len], dtype=torch.long),
+        grid_sizes=torch.tensor([[f, h, w]], dtype=torch.long),
+        freqs=model.freqs.to(device),
+        context=torch.randn(1, model.text_len, model.dim, device=device),
+        context_lens=None)
+    block = model.blocks[0]
+    return lambda: block(**kwargs)
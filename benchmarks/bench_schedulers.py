@@ -0,0 +1,36 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+from wan.configs import WAN_CONFIGS
+from wan.utils.batch import build_sample_scheduler
+
+from .common import benchmark
+from .configs import NUM_STEPS, TINY_LATENT
+
+
+def _sampling_loop(sample_solver, device):
+    # a full sampling loop with random model outputs, divide by NUM_STEPS
+    # for the time per step
+    config = WAN_CONFIGS['t2v-A14B']
+    latent = torch.randn(1, *TINY_LATENT, device=device)
+    noise_preds = torch.randn(NUM_STEPS, *latent.shape, device=device)
+
+    def run():
+        scheduler, timesteps = build_sample_scheduler(
+            sample_solver, NUM_STEPS, 5.0, device, config)
+        x = latent
+        for noise_pred, t in zip(noise_preds, timesteps):
+            x = scheduler.step(noise_pred, t, x, return_dict=False)[0]
+        return x
+
+    return run
+
+
+@benchmark('scheduler.unipc')
+def scheduler_unipc(device):
+    return _sampling_loop('unipc', device)
+
+
+@benchmark('scheduler.dpm++')
+def scheduler_dpmpp(device):
+    return _sampling_loop('dpm++', device)
@@ -0,0 +1,37 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+from wan.modules.t5 import T5Encoder
+
+from .common import benchmark
+from .configs import TINY_T5, TINY_TEXT_LEN
+
+
+def _inputs(device):
+    ids = torch.randint(0, TINY_T5.vocab, (2, TINY_TEXT_LEN), device=device)
+    # one padded prompt
+    mask = torch.ones(2, TINY_TEXT_LEN, dtype=torch.long, device=device)
+    mask[1, TINY_TEXT_LEN // 2:] = 0
+    return ids, mask
+
+
+def _model(device):
+    torch.manual_seed(0)
+    return T5Encoder(**TINY_T5).eval().requires_grad_(False).to(device)
+
+
+@benchmark('t5.attention')
+def t5_attention(device):
+    model = _model(device)
+    ids, mask = _inputs(device)
+    block = model.blocks[0]
+    x = model.token_embedding(ids)
+    pos_bias = block.pos_embedding(x.size(1), x.size(1))
+    return lambda: block.attn(block.norm1(x), mask=mask, pos_bias=pos_bias)
+
+
+@benchmark('t5.encoder')
+def t5_encoder(device):
+    model = _model(device)
+    ids, mask = _inputs(device)
+    return lambda: model(ids, mask)
@@ -0,0 +1,50 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+from wan.modules import vae2_1, vae2_2
+
+from .common import benchmark
+from .configs import TINY_VAE_2_1, TINY_VAE_2_2, TINY_VIDEO
+
+# latents are normalized with (mean, 1 / std), identity here
+_SCALE = [0.0, 1.0]
+
+
+def _model(module, cfg, device):
+    torch.manual_seed(0)
+    return module.WanVAE_(**cfg).eval().requires_grad_(False).to(device)
+
+
+def _latent(model, device):
+    # the latent of TINY_VIDEO, encoded once
+    video = torch.randn(1, *TINY_VIDEO, device=device).clamp_(-1, 1)
+    with torch.no_grad():
+        return model.encode(video, _SCALE)
+
+
+@benchmark('vae2_1.encode')
+def vae2_1_encode(device):
+    model = _model(vae2_1, TINY_VAE_2_1, device)
+    video = torch.randn(1, *TINY_VIDEO, device=device).clamp_(-1, 1)
+    return lambda: model.encode(video, _SCALE)
+
+
+@benchmark('vae2_1.decode')
+def vae2_1_decode(device):
+    model = _model(vae2_1, TINY_VAE_2_1, device)
+    z = _latent(model, device)
+    return lambda: model.decode(z, _SCALE)
+
+
+@benchmark('vae2_2.encode')
+def vae2_2_encode(device):
+    model = _model(vae2_2, TINY_VAE_2_2, device)
+    video = torch.randn(1, *TINY_VIDEO, device=device).clamp_(-1, 1)
+    return lambda: model.encode(video, _SCALE)
+
+
+@benchmark('vae2_2.decode')
+def vae2_2_decode(device):
+    model = _model(vae2_2, TINY_VAE_2_2, device)
+    z = _latent(model, device)
+    return lambda: model.decode(z, _SCALE)
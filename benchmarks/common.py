@@ -0,0 +1,71 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import statistics
+import time
+
+import torch
+
+__all__ = ['BENCHMARKS', 'benchmark', 'measure', 'synchronize']
+
+# name -> setup function, filled by the `benchmark` decorator
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    r"""
+    Registers a benchmark. The decorated function takes the device, builds
+    its inputs from random weights and returns the callable to time.
+    """
+
+    def decorator(fn):
+        assert name not in BENCHMARKS, f"Duplicate benchmark {name}."
+        BENCHMARKS[name] = fn
+        return fn
+
+    return decorator
+
+
+def synchronize(device):
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def measure(fn, device, warmup=2, repeat=10, min_seconds=0.0):
+    r"""
+    Times `fn` after `warmup` calls.
+
+    Args:
+        fn (`callable`):
+            The function to time.
+        device (`torch.device`):
+            Synchronized around every call on CUDA.
+        warmup (`int`, *optional*, defaults to 2):
+            Untimed calls.
+        repeat (`int`, *optional*, defaults to 10):
+            Timed calls, at least.
+        min_seconds (`float`, *optional*, defaults to 0.0):
+            Keep timing until this much time has passed.
+
+    Returns:
+        `dict`:
+            Median, mean, min and standard deviation in milliseconds and the
+            number of timed calls.
+    """
+    with torch.no_grad():
+        for _ in range(warmup):
+            fn()
+        synchronize(device)
+        times = []
+        started = time.perf_counter()
+        while len(times) < repeat or time.perf_counter(
+        ) - started < min_seconds:
+            start = time.perf_counter()
+            fn()
+            synchronize(device)
+            times.append((time.perf_counter() - start) * 1e3)
+    return {
+        'median_ms': statistics.median(times),
+        'mean_ms': statistics.fmean(times),
+        'min_ms': min(times),
+        'std_ms': statistics.pstdev(times),
+        'repeat': len(times),
+    }
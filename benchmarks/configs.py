@@ -0,0 +1,91 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Tiny configs of the Wan models. They keep the layer structure of the real
+configs with narrow widths and few layers, so that every benchmark builds
+from random weights and runs on a CPU in seconds.
+"""
+from easydict import EasyDict
+
+# DiT, a 5 x 16 x 16 latent is 320 tokens with patch size (1, 2, 2)
+TINY_DIT = EasyDict(
+    model_type='t2v',
+    patch_size=(1, 2, 2),
+    text_len=64,
+    in_dim=16,
+    dim=256,
+    ffn_dim=768,
+    freq_dim=256,
+    text_dim=128,
+    out_dim=16,
+    num_heads=4,
+    num_layers=2,
+    window_size=(-1, -1),
+    qk_norm=True,
+    cross_attn_norm=True,
+    eps=1e-6)
+TINY_LATENT = (16, 5, 16, 16)
+
+# S2V DiT without the motioner and framepack, audio injected into block 0
+TINY_S2V = EasyDict(
+    cond_dim=16,
+    audio_dim=64,
+    num_audio_token=4,
+    enable_adain=True,
+    adain_mode='attn_norm',
+    audio_inject_layers=[0],
+    zero_init=True,
+    zero_timestep=True,
+    enable_motioner=False,
+    add_last_motion=True,
+    enable_framepack=False,
+    model_type='s2v',
+    patch_size=(1, 2, 2),
+    text_len=64,
+    in_dim=16,
+    dim=256,
+    ffn_dim=768,
+    freq_dim=256,
+    text_dim=128,
+    out_dim=16,
+    num_heads=4,
+    num_layers=2,
+    window_size=(-1, -1),
+    qk_norm=True,
+    cross_attn_norm=True,
+    eps=1e-6)
+
+# VAEs, 9 frames of 64 x 64 pixels
+TINY_VAE_2_1 = EasyDict(
+    dim=16,
+    z_dim=16,
+    dim_mult=[1, 2, 4, 4],
+    num_res_blocks=2,
+    attn_scales=[],
+    temperal_downsample=[False, True, True],
+    dropout=0.0)
+TINY_VAE_2_2 = EasyDict(
+    dim=16,
+    dec_dim=16,
+    z_dim=48,
+    dim_mult=[1, 2, 4, 4],
+    num_res_blocks=2,
+    attn_scales=[],
+    temperal_downsample=[False, True, True],
+    dropout=0.0)
+TINY_VIDEO = (3, 9, 64, 64)
+
+# umT5 encoder
+TINY_T5 = EasyDict(
+    vocab=1024,
+    dim=128,
+    dim_attn=128,
+    dim_ffn=256,
+    num_heads=4,
+    num_layers=2,
+    num_buckets=32,
+    shared_pos=False,
+    dropout=0.0)
+TINY_TEXT_LEN = 64
+
+# schedulers
+NUM_STEPS = 40
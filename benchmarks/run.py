@@ -0,0 +1,212 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Micro-benchmarks of the hot paths of the Wan models on tiny random-weight
+configs, see `benchmarks/configs.py`. Everything runs on a CPU, so the
+effect of a change can be measured without a GPU or checkpoints.
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --baseline before.json
+    python -m benchmarks.run --compare before.json after.json
+
+A benchmark whose median is more than `--max_regression` slower than in the
+baseline fails the run. Compare results of the same machine, device and
+thread count only.
+"""
+import argparse
+import json
+import platform
+import re
+import subprocess
+import sys
+
+import torch
+
+# imported to register their benchmarks
+from . import (  # noqa: F401
+    bench_dit,
+    bench_io,
+    bench_lora,
+    bench_s2v,
+    bench_schedulers,
+    bench_t5,
+    bench_vae,
+)
+from .common import BENCHMARKS, measure
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the CPU-runnable micro-benchmarks of the Wan models."
+    )
+    parser.add_argument(
+        "--filter",
+        type=str,
+        default=None,
+        help="Only run the benchmarks whose name matches this regular expression, e.g. 'vae|t5'."
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="cpu",
+        help="The device to run on, e.g. cpu or cuda:0.")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="The number of CPU threads of torch, defaults to the torch default.")
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=2,
+        help="Untimed calls per benchmark.")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=10,
+        help="Minimum timed calls per benchmark.")
+    parser.add_argument(
+        "--min_seconds",
+        type=float,
+        default=1.0,
+        help="Minimum time spent timing each benchmark.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the results to this JSON file.")
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Compare against the results of an earlier run.")
+    parser.add_argument(
+        "--compare",
+        type=str,
+        nargs=2,
+        default=None,
+        metavar=("BASELINE", "RESULTS"),
+        help="Only compare two result files, without running anything.")
+    parser.add_argument(
+        "--max_regression",
+        type=float,
+        default=0.1,
+        help="Largest allowed relative slowdown of the median against the baseline."
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        default=False,
+        help="List the benchmarks and exit.")
+    return parser.parse_args()
+
+
+def _environment(device):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'device': str(device),
+        'device_name': torch.cuda.get_device_name(device)
+                       if device.type == 'cuda' else platform.processor(),
+        'threads': torch.get_num_threads(),
+        'torch': torch.__version__,
+        'python': platform.python_version(),
+    }
+
+
+def compare(baseline, results, max_regression):
+    r"""
+    Compares the medians of two result dicts of `run`.
+
+    Returns:
+        List[`str`]:
+            The benchmarks slower than `max_regression`.
+    """
+    for key in ('device', 'threads'):
+        if baseline['environment'].get(key) != results['environment'].get(
+                key):
+            print(f"warning: {key} differs, "
+                  f"{baseline['environment'].get(key)} in the baseline and "
+                  f"{results['environment'].get(key)} now")
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        before = baseline['benchmarks'][name]['median_ms']
+        after = result['median_ms']
+        change = after / max(before, 1e-9) - 1
+        flag = ''
+        if change > max_regression:
+            flag = '  REGRESSION'
+            regressions.append(f"{name} is {change:.0%} slower")
+        elif change < -max_regression:
+            flag = '  faster'
+        print(f"{name:24s} {before:10.3f} ms -> {after:10.3f} ms "
+              f"({change:+.1%}){flag}")
+    return regressions
+
+
+def run(args):
+    device = torch.device(args.device)
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    pattern = re.compile(args.filter) if args.filter else None
+
+    results = {'environment': _environment(device), 'benchmarks': {}}
+    for name, setup in BENCHMARKS.items():
+        if pattern is not None and not pattern.search(name):
+            continue
+        try:
+            with torch.no_grad():
+                fn = setup(device)
+        except ImportError as e:
+            # optional dependencies, e.g. of S2V
+            print(f"{name:24s} skipped, {e}")
+            continue
+        result = measure(
+            fn,
+            device,
+            warmup=args.warmup,
+            repeat=args.repeat,
+            min_seconds=args.min_seconds)
+        results['benchmarks'][name] = result
+        print(f"{name:24s} {result['median_ms']:10.3f} ms "
+              f"(min {result['min_ms']:.3f}, std {result['std_ms']:.3f}, "
+              f"n={result['repeat']})")
+    return results
+
+
+def main():
+    args = _parse_args()
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    if args.compare is not None:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+        if args.output is not None:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        baseline = None
+        if args.baseline is not None:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.max_regression)
+        if regressions:
+            print("\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
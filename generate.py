@@ -17,8 +17,12 @@ from PIL import Image
 import wan
 from wan.configs import MAX_AREA_CONFIGS, SIZE_CONFIGS, SUPPORTED_SIZES, WAN_CONFIGS
 from wan.distributed.util import init_distributed_group
-from wan.utils.prompt_extend import DashScopePromptExpander, QwenPromptExpander
-from wan.utils.utils import merge_video_audio, save_video, str2bool
+from wan.utils.compile import get_seq_len_buckets, save_compile_cache, set_compile_cache
+from wan.utils.guidance import GuidanceSchedule
+from wan.utils.memory_plan import PLANNED_FLAGS, plan_memory
+from wan.utils.profiler import enable_profiling, profiled, record_bytes
+from wan.utils.prompt_file import FileWorkQueue, load_prompt_file
+from wan.utils.utils import save_video, str2bool
 
 
 EXAMPLE_PROMPT = {
@@ -78,12 +82,18 @@ def _validate_args(args):
 
     if args.task == "i2v-A14B":
         assert args.image is not None, "Please specify the image path for i2v."
+    if args.prompt_file is not None:
+        assert os.path.exists(args.prompt_file), f"Prompt file {args.prompt_file} does not exist."
+        assert "animate" not in args.task, f"prompt_file is not supported for task {args.task}."
 
     cfg = WAN_CONFIGS[args.task]
 
     if args.sample_steps is None:
         args.sample_steps = cfg.sample_steps
 
+    if args.sample_tol is not None:
+        cfg.sample_rtol = args.sample_tol
+
     if args.sample_shift is None:
         args.sample_shift = cfg.sample_shift
 
@@ -134,7 +144,19 @@ def _parse_args():
         "--offload_model",
         type=str2bool,
         default=None,
-        help="Whether to offload the model to CPU after each model forward, reducing GPU memory usage."
+        help="Whether to offload the model to CPU after each model forward, reducing GPU memory usage. Chosen by the memory planner if omitted."
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        default=False,
+        help="Print the configuration the memory planner picks for the omitted --offload_model, --t5_cpu, --convert_model_dtype, --dit_fsdp, --t5_fsdp and --vae_parallel flags, and exit."
+    )
+    parser.add_argument(
+        "--plan_memory",
+        type=float,
+        default=None,
+        help="The device memory in GiB the planner fits the configuration into. Defaults to the memory of the GPU."
     )
     parser.add_argument(
         "--ulysses_size",
@@ -143,29 +165,133 @@ def _parse_args():
         help="The size of the ulysses parallelism in DiT.")
     parser.add_argument(
         "--t5_fsdp",
-        action="store_true",
-        default=False,
-        help="Whether to use FSDP for T5.")
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=None,
+        help="Whether to use FSDP for T5. Chosen by the memory planner if omitted.")
     parser.add_argument(
         "--t5_cpu",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=None,
+        help="Whether to place T5 model on CPU. Chosen by the memory planner if omitted.")
+    parser.add_argument(
+        "--t5_broadcast",
         action="store_true",
         default=False,
-        help="Whether to place T5 model on CPU.")
+        help="Whether to load T5 on rank 0 only and broadcast the encoded prompts to the other ranks."
+    )
     parser.add_argument(
         "--dit_fsdp",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=None,
+        help="Whether to use FSDP for DiT. Chosen by the memory planner if omitted.")
+    parser.add_argument(
+        "--dit_tp",
+        action="store_true",
+        default=False,
+        help="Whether to use tensor parallelism for DiT. An alternative to --dit_fsdp that keeps sharded weights resident."
+    )
+    parser.add_argument(
+        "--vae_parallel",
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=None,
+        help="Whether to split VAE decoding spatially across all ranks instead of decoding on rank 0. Chosen by the memory planner if omitted."
+    )
+    parser.add_argument(
+        "--cuda_graph",
+        action="store_true",
+        default=False,
+        help="Whether to capture each denoising step into a CUDA graph and replay it. Works best with --offload_model False."
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        default=False,
+        help="Whether to compile the DiT blocks with torch.compile. Inputs are padded to the sequence lengths of the supported sizes to avoid recompiles."
+    )
+    parser.add_argument(
+        "--compile_cache_dir",
+        type=str,
+        default=None,
+        help="The directory to persist compiled kernels in. Defaults to ~/.cache/wan/compile."
+    )
+    parser.add_argument(
+        "--dit_quant",
+        type=str,
+        default=None,
+        choices=["int8", "fp8"],
+        help="Load the weight-only quantized DiT checkpoint created by tools/quantize_dit.py."
+    )
+    parser.add_argument(
+        "--lora_path",
+        type=str,
+        default=None,
+        help="A LoRA safetensors file (peft or kohya keys) merged into every DiT of the pipeline after loading."
+    )
+    parser.add_argument(
+        "--lora_scale",
+        type=float,
+        default=1.0,
+        help="The strength of --lora_path.")
+    parser.add_argument(
+        "--token_merging",
+        type=float,
+        default=None,
+        help="The fraction of similar tokens merged within local windows before attention and FFN of the DiT blocks, e.g. 0.5. Disabled if omitted."
+    )
+    parser.add_argument(
+        "--token_merging_min_ratio",
+        type=float,
+        default=None,
+        help="The fraction merged at the last timestep, --token_merging decays linearly to it. Defaults to --token_merging."
+    )
+    parser.add_argument(
+        "--autotune",
         action="store_true",
         default=False,
-        help="Whether to use FSDP for DiT.")
+        help="Whether to benchmark the attention backends once per GPU, size and frame_num and use the fastest. Decisions are cached in autotune.json under ckpt_dir."
+    )
     parser.add_argument(
         "--save_file",
         type=str,
         default=None,
         help="The file to save the generated video to.")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="Record the wall time, CUDA time, peak memory and bytes moved of every stage and denoising step, and write a JSON summary and a Chrome/Perfetto trace per rank to --profile_dir."
+    )
+    parser.add_argument(
+        "--profile_dir",
+        type=str,
+        default="profile",
+        help="The directory of the --profile outputs, <task>_rank<rank>.json and <task>_rank<rank>.trace.json."
+    )
     parser.add_argument(
         "--prompt",
         type=str,
         default=None,
         help="The prompt to generate the video from.")
+    parser.add_argument(
+        "--prompt_file",
+        type=str,
+        default=None,
+        help="Generate a video for every item of this file with the pipeline loaded once. A .jsonl file holds objects with a prompt and optionally id, image, seed, size and save_file, any other file one prompt per line, lines starting with '#' are skipped. Items whose video exists are skipped. Without sequence parallel, FSDP or tensor parallelism every rank is an independent replica taking items from a shared queue."
+    )
+    parser.add_argument(
+        "--save_dir",
+        type=str,
+        default="outputs",
+        help="The directory of the videos of --prompt_file items without save_file, saved as <id>.mp4."
+    )
     parser.add_argument(
         "--use_prompt_extend",
         action="store_true",
@@ -202,8 +328,15 @@ def _parse_args():
         "--sample_solver",
         type=str,
         default='unipc',
-        choices=['unipc', 'dpm++'],
-        help="The solver used to sample.")
+        choices=['unipc', 'dpm++', 'euler', 'heun', 'adaptive'],
+        help="The solver used to sample. heun takes two model evaluations per step, adaptive chooses its own steps and uses --sample_steps for the first one."
+    )
+    parser.add_argument(
+        "--sample_tol",
+        type=float,
+        default=None,
+        help="The relative local error tolerance of the adaptive solver. Smaller values take more steps."
+    )
     parser.add_argument(
         "--sample_steps", type=int, default=None, help="The sampling steps.")
     parser.add_argument(
@@ -216,11 +349,31 @@ def _parse_args():
         type=float,
         default=None,
         help="Classifier free guidance scale.")
+    parser.add_argument(
+        "--guidance_interval",
+        type=float,
+        nargs=2,
+        default=None,
+        help="Only apply classifier free guidance for timesteps within this (low, high) window, as fractions of the training timesteps, e.g. 0.0 0.8."
+    )
+    parser.add_argument(
+        "--guidance_threshold",
+        type=float,
+        default=None,
+        help="Stop applying classifier free guidance once the relative norm of the cond/uncond difference drops below this value."
+    )
+    parser.add_argument(
+        "--uncond_every",
+        type=int,
+        default=1,
+        help="Compute the unconditional prediction every k steps and reuse it in between.")
     parser.add_argument(
         "--convert_model_dtype",
-        action="store_true",
-        default=False,
-        help="Whether to convert model paramerters dtype.")
+        type=str2bool,
+        nargs="?",
+        const=True,
+        default=None,
+        help="Whether to convert model paramerters dtype. Chosen by the memory planner if omitted.")
 
     # animate
     parser.add_argument(
@@ -312,97 +465,61 @@ def _init_logging(rank):
         logging.basicConfig(level=logging.ERROR)
 
 
-def generate(args):
-    rank = int(os.getenv("RANK", 0))
-    world_size = int(os.getenv("WORLD_SIZE", 1))
-    local_rank = int(os.getenv("LOCAL_RANK", 0))
-    device = local_rank
-    _init_logging(rank)
-
-    if args.offload_model is None:
-        args.offload_model = False if world_size > 1 else True
-        logging.info(
-            f"offload_model is not specified, set to {args.offload_model}.")
-    if world_size > 1:
-        torch.cuda.set_device(local_rank)
-        dist.init_process_group(
-            backend="nccl",
-            init_method="env://",
-            rank=rank,
-            world_size=world_size)
+def _plan(args, device, world_size, replicas):
+    if args.plan_memory is not None:
+        device_memory = int(args.plan_memory * (1 << 30))
     else:
-        assert not (
-            args.t5_fsdp or args.dit_fsdp
-        ), f"t5_fsdp and dit_fsdp are not supported in non-distributed environments."
-        assert not (
-            args.ulysses_size > 1
-        ), f"sequence parallel are not supported in non-distributed environments."
-
-    if args.ulysses_size > 1:
-        assert args.ulysses_size == world_size, f"The number of ulysses_size should be equal to the world size."
-        init_distributed_group()
-
-    if args.use_prompt_extend:
-        if args.prompt_extend_method == "dashscope":
-            prompt_expander = DashScopePromptExpander(
-                model_name=args.prompt_extend_model,
-                task=args.task,
-                is_vl=args.image is not None)
-        elif args.prompt_extend_method == "local_qwen":
-            prompt_expander = QwenPromptExpander(
-                model_name=args.prompt_extend_model,
-                task=args.task,
-                is_vl=args.image is not None,
-                device=rank)
-        else:
-            raise NotImplementedError(
-                f"Unsupport prompt_extend_method: {args.prompt_extend_method}")
+        device_memory = torch.cuda.get_device_properties(device).total_memory
+    plan = plan_memory(
+        WAN_CONFIGS[args.task],
+        args.task,
+        SIZE_CONFIGS[args.size],
+        args.frame_num,
+        args.sample_steps,
+        device_memory,
+        world_size=world_size,
+        ulysses_size=args.ulysses_size,
+        shardable=world_size > 1 and not replicas,
+        fixed={flag: getattr(args, flag) for flag in PLANNED_FLAGS},
+        t5_broadcast=args.t5_broadcast,
+        dit_tp=args.dit_tp,
+        dit_quant=args.dit_quant,
+        cuda_graph=args.cuda_graph,
+        compile=args.compile,
+        lora=args.lora_path is not None)
+    planned = {
+        flag: value
+        for flag, value in plan['flags'].items()
+        if getattr(args, flag) is None
+    }
+    for flag, value in plan['flags'].items():
+        setattr(args, flag, value)
+    logging.info(
+        f"Memory plan for {device_memory / (1 << 30):.1f} GiB: {planned}, "
+        f"estimated peak {plan['memory']['peak'] / (1 << 30):.1f} GiB.")
+    if not plan['fits']:
+        logging.warning(
+            "No configuration fits the device memory by the estimate, using the smallest one."
+        )
+    return plan
 
-    cfg = WAN_CONFIGS[args.task]
-    if args.ulysses_size > 1:
-        assert cfg.num_heads % args.ulysses_size == 0, f"`{cfg.num_heads=}` cannot be divided evenly by `{args.ulysses_size=}`."
 
-    logging.info(f"Generation job args: {args}")
-    logging.info(f"Generation model config: {cfg}")
-
-    if dist.is_initialized():
-        base_seed = [args.base_seed] if rank == 0 else [None]
-        dist.broadcast_object_list(base_seed, src=0)
-        args.base_seed = base_seed[0]
+def _format_plan(plan):
+    lines = [f"--{flag} {value}" for flag, value in plan['flags'].items()]
+    lines += [
+        f"{phase:>8s}: {nbytes / (1 << 30):.1f} GiB"
+        for phase, nbytes in plan['memory'].items()
+    ]
+    lines.append(f"estimated overhead: {plan['cost']:.1f} s" +
+                 ("" if plan['fits'] else ", does not fit"))
+    return "\n".join(lines)
 
-    logging.info(f"Input prompt: {args.prompt}")
-    img = None
-    if args.image is not None:
-        img = Image.open(args.image).convert("RGB")
-        logging.info(f"Input image: {args.image}")
-
-    # prompt extend
-    if args.use_prompt_extend:
-        logging.info("Extending prompt ...")
-        if rank == 0:
-            prompt_output = prompt_expander(
-                args.prompt,
-                image=img,
-                tar_lang=args.prompt_extend_target_lang,
-                seed=args.base_seed)
-            if prompt_output.status == False:
-                logging.info(
-                    f"Extending prompt failed: {prompt_output.message}")
-                logging.info("Falling back to original prompt.")
-                input_prompt = args.prompt
-            else:
-                input_prompt = prompt_output.prompt
-            input_prompt = [input_prompt]
-        else:
-            input_prompt = [None]
-        if dist.is_initialized():
-            dist.broadcast_object_list(input_prompt, src=0)
-        args.prompt = input_prompt[0]
-        logging.info(f"Extended prompt: {args.prompt}")
 
+@profiled('load')
+def _create_pipeline(args, cfg, device, rank, seq_len_buckets):
     if "t2v" in args.task:
         logging.info("Creating WanT2V pipeline.")
-        wan_t2v = wan.WanT2V(
+        return wan.WanT2V(
             config=cfg,
             checkpoint_dir=args.ckpt_dir,
             device_id=device,
@@ -412,22 +529,18 @@ def generate(args):
             use_sp=(args.ulysses_size > 1),
             t5_cpu=args.t5_cpu,
             convert_model_dtype=args.convert_model_dtype,
+            t5_broadcast=args.t5_broadcast,
+            vae_parallel=args.vae_parallel,
+            dit_tp=args.dit_tp,
+            cuda_graph=args.cuda_graph,
+            compile_dit=args.compile,
+            seq_len_buckets=seq_len_buckets,
+            dit_quant=args.dit_quant,
+            autotune=args.autotune,
         )
-
-        logging.info(f"Generating video ...")
-        video = wan_t2v.generate(
-            args.prompt,
-            size=SIZE_CONFIGS[args.size],
-            frame_num=args.frame_num,
-            shift=args.sample_shift,
-            sample_solver=args.sample_solver,
-            sampling_steps=args.sample_steps,
-            guide_scale=args.sample_guide_scale,
-            seed=args.base_seed,
-            offload_model=args.offload_model)
     elif "ti2v" in args.task:
         logging.info("Creating WanTI2V pipeline.")
-        wan_ti2v = wan.WanTI2V(
+        return wan.WanTI2V(
             config=cfg,
             checkpoint_dir=args.ckpt_dir,
             device_id=device,
@@ -437,24 +550,18 @@ def generate(args):
             use_sp=(args.ulysses_size > 1),
             t5_cpu=args.t5_cpu,
             convert_model_dtype=args.convert_model_dtype,
+            t5_broadcast=args.t5_broadcast,
+            vae_parallel=args.vae_parallel,
+            dit_tp=args.dit_tp,
+            cuda_graph=args.cuda_graph,
+            compile_dit=args.compile,
+            seq_len_buckets=seq_len_buckets,
+            dit_quant=args.dit_quant,
+            autotune=args.autotune,
         )
-
-        logging.info(f"Generating video ...")
-        video = wan_ti2v.generate(
-            args.prompt,
-            img=img,
-            size=SIZE_CONFIGS[args.size],
-            max_area=MAX_AREA_CONFIGS[args.size],
-            frame_num=args.frame_num,
-            shift=args.sample_shift,
-            sample_solver=args.sample_solver,
-            sampling_steps=args.sample_steps,
-            guide_scale=args.sample_guide_scale,
-            seed=args.base_seed,
-            offload_model=args.offload_model)
     elif "animate" in args.task:
         logging.info("Creating Wan-Animate pipeline.")
-        wan_animate = wan.WanAnimate(
+        return wan.WanAnimate(
             config=cfg,
             checkpoint_dir=args.ckpt_dir,
             device_id=device,
@@ -464,24 +571,13 @@ def generate(args):
             use_sp=(args.ulysses_size > 1),
             t5_cpu=args.t5_cpu,
             convert_model_dtype=args.convert_model_dtype,
+            t5_broadcast=args.t5_broadcast,
+            vae_parallel=args.vae_parallel,
             use_relighting_lora=args.use_relighting_lora
         )
-
-        logging.info(f"Generating video ...")
-        video = wan_animate.generate(
-            src_root_path=args.src_root_path,
-            replace_flag=args.replace_flag,
-            refert_num = args.refert_num,
-            clip_len=args.frame_num,
-            shift=args.sample_shift,
-            sample_solver=args.sample_solver,
-            sampling_steps=args.sample_steps,
-            guide_scale=args.sample_guide_scale,
-            seed=args.base_seed,
-            offload_model=args.offload_model)
     elif "s2v" in args.task:
         logging.info("Creating WanS2V pipeline.")
-        wan_s2v = wan.WanS2V(
+        return wan.WanS2V(
             config=cfg,
             checkpoint_dir=args.ckpt_dir,
             device_id=device,
@@ -491,11 +587,111 @@ def generate(args):
             use_sp=(args.ulysses_size > 1),
             t5_cpu=args.t5_cpu,
             convert_model_dtype=args.convert_model_dtype,
+            t5_broadcast=args.t5_broadcast,
+            vae_parallel=args.vae_parallel,
         )
-        logging.info(f"Generating video ...")
-        video = wan_s2v.generate(
-            input_prompt=args.prompt,
-            ref_image_path=args.image,
+    logging.info("Creating WanI2V pipeline.")
+    return wan.WanI2V(
+        config=cfg,
+        checkpoint_dir=args.ckpt_dir,
+        device_id=device,
+        rank=rank,
+        t5_fsdp=args.t5_fsdp,
+        dit_fsdp=args.dit_fsdp,
+        use_sp=(args.ulysses_size > 1),
+        t5_cpu=args.t5_cpu,
+        convert_model_dtype=args.convert_model_dtype,
+        t5_broadcast=args.t5_broadcast,
+        vae_parallel=args.vae_parallel,
+        dit_tp=args.dit_tp,
+        cuda_graph=args.cuda_graph,
+        compile_dit=args.compile,
+        seq_len_buckets=seq_len_buckets,
+        dit_quant=args.dit_quant,
+        autotune=args.autotune,
+    )
+
+
+def _apply_token_merging(pipeline, args, cfg):
+    # imported here, only needed with token merging
+    from wan.modules.tome import TokenMerging
+    token_merging = TokenMerging(
+        ratio=args.token_merging,
+        min_ratio=args.token_merging_min_ratio,
+        num_train_timesteps=cfg.num_train_timesteps)
+    for name in ('model', 'low_noise_model', 'high_noise_model'):
+        model = getattr(pipeline, name, None)
+        if model is not None:
+            # the module wrapped by FSDP runs the forward
+            getattr(model, 'module', model).token_merging = token_merging
+
+
+def _apply_lora(pipeline, args):
+    # imported here, only needed with a LoRA
+    from wan.modules.lora import LoraManager
+    managers = []
+    for name in ('model', 'low_noise_model', 'high_noise_model'):
+        model = getattr(pipeline, name, None)
+        if model is None:
+            continue
+        # merged once for the whole run, never deactivated
+        manager = LoraManager(model, keep_originals=False)
+        manager.activate(
+            os.path.basename(args.lora_path),
+            args.lora_path,
+            scale=args.lora_scale,
+            merge=args.dit_quant is None)
+        managers.append(manager)
+    return managers
+
+
+@profiled('generate')
+def _generate_video(pipeline, args, prompt, img, image_path, size, seed,
+                    guidance_schedule):
+    logging.info(f"Generating video ...")
+    if "t2v" in args.task:
+        return pipeline.generate(
+            prompt,
+            size=SIZE_CONFIGS[size],
+            frame_num=args.frame_num,
+            shift=args.sample_shift,
+            sample_solver=args.sample_solver,
+            sampling_steps=args.sample_steps,
+            guide_scale=args.sample_guide_scale,
+            seed=seed,
+            offload_model=args.offload_model,
+            guidance_schedule=guidance_schedule)
+    elif "ti2v" in args.task:
+        return pipeline.generate(
+            prompt,
+            img=img,
+            size=SIZE_CONFIGS[size],
+            max_area=MAX_AREA_CONFIGS[size],
+            frame_num=args.frame_num,
+            shift=args.sample_shift,
+            sample_solver=args.sample_solver,
+            sampling_steps=args.sample_steps,
+            guide_scale=args.sample_guide_scale,
+            seed=seed,
+            offload_model=args.offload_model,
+            guidance_schedule=guidance_schedule)
+    elif "animate" in args.task:
+        return pipeline.generate(
+            src_root_path=args.src_root_path,
+            replace_flag=args.replace_flag,
+            refert_num = args.refert_num,
+            clip_len=args.frame_num,
+            shift=args.sample_shift,
+            sample_solver=args.sample_solver,
+            sampling_steps=args.sample_steps,
+            guide_scale=args.sample_guide_scale,
+            seed=seed,
+            offload_model=args.offload_model,
+            guidance_schedule=guidance_schedule)
+    elif "s2v" in args.task:
+        return pipeline.generate(
+            input_prompt=prompt,
+            ref_image_path=image_path,
             audio_path=args.audio,
             enable_tts=args.enable_tts,
             tts_prompt_audio=args.tts_prompt_audio,
@@ -503,66 +699,319 @@ def generate(args):
             tts_text=args.tts_text,
             num_repeat=args.num_clip,
             pose_video=args.pose_video,
-            max_area=MAX_AREA_CONFIGS[args.size],
+            max_area=MAX_AREA_CONFIGS[size],
             infer_frames=args.infer_frames,
             shift=args.sample_shift,
             sample_solver=args.sample_solver,
             sampling_steps=args.sample_steps,
             guide_scale=args.sample_guide_scale,
-            seed=args.base_seed,
+            seed=seed,
             offload_model=args.offload_model,
             init_first_frame=args.start_from_ref,
+            guidance_schedule=guidance_schedule,
         )
+    return pipeline.generate(
+        prompt,
+        img,
+        max_area=MAX_AREA_CONFIGS[size],
+        frame_num=args.frame_num,
+        shift=args.sample_shift,
+        sample_solver=args.sample_solver,
+        sampling_steps=args.sample_steps,
+        guide_scale=args.sample_guide_scale,
+        seed=seed,
+        offload_model=args.offload_model,
+        guidance_schedule=guidance_schedule)
+
+
+@profiled('prompt_extend')
+def _extend_prompt(prompt_expander, prompt, img, args, rank, broadcast=True):
+    logging.info("Extending prompt ...")
+    if rank == 0 or not broadcast:
+        prompt_output = prompt_expander(
+            prompt,
+            image=img,
+            tar_lang=args.prompt_extend_target_lang,
+            seed=args.base_seed)
+        if prompt_output.status == False:
+            logging.info(f"Extending prompt failed: {prompt_output.message}")
+            logging.info("Falling back to original prompt.")
+            input_prompt = prompt
+        else:
+            input_prompt = prompt_output.prompt
+        input_prompt = [input_prompt]
     else:
-        logging.info("Creating WanI2V pipeline.")
-        wan_i2v = wan.WanI2V(
-            config=cfg,
-            checkpoint_dir=args.ckpt_dir,
-            device_id=device,
+        input_prompt = [None]
+    if broadcast and dist.is_initialized():
+        dist.broadcast_object_list(input_prompt, src=0)
+    logging.info(f"Extended prompt: {input_prompt[0]}")
+    return input_prompt[0]
+
+
+@profiled('save')
+def _save(args, cfg, video, save_file):
+    logging.info(f"Saving generated video to {save_file}")
+    audio_path = None
+    if "s2v" in args.task:
+        audio_path = args.audio if args.enable_tts is False else "tts.wav"
+    save_video(
+        tensor=video[None],
+        save_file=save_file,
+        fps=cfg.sample_fps,
+        nrow=1,
+        normalize=True,
+        value_range=(-1, 1),
+        audio_path=audio_path)
+    record_bytes(video)
+
+
+def _generate_prompt_file(args, pipeline, prompt_expander, guidance_schedule,
+                          rank, world_size, replicas):
+    r"""
+    Generates the items of `args.prompt_file`. Replicas take items from the
+    shared queue on their own, otherwise rank 0 takes them and broadcasts
+    each one to the ranks sharing the model.
+    """
+    cfg = WAN_CONFIGS[args.task]
+    items = load_prompt_file(args.prompt_file, save_dir=args.save_dir)
+    for item in items:
+        size = item['size'] or args.size
+        if not 's2v' in args.task:
+            assert size in SUPPORTED_SIZES[
+                args.
+                task], f"Unsupport size {size} of item {item['id']} for task {args.task}, supported sizes are: {', '.join(SUPPORTED_SIZES[args.task])}"
+        if args.task == "i2v-A14B" or "s2v" in args.task:
+            assert (item['image'] or args.image) is not None, f"Please specify the image of item {item['id']}."
+
+    queue = None
+    if replicas or rank == 0:
+        queue = FileWorkQueue(
+            items,
+            os.path.join(args.save_dir, '.claims'),
+            rank=rank if replicas else 0,
+            world_size=world_size if replicas else 1,
+            # set by torchrun and shared by all ranks of a launch
+            run_id=os.getenv("TORCHELASTIC_RUN_ID"))
+        logging.info(
+            f"{len(queue.pending())} of {len(items)} items left to generate.")
+    claimed = iter(queue) if queue is not None else None
+
+    num_done = 0
+    while True:
+        item = next(claimed, None) if claimed is not None else None
+        if not replicas and dist.is_initialized():
+            item = [item]
+            dist.broadcast_object_list(item, src=0)
+            item = item[0]
+        if item is None:
+            break
+
+        logging.info(f"[rank {rank}] Item {item['id']}: {item['prompt']}")
+        try:
+            image_path = item['image'] or args.image
+            img = None
+            if image_path is not None and "t2v" not in args.task:
+                img = Image.open(image_path).convert("RGB")
+            prompt = item['prompt']
+            if args.use_prompt_extend:
+                prompt = _extend_prompt(
+                    prompt_expander, prompt, img, args, rank,
+                    broadcast=not replicas)
+            seed = item['seed'] if item['seed'] is not None else args.base_seed
+            video = _generate_video(pipeline, args, prompt, img, image_path,
+                                    item['size'] or args.size, seed,
+                                    guidance_schedule)
+            if rank == 0 or replicas:
+                # write under a temporary name, so that only complete videos
+                # count as done
+                save_file = item['save_file']
+                base, ext = os.path.splitext(save_file)
+                partial = f"{base}.{os.getpid()}.partial{ext}"
+                os.makedirs(os.path.dirname(save_file) or '.', exist_ok=True)
+                _save(args, cfg, video, partial)
+                if os.path.exists(partial):
+                    os.replace(partial, save_file)
+                    num_done += 1
+                else:
+                    logging.error(f"Saving item {item['id']} failed.")
+            del video
+        except Exception:
+            if not replicas:
+                raise
+            logging.exception(f"[rank {rank}] Item {item['id']} failed.")
+        finally:
+            if queue is not None:
+                queue.release(item)
+    logging.info(f"[rank {rank}] Generated {num_done} videos.")
+
+
+def generate(args):
+    rank = int(os.getenv("RANK", 0))
+    world_size = int(os.getenv("WORLD_SIZE", 1))
+    local_rank = int(os.getenv("LOCAL_RANK", 0))
+    device = local_rank
+    # without any model parallelism, the ranks of a prompt file run are
+    # independent replicas and never communicate
+    replicas = args.prompt_file is not None and world_size > 1 and not (
+        args.ulysses_size > 1 or args.t5_fsdp or args.dit_fsdp or
+        args.dit_tp or args.vae_parallel or args.t5_broadcast)
+    _init_logging(0 if replicas else rank)
+
+    if args.plan or any(getattr(args, flag) is None for flag in PLANNED_FLAGS):
+        plan = _plan(args, local_rank, world_size, replicas)
+        if args.plan:
+            if rank == 0:
+                print(_format_plan(plan))
+            return
+    if replicas:
+        torch.cuda.set_device(local_rank)
+    elif world_size > 1:
+        torch.cuda.set_device(local_rank)
+        dist.init_process_group(
+            backend="nccl",
+            init_method="env://",
             rank=rank,
-            t5_fsdp=args.t5_fsdp,
-            dit_fsdp=args.dit_fsdp,
-            use_sp=(args.ulysses_size > 1),
-            t5_cpu=args.t5_cpu,
-            convert_model_dtype=args.convert_model_dtype,
+            world_size=world_size)
+    else:
+        assert not (
+            args.t5_fsdp or args.dit_fsdp or args.dit_tp
+        ), f"t5_fsdp, dit_fsdp and dit_tp are not supported in non-distributed environments."
+        assert not (
+            args.ulysses_size > 1
+        ), f"sequence parallel are not supported in non-distributed environments."
+    if args.profile:
+        # after selecting the device, the CUDA events are recorded on it
+        profiler = enable_profiling(rank=rank)
+
+    if args.ulysses_size > 1:
+        assert args.ulysses_size == world_size, f"The number of ulysses_size should be equal to the world size."
+        init_distributed_group()
+
+    if args.use_prompt_extend:
+        # imports dashscope, only needed here
+        from wan.utils.prompt_extend import (
+            DashScopePromptExpander,
+            QwenPromptExpander,
         )
-        logging.info("Generating video ...")
-        video = wan_i2v.generate(
-            args.prompt,
-            img,
-            max_area=MAX_AREA_CONFIGS[args.size],
-            frame_num=args.frame_num,
-            shift=args.sample_shift,
-            sample_solver=args.sample_solver,
-            sampling_steps=args.sample_steps,
-            guide_scale=args.sample_guide_scale,
-            seed=args.base_seed,
-            offload_model=args.offload_model)
+        if args.prompt_extend_method == "dashscope":
+            prompt_expander = DashScopePromptExpander(
+                model_name=args.prompt_extend_model,
+                task=args.task,
+                is_vl=args.image is not None)
+        elif args.prompt_extend_method == "local_qwen":
+            prompt_expander = QwenPromptExpander(
+                model_name=args.prompt_extend_model,
+                task=args.task,
+                is_vl=args.image is not None,
+                device=rank)
+        else:
+            raise NotImplementedError(
+                f"Unsupport prompt_extend_method: {args.prompt_extend_method}")
 
-    if rank == 0:
-        if args.save_file is None:
-            formatted_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-            formatted_prompt = args.prompt.replace(" ", "_").replace("/",
-                                                                     "_")[:50]
-            suffix = '.mp4'
-            args.save_file = f"{args.task}_{args.size.replace('*','x') if sys.platform=='win32' else args.size}_{args.ulysses_size}_{formatted_prompt}_{formatted_time}" + suffix
-
-        logging.info(f"Saving generated video to {args.save_file}")
-        save_video(
-            tensor=video[None],
-            save_file=args.save_file,
-            fps=cfg.sample_fps,
-            nrow=1,
-            normalize=True,
-            value_range=(-1, 1))
-        if "s2v" in args.task:
-            if args.enable_tts is False:
-                merge_video_audio(video_path=args.save_file, audio_path=args.audio)
-            else:
-                merge_video_audio(video_path=args.save_file, audio_path="tts.wav")
-    del video
+    cfg = WAN_CONFIGS[args.task]
+    if args.ulysses_size > 1:
+        assert cfg.num_heads % args.ulysses_size == 0, f"`{cfg.num_heads=}` cannot be divided evenly by `{args.ulysses_size=}`."
+    if args.t5_broadcast:
+        assert not args.t5_fsdp, f"t5_broadcast cannot be combined with t5_fsdp."
+    if args.dit_tp:
+        assert not (args.dit_fsdp or args.ulysses_size > 1
+                   ), f"dit_tp cannot be combined with dit_fsdp or ulysses_size > 1."
+        assert "s2v" not in args.task and "animate" not in args.task, f"dit_tp is not supported for task {args.task}."
+        assert cfg.num_heads % world_size == 0, f"`{cfg.num_heads=}` cannot be divided evenly by `{world_size=}`."
+        assert cfg.ffn_dim % world_size == 0, f"`{cfg.ffn_dim=}` cannot be divided evenly by `{world_size=}`."
+    if args.cuda_graph:
+        assert not (args.dit_fsdp or args.dit_tp or args.ulysses_size > 1
+                   ), f"cuda_graph cannot be combined with dit_fsdp, dit_tp or ulysses_size > 1."
+        assert "s2v" not in args.task and "animate" not in args.task, f"cuda_graph is not supported for task {args.task}."
+        assert args.sample_solver in ("unipc", "dpm++"), f"cuda_graph is not supported for sample_solver {args.sample_solver}."
+        assert args.guidance_interval is None and args.guidance_threshold is None and args.uncond_every == 1, \
+            f"cuda_graph cannot be combined with a guidance schedule."
+    if args.dit_quant is not None:
+        assert not (args.dit_fsdp or args.dit_tp
+                   ), f"dit_quant cannot be combined with dit_fsdp or dit_tp."
+        assert "s2v" not in args.task and "animate" not in args.task, f"dit_quant is not supported for task {args.task}."
+    if args.autotune:
+        assert "s2v" not in args.task and "animate" not in args.task, f"autotune is not supported for task {args.task}."
+    if args.lora_path is not None:
+        assert not (args.dit_fsdp or args.dit_tp
+                   ), f"lora_path cannot be combined with dit_fsdp or dit_tp."
+        assert "animate" not in args.task, f"lora_path is not supported for task {args.task}, see --use_relighting_lora."
+    if args.token_merging is not None:
+        assert args.ulysses_size == 1 and not (
+            args.cuda_graph or args.compile
+        ), f"token_merging cannot be combined with ulysses_size > 1, cuda_graph or compile."
+        assert "s2v" not in args.task and "animate" not in args.task, f"token_merging is not supported for task {args.task}."
+    seq_len_buckets = None
+    if args.compile:
+        assert not args.dit_fsdp, f"compile cannot be combined with dit_fsdp."
+        assert "s2v" not in args.task and "animate" not in args.task, f"compile is not supported for task {args.task}."
+        if args.compile_cache_dir is None:
+            args.compile_cache_dir = os.path.expanduser("~/.cache/wan/compile")
+        set_compile_cache(args.compile_cache_dir)
+        seq_len_buckets = get_seq_len_buckets(
+            [SIZE_CONFIGS[size] for size in SUPPORTED_SIZES[args.task]],
+            args.frame_num, cfg.vae_stride, cfg.patch_size, args.ulysses_size)
+
+    logging.info(f"Generation job args: {args}")
+    logging.info(f"Generation model config: {cfg}")
+
+    if dist.is_initialized():
+        base_seed = [args.base_seed] if rank == 0 else [None]
+        dist.broadcast_object_list(base_seed, src=0)
+        args.base_seed = base_seed[0]
+
+    guidance_schedule = GuidanceSchedule(
+        interval=args.guidance_interval,
+        delta_threshold=args.guidance_threshold,
+        uncond_every=args.uncond_every,
+        num_train_timesteps=cfg.num_train_timesteps)
+
+    pipeline = _create_pipeline(args, cfg, device, 0 if replicas else rank,
+                                seq_len_buckets)
+    if args.lora_path is not None:
+        _apply_lora(pipeline, args)
+    if args.token_merging is not None:
+        _apply_token_merging(pipeline, args, cfg)
+
+    if args.prompt_file is not None:
+        _generate_prompt_file(args, pipeline,
+                              prompt_expander if args.use_prompt_extend else
+                              None, guidance_schedule, rank, world_size,
+                              replicas)
+    else:
+        logging.info(f"Input prompt: {args.prompt}")
+        img = None
+        if args.image is not None:
+            img = Image.open(args.image).convert("RGB")
+            logging.info(f"Input image: {args.image}")
+
+        # prompt extend
+        if args.use_prompt_extend:
+            args.prompt = _extend_prompt(prompt_expander, args.prompt, img,
+                                         args, rank)
+
+        video = _generate_video(pipeline, args, args.prompt, img, args.image,
+                                args.size, args.base_seed, guidance_schedule)
+
+        if rank == 0:
+            if args.save_file is None:
+                formatted_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+                formatted_prompt = args.prompt.replace(" ", "_").replace(
+                    "/", "_")[:50]
+                suffix = '.mp4'
+                args.save_file = f"{args.task}_{args.size.replace('*','x') if sys.platform=='win32' else args.size}_{args.ulysses_size}_{formatted_prompt}_{formatted_time}" + suffix
+            _save(args, cfg, video, args.save_file)
+        del video
+
+    if args.compile and rank == 0:
+        save_compile_cache(args.compile_cache_dir)
 
     torch.cuda.synchronize()
+    if args.profile:
+        summary_file, trace_file = profiler.save(
+            os.path.join(args.profile_dir, f"{args.task}_rank{rank}.json"))
+        profiler.log_summary()
+        logging.info(f"Saved the profile to {summary_file} and {trace_file}")
     if dist.is_initialized():
         dist.barrier()
         dist.destroy_process_group()
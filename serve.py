@@ -0,0 +1,312 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+r"""
+Long-running generation server. Pipelines are loaded once and stay resident,
+jobs are submitted over HTTP or a Unix socket, see `wan/serving/client.py`.
+
+    python serve.py --pipeline t2v-A14B=./Wan2.2-T2V-A14B --port 8000
+    torchrun --nproc_per_node=8 serve.py --pipeline t2v-A14B=./Wan2.2-T2V-A14B \
+        --dit_fsdp --t5_fsdp --ulysses_size 8
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import warnings
+
+warnings.filterwarnings('ignore')
+
+import torch
+import torch.distributed as dist
+
+from wan.configs import SIZE_CONFIGS, SUPPORTED_SIZES, WAN_CONFIGS
+from wan.distributed.util import init_distributed_group
+from wan.serving import (
+    BatchScheduler,
+    JobQueue,
+    TextEmbeddingCache,
+    Worker,
+    create_pipeline,
+    start_server,
+)
+from wan.utils.compile import get_seq_len_buckets, save_compile_cache, set_compile_cache
+from wan.utils.utils import str2bool
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serve Wan pipelines to a queue of generation jobs")
+    parser.add_argument(
+        "--pipeline",
+        type=str,
+        nargs="+",
+        required=True,
+        help="The pipelines to keep resident, as task=checkpoint_dir.")
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="The address to listen on.")
+    parser.add_argument(
+        "--port", type=int, default=8000, help="The port to listen on.")
+    parser.add_argument(
+        "--unix_socket",
+        type=str,
+        default=None,
+        help="Listen on this Unix socket instead of host and port.")
+    parser.add_argument(
+        "--save_dir",
+        type=str,
+        default="outputs",
+        help="The directory of the generated videos.")
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=5.0,
+        help="Seconds between heartbeats of the ranks while idle.")
+    parser.add_argument(
+        "--max_batch",
+        type=int,
+        default=1,
+        help="Largest number of compatible t2v, i2v or ti2v jobs sampled together, 1 disables batching."
+    )
+    parser.add_argument(
+        "--max_wait",
+        type=float,
+        default=0.5,
+        help="Seconds to wait for compatible jobs before a batch starts.")
+    parser.add_argument(
+        "--max_batch_tokens",
+        type=int,
+        default=None,
+        help="Token budget per rank of a batch, counting both CFG branches. Derived from the free GPU memory if not set."
+    )
+    parser.add_argument(
+        "--text_cache_size",
+        type=int,
+        default=64,
+        help="Number of prompt embeddings cached per pipeline, 0 disables the cache."
+    )
+    parser.add_argument(
+        "--pipeline_stages",
+        action="store_true",
+        default=False,
+        help="Whether to overlap text encoding, VAE decoding and video writing of consecutive jobs with sampling."
+    )
+    parser.add_argument(
+        "--mux_workers",
+        type=int,
+        default=2,
+        help="Processes writing videos with --pipeline_stages.")
+    parser.add_argument(
+        "--offload_model",
+        type=str2bool,
+        default=None,
+        help="Whether to offload the model to CPU after each model forward, reducing GPU memory usage."
+    )
+    parser.add_argument(
+        "--ulysses_size",
+        type=int,
+        default=1,
+        help="The size of the ulysses parallelism in DiT.")
+    parser.add_argument(
+        "--t5_fsdp",
+        action="store_true",
+        default=False,
+        help="Whether to use FSDP for T5.")
+    parser.add_argument(
+        "--t5_cpu",
+        action="store_true",
+        default=False,
+        help="Whether to place T5 model on CPU.")
+    parser.add_argument(
+        "--t5_broadcast",
+        action="store_true",
+        default=False,
+        help="Whether to run T5 on rank 0 only and broadcast the text embeddings.")
+    parser.add_argument(
+        "--dit_fsdp",
+        action="store_true",
+        default=False,
+        help="Whether to use FSDP for DiT.")
+    parser.add_argument(
+        "--dit_tp",
+        action="store_true",
+        default=False,
+        help="Whether to use tensor parallelism for DiT.")
+    parser.add_argument(
+        "--vae_parallel",
+        action="store_true",
+        default=False,
+        help="Whether to decode with all ranks.")
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        default=False,
+        help="Whether to compile the DiT blocks with torch.compile.")
+    parser.add_argument(
+        "--compile_cache_dir",
+        type=str,
+        default=None,
+        help="The directory of the compile cache.")
+    parser.add_argument(
+        "--dit_quant",
+        type=str,
+        default=None,
+        choices=["int8", "fp8"],
+        help="Load weight-only quantized DiT checkpoints.")
+    parser.add_argument(
+        "--autotune",
+        action="store_true",
+        default=False,
+        help="Whether to pick the fastest attention backend per size, cached under the checkpoint dir.")
+    parser.add_argument(
+        "--convert_model_dtype",
+        action="store_true",
+        default=False,
+        help="Whether to convert model paramerters dtype.")
+    args = parser.parse_args()
+
+    pipelines = {}
+    for item in args.pipeline:
+        task, sep, ckpt_dir = item.partition('=')
+        assert sep, f"Expected task=checkpoint_dir, got {item}."
+        assert task in WAN_CONFIGS, f"Unsupport task: {task}"
+        pipelines[task] = ckpt_dir
+    args.pipeline = pipelines
+    return args
+
+
+def _init_logging(rank):
+    # logging
+    if rank == 0:
+        # set format
+        logging.basicConfig(
+            level=logging.INFO,
+            format="[%(asctime)s] %(levelname)s: %(message)s",
+            handlers=[logging.StreamHandler(stream=sys.stdout)])
+    else:
+        logging.basicConfig(level=logging.ERROR)
+
+
+def serve(args):
+    rank = int(os.getenv("RANK", 0))
+    world_size = int(os.getenv("WORLD_SIZE", 1))
+    local_rank = int(os.getenv("LOCAL_RANK", 0))
+    _init_logging(rank)
+
+    if args.offload_model is None:
+        args.offload_model = False if world_size > 1 else True
+        logging.info(
+            f"offload_model is not specified, set to {args.offload_model}.")
+    if world_size > 1:
+        torch.cuda.set_device(local_rank)
+        dist.init_process_group(
+            backend="nccl",
+            init_method="env://",
+            rank=rank,
+            world_size=world_size)
+    else:
+        assert not (
+            args.t5_fsdp or args.dit_fsdp or args.dit_tp
+        ), f"t5_fsdp, dit_fsdp and dit_tp are not supported in non-distributed environments."
+        assert not (
+            args.ulysses_size > 1
+        ), f"sequence parallel are not supported in non-distributed environments."
+    if args.ulysses_size > 1:
+        assert args.ulysses_size == world_size, f"The number of ulysses_size should be equal to the world size."
+        init_distributed_group()
+    if args.t5_broadcast:
+        assert not args.t5_fsdp, f"t5_broadcast cannot be combined with t5_fsdp."
+    if args.compile:
+        if args.compile_cache_dir is None:
+            args.compile_cache_dir = os.path.expanduser("~/.cache/wan/compile")
+        set_compile_cache(args.compile_cache_dir)
+
+    pipelines = {}
+    for task, ckpt_dir in args.pipeline.items():
+        cfg = WAN_CONFIGS[task]
+        seq_len_buckets = None
+        if args.compile and "s2v" not in task and "animate" not in task:
+            seq_len_buckets = get_seq_len_buckets(
+                [SIZE_CONFIGS[size] for size in SUPPORTED_SIZES[task]],
+                cfg.frame_num, cfg.vae_stride, cfg.patch_size,
+                args.ulysses_size)
+        logging.info(f"Creating {task} pipeline from {ckpt_dir}.")
+        pipeline = create_pipeline(
+            task,
+            ckpt_dir,
+            device_id=local_rank,
+            rank=rank,
+            ulysses_size=args.ulysses_size,
+            t5_fsdp=args.t5_fsdp,
+            dit_fsdp=args.dit_fsdp,
+            t5_cpu=args.t5_cpu,
+            convert_model_dtype=args.convert_model_dtype,
+            t5_broadcast=args.t5_broadcast,
+            vae_parallel=args.vae_parallel,
+            dit_tp=args.dit_tp,
+            compile_dit=args.compile,
+            seq_len_buckets=seq_len_buckets,
+            dit_quant=args.dit_quant,
+            autotune=args.autotune,
+            use_relighting_lora=False)
+        if args.text_cache_size > 0 and pipeline.text_encoder is not None:
+            pipeline.text_encoder = TextEmbeddingCache(
+                pipeline.text_encoder, capacity=args.text_cache_size)
+        pipelines[task] = pipeline
+
+    # prompts are only prefetched while T5 stays on one device
+    prefetch_text = not args.t5_fsdp and (args.t5_cpu or
+                                          not args.offload_model)
+    if args.pipeline_stages and not prefetch_text:
+        logging.info(
+            "Prompts are not prefetched with t5_fsdp, or offload_model without t5_cpu."
+        )
+    worker = Worker(
+        pipelines,
+        save_dir=args.save_dir,
+        rank=rank,
+        offload_model=args.offload_model,
+        pipeline_stages=args.pipeline_stages,
+        mux_workers=args.mux_workers,
+        prefetch_text=prefetch_text)
+    queue = None
+    if rank == 0:
+        queue = JobQueue()
+        server = start_server(
+            queue,
+            worker,
+            host=args.host,
+            port=args.port,
+            unix_socket=args.unix_socket)
+
+        def _stop(signum, frame):
+            logging.info("Stopping after the running job ...")
+            worker.stop()
+
+        signal.signal(signal.SIGINT, _stop)
+        signal.signal(signal.SIGTERM, _stop)
+
+    scheduler = None
+    if args.max_batch > 1:
+        scheduler = BatchScheduler(
+            pipelines,
+            max_batch=args.max_batch,
+            max_wait=args.max_wait,
+            max_batch_tokens=args.max_batch_tokens)
+    worker.run(queue, poll_interval=args.poll_interval, scheduler=scheduler)
+
+    if rank == 0:
+        server.shutdown()
+        if args.compile:
+            save_compile_cache(args.compile_cache_dir)
+    if dist.is_initialized():
+        dist.barrier()
+        dist.destroy_process_group()
+    logging.info("Finished.")
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    serve(args)
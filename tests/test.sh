@@ -18,6 +18,18 @@ cd "$REPO_ROOT" || exit 1
 PY_FILE=./generate.py
 
 
+function import_time() {
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Import time of the entry points: "
+    python tools/benchmark_import.py --output import_time.json
+}
+
+
+function micro_benchmarks() {
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> Micro-benchmarks on tiny random-weight models, CPU: "
+    python -m benchmarks.run --output benchmarks_cpu.json
+}
+
+
 function t2v_A14B() {
     CKPT_DIR="$MODEL_DIR/Wan2.2-T2V-A14B"
 
@@ -25,6 +37,10 @@ function t2v_A14B() {
     # echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B 1-GPU Test: "
     # python $PY_FILE --task t2v-A14B --size 480*832 --ckpt_dir $CKPT_DIR
 
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B memory plan: "
+    python $PY_FILE --task t2v-A14B --size 1280*720 --ckpt_dir $CKPT_DIR --plan
+    python $PY_FILE --task t2v-A14B --size 1280*720 --ckpt_dir $CKPT_DIR --plan --plan_memory 48
+
     # Multiple GPU Test
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B Multiple GPU Test: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task t2v-A14B --ckpt_dir $CKPT_DIR --size 832*480 --dit_fsdp --t5_fsdp --ulysses_size $GPUS
@@ -35,6 +51,12 @@ function t2v_A14B() {
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B Multiple GPU Test: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task t2v-A14B --ckpt_dir $CKPT_DIR --size 1280*720 --dit_fsdp --t5_fsdp --ulysses_size $GPUS
 
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B Multiple GPU, tensor parallel DiT: "
+    torchrun --nproc_per_node=$GPUS $PY_FILE --task t2v-A14B --ckpt_dir $CKPT_DIR --size 832*480 --dit_tp --t5_fsdp
+
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B Multiple GPU, profiled stages: "
+    torchrun --nproc_per_node=$GPUS $PY_FILE --task t2v-A14B --ckpt_dir $CKPT_DIR --size 832*480 --dit_fsdp --t5_fsdp --ulysses_size $GPUS --profile --profile_dir profile
+
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> t2v_A14B Multiple GPU, prompt extend local_qwen: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task t2v-A14B --ckpt_dir $CKPT_DIR --size 480*832 --dit_fsdp --t5_fsdp --ulysses_size $GPUS --use_prompt_extend --prompt_extend_model "Qwen/Qwen2.5-3B-Instruct" --prompt_extend_target_lang "en"
 }
@@ -50,6 +72,9 @@ function i2v_A14B() {
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> i2v_14B Multiple GPU Test: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task i2v-A14B --ckpt_dir $CKPT_DIR --size 832*480 --dit_fsdp --t5_fsdp --ulysses_size $GPUS
 
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> i2v_14B Multiple GPU, rank 0 T5 broadcast: "
+    torchrun --nproc_per_node=$GPUS $PY_FILE --task i2v-A14B --ckpt_dir $CKPT_DIR --size 832*480 --dit_fsdp --t5_broadcast --t5_cpu --ulysses_size $GPUS
+
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> i2v_14B Multiple GPU, prompt extend local_qwen: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task i2v-A14B --ckpt_dir $CKPT_DIR --size 720*1280 --dit_fsdp --t5_fsdp --ulysses_size $GPUS --use_prompt_extend --prompt_extend_model "Qwen/Qwen2.5-VL-3B-Instruct" --prompt_extend_target_lang "en"
 
@@ -71,10 +96,34 @@ function ti2v_5B() {
     # echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v 1-GPU Test: "
     # python $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir $CKPT_DIR
 
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v 1-GPU, sharded safetensors checkpoint: "
+    python tools/convert_checkpoint.py --ckpt_dir $CKPT_DIR --output_dir "$CKPT_DIR-st"
+    python tools/convert_checkpoint.py --verify "$CKPT_DIR-st"
+    python $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir "$CKPT_DIR-st" --offload_model False
+
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v 1-GPU, token merging: "
+    python tools/token_merging_report.py --task ti2v-5B --ckpt_dir $CKPT_DIR --size 1280*704 --ratios 0.3 0.5 --report_file token_merging.json
+    python $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir $CKPT_DIR --offload_model False --convert_model_dtype --token_merging 0.5 --token_merging_min_ratio 0.2
+
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v 1-GPU, CUDA graph: "
+    python $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir $CKPT_DIR --offload_model False --convert_model_dtype --cuda_graph
+
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v 1-GPU, torch.compile: "
+    python $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir $CKPT_DIR --offload_model False --convert_model_dtype --compile
+
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v 1-GPU, autotuned attention: "
+    python $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir $CKPT_DIR --offload_model False --convert_model_dtype --autotune
+
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v Multiple GPU, prompt file replicas: "
+    torchrun --nproc_per_node=$GPUS $PY_FILE --task ti2v-5B --size 1280*704 --ckpt_dir $CKPT_DIR --offload_model False --convert_model_dtype --prompt_file tools/korean_prompts.jsonl --save_dir outputs/korean_prompts
+
     # Multiple GPU Test
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v Multiple GPU Test: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task ti2v-5B --ckpt_dir $CKPT_DIR --size 1280*704 --dit_fsdp --t5_fsdp --ulysses_size $GPUS
 
+    echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v Multiple GPU, parallel VAE decode: "
+    torchrun --nproc_per_node=$GPUS $PY_FILE --task ti2v-5B --ckpt_dir $CKPT_DIR --size 1280*704 --dit_fsdp --t5_fsdp --ulysses_size $GPUS --vae_parallel
+
     echo -e "\n\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> ti2v_5B t2v Multiple GPU, prompt extend local_qwen: "
     torchrun --nproc_per_node=$GPUS $PY_FILE --task ti2v-5B --ckpt_dir $CKPT_DIR --size 704*1280 --dit_fsdp --t5_fsdp --ulysses_size $GPUS --use_prompt_extend --prompt_extend_model "Qwen/Qwen2.5-3B-Instruct" --prompt_extend_target_lang "en"
 
@@ -86,6 +135,8 @@ function ti2v_5B() {
 
 }
 
+import_time
+micro_benchmarks
 t2v_A14B
 i2v_A14B
 ti2v_5B
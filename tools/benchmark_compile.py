@@ -0,0 +1,205 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Benchmarks regional `torch.compile` of the DiT against eager execution.
+
+For every sequence length bucket of a task, reports the one-off compile time
+and the steady-state speedup of a forward pass. Weights are random unless
+`--ckpt_dir` is given, the timings do not depend on them.
+
+    python tools/benchmark_compile.py --task ti2v-5B --num_layers 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from wan.configs import SIZE_CONFIGS, SUPPORTED_SIZES, WAN_CONFIGS
+from wan.modules.model import WanModel
+from wan.utils.compile import (
+    compile_blocks,
+    get_seq_len_buckets,
+    set_compile_cache,
+)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark torch.compile of the DiT blocks per sequence length bucket."
+    )
+    parser.add_argument(
+        "--task",
+        type=str,
+        default="ti2v-5B",
+        choices=[k for k in WAN_CONFIGS.keys() if k in ("t2v-A14B", "i2v-A14B", "ti2v-5B")],
+        help="The task whose DiT is benchmarked.")
+    parser.add_argument(
+        "--ckpt_dir",
+        type=str,
+        default=None,
+        help="Load the DiT from this directory instead of using random weights. For A14B tasks the low noise expert is used."
+    )
+    parser.add_argument(
+        "--num_layers",
+        type=int,
+        default=None,
+        help="Override the number of blocks of a randomly initialized DiT.")
+    parser.add_argument(
+        "--frame_num",
+        type=int,
+        default=None,
+        help="The number of frames, defaults to the task config.")
+    parser.add_argument(
+        "--mode",
+        type=str,
+        default=None,
+        help="The torch.compile mode, e.g. max-autotune-no-cudagraphs.")
+    parser.add_argument(
+        "--iters",
+        type=int,
+        default=5,
+        help="The number of timed forward passes per bucket.")
+    parser.add_argument(
+        "--compile_cache_dir",
+        type=str,
+        default=None,
+        help="Persist compiled kernels here, a second run then reports the warm compile time."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the results to this JSON file.")
+    return parser.parse_args()
+
+
+def _load_model(args, cfg, device):
+    if args.ckpt_dir is not None:
+        subfolder = getattr(cfg, 'low_noise_checkpoint', None)
+        model = WanModel.from_pretrained(args.ckpt_dir, subfolder=subfolder)
+    else:
+        # latent channels of the Wan2.1 and Wan2.2 VAEs
+        z_dim = 48 if cfg.vae_checkpoint == 'Wan2.2_VAE.pth' else 16
+        model = WanModel(
+            model_type='i2v' if 'i2v-' in args.task else 't2v',
+            patch_size=cfg.patch_size,
+            text_len=cfg.text_len,
+            in_dim=z_dim * 2 + 4 if 'i2v-' in args.task else z_dim,
+            dim=cfg.dim,
+            ffn_dim=cfg.ffn_dim,
+            freq_dim=cfg.freq_dim,
+            out_dim=z_dim,
+            num_heads=cfg.num_heads,
+            num_layers=args.num_layers or cfg.num_layers,
+            window_size=cfg.window_size,
+            qk_norm=cfg.qk_norm,
+            cross_attn_norm=cfg.cross_attn_norm,
+            eps=cfg.eps)
+    return model.eval().requires_grad_(False).to(
+        device=device, dtype=cfg.param_dtype)
+
+
+def _make_inputs(model, cfg, size, frame_num, device):
+    w, h = size
+    lat_f = (frame_num - 1) // cfg.vae_stride[0] + 1
+    lat_h, lat_w = h // cfg.vae_stride[1], w // cfg.vae_stride[2]
+    out_dim = model.out_dim
+    x = [torch.randn(out_dim, lat_f, lat_h, lat_w, device=device)]
+    y = None
+    if model.model_type == 'i2v':
+        y = [
+            torch.randn(
+                model.in_dim - out_dim, lat_f, lat_h, lat_w, device=device)
+        ]
+    context = [torch.randn(cfg.text_len, model.text_dim, device=device)]
+    t = torch.tensor([999.0], device=device)
+    return x, t, context, y
+
+
+@torch.no_grad()
+def _time(model, inputs, seq_len, iters, dtype):
+    x, t, context, y = inputs
+    with torch.amp.autocast('cuda', dtype=dtype):
+        torch.cuda.synchronize()
+        start = time.perf_counter()
+        model(x, t=t, context=context, seq_len=seq_len, y=y)
+        torch.cuda.synchronize()
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iters):
+            model(x, t=t, context=context, seq_len=seq_len, y=y)
+        torch.cuda.synchronize()
+    return first, (time.perf_counter() - start) / iters
+
+
+def main():
+    args = _parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s: %(message)s",
+        handlers=[logging.StreamHandler(stream=sys.stdout)])
+    assert torch.cuda.is_available(), "The benchmark needs a CUDA device."
+    device = torch.device('cuda')
+
+    cfg = WAN_CONFIGS[args.task]
+    frame_num = args.frame_num or cfg.frame_num
+    sizes = [SIZE_CONFIGS[s] for s in SUPPORTED_SIZES[args.task]]
+    # one representative size per bucket, transposed sizes share a bucket
+    buckets = {
+        get_seq_len_buckets([size], frame_num, cfg.vae_stride,
+                            cfg.patch_size)[0]: size for size in sizes
+    }
+    if args.compile_cache_dir is not None:
+        set_compile_cache(args.compile_cache_dir)
+
+    model = _load_model(args, cfg, device)
+    logging.info(f"Sequence length buckets: {sorted(buckets)}")
+
+    eager = {}
+    for seq_len, size in sorted(buckets.items()):
+        inputs = _make_inputs(model, cfg, size, frame_num, device)
+        _, eager[seq_len] = _time(model, inputs, seq_len, args.iters,
+                                  cfg.param_dtype)
+
+    compile_blocks(model, list(buckets), mode=args.mode)
+    results = []
+    for seq_len, size in sorted(buckets.items()):
+        inputs = _make_inputs(model, cfg, size, frame_num, device)
+        first, compiled = _time(model, inputs, seq_len, args.iters,
+                                cfg.param_dtype)
+        result = {
+            'size': list(size),
+            'seq_len': seq_len,
+            'compile_time': first - compiled,
+            'eager_time': eager[seq_len],
+            'compiled_time': compiled,
+            'speedup': eager[seq_len] / compiled,
+        }
+        logging.info(
+            f"seq_len {seq_len}: compile {result['compile_time']:.1f}s, "
+            f"eager {eager[seq_len] * 1e3:.1f}ms, compiled {compiled * 1e3:.1f}ms, "
+            f"speedup {result['speedup']:.2f}x")
+        results.append(result)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(
+                {
+                    'task': args.task,
+                    'frame_num': frame_num,
+                    'mode': args.mode,
+                    'results': results
+                },
+                f,
+                indent=2)
+        logging.info(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Benchmarks the import time of the entry points with `python -X importtime`.
+
+Every module is imported in a fresh interpreter, the best of `--repeat` runs
+is reported together with the slowest packages it imports. Modules
+that must stay unloaded, e.g. the optional dependencies of S2V and animate
+for a plain `import wan`, fail the run when they are imported. With
+`--baseline`, a slowdown beyond `--max_regression` fails the run as well.
+
+    python tools/benchmark_import.py --output import_time.json
+    python tools/benchmark_import.py --baseline import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# modules that are imported only by the tasks that need them
+OPTIONAL_DEPS = ('dashscope', 'decord', 'cv2', 'peft', 'librosa',
+                 'transformers', 'diffusers')
+
+# entry point -> modules it must not import
+DEFAULT_MODULES = {
+    'wan': OPTIONAL_DEPS,
+    'wan.configs': OPTIONAL_DEPS,
+    'wan.modules.vae2_2': OPTIONAL_DEPS,
+    'wan.serving.client': OPTIONAL_DEPS + ('torch',),
+    'generate': ('dashscope', 'decord', 'cv2', 'peft', 'librosa'),
+}
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the import time of the Wan entry points.")
+    parser.add_argument(
+        "--modules",
+        type=str,
+        nargs="+",
+        default=None,
+        help="The modules to import, defaults to the entry points of the repository."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Imports per module, the fastest one is reported.")
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=5,
+        help="Number of slowest imported packages listed per module.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the results to this JSON file.")
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Compare against the results of an earlier run.")
+    parser.add_argument(
+        "--max_regression",
+        type=float,
+        default=0.2,
+        help="Largest allowed relative slowdown against the baseline.")
+    return parser.parse_args()
+
+
+def _parse_importtime(stderr, module):
+    r"""
+    Parses the `-X importtime` output of `import module`.
+
+    Returns:
+        Tuple[`float`, `dict`]:
+            The cumulative import time of `module` in seconds and that of
+            each top-level package imported on the way.
+    """
+    block = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        # nested imports are indented by two spaces per level and listed
+        # before their parent
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        block.append((name.strip(), int(cumulative) / 1e6))
+        if depth == 0:
+            if name.strip() == module:
+                break
+            block = []
+    total = block[-1][1] if block else 0.0
+    packages = {}
+    for name, seconds in block:
+        if '.' not in name and name != module.split('.')[0]:
+            packages[name] = max(packages.get(name, 0), seconds)
+    return total, packages
+
+
+def measure(module, repeat=3):
+    r"""
+    Imports `module` in `repeat` fresh interpreters.
+
+    Returns:
+        Tuple[`float`, `dict`, `set`]:
+            The fastest import time in seconds, the import time of each
+            top-level package in that run and the names of all loaded
+            modules.
+    """
+    best = None
+    code = (f"import {module}; import sys, json; "
+            f"print(json.dumps(sorted(sys.modules)))")
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                cwd=ROOT,
+                                capture_output=True,
+                                text=True)
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"Importing {module} failed:\n{result.stderr[-2000:]}")
+        total, packages = _parse_importtime(result.stderr, module)
+        if best is None or total < best[0]:
+            best = (total, packages, set(json.loads(result.stdout)))
+    return best
+
+
+def main():
+    args = _parse_args()
+    modules = DEFAULT_MODULES
+    if args.modules is not None:
+        modules = {m: DEFAULT_MODULES.get(m, ()) for m in args.modules}
+
+    results, failures = {}, []
+    for module, forbidden in modules.items():
+        total, packages, loaded = measure(module, repeat=args.repeat)
+        slowest = sorted(packages.items(), key=lambda x: -x[1])[:args.top]
+        unexpected = sorted(m for m in forbidden if m in loaded)
+        results[module] = {
+            'seconds': total,
+            'slowest': dict(slowest),
+            'unexpected': unexpected,
+        }
+        print(f"{module:24s} {total * 1000:8.1f} ms  " +
+              ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in slowest))
+        if unexpected:
+            failures.append(f"{module} imports {', '.join(unexpected)}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for module, result in results.items():
+            if module not in baseline:
+                continue
+            before = baseline[module]['seconds']
+            change = result['seconds'] / max(before, 1e-6) - 1
+            print(f"{module:24s} {before * 1000:8.1f} ms -> "
+                  f"{result['seconds'] * 1000:8.1f} ms ({change:+.0%})")
+            if change > args.max_regression:
+                failures.append(
+                    f"{module} is {change:.0%} slower than the baseline")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Converts a checkpoint dir to size-balanced safetensors shards with a JSON
+index that records the size and sha256 of every shard.
+
+`.pth` files (T5, VAE, CLIP) become `<name>.safetensors.index.json` with
+their shards, and DiT folders (`low_noise_model`, `high_noise_model` or the
+root of ti2v-5B) are resharded in the diffusers layout. Everything else,
+e.g. tokenizers, is linked into the output dir, which then replaces the
+original `--ckpt_dir` of `generate.py`. The loaders prefer the converted
+files: shards are read in parallel and memory mapped, and truncated shards
+fail before the load starts.
+
+    python tools/convert_checkpoint.py --ckpt_dir ./Wan2.2-T2V-A14B --output_dir ./Wan2.2-T2V-A14B-st
+    python tools/convert_checkpoint.py --verify ./Wan2.2-T2V-A14B-st
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+from collections.abc import Mapping
+
+import torch
+from safetensors import safe_open
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from wan.utils.checkpoint import (
+    GiB,
+    INDEX_SUFFIX,
+    save_sharded,
+    sharded_index_path,
+    verify_sharded,
+)
+
+DIT_STEM = 'diffusion_pytorch_model'
+
+# safetensors dtype names, for the shard sizes of DiT folders
+_ITEMSIZE = {
+    'F64': 8,
+    'F32': 4,
+    'F16': 2,
+    'BF16': 2,
+    'I64': 8,
+    'I32': 4,
+    'I16': 2,
+    'I8': 1,
+    'U8': 1,
+    'BOOL': 1,
+    'F8_E4M3': 1,
+    'F8_E5M2': 1,
+}
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convert a Wan checkpoint dir to sharded safetensors with an integrity index."
+    )
+    parser.add_argument(
+        "--ckpt_dir",
+        type=str,
+        default=None,
+        help="The checkpoint dir to convert.")
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=None,
+        help="The dir the converted checkpoint is written to.")
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        default="bfloat16",
+        choices=["bfloat16", "float16", "float32", "none"],
+        help="The dtype floating point weights are cast to, 'none' keeps them as they are."
+    )
+    parser.add_argument(
+        "--keep_dtype",
+        type=str,
+        nargs="*",
+        default=["*VAE*"],
+        help="Patterns of file names that are never cast. The VAE weights are assigned to the model as they are stored."
+    )
+    parser.add_argument(
+        "--max_shard_size",
+        type=float,
+        default=5.0,
+        help="The maximum mean shard size in GiB.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="The number of shards written or verified in parallel.")
+    parser.add_argument(
+        "--verify",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Only verify the sha256 of all shards of a converted dir, exits with 1 on a mismatch."
+    )
+    args = parser.parse_args()
+    if args.verify is None:
+        assert args.ckpt_dir is not None and args.output_dir is not None, \
+            "Pass --ckpt_dir and --output_dir, or --verify."
+        assert os.path.realpath(args.ckpt_dir) != os.path.realpath(
+            args.output_dir), "--output_dir must differ from --ckpt_dir."
+    return args
+
+
+def _init_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s: %(message)s",
+        handlers=[logging.StreamHandler(stream=sys.stdout)])
+
+
+class _SafetensorsStateDict(Mapping):
+    # the tensors of several safetensors files, read on access
+    def __init__(self, files):
+        self.files = {}
+        self.sizes = {}
+        for file in files:
+            with safe_open(file, framework='pt', device='cpu') as f:
+                for key in f.keys():
+                    info = f.get_slice(key)
+                    numel = 1
+                    for n in info.get_shape():
+                        numel *= n
+                    self.files[key] = file
+                    self.sizes[key] = numel * _ITEMSIZE[info.get_dtype()]
+
+    def __getitem__(self, key):
+        with safe_open(self.files[key], framework='pt', device='cpu') as f:
+            return f.get_tensor(key)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+
+def _dit_weights(path):
+    # the safetensors weights of a diffusers model folder, if it is one
+    if not os.path.isfile(os.path.join(path, 'config.json')):
+        return []
+    return sorted(glob.glob(os.path.join(path, f'{DIT_STEM}*.safetensors')))
+
+
+def _link(src, dst):
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except OSError:
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+
+def _dtype_for(args, name):
+    if args.dtype == 'none' or any(
+            fnmatch.fnmatch(name, p) for p in args.keep_dtype):
+        return None
+    return getattr(torch, args.dtype)
+
+
+def _convert_pth(args, src, dst_dir):
+    name = os.path.basename(src)
+    try:
+        state_dict = torch.load(
+            src, map_location='cpu', mmap=True, weights_only=True)
+    except Exception as e:
+        logging.warning(f"Linking {src}, it cannot be loaded as weights: {e}")
+        return _link(src, os.path.join(dst_dir, name))
+    if not isinstance(state_dict, dict) or not all(
+            isinstance(v, torch.Tensor) for v in state_dict.values()):
+        logging.warning(f"Linking {src}, it is not a flat state dict.")
+        return _link(src, os.path.join(dst_dir, name))
+    logging.info(f"Converting {src}")
+    save_sharded(
+        state_dict,
+        dst_dir,
+        os.path.splitext(name)[0],
+        max_shard_size=int(args.max_shard_size * GiB),
+        dtype=_dtype_for(args, name),
+        source=name,
+        num_workers=args.workers)
+
+
+def _convert_dir(args, src, dst):
+    os.makedirs(dst, exist_ok=True)
+    weights = _dit_weights(src)
+    skip = {os.path.basename(w) for w in weights}
+    if weights:
+        skip.add(DIT_STEM + INDEX_SUFFIX)
+    # outputs that exist are kept, so an interrupted conversion resumes
+    if weights and not os.path.exists(
+            os.path.join(dst, DIT_STEM + INDEX_SUFFIX)):
+        logging.info(f"Resharding {src}")
+        state_dict = _SafetensorsStateDict(weights)
+        save_sharded(
+            state_dict,
+            dst,
+            DIT_STEM,
+            max_shard_size=int(args.max_shard_size * GiB),
+            dtype=_dtype_for(args, os.path.basename(src)),
+            sizes=state_dict.sizes,
+            source=os.path.basename(os.path.normpath(src)),
+            num_workers=args.workers)
+
+    for name in sorted(os.listdir(src)):
+        path = os.path.join(src, name)
+        if name in skip:
+            continue
+        if name.endswith('.pth') and os.path.isfile(path):
+            if not os.path.exists(sharded_index_path(os.path.join(dst,
+                                                                  name))):
+                _convert_pth(args, path, dst)
+        elif os.path.isdir(path) and _dit_weights(path):
+            _convert_dir(args, path, os.path.join(dst, name))
+        elif not os.path.lexists(os.path.join(dst, name)):
+            _link(path, os.path.join(dst, name))
+
+
+def _verify(args):
+    index_paths = sorted(
+        glob.glob(
+            os.path.join(args.verify, '**', '*' + INDEX_SUFFIX),
+            recursive=True))
+    errors = []
+    for index_path in index_paths:
+        with open(index_path) as f:
+            if 'files' not in json.load(f):
+                # a diffusers index without hashes, e.g. of a linked folder
+                continue
+        logging.info(f"Verifying {index_path}")
+        errors += verify_sharded(index_path, num_workers=args.workers)
+    for error in errors:
+        logging.error(error)
+    logging.info(f"Verified {len(index_paths)} indexes, {len(errors)} errors.")
+    return not errors
+
+
+def main():
+    args = _parse_args()
+    _init_logging()
+    if args.verify is not None:
+        sys.exit(0 if _verify(args) else 1)
+
+    _convert_dir(args, args.ckpt_dir, args.output_dir)
+    logging.info(f"Converted {args.ckpt_dir} to {args.output_dir}.")
+
+
+if __name__ == "__main__":
+    main()
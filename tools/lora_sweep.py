@@ -0,0 +1,235 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Compares several LoRA checkpoints, e.g. the epochs of one fine-tuning run,
+on the same prompts and seeds as batched jobs.
+
+The DiT is loaded once and all adapters are applied together. Every batch
+mixes samples of different adapters: the base matmuls are shared and each
+sample adds the low-rank delta of its own adapter, see
+`wan.modules.lora.LoraManager.activate_batch`. Videos are written to
+`<save_dir>/<adapter>/<id>.mp4`, next to a `sweep.json` index.
+
+    python tools/lora_sweep.py --task ti2v-5B --ckpt_dir ./Wan2.2-TI2V-5B \
+        --lora out/epoch-0.safetensors out/epoch-1.safetensors \
+        --prompt_file tools/korean_prompts.txt --size 832*480 --frame_num 9
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import wan
+from wan.configs import SIZE_CONFIGS, WAN_CONFIGS
+from wan.modules.lora import LoraManager
+from wan.utils.prompt_file import load_prompt_file
+from wan.utils.utils import save_video, str2bool
+
+BASE = 'base'
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate the same prompts with several LoRA adapters in batched jobs."
+    )
+    parser.add_argument(
+        "--task",
+        type=str,
+        default="ti2v-5B",
+        choices=["t2v-A14B", "ti2v-5B"],
+        help="The task of the base checkpoint.")
+    parser.add_argument(
+        "--ckpt_dir",
+        type=str,
+        required=True,
+        help="The path to the checkpoint directory.")
+    parser.add_argument(
+        "--lora",
+        type=str,
+        nargs="+",
+        required=True,
+        help="The LoRA safetensors files to compare. Each is named by its file name without extension."
+    )
+    parser.add_argument(
+        "--lora_scale",
+        type=float,
+        default=1.0,
+        help="The strength of all adapters.")
+    parser.add_argument(
+        "--include_base",
+        type=str2bool,
+        default=True,
+        help="Whether to also generate every prompt without an adapter.")
+    parser.add_argument(
+        "--prompt",
+        type=str,
+        default=None,
+        help="A single prompt, alternative to --prompt_file.")
+    parser.add_argument(
+        "--prompt_file",
+        type=str,
+        default=None,
+        help="A text file with one prompt per line, or a .jsonl file as read by generate.py.")
+    parser.add_argument(
+        "--base_seed",
+        type=int,
+        default=42,
+        help="The seed of items without their own seed.")
+    parser.add_argument(
+        "--size",
+        type=str,
+        default="1280*704",
+        choices=list(SIZE_CONFIGS.keys()),
+        help="The size of the videos, as width*height.")
+    parser.add_argument(
+        "--frame_num",
+        type=int,
+        default=None,
+        help="The number of frames, defaults to the task config.")
+    parser.add_argument(
+        "--sample_steps",
+        type=int,
+        default=None,
+        help="The number of sampling steps, defaults to the task config.")
+    parser.add_argument(
+        "--sample_shift",
+        type=float,
+        default=None,
+        help="The sampling shift, defaults to the task config.")
+    parser.add_argument(
+        "--sample_guide_scale",
+        type=float,
+        default=None,
+        help="The classifier free guidance scale, defaults to the task config.")
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=4,
+        help="The number of samples generated together.")
+    parser.add_argument(
+        "--offload_model",
+        type=str2bool,
+        default=True,
+        help="Whether to offload the models to CPU between stages.")
+    parser.add_argument(
+        "--t5_cpu",
+        action="store_true",
+        default=False,
+        help="Whether to place T5 model on CPU.")
+    parser.add_argument(
+        "--convert_model_dtype",
+        action="store_true",
+        default=False,
+        help="Whether to convert the DiT parameters to the config dtype.")
+    parser.add_argument(
+        "--save_dir",
+        type=str,
+        default="outputs/lora_sweep",
+        help="The directory the videos are written to.")
+    args = parser.parse_args()
+    assert (args.prompt is None) != (args.prompt_file is None), \
+        "Pass exactly one of --prompt and --prompt_file."
+    return args
+
+
+def _init_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s: %(message)s",
+        handlers=[logging.StreamHandler(stream=sys.stdout)])
+
+
+def _create_pipeline(args, cfg):
+    cls = wan.WanT2V if args.task == "t2v-A14B" else wan.WanTI2V
+    return cls(
+        config=cfg,
+        checkpoint_dir=args.ckpt_dir,
+        device_id=0,
+        rank=0,
+        t5_cpu=args.t5_cpu,
+        convert_model_dtype=args.convert_model_dtype)
+
+
+def _samples(args, names):
+    if args.prompt_file is not None:
+        items = load_prompt_file(args.prompt_file)
+    else:
+        items = [{'id': '0001', 'prompt': args.prompt, 'seed': None}]
+    return [(item, name) for item in items for name in names]
+
+
+def main():
+    args = _parse_args()
+    _init_logging()
+    cfg = WAN_CONFIGS[args.task]
+    frame_num = args.frame_num or cfg.frame_num
+    sample_steps = args.sample_steps or cfg.sample_steps
+    sample_shift = args.sample_shift or cfg.sample_shift
+    guide_scale = args.sample_guide_scale or cfg.sample_guide_scale
+
+    names = [os.path.splitext(os.path.basename(p))[0] for p in args.lora]
+    assert len(set(names)) == len(names) and BASE not in names, \
+        f"LoRA file names must be unique and not '{BASE}', got {names}."
+
+    pipeline = _create_pipeline(args, cfg)
+    managers = []
+    for attr in ('model', 'low_noise_model', 'high_noise_model'):
+        model = getattr(pipeline, attr, None)
+        if model is None:
+            continue
+        manager = LoraManager(model, capacity=len(names))
+        manager.activate_batch(names, args.lora, scale=args.lora_scale)
+        managers.append(manager)
+
+    samples = _samples(args, ([BASE] if args.include_base else []) + names)
+    index = []
+    for start in range(0, len(samples), args.batch_size):
+        batch = samples[start:start + args.batch_size]
+        for manager in managers:
+            manager.set_batch(
+                [None if name == BASE else name for _, name in batch])
+        logging.info(
+            f"Generating {start + len(batch)}/{len(samples)}: "
+            f"{[(item['id'], name) for item, name in batch]}")
+        videos = pipeline.generate_batch(
+            [item['prompt'] for item, _ in batch],
+            [
+                item['seed'] if item['seed'] is not None else args.base_seed
+                for item, _ in batch
+            ],
+            size=SIZE_CONFIGS[args.size],
+            frame_num=frame_num,
+            shift=sample_shift,
+            sampling_steps=sample_steps,
+            guide_scale=guide_scale,
+            offload_model=args.offload_model)
+        for (item, name), video in zip(batch, videos):
+            save_file = os.path.join(args.save_dir, name, f"{item['id']}.mp4")
+            os.makedirs(os.path.dirname(save_file), exist_ok=True)
+            save_video(
+                tensor=video[None],
+                save_file=save_file,
+                fps=cfg.sample_fps,
+                nrow=1,
+                normalize=True,
+                value_range=(-1, 1))
+            index.append({
+                'id': item['id'],
+                'adapter': name,
+                'prompt': item['prompt'],
+                'save_file': save_file
+            })
+        del videos
+        torch.cuda.empty_cache()
+
+    with open(os.path.join(args.save_dir, 'sweep.json'), 'w') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    logging.info(f"Saved {len(index)} videos to {args.save_dir}.")
+
+
+if __name__ == "__main__":
+    main()
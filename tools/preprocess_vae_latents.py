@@ -14,8 +14,8 @@ import logging
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from wan import WanTI2V
 from wan.configs import WAN_CONFIGS
+from wan.modules.vae2_2 import Wan2_2_VAE
 from lora_finetuning.dataset import MBCVideoDataset
 
 # 로깅 설정
@@ -43,18 +43,10 @@ def load_vae_model(ckpt_dir, device_id):
     logger.info(f"VAE 모델 로딩: {ckpt_dir}")
 
     wan_config = WAN_CONFIGS['ti2v-5B']
-    model = WanTI2V(
-        config=wan_config,
-        checkpoint_dir=ckpt_dir,
-        device_id=device_id,
-        rank=device_id,
-        t5_fsdp=False,
-        dit_fsdp=False,
-        use_sp=False,
-        t5_cpu=True,
-        init_on_cpu=False,
-        convert_model_dtype=True
-    )
+    # only the VAE is needed, not the DiT and T5 of the pipeline
+    model = Wan2_2_VAE(
+        vae_pth=os.path.join(ckpt_dir, wan_config.vae_checkpoint),
+        device=torch.device(f"cuda:{device_id}"))
 
     logger.info("✓ VAE 모델 로드 완료")
     return model
@@ -72,7 +64,7 @@ def encode_media_to_latent(dataset, model, media_path, data_type, device):
         # VAE 인코딩 (no gradients)
         with torch.no_grad():
             video_tensor = video_tensor.to(device)
-            latent = model.vae.encode([video_tensor])[0]  # Returns list, take first
+            latent = model.encode([video_tensor])[0]  # Returns list, take first
             latent = latent.cpu()  # Move back to CPU for storage
 
         return latent
@@ -0,0 +1,209 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Converts the DiT checkpoints of a task to weight-only int8 or fp8.
+
+Each expert is written next to its full precision folder, e.g.
+`low_noise_model_int8`, and is picked up by `generate.py --dit_quant int8`.
+With `--report`, both models denoise the same seeded latents and the
+deviation of the quantized output from the full precision one is reported.
+
+    python tools/quantize_dit.py --task t2v-A14B --ckpt_dir ./Wan2.2-T2V-A14B --qtype int8 --report
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from wan.configs import WAN_CONFIGS
+from wan.modules.model import WanModel
+from wan.modules.quant import (
+    quantize_model,
+    quantized_checkpoint_dir,
+    save_quantized_model,
+)
+from wan.utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Quantize the DiT weights of a Wan checkpoint.")
+    parser.add_argument(
+        "--task",
+        type=str,
+        default="t2v-A14B",
+        choices=["t2v-A14B", "i2v-A14B", "ti2v-5B"],
+        help="The task whose checkpoint is converted.")
+    parser.add_argument(
+        "--ckpt_dir",
+        type=str,
+        required=True,
+        help="The path to the checkpoint directory.")
+    parser.add_argument(
+        "--qtype",
+        type=str,
+        default="int8",
+        choices=["int8", "fp8"],
+        help="The weight format.")
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        default=False,
+        help="Compare quantized and full precision outputs on fixed seeds.")
+    parser.add_argument(
+        "--report_seeds",
+        type=int,
+        nargs="+",
+        default=[0, 1, 2],
+        help="The seeds of the report.")
+    parser.add_argument(
+        "--report_size",
+        type=str,
+        default="480*832",
+        help="The latent size of the report, as width*height in pixels.")
+    parser.add_argument(
+        "--report_frames",
+        type=int,
+        default=17,
+        help="The number of frames of the report.")
+    parser.add_argument(
+        "--report_steps",
+        type=int,
+        default=10,
+        help="The number of denoising steps of the report.")
+    parser.add_argument(
+        "--report_file",
+        type=str,
+        default=None,
+        help="Write the report to this JSON file.")
+    return parser.parse_args()
+
+
+def _model_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+@torch.no_grad()
+def _denoise(model, cfg, args, seed, device):
+    r"""
+    Runs a short UniPC trajectory from seeded noise and a seeded random
+    context, standing in for T5 embeddings. Returns the final latent.
+    """
+    w, h = map(int, args.report_size.split('*'))
+    lat_f = (args.report_frames - 1) // cfg.vae_stride[0] + 1
+    lat_h, lat_w = h // cfg.vae_stride[1], w // cfg.vae_stride[2]
+    seq_len = lat_f * lat_h * lat_w // (cfg.patch_size[1] * cfg.patch_size[2])
+
+    g = torch.Generator(device='cpu').manual_seed(seed)
+    latent = torch.randn(
+        model.out_dim, lat_f, lat_h, lat_w, generator=g).to(device)
+    context = [torch.randn(cfg.text_len, model.text_dim, generator=g).to(device)]
+    y = None
+    if model.model_type == 'i2v':
+        y = [
+            torch.randn(
+                model.in_dim - model.out_dim,
+                lat_f,
+                lat_h,
+                lat_w,
+                generator=g).to(device)
+        ]
+
+    scheduler = FlowUniPCMultistepScheduler(
+        num_train_timesteps=cfg.num_train_timesteps,
+        shift=1,
+        use_dynamic_shifting=False)
+    scheduler.set_timesteps(
+        args.report_steps, device=device, shift=cfg.sample_shift)
+    with torch.amp.autocast(device.type, dtype=cfg.param_dtype):
+        for t in scheduler.timesteps:
+            noise_pred = model([latent],
+                               t=t[None].to(device),
+                               context=context,
+                               seq_len=seq_len,
+                               y=y)[0]
+            latent = scheduler.step(
+                noise_pred.unsqueeze(0),
+                t,
+                latent.unsqueeze(0),
+                return_dict=False)[0].squeeze(0)
+    return latent.float().cpu()
+
+
+def _compare(ref, out):
+    ref, out = ref.flatten(), out.flatten()
+    return {
+        'rel_l2': ((out - ref).norm() / ref.norm()).item(),
+        'cosine': torch.nn.functional.cosine_similarity(ref, out, dim=0).item(),
+        'max_abs': (out - ref).abs().max().item(),
+    }
+
+
+def main():
+    args = _parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s: %(message)s",
+        handlers=[logging.StreamHandler(stream=sys.stdout)])
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    cfg = WAN_CONFIGS[args.task]
+    if 'low_noise_checkpoint' in cfg:
+        subfolders = [cfg.low_noise_checkpoint, cfg.high_noise_checkpoint]
+    else:
+        subfolders = [None]
+
+    report = {'task': args.task, 'qtype': args.qtype, 'experts': {}}
+    for subfolder in subfolders:
+        name = subfolder or 'model'
+        logging.info(f"Loading {name} from {args.ckpt_dir}")
+        model = WanModel.from_pretrained(args.ckpt_dir, subfolder=subfolder)
+        model.eval().requires_grad_(False)
+
+        entry = {'bytes': _model_bytes(model)}
+        refs = {}
+        if args.report:
+            model.to(device)
+            for seed in args.report_seeds:
+                refs[seed] = _denoise(model, cfg, args, seed, device)
+            model.cpu()
+
+        quantize_model(model, args.qtype)
+        save_dir = quantized_checkpoint_dir(args.ckpt_dir, subfolder,
+                                            args.qtype)
+        save_quantized_model(model, save_dir, args.qtype)
+        entry['quantized_bytes'] = _model_bytes(model)
+        logging.info(
+            f"Saved {name} to {save_dir}, {entry['bytes'] / 2**30:.2f} GiB -> "
+            f"{entry['quantized_bytes'] / 2**30:.2f} GiB")
+
+        if args.report:
+            model.to(device)
+            entry['seeds'] = {}
+            for seed in args.report_seeds:
+                metrics = _compare(refs[seed],
+                                   _denoise(model, cfg, args, seed, device))
+                entry['seeds'][seed] = metrics
+                logging.info(
+                    f"{name} seed {seed}: rel_l2 {metrics['rel_l2']:.4f}, "
+                    f"cosine {metrics['cosine']:.5f}, max_abs {metrics['max_abs']:.4f}"
+                )
+        report['experts'][name] = entry
+
+        del model, refs
+        gc.collect()
+        torch.cuda.empty_cache()
+
+    if args.report_file is not None:
+        with open(args.report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Saved report to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+"""
+Measures the speedup and the deviation of token merging in the DiT blocks.
+
+The DiT denoises the same seeded latents once without token merging and
+once per merge ratio, with seeded random embeddings standing in for T5.
+The deviation of each final latent from the unmerged one is reported with
+the denoising time, see `wan.modules.tome.TokenMerging`.
+
+    python tools/token_merging_report.py --task ti2v-5B --ckpt_dir ./Wan2.2-TI2V-5B \
+        --ratios 0.3 0.5 0.7 --size 1280*704 --frame_num 81
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from wan.configs import SIZE_CONFIGS, WAN_CONFIGS
+from wan.modules.model import WanModel
+from wan.modules.tome import TokenMerging
+from wan.utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare the DiT output with and without token merging.")
+    parser.add_argument(
+        "--task",
+        type=str,
+        default="ti2v-5B",
+        choices=["t2v-A14B", "i2v-A14B", "ti2v-5B"],
+        help="The task whose DiT is measured.")
+    parser.add_argument(
+        "--ckpt_dir",
+        type=str,
+        required=True,
+        help="The path to the checkpoint directory.")
+    parser.add_argument(
+        "--ratios",
+        type=float,
+        nargs="+",
+        default=[0.3, 0.5, 0.7],
+        help="The merge ratios to measure.")
+    parser.add_argument(
+        "--min_ratio",
+        type=float,
+        default=None,
+        help="The ratio at the last timestep, defaults to each ratio.")
+    parser.add_argument(
+        "--seeds",
+        type=int,
+        nargs="+",
+        default=[0, 1],
+        help="The seeds of the latents.")
+    parser.add_argument(
+        "--size",
+        type=str,
+        default="1280*704",
+        choices=list(SIZE_CONFIGS.keys()),
+        help="The size of the videos, as width*height.")
+    parser.add_argument(
+        "--frame_num",
+        type=int,
+        default=81,
+        help="The number of frames.")
+    parser.add_argument(
+        "--sample_steps",
+        type=int,
+        default=10,
+        help="The number of denoising steps.")
+    parser.add_argument(
+        "--report_file",
+        type=str,
+        default=None,
+        help="Write the report to this JSON file.")
+    return parser.parse_args()
+
+
+@torch.no_grad()
+def _denoise(model, cfg, args, seed, device):
+    r"""
+    Runs a short UniPC trajectory from seeded noise and a seeded random
+    context. Returns the final latent and the seconds spent in the DiT.
+    """
+    w, h = SIZE_CONFIGS[args.size]
+    lat_f = (args.frame_num - 1) // cfg.vae_stride[0] + 1
+    lat_h, lat_w = h // cfg.vae_stride[1], w // cfg.vae_stride[2]
+    seq_len = lat_f * lat_h * lat_w // (cfg.patch_size[1] * cfg.patch_size[2])
+
+    g = torch.Generator(device='cpu').manual_seed(seed)
+    latent = torch.randn(
+        model.out_dim, lat_f, lat_h, lat_w, generator=g).to(device)
+    context = [torch.randn(cfg.text_len, model.text_dim, generator=g).to(device)]
+    y = None
+    if model.model_type == 'i2v':
+        y = [
+            torch.randn(
+                model.in_dim - model.out_dim,
+                lat_f,
+                lat_h,
+                lat_w,
+                generator=g).to(device)
+        ]
+
+    scheduler = FlowUniPCMultistepScheduler(
+        num_train_timesteps=cfg.num_train_timesteps,
+        shift=1,
+        use_dynamic_shifting=False)
+    scheduler.set_timesteps(
+        args.sample_steps, device=device, shift=cfg.sample_shift)
+    seconds = 0.0
+    with torch.amp.autocast(device.type, dtype=cfg.param_dtype):
+        for t, t_host in zip(scheduler.timesteps,
+                             scheduler.timesteps.tolist()):
+            torch.cuda.synchronize(device)
+            start = time.perf_counter()
+            noise_pred = model([latent],
+                               t=t[None].to(device),
+                               context=context,
+                               seq_len=seq_len,
+                               y=y,
+                               timestep=t_host)[0]
+            torch.cuda.synchronize(device)
+            seconds += time.perf_counter() - start
+            latent = scheduler.step(
+                noise_pred.unsqueeze(0),
+                t,
+                latent.unsqueeze(0),
+                return_dict=False)[0].squeeze(0)
+    return latent.float().cpu(), seconds
+
+
+def _compare(ref, out):
+    ref, out = ref.flatten(), out.flatten()
+    return {
+        'rel_l2': ((out - ref).norm() / ref.norm()).item(),
+        'cosine': torch.nn.functional.cosine_similarity(ref, out, dim=0).item(),
+    }
+
+
+def main():
+    args = _parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s: %(message)s",
+        handlers=[logging.StreamHandler(stream=sys.stdout)])
+    device = torch.device('cuda')
+
+    cfg = WAN_CONFIGS[args.task]
+    # the high noise expert runs the noisiest steps, where merging is largest
+    subfolder = cfg.get('high_noise_checkpoint')
+    logging.info(f"Loading {subfolder or 'model'} from {args.ckpt_dir}")
+    model = WanModel.from_pretrained(args.ckpt_dir, subfolder=subfolder)
+    model.eval().requires_grad_(False).to(device, cfg.param_dtype)
+
+    # the first run also warms up the kernels, its time is not reported
+    _denoise(model, cfg, args, args.seeds[0], device)
+    refs, ref_seconds = {}, 0.0
+    for seed in args.seeds:
+        refs[seed], seconds = _denoise(model, cfg, args, seed, device)
+        ref_seconds += seconds
+
+    report = {
+        'task': args.task,
+        'size': args.size,
+        'frame_num': args.frame_num,
+        'seconds': ref_seconds,
+        'ratios': {}
+    }
+    for ratio in args.ratios:
+        model.token_merging = TokenMerging(
+            ratio=ratio,
+            min_ratio=args.min_ratio,
+            num_train_timesteps=cfg.num_train_timesteps)
+        entry = {'seconds': 0.0, 'seeds': {}}
+        for seed in args.seeds:
+            latent, seconds = _denoise(model, cfg, args, seed, device)
+            entry['seconds'] += seconds
+            entry['seeds'][seed] = _compare(refs[seed], latent)
+        entry['speedup'] = ref_seconds / entry['seconds']
+        report['ratios'][ratio] = entry
+        logging.info(
+            f"ratio {ratio}: speedup {entry['speedup']:.2f}x, " + ", ".join(
+                f"seed {seed} rel_l2 {m['rel_l2']:.4f} cosine {m['cosine']:.5f}"
+                for seed, m in entry['seeds'].items()))
+    model.token_merging = None
+
+    if args.report_file is not None:
+        with open(args.report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Saved report to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
-from . import configs, distributed, modules
-from .image2video import WanI2V
-from .speech2video import WanS2V
-from .text2video import WanT2V
-from .textimage2video import WanTI2V
-from .animate import WanAnimate
\ No newline at end of file
+# the pipelines are imported on first access, see `wan.utils.lazy`
+from .utils.lazy import lazy_module
+
+__all__ = ['WanI2V', 'WanS2V', 'WanT2V', 'WanTI2V', 'WanAnimate']
+
+__getattr__, __dir__ = lazy_module(
+    __name__, {
+        'WanI2V': '.image2video',
+        'WanS2V': '.speech2video',
+        'WanT2V': '.text2video',
+        'WanTI2V': '.textimage2video',
+        'WanAnimate': '.animate',
+    },
+    submodules=('configs', 'distributed', 'modules', 'serving', 'utils'))
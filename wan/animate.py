@@ -13,23 +13,29 @@ import torch
 import torch.distributed as dist
 from peft import set_peft_model_state_dict
 from decord import VideoReader
-from tqdm import tqdm
 import torch.nn.functional as F
 from .distributed.fsdp import shard_model
 from .distributed.sequence_parallel import sp_attn_forward, sp_dit_forward
-from .distributed.util import get_world_size
+from .distributed.util import broadcast_tensor_list, get_world_size
+from .distributed.vae_parallel import parallel_vae_decode
 
 from .modules.animate import WanAnimateModel
 from .modules.animate import CLIPModel
 from .modules.t5 import T5EncoderModel
 from .modules.vae2_1 import Wan2_1_VAE
 from .modules.animate.animate_utils import TensorList, get_loraconfig
+from .utils.batch import needs_text_encoder
 from .utils.fm_solvers import (
     FlowDPMSolverMultistepScheduler,
     get_sampling_sigmas,
     retrieve_timesteps,
 )
+from .utils.fm_solvers_device import DeviceFlowScheduler
+from .utils.fm_solvers_ode import FLOW_ODE_SOLVERS, FlowODEScheduler
 from .utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
+from .utils.guidance import GuidanceSchedule
+from .utils.profiler import profile, profile_iter, record_bytes
+from .utils.utils import progress_iter
 
 
 
@@ -47,7 +53,9 @@ class WanAnimate:
         t5_cpu=False,
         init_on_cpu=True,
         convert_model_dtype=False,
-        use_relighting_lora=False
+        use_relighting_lora=False,
+        t5_broadcast=False,
+        vae_parallel=False,
     ):
         r"""
         Initializes the generation model components.
@@ -76,11 +84,18 @@ class WanAnimate:
                 Only works without FSDP.
             use_relighting_lora (`bool`, *optional*, defaults to False):
                Whether to use relighting lora for character replacement. 
+            t5_broadcast (`bool`, *optional*, defaults to False):
+                Load T5 on rank 0 only and broadcast the encoded prompts to the
+                other ranks. Not compatible with t5_fsdp.
+            vae_parallel (`bool`, *optional*, defaults to False):
+                Split VAE decoding across all ranks instead of decoding on rank 0.
         """
         self.device = torch.device(f"cuda:{device_id}")
         self.config = config
         self.rank = rank
         self.t5_cpu = t5_cpu
+        self.t5_broadcast = t5_broadcast
+        self.vae_parallel = vae_parallel
         self.init_on_cpu = init_on_cpu
 
         self.num_train_timesteps = config.num_train_timesteps
@@ -90,14 +105,19 @@ class WanAnimate:
             self.init_on_cpu = False
 
         shard_fn = partial(shard_model, device_id=device_id)
-        self.text_encoder = T5EncoderModel(
-            text_len=config.text_len,
-            dtype=config.t5_dtype,
-            device=torch.device('cpu'),
-            checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
-            tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
-            shard_fn=shard_fn if t5_fsdp else None,
-        )
+        assert not (t5_fsdp and t5_broadcast), \
+            "t5_fsdp and t5_broadcast cannot be used together."
+        if t5_broadcast and rank != 0:
+            self.text_encoder = None
+        else:
+            self.text_encoder = T5EncoderModel(
+                text_len=config.text_len,
+                dtype=config.t5_dtype,
+                device=torch.device('cpu'),
+                checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
+                tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
+                shard_fn=shard_fn if t5_fsdp else None,
+            )
 
         self.clip = CLIPModel(
             dtype=torch.float16,
@@ -308,6 +328,8 @@ class WanAnimate:
         n_prompt="",
         seed=-1,
         offload_model=True,
+        guidance_schedule=None,
+        progress_callback=None,
     ):
         r"""
         Generates video frames from input image using diffusion process.
@@ -324,7 +346,8 @@ class WanAnimate:
             shift (`float`, *optional*, defaults to 5.0):
                 Noise schedule shift parameter. 
             sample_solver (`str`, *optional*, defaults to 'dpm++'):
-                Solver used to sample the video.
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
             sampling_steps (`int`, *optional*, defaults to 20):
                 Number of diffusion sampling steps. Higher values improve quality but slow generation
             guide_scale (`float` or tuple[`float`], *optional*, defaults 1.0):
@@ -339,6 +362,13 @@ class WanAnimate:
                 Random seed for noise generation. If -1, use random seed
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional prediction is computed,
+                see `wan.utils.guidance.GuidanceSchedule`. Defaults to CFG at
+                every step.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
 
         Returns:
             torch.Tensor:
@@ -365,17 +395,29 @@ class WanAnimate:
 
         cond_images, face_images, refer_images = self.prepare_source(src_pose_path=src_pose_path, src_face_path=src_face_path, src_ref_path=src_ref_path)
         
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
+        if self.text_encoder is None:
+            context, context_null = None, None
+        elif not self.t5_cpu:
+            encode = needs_text_encoder(self.text_encoder,
+                                        [input_prompt, n_prompt], self.device)
+            if encode:
+                with profile('offload'):
+                    self.text_encoder.model.to(self.device)
+                    record_bytes(self.text_encoder.model)
             context = self.text_encoder([input_prompt], self.device)
             context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
+            if encode and offload_model:
+                with profile('offload'):
+                    self.text_encoder.model.cpu()
+                    record_bytes(self.text_encoder.model)
         else:
             context = self.text_encoder([input_prompt], torch.device('cpu'))
             context_null = self.text_encoder([n_prompt], torch.device('cpu'))
             context = [t.to(self.device) for t in context]
             context_null = [t.to(self.device) for t in context_null]
+        if self.t5_broadcast:
+            context = broadcast_tensor_list(context, self.device)
+            context_null = broadcast_tensor_list(context_null, self.device)
 
         real_frame_len = len(cond_images)
         target_len = self.get_valid_len(real_frame_len, clip_len, overlap=refert_num)
@@ -500,8 +542,20 @@ class WanAnimate:
                         sample_scheduler,
                         device=self.device,
                         sigmas=sampling_sigmas)
+                elif sample_solver in FLOW_ODE_SOLVERS:
+                    sample_scheduler = FlowODEScheduler(
+                        num_train_timesteps=self.num_train_timesteps,
+                        solver=sample_solver,
+                        rtol=self.config.sample_rtol,
+                        atol=self.config.sample_atol)
+                    sample_scheduler.set_timesteps(
+                        sampling_steps, device=self.device, shift=shift)
+                    timesteps = sample_scheduler.timesteps
                 else:
                     raise NotImplementedError("Unsupported solver.")
+                if not isinstance(sample_scheduler, FlowODEScheduler):
+                    sample_scheduler = DeviceFlowScheduler(
+                        sample_scheduler)
 
                 latents = noise
 
@@ -599,47 +653,67 @@ class WanAnimate:
                         "pose_latents": pose_latents,
                         "face_pixel_values": face_pixel_values_uncond,
                     }
+                guidance = guidance_schedule or GuidanceSchedule(
+                    num_train_timesteps=self.num_train_timesteps)
+                guidance.reset()
 
-                for i, t in enumerate(tqdm(timesteps)):
+                for i, t in enumerate(
+                        profile_iter(progress_iter(timesteps,
+                                                   progress_callback))):
                     latent_model_input = latents
                     timestep = [t]
 
                     timestep = torch.stack(timestep)
 
-                    noise_pred_cond = TensorList(
-                         self.noise_model(TensorList(latent_model_input), t=timestep, **arg_c)
-                    )
+                    with profile('cond'):
+                        noise_pred_cond = TensorList(
+                             self.noise_model(TensorList(latent_model_input), t=timestep, **arg_c)
+                        )
 
                     if guide_scale > 1:
-                        noise_pred_uncond = TensorList(
-                             self.noise_model(
-                                TensorList(latent_model_input), t=timestep, **arg_null
-                            )
-                        )
-                        noise_pred = noise_pred_uncond + guide_scale * (
-                            noise_pred_cond - noise_pred_uncond
-                        )
+                        noise_pred_uncond = [None]
+                        if guidance.needs_uncond(sample_scheduler.host_timesteps[i]):
+                            with profile('uncond'):
+                                noise_pred_uncond = TensorList(
+                                     self.noise_model(
+                                        TensorList(latent_model_input), t=timestep, **arg_null
+                                    )
+                                )
+                        noise_pred = [
+                            guidance(noise_pred_cond[0], noise_pred_uncond[0], guide_scale)
+                        ]
                     else:
                         noise_pred = noise_pred_cond
 
-                    temp_x0 = sample_scheduler.step(
-                        noise_pred[0].unsqueeze(0),
-                        t,
-                        latents[0].unsqueeze(0),
-                        return_dict=False,
-                        generator=seed_g,
-                    )[0]
+                    with profile('scheduler'):
+                        temp_x0 = sample_scheduler.step(
+                            noise_pred[0].unsqueeze(0),
+                            t,
+                            latents[0].unsqueeze(0),
+                            return_dict=False,
+                            generator=seed_g,
+                        )[0]
                     latents[0] = temp_x0.squeeze(0)
 
                     x0 = latents
 
+                logging.info(
+                    f"Sampled with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+                )
+                guidance.log_stats()
+
                 x0 = [x.to(dtype=torch.float32) for x in x0]
-                out_frames = torch.stack(self.vae.decode([x0[0][:, 1:]]))
+                if self.vae_parallel:
+                    out_frames = torch.stack(
+                        parallel_vae_decode(self.vae, [x0[0][:, 1:]]))
+                else:
+                    out_frames = torch.stack(self.vae.decode([x0[0][:, 1:]]))
                 
                 if start != 0:
                     out_frames = out_frames[:, :, refert_num:]
 
                 all_out_frames.append(out_frames.cpu())
+                record_bytes(out_frames)
 
                 start += clip_len - refert_num
                 end += clip_len - refert_num
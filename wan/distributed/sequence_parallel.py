@@ -68,11 +68,13 @@ def sp_dit_forward(
     context,
     seq_len,
     y=None,
+    timestep=None,
 ):
     """
     x:              A list of videos each with shape [C, T, H, W].
     t:              [B].
     context:        A list of text embeddings each with shape [L, C].
+    timestep:       Host copy of t, unused as token merging is not supported.
     """
     if self.model_type == 'i2v':
         assert y is not None
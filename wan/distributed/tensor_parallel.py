@@ -0,0 +1,139 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+import torch.nn.functional as F
+
+__all__ = ['tp_shard_model']
+
+
+def _shard(tensor, dim, rank, world_size):
+    assert tensor.size(dim) % world_size == 0, \
+        f"dim {dim} of size {tensor.size(dim)} cannot be split into {world_size} shards."
+    return tensor.detach().chunk(world_size, dim=dim)[rank].clone()
+
+
+class ColumnParallelLinear(nn.Module):
+    r"""
+    Linear layer whose output features are split across ranks. The input is
+    replicated and the output stays sharded, no communication is needed.
+    """
+
+    def __init__(self, linear, rank, world_size):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features // world_size
+        self.weight = nn.Parameter(
+            _shard(linear.weight, 0, rank, world_size), requires_grad=False)
+        if linear.bias is not None:
+            self.bias = nn.Parameter(
+                _shard(linear.bias, 0, rank, world_size), requires_grad=False)
+        else:
+            self.register_parameter('bias', None)
+
+    def forward(self, x):
+        return F.linear(x, self.weight, self.bias)
+
+
+class RowParallelLinear(nn.Module):
+    r"""
+    Linear layer whose input features are split across ranks. Partial outputs
+    are summed with an all-reduce, the bias is added once after the reduction.
+    """
+
+    def __init__(self, linear, rank, world_size, process_group=None):
+        super().__init__()
+        self.in_features = linear.in_features // world_size
+        self.out_features = linear.out_features
+        self.process_group = process_group
+        self.weight = nn.Parameter(
+            _shard(linear.weight, 1, rank, world_size), requires_grad=False)
+        if linear.bias is not None:
+            self.bias = nn.Parameter(
+                linear.bias.detach().clone(), requires_grad=False)
+        else:
+            self.register_parameter('bias', None)
+
+    def forward(self, x):
+        x = F.linear(x, self.weight)
+        dist.all_reduce(x, group=self.process_group)
+        if self.bias is not None:
+            x = x + self.bias
+        return x
+
+
+class ParallelRMSNorm(nn.Module):
+    r"""
+    RMSNorm over a channel dimension that is sharded across ranks. The sum of
+    squares is all-reduced so the result matches `WanRMSNorm` on the full dim.
+    """
+
+    def __init__(self, norm, rank, world_size, process_group=None):
+        super().__init__()
+        self.dim = norm.dim
+        self.eps = norm.eps
+        self.process_group = process_group
+        self.weight = nn.Parameter(
+            _shard(norm.weight, 0, rank, world_size), requires_grad=False)
+
+    def forward(self, x):
+        r"""
+        Args:
+            x(Tensor): Shape [B, L, C / world_size]
+        """
+        u = x.float()
+        sq_sum = u.pow(2).sum(dim=-1, keepdim=True)
+        dist.all_reduce(sq_sum, group=self.process_group)
+        u = u * torch.rsqrt(sq_sum / self.dim + self.eps)
+        return u.type_as(x) * self.weight
+
+
+def _parallelize_attention(attn, rank, world_size, process_group):
+    assert attn.num_heads % world_size == 0, \
+        f"`num_heads={attn.num_heads}` cannot be divided evenly by `world_size={world_size}`."
+    attn.q = ColumnParallelLinear(attn.q, rank, world_size)
+    attn.k = ColumnParallelLinear(attn.k, rank, world_size)
+    attn.v = ColumnParallelLinear(attn.v, rank, world_size)
+    attn.o = RowParallelLinear(attn.o, rank, world_size, process_group)
+    if attn.qk_norm:
+        attn.norm_q = ParallelRMSNorm(attn.norm_q, rank, world_size,
+                                      process_group)
+        attn.norm_k = ParallelRMSNorm(attn.norm_k, rank, world_size,
+                                      process_group)
+    # heads are split across ranks, head_dim is unchanged
+    attn.num_heads = attn.num_heads // world_size
+
+
+def tp_shard_model(model, process_group=None):
+    r"""
+    Applies tensor parallelism to the transformer blocks of a `WanModel`.
+
+    Attention `q/k/v` and the first FFN linear are column-parallel, attention
+    `o` and the second FFN linear are row-parallel, so every rank keeps
+    `1 / world_size` of the block weights resident and only activations are
+    all-reduced. Embeddings and the head stay replicated.
+
+    Args:
+        model (torch.nn.Module):
+            The model to shard in place. Inputs must be identical on all ranks.
+        process_group (ProcessGroup, *optional*):
+            The tensor parallel group. Defaults to the global group.
+
+    Returns:
+        torch.nn.Module:
+            The sharded model.
+    """
+    rank = dist.get_rank(process_group)
+    world_size = dist.get_world_size(process_group)
+    if world_size == 1:
+        return model
+
+    for block in model.blocks:
+        _parallelize_attention(block.self_attn, rank, world_size,
+                               process_group)
+        _parallelize_attention(block.cross_attn, rank, world_size,
+                               process_group)
+        block.ffn[0] = ColumnParallelLinear(block.ffn[0], rank, world_size)
+        block.ffn[2] = RowParallelLinear(block.ffn[2], rank, world_size,
+                                         process_group)
+    return model
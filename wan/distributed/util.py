@@ -52,3 +52,25 @@ def gather_forward(input, dim):
     # gather sequence
     output = all_gather(input)
     return torch.cat(output, dim=dim).contiguous()
+
+
+def broadcast_tensor_list(tensors, device, src=0, group=None):
+    """
+    Broadcast a list of tensors with arbitrary shapes from `src` to all ranks.
+    Non-source ranks may pass `None`, shapes and dtypes are sent first.
+    """
+    if not dist.is_initialized() or dist.get_world_size(group) == 1:
+        return tensors
+    is_src = dist.get_rank() == src
+    meta = [[(u.shape, u.dtype) for u in tensors] if is_src else None]
+    dist.broadcast_object_list(meta, src=src, group=group)
+
+    output = []
+    for i, (shape, dtype) in enumerate(meta[0]):
+        if is_src:
+            u = tensors[i].to(device).contiguous()
+        else:
+            u = torch.empty(shape, dtype=dtype, device=device)
+        dist.broadcast(u, src=src, group=group)
+        output.append(u)
+    return output
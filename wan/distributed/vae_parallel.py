@@ -0,0 +1,110 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+import torch.distributed as dist
+
+__all__ = ['parallel_vae_decode']
+
+
+def _tile_bounds(length, num_tiles, halo):
+    """
+    Split `length` into `num_tiles` core ranges and extend each by `halo` on
+    both sides. Returns (core_start, core_end, tile_start, tile_end) tuples.
+    """
+    bounds = []
+    for i in range(num_tiles):
+        start = length * i // num_tiles
+        end = length * (i + 1) // num_tiles
+        bounds.append(
+            (start, end, max(0, start - halo), min(length, end + halo)))
+    return bounds
+
+
+def _blend_weight(bound, length, halo, scale, device):
+    """
+    Linear ramp over the 2 * halo region shared with each neighbouring tile,
+    in output (pixel) units.
+    """
+    start, end, tile_start, tile_end = bound
+    n = (tile_end - tile_start) * scale
+    pos = torch.arange(n, device=device, dtype=torch.float32) + 0.5
+    weight = torch.ones(n, device=device, dtype=torch.float32)
+    if start > 0:
+        ramp = (start + halo - tile_start) * scale
+        weight = torch.minimum(weight, pos / ramp)
+    if end < length:
+        ramp = (tile_end - (end - halo)) * scale
+        weight = torch.minimum(weight, (n - pos) / ramp)
+    return weight
+
+
+@torch.no_grad()
+def parallel_vae_decode(vae, zs, halo=8, group=None):
+    r"""
+    Decodes latents with all ranks of `group` by splitting every latent into
+    spatial tiles along its longer side. Each rank decodes one tile with a
+    `halo` of latent pixels on each side, tiles are all-gathered and blended
+    linearly across the overlaps.
+
+    Args:
+        vae (Wan2_1_VAE | Wan2_2_VAE):
+            The VAE wrapper, present on every rank.
+        zs (List[Tensor]):
+            Latents each with shape [C, T, H, W], identical on all ranks.
+        halo (`int`, *optional*, defaults to 8):
+            Overlap in latent pixels added to each side of a tile.
+        group (ProcessGroup, *optional*):
+            Ranks taking part in the decode. Defaults to the global group.
+
+    Returns:
+        List[Tensor]:
+            Decoded videos each with shape [3, F, H, W], on every rank.
+    """
+    if not dist.is_initialized() or dist.get_world_size(group) == 1:
+        return vae.decode(list(zs))
+    rank = dist.get_rank(group)
+    world_size = dist.get_world_size(group)
+
+    videos = []
+    for z in zs:
+        dim = 2 if z.size(2) >= z.size(3) else 3
+        length = z.size(dim)
+        num_tiles = min(world_size, length)
+        bounds = _tile_bounds(length, num_tiles, halo)
+
+        # decode local tile, ranks beyond num_tiles decode nothing
+        if rank < num_tiles:
+            _, _, tile_start, tile_end = bounds[rank]
+            tile = vae.decode([z.narrow(dim, tile_start,
+                                        tile_end - tile_start)])[0]
+            scale = tile.size(dim) // (tile_end - tile_start)
+        else:
+            _, _, tile_start, tile_end = bounds[0]
+            tile = vae.decode([z.narrow(dim, tile_start, 1)])[0]
+            scale = tile.size(dim)
+
+        # pad to a common size so tiles can be all-gathered
+        max_len = max(b[3] - b[2] for b in bounds) * scale
+        shape = list(tile.shape)
+        shape[dim] = max_len
+        padded = tile.new_zeros(shape)
+        padded.narrow(dim, 0, tile.size(dim)).copy_(tile)
+        gathered = [torch.empty_like(padded) for _ in range(world_size)]
+        dist.all_gather(gathered, padded.contiguous(), group=group)
+
+        # blend
+        shape[dim] = length * scale
+        out = tile.new_zeros(shape)
+        weight_sum = tile.new_zeros(shape[dim])
+        for i, bound in enumerate(bounds):
+            _, _, tile_start, tile_end = bound
+            n = (tile_end - tile_start) * scale
+            weight = _blend_weight(bound, length, halo, scale, tile.device)
+            view = [1] * tile.dim()
+            view[dim] = n
+            out.narrow(dim, tile_start * scale, n).add_(
+                gathered[i].narrow(dim, 0, n) * weight.view(view))
+            weight_sum.narrow(0, tile_start * scale, n).add_(weight)
+        view = [1] * tile.dim()
+        view[dim] = shape[dim]
+        videos.append(out / weight_sum.view(view))
+    return videos
@@ -1,10 +1,5 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
-from .attention import flash_attention
-from .model import WanModel
-from .t5 import T5Decoder, T5Encoder, T5EncoderModel, T5Model
-from .tokenizers import HuggingfaceTokenizer
-from .vae2_1 import Wan2_1_VAE
-from .vae2_2 import Wan2_2_VAE
+from ..utils.lazy import lazy_module
 
 __all__ = [
     'Wan2_1_VAE',
@@ -16,4 +11,30 @@ __all__ = [
     'T5EncoderModel',
     'HuggingfaceTokenizer',
     'flash_attention',
+    'QuantLinear',
+    'quantize_model',
+    'load_quantized_model',
+    'LoraManager',
+    'load_lora',
+    'TokenMerging',
 ]
+
+__getattr__, __dir__ = lazy_module(
+    __name__, {
+        'Wan2_1_VAE': '.vae2_1',
+        'Wan2_2_VAE': '.vae2_2',
+        'WanModel': '.model',
+        'T5Model': '.t5',
+        'T5Encoder': '.t5',
+        'T5Decoder': '.t5',
+        'T5EncoderModel': '.t5',
+        'HuggingfaceTokenizer': '.tokenizers',
+        'flash_attention': '.attention',
+        'QuantLinear': '.quant',
+        'quantize_model': '.quant',
+        'load_quantized_model': '.quant',
+        'LoraManager': '.lora',
+        'load_lora': '.lora',
+        'TokenMerging': '.tome',
+    },
+    submodules=('animate', 's2v'))
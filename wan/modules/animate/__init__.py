@@ -1,4 +1,9 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
-from .model_animate import WanAnimateModel
-from .clip import CLIPModel
-__all__ = ['WanAnimateModel', 'CLIPModel']
\ No newline at end of file
+from ...utils.lazy import lazy_module
+
+__all__ = ['WanAnimateModel', 'CLIPModel']
+
+__getattr__, __dir__ = lazy_module(__name__, {
+    'WanAnimateModel': '.model_animate',
+    'CLIPModel': '.clip',
+})
@@ -8,6 +8,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torchvision.transforms as T
 
+from ...utils.checkpoint import load_checkpoint
 from ..attention import flash_attention
 from ..tokenizers import HuggingfaceTokenizer
 from .xlm_roberta import XLMRoberta
@@ -516,7 +517,7 @@ class CLIPModel:
         self.model = self.model.eval().requires_grad_(False)
         logging.info(f'loading {checkpoint_path}')
         self.model.load_state_dict(
-            torch.load(checkpoint_path, map_location='cpu'))
+            load_checkpoint(checkpoint_path))
 
         # init tokenizer
         self.tokenizer = HuggingfaceTokenizer(
@@ -1,4 +1,7 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import itertools
+from collections import OrderedDict
+
 import torch
 
 try:
@@ -18,8 +21,93 @@ import warnings
 __all__ = [
     'flash_attention',
     'attention',
+    'varlen_attention',
+    'available_attention_backends',
+    'get_attention_backend',
+    'set_attention_backend',
 ]
 
+# recently used cumulative sequence lengths, least recently used first
+_CU_SEQLENS = OrderedDict()
+_CU_SEQLENS_SIZE = 64
+# those of captured CUDA graphs, which replay them and must keep them alive
+_CU_SEQLENS_CAPTURED = {}
+
+# backend used when no flash attention version is passed, None picks the
+# newest available one
+_BACKEND = None
+_FA_VERSIONS = {'fa3': 3, 'fa2': 2}
+
+
+def available_attention_backends():
+    r"""
+    Returns the attention backends usable on CUDA, a subset of 'fa3', 'fa2'
+    and 'sdpa'.
+    """
+    backends = []
+    if FLASH_ATTN_3_AVAILABLE:
+        backends.append('fa3')
+    if FLASH_ATTN_2_AVAILABLE:
+        backends.append('fa2')
+    backends.append('sdpa')
+    return backends
+
+
+def get_attention_backend():
+    return _BACKEND
+
+
+def set_attention_backend(backend):
+    r"""
+    Selects the attention backend of `flash_attention` and `varlen_attention`
+    for calls that do not pass a flash attention version, e.g. the winner of
+    `wan.utils.autotune`.
+
+    Args:
+        backend (`str`):
+            One of 'fa3', 'fa2' and 'sdpa', or None for the newest available
+            flash attention.
+    """
+    global _BACKEND
+    assert backend is None or backend in available_attention_backends(), \
+        f"Attention backend {backend} is not available."
+    _BACKEND = backend
+
+
+def _flash_version(q, version):
+    # flash attention version to run, or None for the SDPA fallback
+    if q.device.type != 'cuda' or not (FLASH_ATTN_2_AVAILABLE or
+                                       FLASH_ATTN_3_AVAILABLE):
+        return None
+    if version is None and _BACKEND is not None:
+        return _FA_VERSIONS.get(_BACKEND)
+    return version or (3 if FLASH_ATTN_3_AVAILABLE else 2)
+
+
+def _cu_seqlens(lens, device):
+    """
+    Cumulative sequence lengths on `device`. Cached by value, so repeated
+    calls issue no host-to-device copy, which is not allowed while a CUDA
+    graph is being captured. The cache keeps the last `_CU_SEQLENS_SIZE`
+    values, plus every value used by a captured graph.
+    """
+    key = (tuple(lens), device)
+    if key in _CU_SEQLENS_CAPTURED:
+        return _CU_SEQLENS_CAPTURED[key]
+    if key in _CU_SEQLENS:
+        _CU_SEQLENS.move_to_end(key)
+        cu_seqlens = _CU_SEQLENS[key]
+    else:
+        cu_seqlens = torch.tensor([0, *itertools.accumulate(lens)],
+                                  dtype=torch.int32,
+                                  device=device)
+        _CU_SEQLENS[key] = cu_seqlens
+        if len(_CU_SEQLENS) > _CU_SEQLENS_SIZE:
+            _CU_SEQLENS.popitem(last=False)
+    if device.type == 'cuda' and torch.cuda.is_current_stream_capturing():
+        _CU_SEQLENS_CAPTURED[key] = _CU_SEQLENS.pop(key)
+    return cu_seqlens
+
 
 def flash_attention(
     q,
@@ -48,10 +136,15 @@ def flash_attention(
     window_size:    (left right). If not (-1, -1), apply sliding window local attention.
     deterministic:  bool. If True, slightly slower and uses more memory.
     dtype:          torch.dtype. Apply when dtype of q/k/v is not float16/bfloat16.
+
+    Off CUDA, without flash attention or with the 'sdpa' backend selected by
+    `set_attention_backend`, the attention runs through the
+    `scaled_dot_product_attention` fallback of `varlen_attention`, e.g. for
+    CPU benchmarks.
     """
     half_dtypes = (torch.float16, torch.bfloat16)
     assert dtype in half_dtypes
-    assert q.device.type == 'cuda' and q.size(-1) <= 256
+    assert q.size(-1) <= 256
 
     # params
     b, lq, lk, out_dtype = q.size(0), q.size(1), k.size(1), q.dtype
@@ -62,20 +155,18 @@ def flash_attention(
     # preprocess query
     if q_lens is None:
         q = half(q.flatten(0, 1))
-        q_lens = torch.tensor(
-            [lq] * b, dtype=torch.int32).to(
-                device=q.device, non_blocking=True)
+        q_lens = [lq] * b
     else:
+        q_lens = [int(v) for v in q_lens]
         q = half(torch.cat([u[:v] for u, v in zip(q, q_lens)]))
 
     # preprocess key, value
     if k_lens is None:
         k = half(k.flatten(0, 1))
         v = half(v.flatten(0, 1))
-        k_lens = torch.tensor(
-            [lk] * b, dtype=torch.int32).to(
-                device=k.device, non_blocking=True)
+        k_lens = [lk] * b
     else:
+        k_lens = [int(v) for v in k_lens]
         k = half(torch.cat([u[:v] for u, v in zip(k, k_lens)]))
         v = half(torch.cat([u[:v] for u, v in zip(v, k_lens)]))
 
@@ -85,22 +176,33 @@ def flash_attention(
     if q_scale is not None:
         q = q * q_scale
 
-    if version is not None and version == 3 and not FLASH_ATTN_3_AVAILABLE:
+    version = _flash_version(q, version)
+    if version is None:
+        return varlen_attention(
+            q,
+            k,
+            v,
+            q_lens,
+            k_lens,
+            softmax_scale=softmax_scale,
+            causal=causal,
+            window_size=window_size,
+            dtype=dtype).unflatten(0, (b, lq)).type(out_dtype)
+
+    if version == 3 and not FLASH_ATTN_3_AVAILABLE:
         warnings.warn(
             'Flash attention 3 is not available, use flash attention 2 instead.'
         )
 
     # apply attention
-    if (version is None or version == 3) and FLASH_ATTN_3_AVAILABLE:
+    if version == 3 and FLASH_ATTN_3_AVAILABLE:
         # Note: dropout_p, window_size are not supported in FA3 now.
         x = flash_attn_interface.flash_attn_varlen_func(
             q=q,
             k=k,
             v=v,
-            cu_seqlens_q=torch.cat([q_lens.new_zeros([1]), q_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
-            cu_seqlens_k=torch.cat([k_lens.new_zeros([1]), k_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
+            cu_seqlens_q=_cu_seqlens(q_lens, q.device),
+            cu_seqlens_k=_cu_seqlens(k_lens, q.device),
             seqused_q=None,
             seqused_k=None,
             max_seqlen_q=lq,
@@ -114,10 +216,8 @@ def flash_attention(
             q=q,
             k=k,
             v=v,
-            cu_seqlens_q=torch.cat([q_lens.new_zeros([1]), q_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
-            cu_seqlens_k=torch.cat([k_lens.new_zeros([1]), k_lens]).cumsum(
-                0, dtype=torch.int32).to(q.device, non_blocking=True),
+            cu_seqlens_q=_cu_seqlens(q_lens, q.device),
+            cu_seqlens_k=_cu_seqlens(k_lens, q.device),
             max_seqlen_q=lq,
             max_seqlen_k=lk,
             dropout_p=dropout_p,
@@ -130,6 +230,102 @@ def flash_attention(
     return x.type(out_dtype)
 
 
+def varlen_attention(
+    q,
+    k,
+    v,
+    q_lens,
+    k_lens,
+    softmax_scale=None,
+    causal=False,
+    window_size=(-1, -1),
+    deterministic=False,
+    dtype=torch.bfloat16,
+    version=None,
+):
+    """
+    Attention over packed sequences, without padding.
+
+    q:              [Lq, Nq, C1]. Queries of all sequences, concatenated.
+    k:              [Lk, Nk, C1]. Keys of all sequences, concatenated.
+    v:              [Lk, Nk, C2]. Nq must be divisible by Nk.
+    q_lens:         list of int. Length of each query sequence, sums to Lq.
+    k_lens:         list of int. Length of each key sequence, sums to Lk.
+    softmax_scale:  float. The scaling of QK^T before applying softmax.
+    causal:         bool. Whether to apply causal attention mask.
+    window_size:    (left right). If not (-1, -1), apply sliding window local attention.
+    deterministic:  bool. If True, slightly slower and uses more memory.
+    dtype:          torch.dtype. Apply when dtype of q/k/v is not float16/bfloat16.
+
+    Sequence i attends from q[sum(q_lens[:i]):][:q_lens[i]] to the matching
+    slice of k and v. Without flash attention every sequence goes through
+    `scaled_dot_product_attention` on its own, which is slower but exact.
+    """
+    half_dtypes = (torch.float16, torch.bfloat16)
+    assert dtype in half_dtypes
+    assert len(q_lens) == len(k_lens)
+    out_dtype = q.dtype
+
+    def half(x):
+        return x if x.dtype in half_dtypes else x.to(dtype)
+
+    q, k, v = half(q), half(k), half(v)
+    q = q.to(v.dtype)
+    k = k.to(v.dtype)
+
+    version = _flash_version(q, version)
+    if version is not None:
+        cu_seqlens_q = _cu_seqlens(q_lens, q.device)
+        cu_seqlens_k = _cu_seqlens(k_lens, q.device)
+        if version == 3 and FLASH_ATTN_3_AVAILABLE:
+            x = flash_attn_interface.flash_attn_varlen_func(
+                q=q,
+                k=k,
+                v=v,
+                cu_seqlens_q=cu_seqlens_q,
+                cu_seqlens_k=cu_seqlens_k,
+                seqused_q=None,
+                seqused_k=None,
+                max_seqlen_q=max(q_lens),
+                max_seqlen_k=max(k_lens),
+                softmax_scale=softmax_scale,
+                causal=causal,
+                deterministic=deterministic)[0]
+        else:
+            x = flash_attn.flash_attn_varlen_func(
+                q=q,
+                k=k,
+                v=v,
+                cu_seqlens_q=cu_seqlens_q,
+                cu_seqlens_k=cu_seqlens_k,
+                max_seqlen_q=max(q_lens),
+                max_seqlen_k=max(k_lens),
+                softmax_scale=softmax_scale,
+                causal=causal,
+                window_size=window_size,
+                deterministic=deterministic)
+        return x.type(out_dtype)
+
+    if window_size != (-1, -1):
+        warnings.warn(
+            'Sliding window attention requires flash attention, attending globally instead.'
+        )
+    out = []
+    for q_i, k_i, v_i in zip(
+            q.split(q_lens), k.split(k_lens), v.split(k_lens)):
+        if k_i.size(1) != q_i.size(1):
+            k_i = k_i.repeat_interleave(q_i.size(1) // k_i.size(1), dim=1)
+            v_i = v_i.repeat_interleave(q_i.size(1) // v_i.size(1), dim=1)
+        out.append(
+            torch.nn.functional.scaled_dot_product_attention(
+                q_i.transpose(0, 1),
+                k_i.transpose(0, 1),
+                v_i.transpose(0, 1),
+                is_causal=causal,
+                scale=softmax_scale).transpose(0, 1))
+    return torch.cat(out).type(out_dtype)
+
+
 def attention(
     q,
     k,
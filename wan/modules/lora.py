@@ -0,0 +1,529 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+import re
+from collections import OrderedDict
+
+import torch
+import torch.nn as nn
+from safetensors.torch import load_file
+
+from .quant import QuantLinear
+
+__all__ = [
+    'LoraAdapter', 'LoraManager', 'load_lora', 'stack_lora_layers',
+    'lora_delta_bgmv', 'lora_delta_sgmv', 'lora_delta_reference'
+]
+
+# prefixes of trainer and peft checkpoints in front of the `WanModel` names
+_PREFIXES = ('base_model.model.', 'diffusion_model.', 'transformer.', 'model.',
+             'dit.', 'pipe.dit.')
+_KEY = re.compile(
+    r'^(?P<module>.+?)\.(?:(?P<down>lora_A|lora_down)|(?P<up>lora_B|lora_up))'
+    r'(?:\.[^.]+)?\.weight$')
+_ALPHA = re.compile(r'^(?P<module>.+?)\.alpha$')
+
+
+def _strip_prefix(key):
+    for prefix in _PREFIXES:
+        if key.startswith(prefix):
+            return key[len(prefix):]
+    return key
+
+
+class LoraAdapter:
+    r"""
+    Low-rank weight deltas of one adapter, `delta W = scale * up @ down` per
+    target linear. Weights stay in (pinned) host memory, device copies are
+    made on first use and kept.
+
+    Args:
+        layers (`dict[str, tuple]`):
+            (down [rank, in_features], up [out_features, rank], scale) by
+            module name.
+        name (`str`, *optional*):
+            Name of the adapter, used in logs.
+    """
+
+    def __init__(self, layers, name=None):
+        self.layers = layers
+        self.name = name
+        self._device_layers = {}
+
+    @property
+    def rank(self):
+        return max(down.size(0) for down, _, _ in self.layers.values())
+
+    def nbytes(self):
+        return sum(
+            down.numel() * down.element_size() + up.numel() * up.element_size()
+            for down, up, _ in self.layers.values())
+
+    def to(self, device, dtype):
+        r"""
+        Returns the layers on `device` in `dtype`, cached per device and dtype.
+        """
+        key = (torch.device(device), dtype)
+        if key not in self._device_layers:
+            self._device_layers[key] = {
+                name: (down.to(device, dtype, non_blocking=True),
+                       up.to(device, dtype, non_blocking=True), scale)
+                for name, (down, up, scale) in self.layers.items()
+            }
+        return self._device_layers[key]
+
+    def release(self):
+        r"""
+        Drops the device copies.
+        """
+        self._device_layers.clear()
+
+
+def load_lora(path, scale=1.0, dtype=torch.bfloat16, name=None):
+    r"""
+    Reads a LoRA safetensors file. peft ('lora_A'/'lora_B', as written by
+    DiffSynth-Studio) and kohya ('lora_down'/'lora_up' with an optional
+    'alpha') keys are understood, with or without a 'diffusion_model.' style
+    prefix.
+
+    Args:
+        path (`str`):
+            The safetensors file.
+        scale (`float`, *optional*, defaults to 1.0):
+            Strength multiplied into the scale `alpha / rank` of each layer.
+        dtype (`torch.dtype`, *optional*, defaults to torch.bfloat16):
+            Dtype the low-rank weights are kept in.
+        name (`str`, *optional*):
+            Name of the adapter, defaults to `path`.
+
+    Returns:
+        LoraAdapter:
+            The adapter in host memory, pinned if CUDA is available.
+    """
+    state_dict = load_file(path)
+    downs, ups, alphas = {}, {}, {}
+    for key, value in state_dict.items():
+        key = _strip_prefix(key)
+        match = _KEY.match(key)
+        if match is not None:
+            target = downs if match.group('down') else ups
+            target[match.group('module')] = value
+            continue
+        match = _ALPHA.match(key)
+        if match is not None:
+            alphas[match.group('module')] = float(value)
+            continue
+        logging.warning(f"Ignoring the unknown LoRA key {key} of {path}.")
+    assert downs.keys() == ups.keys(), \
+        f"LoRA {path} has unpaired layers: {sorted(downs.keys() ^ ups.keys())}."
+    assert downs, f"No LoRA layers found in {path}."
+
+    pin = torch.cuda.is_available()
+    layers = {}
+    for module, down in downs.items():
+        up = ups[module]
+        rank = down.size(0)
+        layer_scale = scale * alphas.get(module, rank) / rank
+        down = down.to(dtype).contiguous()
+        up = up.to(dtype).contiguous()
+        if pin:
+            down, up = down.pin_memory(), up.pin_memory()
+        layers[module] = (down, up, layer_scale)
+    return LoraAdapter(layers, name=name or path)
+
+
+def stack_lora_layers(adapters, name, out_features, in_features):
+    r"""
+    Stacks the layer `name` of several adapters into downs [N + 1, rank,
+    in_features] and ups [N + 1, out_features, rank], zero-padded to the
+    largest rank. The scale is folded into the ups, and the last slot is all
+    zeros, for samples without an adapter and adapters without the layer.
+    """
+    rank = max(a.layers[name][0].size(0) for a in adapters if name in a.layers)
+    dtype = next(iter(adapters[0].layers.values()))[0].dtype
+    downs = torch.zeros(len(adapters) + 1, rank, in_features, dtype=dtype)
+    ups = torch.zeros(len(adapters) + 1, out_features, rank, dtype=dtype)
+    for i, adapter in enumerate(adapters):
+        if name in adapter.layers:
+            down, up, scale = adapter.layers[name]
+            downs[i, :down.size(0)] = down
+            ups[i, :, :up.size(1)] = up.float().mul(scale).to(dtype)
+    if torch.cuda.is_available():
+        downs, ups = downs.pin_memory(), ups.pin_memory()
+    return downs, ups
+
+
+def lora_delta_reference(x, seg_lens, ids, downs, ups):
+    r"""
+    Pure-torch reference of the multi-LoRA delta: each sample is multiplied
+    by its full delta weight `ups[i] @ downs[i]` in float32.
+
+    Args:
+        x (`torch.Tensor`):
+            Inputs of all samples concatenated, [sum(seg_lens), in_features].
+        seg_lens (List[`int`]):
+            Rows of each sample.
+        ids (List[`int`]):
+            Slot of `downs` and `ups` of each sample.
+        downs (`torch.Tensor`):
+            [N, rank, in_features], see `stack_lora_layers`.
+        ups (`torch.Tensor`):
+            [N, out_features, rank], scales folded in.
+
+    Returns:
+        `torch.Tensor`:
+            [sum(seg_lens), out_features] in the dtype of `x`.
+    """
+    out = []
+    for rows, i in zip(x.split(seg_lens), ids):
+        delta = ups[i].float() @ downs[i].float()
+        out.append(rows.float() @ delta.t())
+    return torch.cat(out).to(x.dtype)
+
+
+def lora_delta_bgmv(x, ids, downs, ups):
+    r"""
+    Multi-LoRA delta of a padded batch: the low-rank weights of every sample
+    are gathered and applied with two batched matmuls.
+
+    Args:
+        x (`torch.Tensor`):
+            [B, L, in_features].
+        ids (`torch.LongTensor`):
+            [B] slots of `downs` and `ups`, on the device of `x`.
+        downs, ups (`torch.Tensor`):
+            See `lora_delta_reference`.
+
+    Returns:
+        `torch.Tensor`:
+            [B, L, out_features].
+    """
+    h = torch.bmm(x, downs[ids].transpose(1, 2))
+    return torch.bmm(h, ups[ids].transpose(1, 2))
+
+
+def lora_delta_sgmv(x, seg_lens, ids, downs, ups):
+    r"""
+    Multi-LoRA delta of a packed batch, one low-rank matmul pair per segment
+    of consecutive rows. Segment bounds are host-side, so no index tensor is
+    copied to the device.
+
+    Args:
+        x (`torch.Tensor`):
+            [sum(seg_lens), in_features].
+        seg_lens, ids, downs, ups:
+            See `lora_delta_reference`.
+
+    Returns:
+        `torch.Tensor`:
+            [sum(seg_lens), out_features].
+    """
+    out = x.new_empty(x.size(0), ups.size(1))
+    start = 0
+    for length, i in zip(seg_lens, ids):
+        rows = x[start:start + length]
+        out[start:start + length] = (rows @ downs[i].t()) @ ups[i].t()
+        start += length
+    return out
+
+
+class LoraManager:
+    r"""
+    Switches LoRA adapters on the resident weights of a `WanModel` without
+    reloading it.
+
+    An adapter is either merged into the base linears in place, which costs
+    nothing per step, or applied unmerged through forward hooks that add
+    `scale * (x @ down^T) @ up^T` with one fused `addmm`, which leaves the base
+    weights untouched and also works for `QuantLinear`. Up to `capacity`
+    adapters are kept in pinned host memory, so switching copies only the
+    low-rank weights to the device.
+
+    Merging computes the delta in float32. Deactivating a merged adapter
+    subtracts the recomputed delta from float32 weights. Lower precision
+    weights would drift by their rounding errors, so their originals are
+    kept in pinned host memory while the adapter is merged and copied back.
+    Without `keep_originals` nothing is kept and a merged adapter cannot be
+    deactivated, for one-shot merges. FSDP and tensor parallel models are
+    not supported.
+
+    `activate_batch` applies several adapters at once, and `set_batch`
+    assigns one of them to each sample of a batch. The base matmul is shared
+    and the per-sample deltas are added with gathered batched matmuls for
+    padded inputs, `lora_delta_bgmv`, or segmented ones for packed inputs,
+    `lora_delta_sgmv`.
+
+    Args:
+        model (torch.nn.Module):
+            The model, usually a `WanModel`.
+        capacity (`int`, *optional*, defaults to 4):
+            Number of adapters kept in host memory. The least recently used
+            inactive adapter is dropped first, active adapters are kept until
+            they are deactivated.
+        keep_originals (`bool`, *optional*, defaults to True):
+            Whether merged adapters can be deactivated. If False, merges are
+            permanent and no host copies of the weights are made.
+    """
+
+    def __init__(self, model, capacity=4, keep_originals=True):
+        self.model = model
+        self.capacity = capacity
+        self.keep_originals = keep_originals
+        self.adapters = OrderedDict()
+        self.active = None
+        self.merged = False
+        self._originals = {}
+        self._handles = []
+        self._stacked = None
+        self._ids = None
+        self._seq_lens = None
+        self._device_ids = {}
+
+    def load(self, name, path=None, scale=1.0):
+        r"""
+        Caches the adapter `name`, read from `path` unless it is cached
+        already.
+
+        Returns:
+            LoraAdapter:
+                The cached adapter.
+        """
+        return self._load(name, path, scale, keep=(name,))
+
+    def _load(self, name, path, scale, keep):
+        if name in self.adapters:
+            self.adapters.move_to_end(name)
+            return self.adapters[name]
+        assert path is not None, f"LoRA {name} is not loaded."
+        adapter = load_lora(path, scale=scale, name=name)
+        modules = dict(self.model.named_modules())
+        missing = [k for k in adapter.layers if k not in modules]
+        assert not missing, \
+            f"LoRA {name} targets modules the model does not have: {missing[:4]}."
+        for k, (down, up, _) in adapter.layers.items():
+            module = modules[k]
+            assert isinstance(module, (nn.Linear, QuantLinear)), \
+                f"LoRA {name} targets {k}, which is a {type(module).__name__}, not a linear."
+            assert (up.size(0), down.size(1)) == (module.out_features,
+                                                  module.in_features), \
+                f"LoRA {name} does not match the shape of {k}."
+        self.adapters[name] = adapter
+        self._evict(keep=keep, strict=False)
+        logging.info(
+            f"Loaded LoRA {name} of rank {adapter.rank} on {len(adapter.layers)} layers, "
+            f"{adapter.nbytes() / 2**20:.1f} MiB.")
+        return adapter
+
+    def _evict(self, keep=(), strict=True):
+        # drops the least recently used adapters beyond the capacity, never
+        # the active ones or those in `keep`
+        keep = set(keep) | set(self._active_names())
+        while len(self.adapters) > self.capacity:
+            evict = next((k for k in self.adapters if k not in keep), None)
+            if evict is None:
+                if strict:
+                    raise RuntimeError(
+                        f"Cannot evict a LoRA to stay within the capacity of "
+                        f"{self.capacity}, all of {list(self.adapters)} are in use."
+                    )
+                # kept beyond the capacity until the active ones are
+                # deactivated
+                return
+            self.adapters.pop(evict).release()
+
+    def _active_names(self):
+        if self.active is None:
+            return ()
+        return self.active if isinstance(self.active, tuple) else (
+            self.active,)
+
+    @torch.no_grad()
+    def _merge(self, adapter):
+        modules = dict(self.model.named_modules())
+        for k, (down, up, scale) in adapter.layers.items():
+            weight = modules[k].weight
+            assert isinstance(modules[k], nn.Linear), \
+                f"{k} is quantized, apply the LoRA with merge=False."
+            if self.keep_originals and weight.dtype != torch.float32:
+                self._originals[k] = torch.empty(
+                    weight.shape,
+                    dtype=weight.dtype,
+                    device='cpu',
+                    pin_memory=weight.is_cuda).copy_(weight)
+            weight.copy_(
+                weight.float().add_(
+                    self._delta(down, up, weight.device), alpha=scale))
+
+    @staticmethod
+    def _delta(down, up, device):
+        return up.to(device, torch.float32, non_blocking=True) @ down.to(
+            device, torch.float32, non_blocking=True)
+
+    @torch.no_grad()
+    def _unmerge(self, adapter):
+        if not self.keep_originals:
+            raise RuntimeError(
+                f"LoRA {adapter.name} is merged permanently, create the "
+                f"LoraManager with keep_originals=True to deactivate it.")
+        # the weights may have moved since the merge, e.g. by offloading
+        modules = dict(self.model.named_modules())
+        for k, (down, up, scale) in adapter.layers.items():
+            weight = modules[k].weight
+            if k in self._originals:
+                weight.copy_(self._originals[k])
+            else:
+                weight.sub_(self._delta(down, up, weight.device), alpha=scale)
+        self._originals = {}
+
+    @staticmethod
+    def _hook(adapter, name):
+
+        def hook(module, inputs, output):
+            # device copies follow the module, e.g. across expert swaps
+            x = inputs[0]
+            down, up, scale = adapter.to(x.device, output.dtype)[name]
+            out = torch.addmm(
+                output.reshape(-1, output.size(-1)),
+                x.reshape(-1, x.size(-1)).to(down.dtype) @ down.t(),
+                up.t(),
+                alpha=scale)
+            return out.view(output.shape)
+
+        return hook
+
+    def _apply(self, adapter):
+        modules = dict(self.model.named_modules())
+        for k in adapter.layers:
+            self._handles.append(modules[k].register_forward_hook(
+                self._hook(adapter, k)))
+
+    def _batch_hook(self, name):
+
+        def hook(module, inputs, output):
+            assert self._ids is not None, \
+                "Assign the adapters of the batch with set_batch first."
+            x = inputs[0].to(output.dtype)
+            downs, ups, _ = self._stacked.to(x.device, output.dtype)[name]
+            ids, seq_lens = self._ids, self._seq_lens
+            if x.size(0) % len(ids) == 0 and (x.size(0) > 1 or
+                                               len(ids) == 1):
+                # padded samples, repeated e.g. for the unconditional half
+                repeat = x.size(0) // len(ids)
+                key = (x.device, repeat)
+                if key not in self._device_ids:
+                    self._device_ids[key] = torch.tensor(
+                        ids * repeat, dtype=torch.long, device=x.device)
+                delta = lora_delta_bgmv(
+                    x.reshape(x.size(0), -1, x.size(-1)),
+                    self._device_ids[key], downs, ups)
+            else:
+                assert seq_lens is not None, \
+                    "Packed inputs need the seq_lens of set_batch."
+                x = x.reshape(-1, x.size(-1))
+                repeat = x.size(0) // sum(seq_lens)
+                delta = lora_delta_sgmv(x, seq_lens * repeat, ids * repeat,
+                                        downs, ups)
+            return output + delta.view(output.shape)
+
+        return hook
+
+    def activate_batch(self, names, paths=None, scale=1.0):
+        r"""
+        Applies the adapters `names` together, unmerged. Each sample of a
+        forward uses the adapter assigned by `set_batch`.
+
+        Args:
+            names (List[`str`]):
+                The adapters, loaded from `paths` if not cached.
+            paths (List[`str`], *optional*):
+                Safetensors files of the adapters.
+            scale (`float`, *optional*, defaults to 1.0):
+                Strength of the adapters that are loaded.
+        """
+        assert len(names) <= self.capacity, \
+            f"{len(names)} adapters exceed the capacity of {self.capacity}."
+        paths = paths or [None] * len(names)
+        adapters = [
+            self._load(name, path, scale, keep=names)
+            for name, path in zip(names, paths)
+        ]
+        self.deactivate()
+        self._evict(keep=names)
+        modules = dict(self.model.named_modules())
+        layers = {}
+        for k in sorted(set().union(*(a.layers for a in adapters))):
+            module = modules[k]
+            downs, ups = stack_lora_layers(adapters, k, module.out_features,
+                                           module.in_features)
+            layers[k] = (downs, ups, 1.0)
+            self._handles.append(
+                module.register_forward_hook(self._batch_hook(k)))
+        self._stacked = LoraAdapter(layers, name='+'.join(names))
+        self.active, self.merged = tuple(names), False
+
+    def set_batch(self, adapters, seq_lens=None):
+        r"""
+        Assigns an adapter of `activate_batch` to each sample of the next
+        forwards. Batches that repeat the samples, e.g. conditional and
+        unconditional inputs in one forward, use the same assignment for
+        every repetition.
+
+        Args:
+            adapters (List[`str`]):
+                Adapter name of each sample, None for the base model.
+            seq_lens (List[`int`], *optional*):
+                Tokens of each sample, needed for packed forwards.
+        """
+        assert isinstance(self.active, tuple), \
+            "Activate the adapters with activate_batch first."
+        base = len(self.active)
+        self._ids = [
+            base if name is None else self.active.index(name)
+            for name in adapters
+        ]
+        self._seq_lens = None if seq_lens is None else [int(l) for l in seq_lens]
+        self._device_ids = {}
+
+    def activate(self, name, path=None, scale=1.0, merge=True):
+        r"""
+        Replaces the active adapter by `name`.
+
+        Args:
+            name (`str`):
+                The adapter, loaded from `path` if not cached.
+            path (`str`, *optional*):
+                Safetensors file of the adapter.
+            scale (`float`, *optional*, defaults to 1.0):
+                Strength of the adapter, only used when it is loaded.
+            merge (`bool`, *optional*, defaults to True):
+                Merge the adapter into the base weights, or apply it through
+                forward hooks.
+        """
+        adapter = self.load(name, path, scale)
+        if self.active == name and self.merged == merge:
+            return
+        self.deactivate()
+        self._evict(keep=(name,))
+        if merge:
+            self._merge(adapter)
+        else:
+            self._apply(adapter)
+        self.active, self.merged = name, merge
+
+    def deactivate(self):
+        r"""
+        Restores the base model: unmerges or unhooks the active adapter.
+        """
+        if self.active is None:
+            return
+        if self.merged:
+            self._unmerge(self.adapters[self.active])
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        if isinstance(self.active, tuple):
+            self._stacked = None
+            self._ids = self._seq_lens = None
+            self._device_ids = {}
+        else:
+            self.adapters[self.active].release()
+        self.active, self.merged = None, False
@@ -1,12 +1,15 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
 import math
+import os
 
 import torch
 import torch.nn as nn
 from diffusers.configuration_utils import ConfigMixin, register_to_config
 from diffusers.models.modeling_utils import ModelMixin
 
-from .attention import flash_attention
+from ..utils.checkpoint import check_checkpoint_dir
+from .attention import flash_attention, varlen_attention
+from .tome import TokenMerger
 
 __all__ = ['WanModel']
 
@@ -19,7 +22,9 @@ def sinusoidal_embedding_1d(dim, position):
 
     # calculation
     sinusoid = torch.outer(
-        position, torch.pow(10000, -torch.arange(half).to(position).div(half)))
+        position, torch.pow(10000,
+                            -torch.arange(half, device=position.device).to(
+                                position).div(half)))
     x = torch.cat([torch.cos(sinusoid), torch.sin(sinusoid)], dim=1)
     return x
 
@@ -35,6 +40,16 @@ def rope_params(max_seq_len, dim, theta=10000):
     return freqs
 
 
+def _rope_grid_freqs(freqs, f, h, w):
+    # multipliers of an (f, h, w) grid, freqs split into (f, h, w) parts
+    return torch.cat([
+        freqs[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
+        freqs[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
+        freqs[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
+    ],
+                     dim=-1).reshape(f * h * w, 1, -1)
+
+
 @torch.amp.autocast('cuda', enabled=False)
 def rope_apply(x, grid_sizes, freqs):
     n, c = x.size(2), x.size(3) // 2
@@ -50,12 +65,7 @@ def rope_apply(x, grid_sizes, freqs):
         # precompute multipliers
         x_i = torch.view_as_complex(x[i, :seq_len].to(torch.float64).reshape(
             seq_len, n, -1, 2))
-        freqs_i = torch.cat([
-            freqs[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
-            freqs[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
-            freqs[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
-        ],
-                            dim=-1).reshape(seq_len, 1, -1)
+        freqs_i = _rope_grid_freqs(freqs, f, h, w)
 
         # apply rotary embedding
         x_i = torch.view_as_real(x_i * freqs_i).flatten(2)
@@ -66,6 +76,37 @@ def rope_apply(x, grid_sizes, freqs):
     return torch.stack(output).float()
 
 
+@torch.amp.autocast('cuda', enabled=False)
+def rope_apply_packed(x, grid_sizes, freqs):
+    r"""
+    `rope_apply` for packed samples, x has shape [1, L, N, C] with the tokens
+    of each grid in `grid_sizes` stored back to back.
+    """
+    n, c = x.size(2), x.size(3) // 2
+    freqs = freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1)
+    seq_lens = [f * h * w for f, h, w in grid_sizes.tolist()]
+
+    output = []
+    for x_i, (f, h, w) in zip(x[0].split(seq_lens), grid_sizes.tolist()):
+        x_i = torch.view_as_complex(
+            x_i.to(torch.float64).reshape(x_i.size(0), n, -1, 2))
+        x_i = torch.view_as_real(x_i * _rope_grid_freqs(freqs, f, h, w))
+        output.append(x_i.flatten(2))
+    return torch.cat(output).unsqueeze(0).float()
+
+
+@torch.amp.autocast('cuda', enabled=False)
+def rope_apply_tokens(x, freqs):
+    r"""
+    `rope_apply` with the multipliers of every token given, x has shape
+    [B, L, N, C] and freqs [B, L, 1, C / 2], e.g. of the tokens kept by token
+    merging.
+    """
+    b, s, n = x.shape[:3]
+    x = torch.view_as_complex(x.to(torch.float64).reshape(b, s, n, -1, 2))
+    return torch.view_as_real(x * freqs).flatten(3).float()
+
+
 class WanRMSNorm(nn.Module):
 
     def __init__(self, dim, eps=1e-5):
@@ -123,13 +164,21 @@ class WanSelfAttention(nn.Module):
         self.norm_q = WanRMSNorm(dim, eps=eps) if qk_norm else nn.Identity()
         self.norm_k = WanRMSNorm(dim, eps=eps) if qk_norm else nn.Identity()
 
-    def forward(self, x, seq_lens, grid_sizes, freqs):
+    def forward(self,
+                x,
+                seq_lens,
+                grid_sizes,
+                freqs,
+                packed=False,
+                token_freqs=None):
         r"""
         Args:
             x(Tensor): Shape [B, L, num_heads, C / num_heads]
             seq_lens(Tensor): Shape [B]
             grid_sizes(Tensor): Shape [B, 3], the second dimension contains (F, H, W)
             freqs(Tensor): Rope freqs, shape [1024, C / num_heads / 2]
+            packed(`bool`): Whether x holds all samples back to back, shape [1, sum(seq_lens), C]
+            token_freqs(Tensor, *optional*): Rope multipliers of every token, shape [B, L, 1, C / num_heads / 2], used instead of the grid of `grid_sizes`
         """
         b, s, n, d = *x.shape[:2], self.num_heads, self.head_dim
 
@@ -142,9 +191,26 @@ class WanSelfAttention(nn.Module):
 
         q, k, v = qkv_fn(x)
 
+        if packed:
+            lens = seq_lens.tolist()
+            x = varlen_attention(
+                q=rope_apply_packed(q, grid_sizes, freqs)[0],
+                k=rope_apply_packed(k, grid_sizes, freqs)[0],
+                v=v[0],
+                q_lens=lens,
+                k_lens=lens,
+                window_size=self.window_size).unsqueeze(0)
+            return self.o(x.flatten(2))
+
+        if token_freqs is not None:
+            q = rope_apply_tokens(q, token_freqs)
+            k = rope_apply_tokens(k, token_freqs)
+        else:
+            q = rope_apply(q, grid_sizes, freqs)
+            k = rope_apply(k, grid_sizes, freqs)
         x = flash_attention(
-            q=rope_apply(q, grid_sizes, freqs),
-            k=rope_apply(k, grid_sizes, freqs),
+            q=q,
+            k=k,
             v=v,
             k_lens=seq_lens,
             window_size=self.window_size)
@@ -157,21 +223,33 @@ class WanSelfAttention(nn.Module):
 
 class WanCrossAttention(WanSelfAttention):
 
-    def forward(self, x, context, context_lens):
+    def forward(self, x, context, context_lens, seq_lens=None):
         r"""
         Args:
             x(Tensor): Shape [B, L1, C]
             context(Tensor): Shape [B, L2, C]
             context_lens(Tensor): Shape [B]
+            seq_lens(Tensor, *optional*): Shape [B], only for packed x of shape [1, sum(seq_lens), C]
         """
         b, n, d = x.size(0), self.num_heads, self.head_dim
 
         # compute query, key, value
         q = self.norm_q(self.q(x)).view(b, -1, n, d)
-        k = self.norm_k(self.k(context)).view(b, -1, n, d)
-        v = self.v(context).view(b, -1, n, d)
+        k = self.norm_k(self.k(context)).view(context.size(0), -1, n, d)
+        v = self.v(context).view(context.size(0), -1, n, d)
 
         # compute attention
+        if seq_lens is not None:
+            k_lens = [k.size(1)] * k.size(0) if context_lens is None else [
+                int(u) for u in context_lens
+            ]
+            x = varlen_attention(
+                q[0],
+                torch.cat([u[:l] for u, l in zip(k, k_lens)]),
+                torch.cat([u[:l] for u, l in zip(v, k_lens)]),
+                q_lens=seq_lens.tolist(),
+                k_lens=k_lens).unsqueeze(0)
+            return self.o(x.flatten(2))
         x = flash_attention(q, k, v, k_lens=context_lens)
 
         # output
@@ -225,6 +303,8 @@ class WanAttentionBlock(nn.Module):
         freqs,
         context,
         context_lens,
+        packed=False,
+        merge=None,
     ):
         r"""
         Args:
@@ -233,6 +313,8 @@ class WanAttentionBlock(nn.Module):
             seq_lens(Tensor): Shape [B], length of each sequence in batch
             grid_sizes(Tensor): Shape [B, 3], the second dimension contains (F, H, W)
             freqs(Tensor): Rope freqs, shape [1024, C / num_heads / 2]
+            packed(`bool`): Whether x and e hold all samples back to back, with B = 1 and L = sum(seq_lens)
+            merge(*optional*): Token merging of this block from `TokenMerger.match`, attention and FFN run on the merged tokens
         """
         assert e.dtype == torch.float32
         with torch.amp.autocast('cuda', dtype=torch.float32):
@@ -240,17 +322,38 @@ class WanAttentionBlock(nn.Module):
         assert e[0].dtype == torch.float32
 
         # self-attention
-        y = self.self_attn(
-            self.norm1(x).float() * (1 + e[1].squeeze(2)) + e[0].squeeze(2),
-            seq_lens, grid_sizes, freqs)
+        y = self.norm1(x).float() * (1 + e[1].squeeze(2)) + e[0].squeeze(2)
+        if packed:
+            y = self.self_attn(y, seq_lens, grid_sizes, freqs, packed=True)
+        elif merge is not None:
+            y = merge.unmerge(
+                self.self_attn(
+                    merge.merge(y),
+                    seq_lens - merge.num_merged,
+                    grid_sizes,
+                    freqs,
+                    token_freqs=merge.freqs))
+        else:
+            y = self.self_attn(y, seq_lens, grid_sizes, freqs)
         with torch.amp.autocast('cuda', dtype=torch.float32):
             x = x + y * e[2].squeeze(2)
 
         # cross-attention & ffn function
         def cross_attn_ffn(x, context, context_lens, e):
-            x = x + self.cross_attn(self.norm3(x), context, context_lens)
-            y = self.ffn(
-                self.norm2(x).float() * (1 + e[4].squeeze(2)) + e[3].squeeze(2))
+            if packed:
+                x = x + self.cross_attn(
+                    self.norm3(x), context, context_lens, seq_lens=seq_lens)
+            elif merge is not None:
+                x = x + merge.unmerge(
+                    self.cross_attn(
+                        merge.merge(self.norm3(x)), context, context_lens))
+            else:
+                x = x + self.cross_attn(self.norm3(x), context, context_lens)
+            y = self.norm2(x).float() * (1 + e[4].squeeze(2)) + e[3].squeeze(2)
+            if merge is not None:
+                y = merge.unmerge(self.ffn(merge.merge(y)))
+            else:
+                y = self.ffn(y)
             with torch.amp.autocast('cuda', dtype=torch.float32):
                 x = x + y * e[5].squeeze(2)
             return x
@@ -404,9 +507,26 @@ class WanModel(ModelMixin, ConfigMixin):
         ],
                                dim=1)
 
+        # sequence lengths to pad to, set by `compile_blocks`
+        self.seq_len_buckets = None
+
+        # `TokenMerging` of the blocks, disabled if None
+        self.token_merging = None
+
         # initialize weights
         self.init_weights()
 
+    @classmethod
+    def from_pretrained(cls, pretrained_model_name_or_path, *args, **kwargs):
+        # shards converted by tools/convert_checkpoint.py are checked for
+        # truncation before the load
+        path = os.path.join(pretrained_model_name_or_path,
+                            kwargs.get('subfolder') or '')
+        if os.path.isdir(path):
+            check_checkpoint_dir(path)
+        return super().from_pretrained(pretrained_model_name_or_path, *args,
+                                       **kwargs)
+
     def forward(
         self,
         x,
@@ -414,6 +534,8 @@ class WanModel(ModelMixin, ConfigMixin):
         context,
         seq_len,
         y=None,
+        packed=False,
+        timestep=None,
     ):
         r"""
         Forward pass through the diffusion model
@@ -429,6 +551,15 @@ class WanModel(ModelMixin, ConfigMixin):
                 Maximum sequence length for positional encoding
             y (List[Tensor], *optional*):
                 Conditional video inputs for image-to-video mode, same shape as x
+            packed (`bool`, *optional*, defaults to False):
+                Concatenate the tokens of all samples into one sequence instead
+                of padding each to `seq_len`. Attention runs per sample on the
+                varlen path, so samples of different sizes share a forward
+                without padding. `seq_len` is ignored.
+            timestep (`float`, *optional*):
+                Host copy of the largest timestep in `t`, sets the token merging
+                ratio without reading `t` back from the device. Merging runs at
+                the ratio of the noisiest timestep if None.
 
         Returns:
             List[Tensor]:
@@ -450,7 +581,13 @@ class WanModel(ModelMixin, ConfigMixin):
             [torch.tensor(u.shape[2:], dtype=torch.long) for u in x])
         x = [u.flatten(2).transpose(1, 2) for u in x]
         seq_lens = torch.tensor([u.size(1) for u in x], dtype=torch.long)
+        if packed:
+            return self._forward_packed(x, t, context, seq_lens, grid_sizes)
         assert seq_lens.max() <= seq_len
+        if self.seq_len_buckets is not None:
+            # padded tokens are masked out as keys and dropped on unpatchify
+            seq_len = next((b for b in self.seq_len_buckets if b >= seq_len),
+                           seq_len)
         x = torch.cat([
             torch.cat([u, u.new_zeros(1, seq_len - u.size(1), u.size(2))],
                       dim=1) for u in x
@@ -459,6 +596,9 @@ class WanModel(ModelMixin, ConfigMixin):
         # time embeddings
         if t.dim() == 1:
             t = t.expand(t.size(0), seq_len)
+        elif t.size(1) < seq_len:
+            t = torch.cat([t, t[:, -1:].expand(-1, seq_len - t.size(1))],
+                          dim=1)
         with torch.amp.autocast('cuda', dtype=torch.float32):
             bt = t.size(0)
             t = t.flatten()
@@ -486,6 +626,86 @@ class WanModel(ModelMixin, ConfigMixin):
             context=context,
             context_lens=context_lens)
 
+        merger = self._token_merger(grid_sizes, seq_len, device)
+        if merger is not None:
+            # tokens of different timesteps have different embeddings
+            key = e0[:, :, 0, 0]
+            if timestep is None:
+                timestep = self.token_merging.num_train_timesteps
+        for i, block in enumerate(self.blocks):
+            r = 0 if merger is None else merger.num_merged(
+                timestep, i, self.num_layers)
+            if r > 0:
+                x = block(x, merge=merger.match(x, key, r), **kwargs)
+            else:
+                x = block(x, **kwargs)
+
+        # head
+        x = self.head(x, e)
+
+        # unpatchify
+        x = self.unpatchify(x, grid_sizes)
+        return [u.float() for u in x]
+
+    def _token_merger(self, grid_sizes, seq_len, device):
+        r"""
+        Returns the `TokenMerger` of a forward pass if token merging is
+        enabled and all samples share their grid, None otherwise.
+        """
+        if self.token_merging is None or (grid_sizes != grid_sizes[0]).any():
+            return None
+        c = self.dim // self.num_heads // 2
+        return TokenMerger(
+            self.token_merging,
+            grid_sizes[0].tolist(),
+            seq_len,
+            self.freqs.split([c - 2 * (c // 3), c // 3, c // 3], dim=1),
+            device)
+
+    def _forward_packed(self, x, t, context, seq_lens, grid_sizes):
+        r"""
+        Runs the blocks on the patch embeddings `x` of all samples
+        concatenated into one sequence of shape [1, sum(seq_lens), C]. The
+        timestep embeddings are concatenated the same way, so modulation is
+        applied per sample.
+        """
+        lens = seq_lens.tolist()
+        x = torch.cat(x, dim=1)
+
+        # per token timesteps, t is [B] or [B, L] padded like in `forward`
+        if t.dim() == 1:
+            t = torch.cat([u.expand(l) for u, l in zip(t, lens)])
+        else:
+            t = torch.cat([
+                u[:l] if u.size(0) >= l else torch.cat(
+                    [u, u[-1:].expand(l - u.size(0))])
+                for u, l in zip(t, lens)
+            ])
+        with torch.amp.autocast('cuda', dtype=torch.float32):
+            e = self.time_embedding(
+                sinusoidal_embedding_1d(self.freq_dim,
+                                        t).unsqueeze(0).float())
+            e0 = self.time_projection(e).unflatten(2, (6, self.dim))
+            assert e.dtype == torch.float32 and e0.dtype == torch.float32
+
+        # context
+        context = self.text_embedding(
+            torch.stack([
+                torch.cat(
+                    [u, u.new_zeros(self.text_len - u.size(0), u.size(1))])
+                for u in context
+            ]))
+
+        # arguments
+        kwargs = dict(
+            e=e0,
+            seq_lens=seq_lens,
+            grid_sizes=grid_sizes,
+            freqs=self.freqs,
+            context=context,
+            context_lens=None,
+            packed=True)
+
         for block in self.blocks:
             x = block(x, **kwargs)
 
@@ -493,7 +713,7 @@ class WanModel(ModelMixin, ConfigMixin):
         x = self.head(x, e)
 
         # unpatchify
-        x = self.unpatchify(x, grid_sizes)
+        x = self.unpatchify(x[0].split(lens), grid_sizes)
         return [u.float() for u in x]
 
     def unpatchify(self, x, grid_sizes):
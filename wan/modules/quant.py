@@ -0,0 +1,343 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import json
+import logging
+import os
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from accelerate import init_empty_weights
+from safetensors.torch import load_file, save_file
+
+from .model import WanModel
+
+__all__ = [
+    'QuantLinear', 'quantize_model', 'save_quantized_model',
+    'load_quantized_model', 'quantized_checkpoint_dir', 'quant_kernels'
+]
+
+QUANT_CONFIG_NAME = 'quantization_config.json'
+QUANT_WEIGHTS_NAME = 'quantized_model.safetensors'
+
+# linears that hold nearly all DiT weights, the head and the time embedding
+# are small and stay in full precision
+QUANT_TARGETS = (
+    'self_attn.q',
+    'self_attn.k',
+    'self_attn.v',
+    'self_attn.o',
+    'cross_attn.q',
+    'cross_attn.k',
+    'cross_attn.v',
+    'cross_attn.o',
+    'ffn.0',
+    'ffn.2',
+    'text_embedding.0',
+    'text_embedding.2',
+    'time_projection.1',
+)
+
+# largest finite value of each storage format
+_QMAX = {'int8': 127.0, 'fp8': 448.0}
+
+# fused kernels that work on each device, probed once by `quant_kernels`
+_KERNELS = {}
+
+
+def _int8_mm(x, weight, scale):
+    # int8 weights are dequantized inside the matmul
+    out = torch._weight_int8pack_mm(
+        x.reshape(-1, x.size(-1)).contiguous(), weight, scale.to(x.dtype))
+    return out.view(*x.shape[:-1], weight.size(0))
+
+
+def _fp8_mm(x, weight, scale):
+    # activations are quantized to fp8 per token, both scales are applied
+    # by the kernel
+    x2 = x.reshape(-1, x.size(-1))
+    x_scale = x2.abs().amax(dim=1, keepdim=True).float().clamp(
+        min=1e-12) / _QMAX['fp8']
+    out = torch._scaled_mm(
+        (x2 / x_scale).to(torch.float8_e4m3fn),
+        weight.view(torch.float8_e4m3fn).t(),
+        scale_a=x_scale,
+        scale_b=scale.float()[None],
+        out_dtype=x.dtype)
+    return out.view(*x.shape[:-1], weight.size(0))
+
+
+def _probe(fn, qtype, device, dtype):
+    x = torch.randn(16, 32, dtype=dtype, device=device)
+    weight = torch.randint(-8, 8, (32, 32), dtype=torch.int8, device=device)
+    try:
+        if qtype == 'fp8':
+            weight = weight.to(torch.float8_e4m3fn).view(torch.uint8)
+        fn(x, weight, torch.ones(32, device=device))
+        return True
+    except (RuntimeError, NotImplementedError, AttributeError):
+        return False
+
+
+def quant_kernels(device):
+    r"""
+    Returns which fused matmul kernels of `QuantLinear` work on `device`,
+    probed once per device with a tiny matmul.
+
+    Returns:
+        `dict`:
+            Whether 'int8' and, with `act_quant`, 'fp8' run fused, for
+            activations of 'dtype', bfloat16 on CUDA and float32 on other
+            devices.
+    """
+    device = torch.device(device)
+    if device.type == 'cuda' and device.index is None:
+        device = torch.device('cuda', torch.cuda.current_device())
+    if device not in _KERNELS:
+        dtype = torch.bfloat16 if device.type == 'cuda' else torch.float32
+        _KERNELS[device] = {
+            'dtype': dtype,
+            'int8': _probe(_int8_mm, 'int8', device, dtype),
+            'fp8': device.type == 'cuda' and
+                   _probe(_fp8_mm, 'fp8', device, dtype),
+        }
+        logging.info(f"Fused quantized matmuls on {device}: "
+                     f"int8 {_KERNELS[device]['int8']}, "
+                     f"fp8 {_KERNELS[device]['fp8']}.")
+    return _KERNELS[device]
+
+
+class QuantLinear(nn.Module):
+    r"""
+    Linear layer with quantized weights and a per output channel scale.
+
+    By default only the weights are quantized. int8 weights are multiplied
+    by the fused `torch._weight_int8pack_mm` kernel on devices where
+    `quant_kernels` finds it working. fp8 weights, and int8 ones without the
+    kernel, are cast to the activation dtype on every forward and the scale
+    is applied to the output: this only saves memory and is slower than an
+    unquantized linear. With `act_quant`, fp8 layers also quantize the
+    activations to fp8 per token and run `torch._scaled_mm` (W8A8), which is
+    faster but less accurate than weight-only fp8.
+
+    fp8 weights are stored as `uint8` and the scale stays in float32, so
+    that `Module.to(dtype)` changes neither.
+
+    Args:
+        in_features (`int`):
+            Size of each input sample.
+        out_features (`int`):
+            Size of each output sample.
+        bias (`bool`, *optional*, defaults to True):
+            Whether the layer has a bias.
+        qtype (`str`, *optional*, defaults to 'int8'):
+            Weight format, 'int8' or 'fp8' (e4m3).
+        act_quant (`bool`, *optional*, defaults to False):
+            Whether fp8 layers quantize the activations too.
+    """
+
+    def __init__(self,
+                 in_features,
+                 out_features,
+                 bias=True,
+                 qtype='int8',
+                 act_quant=False):
+        super().__init__()
+        assert qtype in _QMAX, f"Unsupported quantization type: {qtype}."
+        assert not act_quant or qtype == 'fp8', \
+            f"Activation quantization needs fp8 weights, got {qtype}."
+        self.in_features = in_features
+        self.out_features = out_features
+        self.qtype = qtype
+        self.act_quant = act_quant
+        storage = torch.int8 if qtype == 'int8' else torch.uint8
+        self.weight = nn.Parameter(
+            torch.empty(out_features, in_features, dtype=storage),
+            requires_grad=False)
+        self.scale = nn.Parameter(
+            torch.empty(out_features, dtype=torch.float32),
+            requires_grad=False)
+        if bias:
+            self.bias = nn.Parameter(
+                torch.empty(out_features), requires_grad=False)
+        else:
+            self.register_parameter('bias', None)
+
+    @classmethod
+    def from_linear(cls, linear, qtype='int8', act_quant=False):
+        r"""
+        Quantizes the weight of `linear` with one absmax scale per row.
+        """
+        layer = cls(
+            linear.in_features,
+            linear.out_features,
+            bias=linear.bias is not None,
+            qtype=qtype,
+            act_quant=act_quant)
+        weight = linear.weight.detach().float()
+        scale = weight.abs().amax(dim=1).clamp(min=1e-12) / _QMAX[qtype]
+        weight = weight / scale[:, None]
+        if qtype == 'int8':
+            weight = weight.round().clamp(-127, 127).to(torch.int8)
+        else:
+            weight = weight.to(torch.float8_e4m3fn).view(torch.uint8)
+        layer.weight = nn.Parameter(weight, requires_grad=False)
+        layer.scale = nn.Parameter(scale, requires_grad=False)
+        if linear.bias is not None:
+            layer.bias = nn.Parameter(
+                linear.bias.detach().clone(), requires_grad=False)
+        return layer
+
+    def _apply(self, fn, recurse=True):
+        # the scale follows device moves but not dtype casts
+        scale = self.scale
+        super()._apply(fn, recurse)
+        if self.scale.dtype != scale.dtype:
+            self.scale.data = scale.data.to(self.scale.device)
+        return self
+
+    def dequantize(self, dtype=torch.float32):
+        r"""
+        Returns the weight in full precision.
+        """
+        weight = self.weight
+        if self.qtype == 'fp8':
+            weight = weight.view(torch.float8_e4m3fn)
+        return weight.to(dtype) * self.scale.to(dtype)[:, None]
+
+    def forward(self, x):
+        # follow autocast like nn.Linear does
+        device_type = x.device.type
+        if torch.is_autocast_enabled(device_type):
+            x = x.to(torch.get_autocast_dtype(device_type))
+
+        kernels = _KERNELS.get(x.device) or quant_kernels(x.device)
+        fused = self.qtype == 'int8' or self.act_quant
+        if fused and kernels[self.qtype] and x.dtype == kernels['dtype']:
+            fn = _int8_mm if self.qtype == 'int8' else _fp8_mm
+            out = fn(x, self.weight, self.scale)
+        else:
+            weight = self.weight
+            if self.qtype == 'fp8':
+                weight = weight.view(torch.float8_e4m3fn)
+            out = F.linear(x, weight.to(x.dtype)) * self.scale.to(x.dtype)
+        if self.bias is not None:
+            out = out + self.bias.to(out.dtype)
+        return out
+
+    def extra_repr(self):
+        return f"in_features={self.in_features}, out_features={self.out_features}, bias={self.bias is not None}, qtype={self.qtype}, act_quant={self.act_quant}"
+
+
+def _quant_targets(model, targets=QUANT_TARGETS):
+    for name, module in model.named_modules():
+        if isinstance(module, nn.Linear) and any(
+                name == t or name.endswith('.' + t) for t in targets):
+            yield name, module
+
+
+def quantize_model(model,
+                   qtype='int8',
+                   targets=QUANT_TARGETS,
+                   act_quant=False):
+    r"""
+    Replaces the linears of `model` named by `targets` with `QuantLinear`.
+
+    Args:
+        model (torch.nn.Module):
+            The model to quantize in place, usually a `WanModel`.
+        qtype (`str`, *optional*, defaults to 'int8'):
+            Weight format, 'int8' or 'fp8' (e4m3).
+        targets (`tuple`, *optional*):
+            Suffixes of the module names to quantize.
+        act_quant (`bool`, *optional*, defaults to False):
+            Whether fp8 layers also quantize their activations, see
+            `QuantLinear`.
+
+    Returns:
+        torch.nn.Module:
+            The quantized model.
+    """
+    for name, linear in list(_quant_targets(model, targets)):
+        parent_name, _, child_name = name.rpartition('.')
+        parent = model.get_submodule(parent_name)
+        setattr(parent, child_name,
+                QuantLinear.from_linear(linear, qtype, act_quant=act_quant))
+    return model
+
+
+def quantized_checkpoint_dir(checkpoint_dir, subfolder=None, qtype='int8'):
+    r"""
+    Directory of the quantized copy of a DiT checkpoint, e.g.
+    `low_noise_model_int8` next to `low_noise_model`.
+    """
+    return os.path.join(checkpoint_dir, f"{subfolder or 'model'}_{qtype}")
+
+
+def save_quantized_model(model, save_dir, qtype, targets=QUANT_TARGETS):
+    r"""
+    Writes a model quantized by `quantize_model` to `save_dir`, as its
+    `config.json`, a quantization config and a safetensors file.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    model.save_config(save_dir)
+    with open(os.path.join(save_dir, QUANT_CONFIG_NAME), 'w') as f:
+        json.dump({'qtype': qtype, 'targets': list(targets)}, f, indent=2)
+    state_dict = {
+        k: v.contiguous() for k, v in model.state_dict().items()
+    }
+    save_file(state_dict, os.path.join(save_dir, QUANT_WEIGHTS_NAME))
+
+
+def load_quantized_model(checkpoint_dir,
+                         subfolder=None,
+                         qtype='int8',
+                         model_cls=WanModel,
+                         device=None,
+                         act_quant=False):
+    r"""
+    Loads a DiT written by `save_quantized_model`. The model is created
+    without allocating full precision weights, so peak host memory stays at
+    the size of the quantized checkpoint.
+
+    Args:
+        checkpoint_dir (`str`):
+            Path to the directory containing model checkpoints.
+        subfolder (`str`, *optional*):
+            Subfolder of the full precision checkpoint, e.g. `low_noise_model`.
+        qtype (`str`, *optional*, defaults to 'int8'):
+            Weight format, 'int8' or 'fp8'.
+        model_cls (`type`, *optional*, defaults to WanModel):
+            Class of the quantized model.
+        device (`torch.device`, *optional*):
+            Device the model will run on, its fused kernels are probed now.
+        act_quant (`bool`, *optional*, defaults to False):
+            Whether fp8 layers also quantize their activations, see
+            `QuantLinear`.
+
+    Returns:
+        torch.nn.Module:
+            The quantized model on CPU.
+    """
+    path = quantized_checkpoint_dir(checkpoint_dir, subfolder, qtype)
+    assert os.path.isfile(os.path.join(path, QUANT_CONFIG_NAME)), \
+        f"No {qtype} checkpoint found in {path}, create one with tools/quantize_dit.py."
+    with open(os.path.join(path, QUANT_CONFIG_NAME)) as f:
+        quant_config = json.load(f)
+
+    with init_empty_weights():
+        model = model_cls.from_config(model_cls.load_config(path))
+        quantize_model(
+            model,
+            quant_config['qtype'],
+            quant_config['targets'],
+            act_quant=act_quant)
+    state_dict = load_file(os.path.join(path, QUANT_WEIGHTS_NAME))
+    # checkpoints of earlier versions hold the scales in the model dtype
+    state_dict = {
+        k: v.float() if k.endswith('.scale') else v
+        for k, v in state_dict.items()
+    }
+    model.load_state_dict(state_dict, assign=True)
+    if device is not None:
+        quant_kernels(device)
+    return model
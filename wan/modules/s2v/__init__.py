@@ -1,5 +1,9 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
-from .audio_encoder import AudioEncoder
-from .model_s2v import WanModel_S2V
+from ...utils.lazy import lazy_module
 
 __all__ = ['WanModel_S2V', 'AudioEncoder']
+
+__getattr__, __dir__ = lazy_module(__name__, {
+    'WanModel_S2V': '.model_s2v',
+    'AudioEncoder': '.audio_encoder',
+})
@@ -7,6 +7,8 @@ import torch
 import torch.nn.functional as F
 from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 
+from ...utils.profiler import profiled
+
 
 def get_sample_indices(original_fps,
                        total_frames,
@@ -63,6 +65,7 @@ class AudioEncoder():
 
         self.video_rate = 30
 
+    @profiled('audio_encode')
     def extract_audio_feat(self,
                            audio_path,
                            return_all_layers=False,
@@ -1,5 +1,6 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
 import math
+import os
 import types
 from copy import deepcopy
 
@@ -17,6 +18,7 @@ from ...distributed.sequence_parallel import (
     get_rank,
     get_world_size,
 )
+from ...utils.checkpoint import check_checkpoint_dir
 from ..model import (
     Head,
     WanAttentionBlock,
@@ -647,6 +649,17 @@ class WanModel_S2V(ModelMixin, ConfigMixin):
 
         return hidden_states
 
+    @classmethod
+    def from_pretrained(cls, pretrained_model_name_or_path, *args, **kwargs):
+        # shards converted by tools/convert_checkpoint.py are checked for
+        # truncation before the load
+        path = os.path.join(pretrained_model_name_or_path,
+                            kwargs.get('subfolder') or '')
+        if os.path.isdir(path):
+            check_checkpoint_dir(path)
+        return super().from_pretrained(pretrained_model_name_or_path, *args,
+                                       **kwargs)
+
     def forward(
             self,
             x,
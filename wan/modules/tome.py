@@ -0,0 +1,208 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+__all__ = ['TokenMerging', 'TokenMerger']
+
+
+class TokenMerging:
+    r"""
+    Settings and schedule of token merging in the DiT blocks, after ToMe for
+    Stable Diffusion (Bolya and Hoffman, 2023) adapted to video.
+
+    The token grid is split into local windows of `window` (frames, height,
+    width) tokens. Within each window the tokens on a `dst_stride` sub-grid
+    are destinations and all others are sources. Every source is matched to
+    its most similar destination of the same window, and the sources with
+    the highest cosine similarity are averaged into their destinations before
+    self-attention, cross-attention and the FFN of a block. The outputs are
+    copied back to the merged sources afterwards, so the residual stream
+    keeps all tokens.
+
+    The fraction of merged tokens falls linearly from `ratio` at the noisiest
+    timestep to `min_ratio` at timestep 0, and merging only runs in the
+    blocks `layers[0]` to `layers[1]`, a slice of the block indices.
+    Override `ratio_at` for other schedules.
+
+    Args:
+        ratio (`float`, *optional*, defaults to 0.5):
+            Fraction of the tokens merged at the noisiest timestep.
+        min_ratio (`float`, *optional*):
+            Fraction merged at timestep 0, defaults to `ratio`.
+        layers (`tuple`, *optional*, defaults to (2, -2)):
+            Start and end of the merged blocks, negative values count from
+            the last block and None means the first or the last.
+        window (`tuple`, *optional*, defaults to (2, 4, 4)):
+            Tokens per matching window along frames, height and width.
+        dst_stride (`tuple`, *optional*, defaults to (1, 2, 2)):
+            Stride of the destination tokens within a window, which bounds
+            the ratio: (1, 2, 2) merges at most 3 of 4 tokens.
+        num_train_timesteps (`int`, *optional*, defaults to 1000):
+            Scale of the timesteps passed to the model.
+    """
+
+    def __init__(self,
+                 ratio=0.5,
+                 min_ratio=None,
+                 layers=(2, -2),
+                 window=(2, 4, 4),
+                 dst_stride=(1, 2, 2),
+                 num_train_timesteps=1000):
+        min_ratio = ratio if min_ratio is None else min_ratio
+        assert 0 <= min_ratio < 1 and 0 <= ratio < 1, \
+            f"Merge ratios must be in [0, 1), got {ratio} and {min_ratio}."
+        assert all(s <= w for s, w in zip(dst_stride, window)), \
+            f"dst_stride {dst_stride} must fit into window {window}."
+        self.ratio = ratio
+        self.min_ratio = min_ratio
+        self.layers = layers
+        self.window = tuple(window)
+        self.dst_stride = tuple(dst_stride)
+        self.num_train_timesteps = num_train_timesteps
+
+    def ratio_at(self, timestep, layer, num_layers):
+        r"""
+        Returns the fraction of tokens merged in block `layer` at `timestep`.
+        """
+        if layer not in range(num_layers)[slice(*self.layers)]:
+            return 0.0
+        noise = min(max(timestep / self.num_train_timesteps, 0.0), 1.0)
+        return self.min_ratio + (self.ratio - self.min_ratio) * noise
+
+
+def _windows(grid, window, dst_stride, device):
+    # token indices of every full window [W, K] and the local positions of
+    # sources and destinations, tokens of partial windows are never merged
+    f, h, w = grid
+    wt, wh, ww = (min(u, v) for u, v in zip(window, grid))
+    nt, nh, nw = f // wt, h // wh, w // ww
+    index = torch.arange(f * h * w, device=device).view(f, h, w)
+    index = index[:nt * wt, :nh * wh, :nw * ww].reshape(nt, wt, nh, wh, nw, ww)
+    index = index.permute(0, 2, 4, 1, 3, 5).reshape(nt * nh * nw, -1)
+    is_dst = torch.zeros(wt, wh, ww, dtype=torch.bool, device=device)
+    is_dst[::dst_stride[0], ::dst_stride[1], ::dst_stride[2]] = True
+    is_dst = is_dst.flatten()
+    return index, (~is_dst).nonzero()[:, 0], is_dst.nonzero()[:, 0]
+
+
+class TokenMerger:
+    r"""
+    Token merging of one forward pass. The windows and the rope multipliers
+    of the grid are computed once, the matching once per block by `match`,
+    as the tokens change from block to block.
+
+    Args:
+        config (`TokenMerging`):
+            Settings and schedule.
+        grid (`tuple[int]`):
+            (F, H, W) tokens of every sample, all samples share the grid.
+        seq_len (`int`):
+            Length of the padded sequences, padding is never merged.
+        freqs (`Tensor`):
+            Rope freqs of the model split into their (F, H, W) parts.
+        device (`torch.device`):
+            Device of the tokens.
+    """
+
+    def __init__(self, config, grid, seq_len, freqs, device):
+        self.config = config
+        self.num_tokens = grid[0] * grid[1] * grid[2]
+        self.seq_len = seq_len
+        self.index, self.src, self.dst = _windows(grid, config.window,
+                                                  config.dst_stride, device)
+
+        # multipliers of every position, padding is not rotated
+        f, h, w = grid
+        c = sum(u.size(1) for u in freqs)
+        grid_freqs = torch.cat([
+            freqs[0][:f].view(f, 1, 1, -1).expand(f, h, w, -1),
+            freqs[1][:h].view(1, h, 1, -1).expand(f, h, w, -1),
+            freqs[2][:w].view(1, 1, w, -1).expand(f, h, w, -1)
+        ],
+                               dim=-1).reshape(-1, 1, c)
+        self.freqs = torch.cat([
+            grid_freqs,
+            grid_freqs.new_ones(seq_len - self.num_tokens, 1, c)
+        ])
+
+    def num_merged(self, timestep, layer, num_layers):
+        r"""
+        Returns the number of tokens merged per sample in block `layer`.
+        """
+        ratio = self.config.ratio_at(timestep, layer, num_layers)
+        return min(
+            int(ratio * self.num_tokens),
+            self.index.size(0) * self.src.size(0))
+
+    @torch.no_grad()
+    def match(self, x, key, r):
+        r"""
+        Matches the tokens of one block.
+
+        Args:
+            x (`Tensor`):
+                Tokens of shape [B, L, C] the similarity is computed on.
+            key (`Tensor`):
+                Shape [B, L], tokens of different keys are never merged, e.g.
+                of different timesteps.
+            r (`int`):
+                Tokens to merge per sample.
+
+        Returns:
+            `_Merge`:
+                The merge and unmerge functions of the block.
+        """
+        b, c = x.size(0), x.size(2)
+        windows = x[:, self.index]
+        windows = windows / windows.norm(dim=-1, keepdim=True).clamp_min(1e-6)
+        scores = windows[:, :, self.src] @ windows[:, :, self.dst].transpose(
+            -1, -2)
+        keys = key[:, self.index]
+        scores = scores.masked_fill(
+            keys[:, :, self.src, None] != keys[:, :, None, self.dst],
+            -torch.inf)
+        del windows
+
+        # every source and its best destination, the r best pairs merge
+        node_max, node_idx = scores.max(dim=-1)
+        dst_of_src = self.index[:, self.dst].flatten()[
+            (torch.arange(self.index.size(0), device=x.device) *
+             self.dst.size(0)).view(1, -1, 1) + node_idx].flatten(1)
+        edges = node_max.flatten(1).argsort(dim=-1, descending=True)[:, :r]
+        src = self.index[:, self.src].flatten()[edges]
+        dst = dst_of_src.gather(1, edges)
+
+        # kept tokens in their original order
+        merged = torch.zeros(
+            b, self.seq_len, dtype=torch.int32, device=x.device).scatter_(
+                1, src, 1)
+        kept = merged.argsort(dim=-1, stable=True)[:, :self.seq_len - r]
+        return _Merge(src, dst, kept, self.freqs[kept], c)
+
+
+class _Merge:
+
+    def __init__(self, src, dst, kept, freqs, dim):
+        self.src = src.unsqueeze(-1).expand(-1, -1, dim)
+        self.dst = dst.unsqueeze(-1).expand(-1, -1, dim)
+        self.kept = kept.unsqueeze(-1).expand(-1, -1, dim)
+        # rope multipliers of the kept tokens, shape [B, L', 1, C / 2]
+        self.freqs = freqs
+        self.num_merged = src.size(1)
+
+    def merge(self, x):
+        r"""
+        Averages the merged sources into their destinations, [B, L, C] to
+        [B, L - r, C].
+        """
+        x = x.scatter_reduce(
+            1, self.dst, x.gather(1, self.src), reduce='mean', include_self=True)
+        return x.gather(1, self.kept)
+
+    def unmerge(self, x):
+        r"""
+        Copies the outputs of the destinations to their merged sources,
+        [B, L - r, C] to [B, L, C].
+        """
+        out = x.new_empty(x.size(0), self.src.size(1) + x.size(1), x.size(2))
+        out.scatter_(1, self.kept, x)
+        return out.scatter_(1, self.src, out.gather(1, self.dst))
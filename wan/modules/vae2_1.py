@@ -7,6 +7,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 from einops import rearrange
 
+from ..utils.checkpoint import load_checkpoint
+from ..utils.profiler import profiled
+
 __all__ = [
     'Wan2_1_VAE',
 ]
@@ -611,7 +614,7 @@ def _video_vae(pretrained_path=None, z_dim=None, device='cpu', **kwargs):
     # load checkpoint
     logging.info(f'loading {pretrained_path}')
     model.load_state_dict(
-        torch.load(pretrained_path, map_location=device), assign=True)
+        load_checkpoint(pretrained_path, map_location=device), assign=True)
 
     return model
 
@@ -644,6 +647,7 @@ class Wan2_1_VAE:
             z_dim=z_dim,
         ).eval().requires_grad_(False).to(device)
 
+    @profiled('vae_encode')
     def encode(self, videos):
         """
         videos: A list of videos each with shape [C, T, H, W].
@@ -654,6 +658,7 @@ class Wan2_1_VAE:
                 for u in videos
             ]
 
+    @profiled('vae_decode')
     def decode(self, zs):
         with amp.autocast(dtype=self.dtype):
             return [
@@ -661,3 +666,13 @@ class Wan2_1_VAE:
                                   self.scale).float().clamp_(-1, 1).squeeze(0)
                 for u in zs
             ]
+
+    @profiled('vae_decode')
+    def decode_batch(self, zs):
+        """
+        zs: A list of latents with the same shape [C, T, H, W], decoded as one batch.
+        """
+        with amp.autocast(dtype=self.dtype):
+            return list(
+                self.model.decode(torch.stack(zs),
+                                  self.scale).float().clamp_(-1, 1).unbind(0))
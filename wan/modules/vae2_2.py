@@ -7,6 +7,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 from einops import rearrange
 
+from ..utils.checkpoint import load_checkpoint
+from ..utils.profiler import profiled
+
 __all__ = [
     "Wan2_2_VAE",
 ]
@@ -880,7 +883,7 @@ def _video_vae(pretrained_path=None, z_dim=16, dim=160, device="cpu", **kwargs):
     # load checkpoint
     logging.info(f"loading {pretrained_path}")
     model.load_state_dict(
-        torch.load(pretrained_path, map_location=device), assign=True)
+        load_checkpoint(pretrained_path, map_location=device), assign=True)
 
     return model
 
@@ -1021,6 +1024,7 @@ class Wan2_2_VAE:
                 temperal_downsample=temperal_downsample,
             ).eval().requires_grad_(False).to(device))
 
+    @profiled('vae_encode')
     def encode(self, videos):
         try:
             if not isinstance(videos, list):
@@ -1035,6 +1039,7 @@ class Wan2_2_VAE:
             logging.info(e)
             return None
 
+    @profiled('vae_decode')
     def decode(self, zs):
         try:
             if not isinstance(zs, list):
@@ -1049,3 +1054,13 @@ class Wan2_2_VAE:
         except TypeError as e:
             logging.info(e)
             return None
+
+    @profiled('vae_decode')
+    def decode_batch(self, zs):
+        """
+        zs: A list of latents with the same shape [C, T, H, W], decoded as one batch.
+        """
+        with amp.autocast(dtype=self.dtype):
+            return list(
+                self.model.decode(torch.stack(zs),
+                                  self.scale).float().clamp_(-1, 1).unbind(0))
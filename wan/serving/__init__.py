@@ -0,0 +1,23 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+# the client runs without torch, the rest is imported on first access
+from ..utils.lazy import lazy_module
+
+__all__ = [
+    'BatchScheduler', 'WanClient', 'Job', 'JobQueue', 'ServingMetrics',
+    'StagedExecutor', 'start_server', 'TextEmbeddingCache', 'Worker',
+    'create_pipeline'
+]
+
+__getattr__, __dir__ = lazy_module(
+    __name__, {
+        'BatchScheduler': '.batching',
+        'WanClient': '.client',
+        'Job': '.jobs',
+        'JobQueue': '.jobs',
+        'ServingMetrics': '.metrics',
+        'StagedExecutor': '.pipelining',
+        'start_server': '.server',
+        'TextEmbeddingCache': '.worker',
+        'Worker': '.worker',
+        'create_pipeline': '.worker',
+    })
@@ -0,0 +1,160 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+import time
+
+import torch
+from PIL import Image
+
+from ..configs import SIZE_CONFIGS, WAN_CONFIGS
+
+__all__ = ['BatchScheduler']
+
+# tasks whose pipelines implement `generate_batch`
+BATCHED_TASKS = ('t2v', 'i2v', 'ti2v')
+
+# spec entries that a batch shares, prompts and seeds may differ
+_SHARED_KEYS = ('task', 'size', 'frame_num', 'sample_steps', 'sample_solver',
+                'sample_shift', 'sample_guide_scale', 'n_prompt',
+                'guidance_interval', 'guidance_threshold', 'uncond_every')
+
+
+def _freeze(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class BatchScheduler:
+    r"""
+    Groups queued jobs that can share one sampling loop.
+
+    Jobs are compatible when they agree on `_SHARED_KEYS` and, for image
+    conditioned jobs, on the input image size, so their latents have the same
+    shape. The scheduler takes the job with the highest priority and then
+    keeps adding compatible jobs for up to `max_wait` seconds, until the batch
+    has `max_batch` jobs or the next one would exceed the token budget.
+
+    The token budget bounds the DiT activations. Every sample contributes
+    twice its sequence length per rank, once for each CFG branch. Without
+    `max_batch_tokens` the budget is derived from the free device memory,
+    less the DiT weights that are loaded on demand, and `bytes_per_token`.
+
+    Args:
+        pipelines (`dict`):
+            Maps each served task to its pipeline.
+        max_batch (`int`, *optional*, defaults to 4):
+            Largest number of jobs per batch, 1 disables batching.
+        max_wait (`float`, *optional*, defaults to 0.5):
+            Seconds to wait for compatible jobs after the first one.
+        max_batch_tokens (`int`, *optional*):
+            Token budget per rank of a batch.
+        memory_fraction (`float`, *optional*, defaults to 0.9):
+            Fraction of the free memory available to the automatic budget.
+    """
+
+    def __init__(self,
+                 pipelines,
+                 max_batch=4,
+                 max_wait=0.5,
+                 max_batch_tokens=None,
+                 memory_fraction=0.9):
+        self.pipelines = pipelines
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_batch_tokens = max_batch_tokens
+        self.memory_fraction = memory_fraction
+        self._keys = {}
+
+    def batch_key(self, job):
+        r"""
+        Returns the key shared by all jobs of a batch, or None if the job
+        always runs alone.
+        """
+        if job.id not in self._keys:
+            spec = job.spec
+            key = None
+            if spec['task'].split('-')[0] in BATCHED_TASKS:
+                key = tuple(_freeze(spec[k]) for k in _SHARED_KEYS)
+                image_size = None
+                if spec.get('image') is not None:
+                    with Image.open(spec['image']) as img:
+                        image_size = img.size
+                key += (image_size,)
+            self._keys[job.id] = key
+        return self._keys[job.id]
+
+    def num_tokens(self, spec):
+        r"""
+        Tokens per rank of one sample for both CFG branches.
+        """
+        cfg = WAN_CONFIGS[spec['task']]
+        w, h = SIZE_CONFIGS[spec['size']]
+        seq_len = ((spec['frame_num'] - 1) // cfg.vae_stride[0] + 1) * (
+            h // cfg.vae_stride[1] // cfg.patch_size[1]) * (
+                w // cfg.vae_stride[2] // cfg.patch_size[2])
+        return 2 * seq_len // self.pipelines[spec['task']].sp_size
+
+    @staticmethod
+    def bytes_per_token(cfg):
+        r"""
+        Rough upper bound of the activation memory per token inside one DiT
+        block: the FFN hidden state, q, k, v in bf16, the float64 RoPE copies
+        of q and k and the float32 residual and modulation terms.
+        """
+        return 2 * cfg.ffn_dim + (3 * 2 + 2 * 16 + 4 * 4) * cfg.dim
+
+    def token_budget(self, task):
+        if self.max_batch_tokens is not None:
+            return self.max_batch_tokens
+        if not torch.cuda.is_available():
+            return float('inf')
+        pipeline = self.pipelines[task]
+        free = torch.cuda.mem_get_info()[0] * self.memory_fraction
+        experts = [
+            getattr(pipeline, name)
+            for name in ('model', 'low_noise_model', 'high_noise_model')
+            if isinstance(getattr(pipeline, name, None), torch.nn.Module)
+        ]
+        free -= max([
+            sum(p.numel() * p.element_size()
+                for p in m.parameters())
+            for m in experts
+            if next(m.parameters()).device.type == 'cpu'
+        ],
+                    default=0)
+        return max(0, free) / self.bytes_per_token(WAN_CONFIGS[task])
+
+    def next_batch(self, queue, timeout=None):
+        r"""
+        Takes the next batch of jobs from `queue`, waiting up to `timeout`
+        seconds for the first one. Returns an empty list if there is none.
+        """
+        job = queue.get(timeout=timeout)
+        if job is None:
+            return []
+        batch = [job]
+        key = self.batch_key(job)
+        if key is not None and self.max_batch > 1:
+            budget = self.token_budget(job.spec['task'])
+            tokens = self.num_tokens(job.spec)
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                job = queue.take(
+                    lambda j: self.batch_key(j) == key and tokens + self.
+                    num_tokens(j.spec) <= budget,
+                    timeout=remaining)
+                if job is None:
+                    break
+                batch.append(job)
+                tokens += self.num_tokens(job.spec)
+            if len(batch) > 1:
+                logging.info(
+                    f"Batched {len(batch)} jobs with {tokens} of {budget:.0f} tokens."
+                )
+        # forget the keys of jobs that left the queue
+        for job_id in list(self._keys):
+            job = queue.job(job_id)
+            if job is None or job.state != 'queued':
+                del self._keys[job_id]
+        return batch
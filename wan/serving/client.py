@@ -0,0 +1,202 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+r"""
+Client of the generation server started by `serve.py`.
+
+    python -m wan.serving.client --url http://127.0.0.1:8000 --task t2v-A14B \
+        --prompt "A cat surfing" --output cat.mp4
+"""
+import argparse
+import http.client
+import json
+import socket
+import sys
+from urllib.parse import urlparse
+
+__all__ = ['WanClient']
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class WanClient:
+    r"""
+    Talks to the HTTP API of a generation server.
+
+    Args:
+        url (`str`, *optional*, defaults to 'http://127.0.0.1:8000'):
+            Server address, `http://host:port` or `unix:///path/to/socket`.
+        timeout (`float`, *optional*):
+            Socket timeout in seconds, None waits forever.
+    """
+
+    def __init__(self, url='http://127.0.0.1:8000', timeout=None):
+        self.url = urlparse(url)
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.url.scheme == 'unix':
+            return _UnixHTTPConnection(self.url.path, timeout=self.timeout)
+        return http.client.HTTPConnection(
+            self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        conn = self._connection()
+        try:
+            headers = {}
+            if body is not None:
+                body = json.dumps(body).encode()
+                headers['Content-Type'] = 'application/json'
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise RuntimeError(
+                f"{method} {path} failed with {response.status}: {data.decode()}")
+        return data
+
+    def health(self):
+        return json.loads(self._request('GET', '/health'))
+
+    def metrics(self):
+        return json.loads(self._request('GET', '/metrics'))
+
+    def submit(self, priority=0, **spec):
+        r"""
+        Queues a job, see `Worker.prepare_spec` for the keys of `spec`.
+        Returns the job as a dict with its `id`.
+        """
+        return json.loads(
+            self._request('POST', '/jobs', {
+                'priority': priority,
+                **spec
+            }))
+
+    def status(self, job_id):
+        return json.loads(self._request('GET', f'/jobs/{job_id}'))
+
+    def jobs(self):
+        return json.loads(self._request('GET', '/jobs'))
+
+    def cancel(self, job_id):
+        return json.loads(self._request('DELETE', f'/jobs/{job_id}'))
+
+    def events(self, job_id, start=0):
+        r"""
+        Yields the events of a job as dicts until it finishes.
+        """
+        conn = self._connection()
+        try:
+            conn.request('GET', f'/jobs/{job_id}/events?start={start}')
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(
+                    f"Events of job {job_id} failed with {response.status}: {response.read().decode()}"
+                )
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+    def wait(self, job_id, callback=None):
+        r"""
+        Blocks until the job finishes, passing every event to `callback`.
+        Returns the final job dict.
+        """
+        for event in self.events(job_id):
+            if callback is not None:
+                callback(event)
+        return self.status(job_id)
+
+    def download(self, job_id, save_file):
+        with open(save_file, 'wb') as f:
+            f.write(self._request('GET', f'/jobs/{job_id}/result'))
+        return save_file
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Submit a job to a Wan generation server")
+    parser.add_argument(
+        "--url",
+        type=str,
+        default="http://127.0.0.1:8000",
+        help="The server address, http://host:port or unix:///path/to/socket.")
+    parser.add_argument(
+        "--task", type=str, default=None, help="The task to run.")
+    parser.add_argument(
+        "--prompt", type=str, default="", help="The prompt to generate from.")
+    parser.add_argument(
+        "--image",
+        type=str,
+        default=None,
+        help="The image path on the server for i2v, ti2v and s2v.")
+    parser.add_argument(
+        "--size", type=str, default=None, help="The area (width*height).")
+    parser.add_argument(
+        "--seed", type=int, default=-1, help="The seed for generation.")
+    parser.add_argument(
+        "--sample_steps", type=int, default=None, help="The sampling steps.")
+    parser.add_argument(
+        "--priority",
+        type=int,
+        default=0,
+        help="Jobs with a higher priority run first.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Download the video to this file.")
+    parser.add_argument(
+        "--no_wait",
+        action="store_true",
+        default=False,
+        help="Print the job id and return without waiting.")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    client = WanClient(args.url)
+    spec = {'prompt': args.prompt, 'seed': args.seed}
+    for key in ('task', 'image', 'size', 'sample_steps'):
+        if getattr(args, key) is not None:
+            spec[key] = getattr(args, key)
+
+    job = client.submit(priority=args.priority, **spec)
+    print(f"Submitted job {job['id']}")
+    if args.no_wait:
+        return
+
+    def report(event):
+        if event['event'] == 'progress':
+            print(f"\rstep {event['step']}/{event['total'] or '?'}",
+                  end='',
+                  flush=True)
+        else:
+            print(f"\n{event['event']}", flush=True)
+
+    job = client.wait(job['id'], callback=report)
+    if job['state'] != 'done':
+        print(f"Job {job['id']} {job['state']}: {job['error']}")
+        sys.exit(1)
+    if args.output is not None:
+        client.download(job['id'], args.output)
+        print(f"Saved video to {args.output}")
+    else:
+        print(f"Video saved on the server at {job['result']}")
+
+
+if __name__ == "__main__":
+    main()
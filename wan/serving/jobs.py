@@ -0,0 +1,220 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import heapq
+import itertools
+import threading
+import time
+import uuid
+
+__all__ = ['Job', 'JobQueue', 'TERMINAL_STATES']
+
+TERMINAL_STATES = ('done', 'failed', 'cancelled')
+
+
+class Job:
+    r"""
+    A generation request and its lifecycle, shared between the HTTP threads
+    and the worker.
+
+    Every state change and progress update is appended to an event log, so
+    clients can follow a job from any point with `events`.
+
+    Args:
+        spec (`dict`):
+            Generation arguments, see `Worker.prepare_spec`.
+        priority (`int`, *optional*, defaults to 0):
+            Jobs with a higher priority are served first, equal priorities in
+            submission order.
+        job_id (`str`, *optional*):
+            Identifier, a random one by default.
+    """
+
+    def __init__(self, spec, priority=0, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.spec = spec
+        self.priority = priority
+        self.state = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.step = 0
+        self.total_steps = None
+        self._events = []
+        self._cond = threading.Condition()
+        self.emit('queued')
+
+    @property
+    def done(self):
+        return self.state in TERMINAL_STATES
+
+    def emit(self, event, **data):
+        with self._cond:
+            self._events.append({'event': event, 'time': time.time(), **data})
+            self._cond.notify_all()
+
+    def start(self):
+        self.state = 'running'
+        self.started = time.time()
+        self.emit('running')
+
+    def progress(self, step, total=None):
+        self.step, self.total_steps = step, total
+        self.emit('progress', step=step, total=total)
+
+    def finish(self, result):
+        self.state = 'done'
+        self.result = result
+        self.finished = time.time()
+        self.emit('done', result=result)
+
+    def fail(self, error):
+        self.state = 'failed'
+        self.error = error
+        self.finished = time.time()
+        self.emit('failed', error=error)
+
+    def cancel(self):
+        self.state = 'cancelled'
+        self.finished = time.time()
+        self.emit('cancelled')
+
+    def events(self, start=0, timeout=None):
+        r"""
+        Yields the events of the job from index `start` on, blocking until
+        the job reaches a terminal state or no event arrives for `timeout`
+        seconds.
+        """
+        index = start
+        while True:
+            with self._cond:
+                if index >= len(self._events) and not self.done:
+                    self._cond.wait(timeout)
+                events = self._events[index:]
+            if not events:
+                return
+            for event in events:
+                yield event
+            index += len(events)
+            if self.done and index >= len(self._events):
+                return
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'state': self.state,
+            'priority': self.priority,
+            'spec': self.spec,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'step': self.step,
+            'total_steps': self.total_steps,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    r"""
+    Thread-safe priority queue of `Job`s that also keeps every submitted job
+    for lookup by id.
+
+    Args:
+        max_finished (`int`, *optional*, defaults to 1000):
+            Number of finished jobs kept for lookup, older ones are dropped.
+    """
+
+    def __init__(self, max_finished=1000):
+        self.max_finished = max_finished
+        self._heap = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return sum(1 for *_, job in self._heap if job.state == 'queued')
+
+    def put(self, job):
+        with self._cond:
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap,
+                           (-job.priority, next(self._counter), job))
+            self._prune()
+            self._cond.notify()
+        return job
+
+    def get(self, timeout=None):
+        r"""
+        Removes and returns the queued job with the highest priority, or None
+        if there is none within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][-1].state != 'queued':
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    return heapq.heappop(self._heap)[-1]
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def take(self, predicate, timeout=None):
+        r"""
+        Removes and returns the queued job with the highest priority for
+        which `predicate(job)` holds, waiting up to `timeout` seconds for one
+        to arrive. Returns None if there is none.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for entry in sorted(self._heap):
+                    if entry[-1].state == 'queued' and predicate(entry[-1]):
+                        self._heap.remove(entry)
+                        heapq.heapify(self._heap)
+                        return entry[-1]
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def peek(self, n=1):
+        r"""
+        Returns up to `n` queued jobs in the order they would be served,
+        without removing them.
+        """
+        with self._cond:
+            return [
+                entry[-1]
+                for entry in sorted(self._heap)
+                if entry[-1].state == 'queued'
+            ][:n]
+
+    def job(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        r"""
+        Cancels a queued job. Returns False if the job is unknown or already
+        running.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != 'queued':
+                return False
+            job.cancel()
+            return True
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.done]
+        for job in sorted(
+                finished, key=lambda j: j.finished)[:-self.max_finished or None]:
+            del self._jobs[job.id]
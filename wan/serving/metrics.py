@@ -0,0 +1,146 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+__all__ = ['ServingMetrics']
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _quantiles(values):
+    if not values:
+        return {f"p{round(q * 100)}": None for q in QUANTILES}
+    values = sorted(values)
+    return {
+        f"p{round(q * 100)}": values[min(len(values) - 1, int(q * len(values)))]
+        for q in QUANTILES
+    }
+
+
+class ServingMetrics:
+    r"""
+    Latency and batching statistics of a generation server.
+
+    For each finished job the queue wait (submission to start), the run time
+    and the end-to-end latency are kept for the last `window` jobs, from
+    which percentiles are reported. Batch sizes are counted over the whole
+    lifetime of the server.
+
+    With pipelined stages, see `StagedExecutor`, the busy time of each stage
+    is accumulated as well. Its utilization is the busy time per worker of
+    the stage over the uptime.
+
+    Args:
+        window (`int`, *optional*, defaults to 10000):
+            Number of recent jobs the percentiles are computed over.
+    """
+
+    def __init__(self, window=10000):
+        self.started = time.time()
+        self.num_jobs = Counter()
+        self.batch_sizes = Counter()
+        self._wait = deque(maxlen=window)
+        self._run = deque(maxlen=window)
+        self._latency = deque(maxlen=window)
+        self.stage_busy = Counter()
+        self.stage_count = Counter()
+        self.stage_workers = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        r"""
+        Counts the time spent inside the context as busy time of stage `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start)
+
+    def record_stage(self, name, seconds):
+        with self._lock:
+            self.stage_busy[name] += seconds
+            self.stage_count[name] += 1
+
+    def record_batch(self, jobs):
+        r"""
+        Records a batch of jobs run together, after they finished.
+        """
+        with self._lock:
+            self.batch_sizes[len(jobs)] += 1
+            for job in jobs:
+                self.num_jobs[job.state] += 1
+                if job.state != 'done':
+                    continue
+                self._wait.append(job.started - job.created)
+                self._run.append(job.finished - job.started)
+                self._latency.append(job.finished - job.created)
+
+    def to_dict(self):
+        with self._lock:
+            uptime = time.time() - self.started
+            return {
+                'uptime': uptime,
+                'jobs': dict(self.num_jobs),
+                'jobs_per_hour': self.num_jobs['done'] / uptime * 3600,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'queue_wait': _quantiles(self._wait),
+                'run_time': _quantiles(self._run),
+                'latency': _quantiles(self._latency),
+                'stages': {
+                    name: {
+                        'count': self.stage_count[name],
+                        'busy': busy,
+                        'utilization':
+                            busy / (uptime * self.stage_workers.get(name, 1)),
+                    } for name, busy in self.stage_busy.items()
+                },
+            }
+
+    def to_prometheus(self):
+        r"""
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        stats = self.to_dict()
+        lines = [
+            '# TYPE wan_jobs_total counter',
+            *[
+                f'wan_jobs_total{{state="{state}"}} {count}'
+                for state, count in stats['jobs'].items()
+            ],
+            '# TYPE wan_batch_size histogram',
+        ]
+        with self._lock:
+            sizes = sorted(self.batch_sizes.items())
+        cumulative, total = 0, 0
+        for size, count in sizes:
+            cumulative += count
+            total += size * count
+            lines.append(f'wan_batch_size_bucket{{le="{size}"}} {cumulative}')
+        lines += [
+            f'wan_batch_size_bucket{{le="+Inf"}} {cumulative}',
+            f'wan_batch_size_sum {total}',
+            f'wan_batch_size_count {cumulative}',
+        ]
+        for name in ('queue_wait', 'run_time', 'latency'):
+            lines.append(f'# TYPE wan_{name}_seconds summary')
+            for key, value in stats[name].items():
+                if value is not None:
+                    lines.append(
+                        f'wan_{name}_seconds{{quantile="{int(key[1:]) / 100}"}} {value}'
+                    )
+        if stats['stages']:
+            lines.append('# TYPE wan_stage_busy_seconds_total counter')
+            lines += [
+                f'wan_stage_busy_seconds_total{{stage="{name}"}} {stage["busy"]}'
+                for name, stage in stats['stages'].items()
+            ]
+            lines.append('# TYPE wan_stage_utilization gauge')
+            lines += [
+                f'wan_stage_utilization{{stage="{name}"}} {stage["utilization"]}'
+                for name, stage in stats['stages'].items()
+            ]
+        return '\n'.join(lines) + '\n'
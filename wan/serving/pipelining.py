@@ -0,0 +1,249 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import torch
+
+from ..utils.video_writer import to_uint8_frames, write_video
+
+__all__ = ['StagedExecutor']
+
+# pipelines that decode once after sampling, s2v and animate condition later
+# clips on the decoded frames
+DEFERRED_DECODE_TASKS = ('t2v', 'i2v', 'ti2v')
+
+
+def _mux(frames, save_file, fps, audio_path=None):
+    # runs in a mux process, returns the busy time
+    start = time.perf_counter()
+    write_video(frames, save_file, fps=fps, audio_path=audio_path)
+    return time.perf_counter() - start
+
+
+def _frames(video):
+    return to_uint8_frames(video).cpu().numpy()
+
+
+class _DeferredVAE:
+    r"""
+    Stands in for `pipeline.vae` while a job samples, so that `decode` and
+    `decode_batch` return futures of the uint8 frames instead of blocking.
+    Encoding waits for a running decode, both use the feature caches of the
+    VAE model.
+    """
+
+    def __init__(self, vae, executor):
+        self.vae = vae
+        self.executor = executor
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['vae'], name)
+
+    def encode(self, *args, **kwargs):
+        with self.executor._vae_lock:
+            return self.vae.encode(*args, **kwargs)
+
+    def decode(self, zs):
+        return self.executor.decode(self.vae.decode, zs)
+
+    def decode_batch(self, zs):
+        return self.executor.decode(self.vae.decode_batch, zs)
+
+
+class StagedExecutor:
+    r"""
+    Overlaps the stages of consecutive jobs with the DiT sampling of the
+    running one. The prompts of the next queued jobs are encoded into their
+    `TextEmbeddingCache` on a thread, on a side stream unless T5 is on the
+    CPU. The VAE decode of a finished job runs on a second thread and
+    stream, and the mp4 encoding and audio muxing in a process pool. The
+    busy time of the encode, denoise, decode and mux stages goes to
+    `metrics`.
+
+    Prefetching requires T5 to stay on one device, so it is off with
+    `offload_model` unless T5 runs on the CPU, and with FSDP T5, whose
+    collectives must not run on a side thread. Decoding is only deferred
+    for the T2V, I2V and TI2V pipelines without `vae_parallel`. Decoding
+    next to sampling raises the peak memory by the VAE activations.
+
+    Args:
+        metrics (ServingMetrics):
+            Receives the busy time of each stage.
+        num_mux_workers (`int`, *optional*, defaults to 2):
+            Processes writing videos.
+        lookahead (`int`, *optional*, defaults to 2):
+            Number of queued jobs whose prompts are prefetched.
+        prefetch_text (`bool`, *optional*, defaults to True):
+            Whether to prefetch prompt embeddings.
+    """
+
+    def __init__(self,
+                 metrics,
+                 num_mux_workers=2,
+                 lookahead=2,
+                 prefetch_text=True):
+        self.metrics = metrics
+        self.lookahead = lookahead
+        self.prefetch_text = prefetch_text
+        self._encoder = ThreadPoolExecutor(1, thread_name_prefix='wan-encode')
+        self._decoder = ThreadPoolExecutor(1, thread_name_prefix='wan-decode')
+        # spawn, forking a process that holds a CUDA context is unsafe
+        self._muxer = ProcessPoolExecutor(
+            num_mux_workers, mp_context=multiprocessing.get_context('spawn'))
+        self._encode_stream = None
+        self._decode_stream = None
+        if torch.cuda.is_available():
+            self._encode_stream = torch.cuda.Stream()
+            self._decode_stream = torch.cuda.Stream()
+        self._vae_lock = threading.Lock()
+        self._prefetched = set()
+        metrics.stage_workers['mux'] = num_mux_workers
+
+    def prefetch(self, pipelines, jobs):
+        r"""
+        Encodes the prompts of `jobs` in the background.
+        """
+        if not self.prefetch_text:
+            return
+        self._prefetched &= {job.id for job in jobs}
+        for job in jobs:
+            pipeline = pipelines[job.spec['task']]
+            encoder = pipeline.text_encoder
+            if job.id in self._prefetched or not hasattr(encoder, 'prefetch'):
+                continue
+            self._prefetched.add(job.id)
+            texts = [
+                job.spec['prompt'], job.spec['n_prompt'] or
+                pipeline.sample_neg_prompt
+            ]
+            if pipeline.t5_cpu:
+                device, stream = torch.device('cpu'), None
+            else:
+                device, stream = pipeline.device, self._encode_stream
+            self._encoder.submit(self._prefetch, encoder, texts, device,
+                                 stream)
+
+    def _prefetch(self, encoder, texts, device, stream):
+        try:
+            with self.metrics.stage('encode'):
+                encoder.prefetch(texts, device, stream=stream)
+        except Exception:
+            logging.warning(
+                f"Prefetching prompts failed:\n{traceback.format_exc()}")
+
+    @contextmanager
+    def denoise(self, task, pipeline):
+        r"""
+        Times the sampling of a job and, where supported, defers the decode
+        of its latents, see `decode`.
+        """
+        deferred = (
+            task.split('-')[0] in DEFERRED_DECODE_TASKS and
+            not pipeline.vae_parallel)
+        vae = pipeline.vae
+        if deferred:
+            pipeline.vae = _DeferredVAE(vae, self)
+        try:
+            with self.metrics.stage('denoise'):
+                yield
+        finally:
+            pipeline.vae = vae
+
+    def decode(self, fn, zs):
+        r"""
+        Queues `fn(zs)` on the decode thread once the current stream has
+        produced `zs`. Returns a future of the uint8 frames per latent.
+        """
+        event = None
+        if self._decode_stream is not None:
+            event = torch.cuda.Event()
+            event.record()
+            # keep the allocator from reusing the latents before the decode
+            for z in zs:
+                z.record_stream(self._decode_stream)
+        batch = self._decoder.submit(self._decode, fn, zs, event)
+        futures = [Future() for _ in zs]
+
+        def _split(f):
+            try:
+                frames = f.result()
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+            for future, u in zip(futures, frames):
+                future.set_result(u)
+
+        batch.add_done_callback(_split)
+        return futures
+
+    @torch.no_grad()
+    def _decode(self, fn, zs, event):
+        with self.metrics.stage('decode'), self._vae_lock, torch.cuda.stream(
+                self._decode_stream):
+            if event is not None:
+                self._decode_stream.wait_event(event)
+            return [_frames(video) for video in fn(zs)]
+
+    def save(self, video, save_file, fps, audio_path=None):
+        r"""
+        Writes a video in the mux processes.
+
+        Args:
+            video (`torch.Tensor` or `Future`):
+                A [C, T, H, W] video in [-1, 1], or a future of its frames
+                from `decode`.
+            save_file (`str`):
+                Path of the mp4 file.
+            fps (`int`):
+                Frame rate.
+            audio_path (`str`, *optional*):
+                Audio muxed into the video.
+
+        Returns:
+            Future:
+                Resolves to `save_file` once the file is written.
+        """
+        result = Future()
+
+        def _muxed(f):
+            try:
+                self.metrics.record_stage('mux', f.result())
+                result.set_result(save_file)
+            except BaseException as e:
+                result.set_exception(e)
+
+        def _submit(frames):
+            try:
+                self._muxer.submit(_mux, frames, save_file, fps,
+                                   audio_path).add_done_callback(_muxed)
+            except BaseException as e:
+                result.set_exception(e)
+
+        if isinstance(video, Future):
+
+            def _decoded(f):
+                try:
+                    frames = f.result()
+                except BaseException as e:
+                    result.set_exception(e)
+                    return
+                _submit(frames)
+
+            video.add_done_callback(_decoded)
+        else:
+            _submit(_frames(video))
+        return result
+
+    def shutdown(self):
+        r"""
+        Waits for the queued decodes and writes to finish.
+        """
+        self._encoder.shutdown(wait=True)
+        self._decoder.shutdown(wait=True)
+        self._muxer.shutdown(wait=True)
@@ -0,0 +1,189 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import json
+import logging
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .jobs import Job
+
+__all__ = ['start_server']
+
+
+class _Handler(BaseHTTPRequestHandler):
+    r"""
+    JSON API of the generation server.
+
+        GET    /health               server status and served tasks
+        GET    /metrics              latency percentiles and batch sizes,
+                                     ?format=prometheus for the text format
+        POST   /jobs                 submit a job, body {"priority": p, **spec}
+        GET    /jobs                 all known jobs
+        GET    /jobs/<id>            one job
+        GET    /jobs/<id>/events     newline-delimited JSON events until the
+                                     job finishes, ?start=i skips the first i
+        GET    /jobs/<id>/result     the generated video
+        DELETE /jobs/<id>            cancel a queued job
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def _send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json({'error': message}, status)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        job = None
+        if len(parts) >= 2 and parts[0] == 'jobs':
+            job = self.server.queue.job(parts[1])
+            if job is None:
+                self._send_error(404, f"Unknown job {parts[1]}.")
+                return None, None, None
+        return parts, job, parse_qs(url.query)
+
+    def do_GET(self):
+        parts, job, query = self._route()
+        if parts is None:
+            return
+        if parts == ['health']:
+            self._send_json({
+                'status': 'ok',
+                'tasks': self.server.worker.tasks,
+                'queued': len(self.server.queue),
+            })
+        elif parts == ['metrics']:
+            metrics = self.server.worker.metrics
+            if query.get('format', ['json'])[0] == 'prometheus':
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send_json(metrics.to_dict())
+        elif parts == ['jobs']:
+            self._send_json([j.to_dict() for j in self.server.queue.jobs()])
+        elif len(parts) == 2 and job is not None:
+            self._send_json(job.to_dict())
+        elif len(parts) == 3 and parts[2] == 'events':
+            start = int(query.get('start', ['0'])[0])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for event in job.events(start):
+                    self.wfile.write((json.dumps(event) + '\n').encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        elif len(parts) == 3 and parts[2] == 'result':
+            if job.state != 'done' or job.result is None:
+                self._send_error(409, f"Job {job.id} is {job.state}.")
+                return
+            with open(job.result, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_error(404, f"Unknown path {self.path}.")
+
+    def do_POST(self):
+        parts, _, _ = self._route()
+        if parts is None:
+            return
+        if parts != ['jobs']:
+            self._send_error(404, f"Unknown path {self.path}.")
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            spec = json.loads(self.rfile.read(length) or b'{}')
+            priority = int(spec.pop('priority', 0))
+            spec = self.server.worker.prepare_spec(spec)
+        except (ValueError, TypeError) as e:
+            self._send_error(400, str(e))
+            return
+        job = self.server.queue.put(Job(spec, priority=priority))
+        logging.info(f"Queued job {job.id} with priority {priority}.")
+        self._send_json(job.to_dict(), 202)
+
+    def do_DELETE(self):
+        parts, job, _ = self._route()
+        if parts is None:
+            return
+        if len(parts) != 2 or job is None:
+            self._send_error(404, f"Unknown path {self.path}.")
+        elif self.server.queue.cancel(job.id):
+            self._send_json(job.to_dict())
+        else:
+            self._send_error(409, f"Job {job.id} is {job.state}.")
+
+
+class _UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name, self.server_port = self.server_address, 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, None
+
+
+def start_server(queue, worker, host='127.0.0.1', port=8000, unix_socket=None):
+    r"""
+    Serves the HTTP API in a background thread.
+
+    Args:
+        queue (JobQueue):
+            Queue that accepted jobs are put into.
+        worker (Worker):
+            Validates job specs, see `Worker.prepare_spec`.
+        host (`str`, *optional*, defaults to '127.0.0.1'):
+            Address to listen on.
+        port (`int`, *optional*, defaults to 8000):
+            Port to listen on.
+        unix_socket (`str`, *optional*):
+            Listen on this Unix socket instead of TCP.
+
+    Returns:
+        ThreadingHTTPServer:
+            The running server, stop it with `shutdown`.
+    """
+    if unix_socket is not None:
+        server = _UnixHTTPServer(unix_socket, _Handler)
+        address = f"unix://{unix_socket}"
+    else:
+        server = ThreadingHTTPServer((host, port), _Handler)
+        address = f"http://{host}:{server.server_port}"
+    server.daemon_threads = True
+    server.queue = queue
+    server.worker = worker
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving {worker.tasks} on {address}")
+    return server
@@ -0,0 +1,549 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import importlib
+import logging
+import os
+import random
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import torch
+import torch.distributed as dist
+from PIL import Image
+
+from ..configs import MAX_AREA_CONFIGS, SIZE_CONFIGS, SUPPORTED_SIZES, WAN_CONFIGS
+from ..utils.guidance import GuidanceSchedule
+from ..utils.utils import save_video
+from .jobs import Job
+from .metrics import ServingMetrics
+from .pipelining import StagedExecutor
+
+__all__ = ['create_pipeline', 'TextEmbeddingCache', 'Worker']
+
+# pipelines whose constructor takes the DiT acceleration options
+_ACCELERATED_TASKS = ('t2v', 'i2v', 'ti2v')
+
+# module and class of the pipeline of each kind of task
+_PIPELINES = {
+    't2v': ('text2video', 'WanT2V'),
+    'i2v': ('image2video', 'WanI2V'),
+    'ti2v': ('textimage2video', 'WanTI2V'),
+    's2v': ('speech2video', 'WanS2V'),
+    'animate': ('animate', 'WanAnimate'),
+}
+
+
+def create_pipeline(task,
+                    checkpoint_dir,
+                    device_id=0,
+                    rank=0,
+                    ulysses_size=1,
+                    t5_fsdp=False,
+                    dit_fsdp=False,
+                    t5_cpu=False,
+                    convert_model_dtype=False,
+                    t5_broadcast=False,
+                    vae_parallel=False,
+                    **options):
+    r"""
+    Creates the pipeline of `task` the same way as `generate.py`.
+
+    Args:
+        task (`str`):
+            A key of `WAN_CONFIGS`.
+        checkpoint_dir (`str`):
+            Path to the checkpoint directory of the task.
+        options:
+            Further constructor arguments. `dit_tp`, `cuda_graph`,
+            `compile_dit`, `seq_len_buckets`, `dit_quant` and `autotune` only
+            apply to the T2V, I2V and TI2V pipelines, `use_relighting_lora` only to
+            Animate, and are dropped for the others.
+
+    Returns:
+        The pipeline, e.g. a `WanT2V`.
+    """
+    cfg = WAN_CONFIGS[task]
+    kwargs = dict(
+        config=cfg,
+        checkpoint_dir=checkpoint_dir,
+        device_id=device_id,
+        rank=rank,
+        t5_fsdp=t5_fsdp,
+        dit_fsdp=dit_fsdp,
+        use_sp=(ulysses_size > 1),
+        t5_cpu=t5_cpu,
+        convert_model_dtype=convert_model_dtype,
+        t5_broadcast=t5_broadcast,
+        vae_parallel=vae_parallel)
+    kind = task.split('-')[0]
+    if kind in _ACCELERATED_TASKS:
+        kwargs.update({
+            k: v for k, v in options.items() if k in
+            ('dit_tp', 'cuda_graph', 'compile_dit', 'seq_len_buckets',
+             'dit_quant', 'autotune')
+        })
+    elif kind == 'animate':
+        kwargs['use_relighting_lora'] = options.get('use_relighting_lora',
+                                                    False)
+
+    # imported here, so that serving a task only loads its dependencies
+    module_name, cls = _PIPELINES[kind]
+    module = importlib.import_module(f"..{module_name}", __package__)
+    return getattr(module, cls)(**kwargs)
+
+
+class TextEmbeddingCache:
+    r"""
+    LRU cache in front of a `T5EncoderModel`, so that prompts repeated across
+    requests, above all the negative prompt, are encoded once. Attribute
+    access is forwarded to the encoder, so it replaces `pipeline.text_encoder`
+    in place.
+
+    Args:
+        text_encoder (T5EncoderModel):
+            The wrapped encoder.
+        capacity (`int`, *optional*, defaults to 64):
+            Number of embeddings kept per device.
+    """
+
+    def __init__(self, text_encoder, capacity=64):
+        self.text_encoder = text_encoder
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__['text_encoder'], name)
+
+    def __call__(self, texts, device):
+        # the lock also keeps the tokenizer and encoder to one thread
+        with self._lock:
+            missing = self._missing(texts, device)
+            if missing:
+                self._insert(missing, device,
+                             self.text_encoder(missing, device))
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            out = []
+            for text in texts:
+                self._cache.move_to_end((text, str(device)))
+                out.append(self._cache[(text, str(device))])
+            self._evict()
+        return out
+
+    def contains(self, texts, device):
+        r"""
+        Whether all `texts` are cached for `device`. They are marked as
+        recently used, so that a prefetch does not evict them before the
+        call that encodes them.
+        """
+        with self._lock:
+            if self._missing(texts, device):
+                return False
+            for text in texts:
+                self._cache.move_to_end((text, str(device)))
+            return True
+
+    def prefetch(self, texts, device, stream=None):
+        r"""
+        Encodes the uncached `texts` ahead of time, to be called from a
+        background thread while the encoder stays on one device. On the GPU
+        the encoder runs on `stream` and the embeddings are handed over to
+        the default stream. Returns the number of encoded texts.
+        """
+        with self._lock:
+            missing = self._missing(texts, device)
+            if not missing:
+                return 0
+            with torch.no_grad(), torch.cuda.stream(stream):
+                contexts = self.text_encoder(missing, device)
+            if stream is not None:
+                stream.synchronize()
+                for context in contexts:
+                    context.record_stream(
+                        torch.cuda.default_stream(context.device))
+            self._insert(missing, device, contexts)
+            self._evict()
+        return len(missing)
+
+    def _missing(self, texts, device):
+        return [
+            t for t in dict.fromkeys(texts) if (t, str(device)) not in self._cache
+        ]
+
+    def _insert(self, texts, device, contexts):
+        for text, context in zip(texts, contexts):
+            self._cache[(text, str(device))] = context
+
+    def _evict(self):
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+
+class Worker:
+    r"""
+    Runs generation jobs on resident pipelines.
+
+    Under `torchrun` every rank holds the pipelines and runs `run`. Rank 0
+    takes jobs from the queue and broadcasts each spec, so all ranks enter
+    the same `generate` call. While idle, rank 0 broadcasts a heartbeat
+    every `poll_interval` seconds to keep the collectives from timing out.
+    With a `BatchScheduler`, compatible jobs run together through
+    `generate_batch`. With `pipeline_stages`, rank 0 hands the decoding and
+    writing of finished jobs to a `StagedExecutor` and moves on to the next
+    job, whose prompts were encoded in the meantime. Jobs then finish once
+    their video is written.
+
+    Args:
+        pipelines (`dict`):
+            Maps each served task to its pipeline.
+        save_dir (`str`):
+            Directory of the generated videos.
+        rank (`int`, *optional*, defaults to 0):
+            Process rank.
+        offload_model (`bool`, *optional*, defaults to True):
+            Passed to every `generate` call.
+        pipeline_stages (`bool`, *optional*, defaults to False):
+            Whether to overlap text encoding, decoding and writing of
+            consecutive jobs with sampling.
+        mux_workers (`int`, *optional*, defaults to 2):
+            Processes writing videos with `pipeline_stages`.
+        prefetch_text (`bool`, *optional*, defaults to True):
+            Whether to encode the prompts of queued jobs ahead of time with
+            `pipeline_stages`.
+    """
+
+    def __init__(self,
+                 pipelines,
+                 save_dir,
+                 rank=0,
+                 offload_model=True,
+                 pipeline_stages=False,
+                 mux_workers=2,
+                 prefetch_text=True):
+        self.pipelines = pipelines
+        self.save_dir = save_dir
+        self.rank = rank
+        self.offload_model = offload_model
+        self.metrics = ServingMetrics()
+        self.stages = None
+        if pipeline_stages and rank == 0:
+            self.stages = StagedExecutor(
+                self.metrics,
+                num_mux_workers=mux_workers,
+                prefetch_text=prefetch_text)
+        self._stopped = False
+        if rank == 0:
+            os.makedirs(save_dir, exist_ok=True)
+
+    @property
+    def tasks(self):
+        return list(self.pipelines)
+
+    def prepare_spec(self, spec):
+        r"""
+        Validates a job spec and fills in the defaults of its task, as
+        `generate.py` does for its arguments. Raises ValueError for invalid
+        specs. A seed of -1 is replaced by a random seed here, so every rank
+        receives the same one.
+
+        Keys are `task`, `prompt`, `n_prompt`, `image`, `size`, `frame_num`,
+        `sample_solver`, `sample_steps`, `sample_shift`, `sample_guide_scale`,
+        `seed`, `guidance_interval`, `guidance_threshold`, `uncond_every`,
+        and for s2v `audio`, `pose_video`, `num_clip`, `infer_frames`,
+        `start_from_ref`, for animate `src_root_path`, `replace_flag`,
+        `refert_num`. Paths refer to the server's file system.
+        """
+        spec = dict(spec)
+        task = spec.get('task', self.tasks[0])
+        if task not in self.pipelines:
+            raise ValueError(
+                f"Task {task} is not served, served tasks are {self.tasks}.")
+        cfg = WAN_CONFIGS[task]
+        spec['task'] = task
+        spec.setdefault('prompt', "")
+        spec.setdefault('n_prompt', "")
+        spec.setdefault('image', None)
+        spec.setdefault('size', "1280*720")
+        spec.setdefault('frame_num', cfg.frame_num)
+        spec.setdefault('sample_solver', 'unipc')
+        spec.setdefault('sample_steps', cfg.sample_steps)
+        spec.setdefault('sample_shift', cfg.sample_shift)
+        spec.setdefault('sample_guide_scale', cfg.sample_guide_scale)
+        spec.setdefault('guidance_interval', None)
+        spec.setdefault('guidance_threshold', None)
+        spec.setdefault('uncond_every', 1)
+        seed = spec.get('seed', -1)
+        spec['seed'] = seed if seed >= 0 else random.randint(0, sys.maxsize)
+
+        if 's2v' not in task and spec['size'] not in SUPPORTED_SIZES[task]:
+            raise ValueError(
+                f"Unsupport size {spec['size']} for task {task}, supported sizes are: {', '.join(SUPPORTED_SIZES[task])}"
+            )
+        if task.startswith('i2v') and spec['image'] is None:
+            raise ValueError("Please specify the image path for i2v.")
+        if 's2v' in task:
+            if spec['image'] is None or spec.get('audio') is None:
+                raise ValueError("Please specify the image and audio paths for s2v.")
+        if 'animate' in task and spec.get('src_root_path') is None:
+            raise ValueError("Please specify src_root_path for animate.")
+        for key in ('image', 'audio', 'pose_video'):
+            if spec.get(key) is not None and not os.path.exists(spec[key]):
+                raise ValueError(f"{key} {spec[key]} does not exist.")
+        return spec
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self, queue=None, poll_interval=5.0, scheduler=None):
+        r"""
+        Serves jobs until `stop` is called on rank 0.
+
+        Args:
+            queue (JobQueue, *optional*):
+                The job queue, only used on rank 0.
+            poll_interval (`float`, *optional*, defaults to 5.0):
+                Seconds between heartbeats while idle.
+            scheduler (BatchScheduler, *optional*):
+                Groups queued jobs into batches, only used on rank 0. Without
+                it every job runs alone.
+        """
+        while True:
+            jobs = []
+            if self.rank == 0:
+                message = ('stop',) if self._stopped else ('idle',)
+                if not self._stopped:
+                    if scheduler is not None:
+                        jobs = scheduler.next_batch(
+                            queue, timeout=poll_interval)
+                    else:
+                        jobs = [queue.get(timeout=poll_interval)]
+                    jobs = [job for job in jobs if job is not None]
+                    if jobs:
+                        message = ('jobs', [(job.id, job.spec) for job in jobs])
+                    if self.stages is not None:
+                        self.stages.prefetch(
+                            self.pipelines,
+                            queue.peek(self.stages.lookahead))
+            else:
+                message = None
+            if dist.is_initialized():
+                message = [message]
+                dist.broadcast_object_list(message, src=0)
+                message = message[0]
+
+            if message[0] == 'stop':
+                break
+            if message[0] == 'jobs':
+                if not jobs:
+                    jobs = [
+                        Job(spec, job_id=job_id) for job_id, spec in message[1]
+                    ]
+                self.execute(jobs)
+        if self.stages is not None:
+            self.stages.shutdown()
+
+    def execute(self, jobs):
+        r"""
+        Runs a job, or a batch of compatible jobs in one sampling loop, and
+        saves the videos on rank 0. With `pipeline_stages` the videos are
+        decoded and saved in the background.
+        """
+        if isinstance(jobs, Job):
+            jobs = [jobs]
+        for job in jobs:
+            job.start()
+            logging.info(f"Running job {job.id}: {job.spec}")
+        progress = None
+        if self.rank == 0:
+
+            def progress(step, total):
+                for job in jobs:
+                    job.progress(step, total)
+
+        try:
+            task = jobs[0].spec['task']
+            with (self.stages.denoise(task, self.pipelines[task])
+                  if self.stages is not None else nullcontext()):
+                if len(jobs) == 1:
+                    videos = [self._generate(jobs[0].spec, progress)]
+                else:
+                    videos = self._generate_batch(
+                        [job.spec for job in jobs], progress)
+            if self.stages is not None:
+                self._finish_async(jobs, [
+                    self.stages.save(video, *self._save_args(job))
+                    for job, video in zip(jobs, videos)
+                ])
+                return
+            results = [None] * len(jobs)
+            if self.rank == 0:
+                results = [
+                    self._save(job, video) for job, video in zip(jobs, videos)
+                ]
+            del videos
+            for job, result in zip(jobs, results):
+                job.finish(result)
+                logging.info(f"Finished job {job.id}: {result}")
+        except Exception as e:
+            logging.error(
+                f"Jobs {[job.id for job in jobs]} failed:\n{traceback.format_exc()}"
+            )
+            for job in jobs:
+                job.fail(f"{type(e).__name__}: {e}")
+        finally:
+            torch.cuda.empty_cache()
+        if self.rank == 0:
+            self.metrics.record_batch(jobs)
+
+    def _finish_async(self, jobs, futures):
+        # finishes each job once its video is written, records the batch
+        # after the last one
+        remaining = [len(jobs)]
+        lock = threading.Lock()
+
+        def _done(job, future):
+            try:
+                job.finish(future.result())
+                logging.info(f"Finished job {job.id}: {job.result}")
+            except Exception as e:
+                logging.error(f"Saving job {job.id} failed: {e}")
+                job.fail(f"{type(e).__name__}: {e}")
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            self.metrics.record_batch(jobs)
+
+        for job, future in zip(jobs, futures):
+            future.add_done_callback(lambda f, job=job: _done(job, f))
+
+    def _save_args(self, job):
+        audio_path = job.spec['audio'] if 's2v' in job.spec['task'] else None
+        return (os.path.join(self.save_dir, f"{job.id}.mp4"),
+                WAN_CONFIGS[job.spec['task']].sample_fps, audio_path)
+
+    def _save(self, job, video):
+        result, fps, audio_path = self._save_args(job)
+        save_video(
+            tensor=video[None],
+            save_file=result,
+            fps=fps,
+            nrow=1,
+            normalize=True,
+            value_range=(-1, 1),
+            audio_path=audio_path)
+        return result
+
+    def _common_kwargs(self, spec, progress=None):
+        cfg = WAN_CONFIGS[spec['task']]
+        guidance_schedule = GuidanceSchedule(
+            interval=spec['guidance_interval'],
+            delta_threshold=spec['guidance_threshold'],
+            uncond_every=spec['uncond_every'],
+            num_train_timesteps=cfg.num_train_timesteps)
+        return dict(
+            shift=spec['sample_shift'],
+            sample_solver=spec['sample_solver'],
+            sampling_steps=spec['sample_steps'],
+            guide_scale=spec['sample_guide_scale'],
+            n_prompt=spec['n_prompt'],
+            offload_model=self.offload_model,
+            guidance_schedule=guidance_schedule,
+            progress_callback=progress)
+
+    @torch.no_grad()
+    def _generate_batch(self, specs, progress=None):
+        # the specs agree on everything but prompt, seed and image
+        spec = specs[0]
+        task = spec['task']
+        pipeline = self.pipelines[task]
+        prompts = [s['prompt'] for s in specs]
+        seeds = [s['seed'] for s in specs]
+        imgs = None
+        if spec['image'] is not None:
+            imgs = [Image.open(s['image']).convert("RGB") for s in specs]
+        common = self._common_kwargs(spec, progress)
+
+        if "t2v" in task:
+            return pipeline.generate_batch(
+                prompts,
+                seeds,
+                size=SIZE_CONFIGS[spec['size']],
+                frame_num=spec['frame_num'],
+                **common)
+        elif "ti2v" in task:
+            return pipeline.generate_batch(
+                prompts,
+                seeds,
+                imgs=imgs,
+                size=SIZE_CONFIGS[spec['size']],
+                max_area=MAX_AREA_CONFIGS[spec['size']],
+                frame_num=spec['frame_num'],
+                **common)
+        return pipeline.generate_batch(
+            prompts,
+            imgs,
+            seeds,
+            max_area=MAX_AREA_CONFIGS[spec['size']],
+            frame_num=spec['frame_num'],
+            **common)
+
+    @torch.no_grad()
+    def _generate(self, spec, progress=None):
+        task = spec['task']
+        pipeline = self.pipelines[task]
+        common = dict(self._common_kwargs(spec, progress), seed=spec['seed'])
+
+        if "t2v" in task:
+            return pipeline.generate(
+                spec['prompt'],
+                size=SIZE_CONFIGS[spec['size']],
+                frame_num=spec['frame_num'],
+                **common)
+        elif "ti2v" in task:
+            img = None
+            if spec['image'] is not None:
+                img = Image.open(spec['image']).convert("RGB")
+            return pipeline.generate(
+                spec['prompt'],
+                img=img,
+                size=SIZE_CONFIGS[spec['size']],
+                max_area=MAX_AREA_CONFIGS[spec['size']],
+                frame_num=spec['frame_num'],
+                **common)
+        elif "animate" in task:
+            return pipeline.generate(
+                src_root_path=spec['src_root_path'],
+                replace_flag=spec.get('replace_flag', False),
+                refert_num=spec.get('refert_num', 77),
+                clip_len=spec['frame_num'],
+                input_prompt=spec['prompt'],
+                **common)
+        elif "s2v" in task:
+            return pipeline.generate(
+                input_prompt=spec['prompt'],
+                ref_image_path=spec['image'],
+                audio_path=spec['audio'],
+                enable_tts=False,
+                tts_prompt_audio=None,
+                tts_prompt_text=None,
+                tts_text=None,
+                num_repeat=spec.get('num_clip'),
+                pose_video=spec.get('pose_video'),
+                max_area=MAX_AREA_CONFIGS[spec['size']],
+                infer_frames=spec.get('infer_frames', 80),
+                init_first_frame=spec.get('start_from_ref', False),
+                **common)
+        img = Image.open(spec['image']).convert("RGB")
+        return pipeline.generate(
+            spec['prompt'],
+            img,
+            max_area=MAX_AREA_CONFIGS[spec['size']],
+            frame_num=spec['frame_num'],
+            **common)
@@ -19,21 +19,27 @@ from decord import VideoReader
 from PIL import Image
 from safetensors import safe_open
 from torchvision import transforms
-from tqdm import tqdm
 
 from .distributed.fsdp import shard_model
 from .distributed.sequence_parallel import sp_attn_forward, sp_dit_forward
-from .distributed.util import get_world_size
+from .distributed.util import broadcast_tensor_list, get_world_size
+from .distributed.vae_parallel import parallel_vae_decode
 from .modules.s2v.audio_encoder import AudioEncoder
 from .modules.s2v.model_s2v import WanModel_S2V, sp_attn_forward_s2v
 from .modules.t5 import T5EncoderModel
 from .modules.vae2_1 import Wan2_1_VAE
+from .utils.batch import needs_text_encoder
 from .utils.fm_solvers import (
     FlowDPMSolverMultistepScheduler,
     get_sampling_sigmas,
     retrieve_timesteps,
 )
+from .utils.fm_solvers_device import DeviceFlowScheduler
+from .utils.fm_solvers_ode import FLOW_ODE_SOLVERS, FlowODEScheduler
 from .utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
+from .utils.guidance import GuidanceSchedule
+from .utils.profiler import profile, profile_iter, record_bytes
+from .utils.utils import progress_iter
 
 
 def load_safetensors(path):
@@ -58,6 +64,8 @@ class WanS2V:
         t5_cpu=False,
         init_on_cpu=True,
         convert_model_dtype=False,
+        t5_broadcast=False,
+        vae_parallel=False,
     ):
         r"""
         Initializes the image-to-video generation model components.
@@ -84,11 +92,18 @@ class WanS2V:
             convert_model_dtype (`bool`, *optional*, defaults to False):
                 Convert DiT model parameters dtype to 'config.param_dtype'.
                 Only works without FSDP.
+            t5_broadcast (`bool`, *optional*, defaults to False):
+                Load T5 on rank 0 only and broadcast the encoded prompts to the
+                other ranks. Not compatible with t5_fsdp.
+            vae_parallel (`bool`, *optional*, defaults to False):
+                Split VAE decoding across all ranks instead of decoding on rank 0.
         """
         self.device = torch.device(f"cuda:{device_id}")
         self.config = config
         self.rank = rank
         self.t5_cpu = t5_cpu
+        self.t5_broadcast = t5_broadcast
+        self.vae_parallel = vae_parallel
         self.init_on_cpu = init_on_cpu
 
         self.num_train_timesteps = config.num_train_timesteps
@@ -98,14 +113,19 @@ class WanS2V:
             self.init_on_cpu = False
 
         shard_fn = partial(shard_model, device_id=device_id)
-        self.text_encoder = T5EncoderModel(
-            text_len=config.text_len,
-            dtype=config.t5_dtype,
-            device=torch.device('cpu'),
-            checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
-            tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
-            shard_fn=shard_fn if t5_fsdp else None,
-        )
+        assert not (t5_fsdp and t5_broadcast), \
+            "t5_fsdp and t5_broadcast cannot be used together."
+        if t5_broadcast and rank != 0:
+            self.text_encoder = None
+        else:
+            self.text_encoder = T5EncoderModel(
+                text_len=config.text_len,
+                dtype=config.t5_dtype,
+                device=torch.device('cpu'),
+                checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
+                tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
+                shard_fn=shard_fn if t5_fsdp else None,
+            )
 
         self.vae = Wan2_1_VAE(
             vae_pth=os.path.join(checkpoint_dir, config.vae_checkpoint),
@@ -410,6 +430,8 @@ class WanS2V:
         seed=-1,
         offload_model=True,
         init_first_frame=False,
+        guidance_schedule=None,
+        progress_callback=None,
     ):
         r"""
         Generates video frames from input image and text prompt using diffusion process.
@@ -433,7 +455,8 @@ class WanS2V:
                 Noise schedule shift parameter. Affects temporal dynamics
                 [NOTE]: If you want to generate a 480p video, it is recommended to set the shift value to 3.0.
             sample_solver (`str`, *optional*, defaults to 'unipc'):
-                Solver used to sample the video.
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
             sampling_steps (`int`, *optional*, defaults to 40):
                 Number of diffusion sampling steps. Higher values improve quality but slow generation
             guide_scale (`float` or tuple[`float`], *optional*, defaults 5.0):
@@ -448,6 +471,13 @@ class WanS2V:
                 If True, offloads models to CPU during generation to save VRAM
             init_first_frame (`bool`, *optional*, defaults to False):
                 Whether to use the reference image as the first frame (i.e., standard image-to-video generation)
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional prediction is computed,
+                see `wan.utils.guidance.GuidanceSchedule`. Defaults to CFG at
+                every step.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
 
         Returns:
             torch.Tensor:
@@ -519,17 +549,29 @@ class WanS2V:
             n_prompt = self.sample_neg_prompt
 
         # preprocess
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
+        if self.text_encoder is None:
+            context, context_null = None, None
+        elif not self.t5_cpu:
+            encode = needs_text_encoder(self.text_encoder,
+                                        [input_prompt, n_prompt], self.device)
+            if encode:
+                with profile('offload'):
+                    self.text_encoder.model.to(self.device)
+                    record_bytes(self.text_encoder.model)
             context = self.text_encoder([input_prompt], self.device)
             context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
+            if encode and offload_model:
+                with profile('offload'):
+                    self.text_encoder.model.cpu()
+                    record_bytes(self.text_encoder.model)
         else:
             context = self.text_encoder([input_prompt], torch.device('cpu'))
             context_null = self.text_encoder([n_prompt], torch.device('cpu'))
             context = [t.to(self.device) for t in context]
             context_null = [t.to(self.device) for t in context_null]
+        if self.t5_broadcast:
+            context = broadcast_tensor_list(context, self.device)
+            context_null = broadcast_tensor_list(context_null, self.device)
 
         out = []
         # evaluation mode
@@ -537,7 +579,7 @@ class WanS2V:
                 torch.amp.autocast('cuda', dtype=self.param_dtype),
                 torch.no_grad(),
         ):
-            for r in range(num_repeat):
+            for r in profile_iter(range(num_repeat), 'clip'):
                 seed_g = torch.Generator(device=self.device)
                 seed_g.manual_seed(seed + r)
 
@@ -574,8 +616,20 @@ class WanS2V:
                         sample_scheduler,
                         device=self.device,
                         sigmas=sampling_sigmas)
+                elif sample_solver in FLOW_ODE_SOLVERS:
+                    sample_scheduler = FlowODEScheduler(
+                        num_train_timesteps=self.num_train_timesteps,
+                        solver=sample_solver,
+                        rtol=self.config.sample_rtol,
+                        atol=self.config.sample_atol)
+                    sample_scheduler.set_timesteps(
+                        sampling_steps, device=self.device, shift=shift)
+                    timesteps = sample_scheduler.timesteps
                 else:
                     raise NotImplementedError("Unsupported solver.")
+                if not isinstance(sample_scheduler, FlowODEScheduler):
+                    sample_scheduler = DeviceFlowScheduler(
+                        sample_scheduler)
 
                 latents = deepcopy(noise)
                 with torch.no_grad():
@@ -611,38 +665,58 @@ class WanS2V:
                         "drop_motion_frames": drop_first_motion and r == 0,
                     }
                 if offload_model or self.init_on_cpu:
-                    self.noise_model.to(self.device)
+                    with profile('offload'):
+                        self.noise_model.to(self.device)
+                        record_bytes(self.noise_model)
                     torch.cuda.empty_cache()
+                guidance = guidance_schedule or GuidanceSchedule(
+                    num_train_timesteps=self.num_train_timesteps)
+                guidance.reset()
 
-                for i, t in enumerate(tqdm(timesteps)):
+                for i, t in enumerate(
+                        profile_iter(progress_iter(timesteps,
+                                                   progress_callback))):
                     latent_model_input = latents[0:1]
                     timestep = [t]
 
                     timestep = torch.stack(timestep).to(self.device)
 
-                    noise_pred_cond = self.noise_model(
-                        latent_model_input, t=timestep, **arg_c)
+                    with profile('cond'):
+                        noise_pred_cond = self.noise_model(
+                            latent_model_input, t=timestep, **arg_c)
 
                     if guide_scale > 1:
-                        noise_pred_uncond = self.noise_model(
-                            latent_model_input, t=timestep, **arg_null)
+                        noise_pred_uncond = [None]
+                        if guidance.needs_uncond(
+                                sample_scheduler.host_timesteps[i]):
+                            with profile('uncond'):
+                                noise_pred_uncond = self.noise_model(
+                                    latent_model_input, t=timestep, **arg_null)
                         noise_pred = [
-                            u + guide_scale * (c - u)
-                            for c, u in zip(noise_pred_cond, noise_pred_uncond)
+                            guidance(noise_pred_cond[0], noise_pred_uncond[0],
+                                     guide_scale)
                         ]
                     else:
                         noise_pred = noise_pred_cond
 
-                    temp_x0 = sample_scheduler.step(
-                        noise_pred[0].unsqueeze(0),
-                        t,
-                        latents[0].unsqueeze(0),
-                        return_dict=False,
-                        generator=seed_g)[0]
+                    with profile('scheduler'):
+                        temp_x0 = sample_scheduler.step(
+                            noise_pred[0].unsqueeze(0),
+                            t,
+                            latents[0].unsqueeze(0),
+                            return_dict=False,
+                            generator=seed_g)[0]
                     latents[0] = temp_x0.squeeze(0)
 
+                logging.info(
+                    f"Sampled with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+                )
+                guidance.log_stats()
+
                 if offload_model:
-                    self.noise_model.cpu()
+                    with profile('offload'):
+                        self.noise_model.cpu()
+                        record_bytes(self.noise_model)
                     torch.cuda.synchronize()
                     torch.cuda.empty_cache()
                 latents = torch.stack(latents)
@@ -650,7 +724,11 @@ class WanS2V:
                     decode_latents = torch.cat([motion_latents, latents], dim=2)
                 else:
                     decode_latents = torch.cat([ref_latents, latents], dim=2)
-                image = torch.stack(self.vae.decode(decode_latents))
+                if self.vae_parallel:
+                    image = torch.stack(
+                        parallel_vae_decode(self.vae, decode_latents))
+                else:
+                    image = torch.stack(self.vae.decode(decode_latents))
                 image = image[:, :, -(infer_frames):]
                 if (drop_first_motion and r == 0):
                     image = image[:, :, 3:]
@@ -666,6 +744,7 @@ class WanS2V:
                 motion_latents = torch.stack(
                     self.vae.encode(videos_last_frames))
                 out.append(image.cpu())
+                record_bytes(image)
 
         videos = torch.cat(out, dim=2)
         del noise, latents
@@ -12,20 +12,36 @@ from functools import partial
 import torch
 import torch.cuda.amp as amp
 import torch.distributed as dist
-from tqdm import tqdm
 
 from .distributed.fsdp import shard_model
 from .distributed.sequence_parallel import sp_attn_forward, sp_dit_forward
-from .distributed.util import get_world_size
+from .distributed.tensor_parallel import tp_shard_model
+from .distributed.util import broadcast_tensor_list, get_world_size
+from .distributed.vae_parallel import parallel_vae_decode
 from .modules.model import WanModel
+from .modules.quant import load_quantized_model
 from .modules.t5 import T5EncoderModel
 from .modules.vae2_1 import Wan2_1_VAE
+from .utils.autotune import Autotuner
+from .utils.batch import (
+    build_sample_scheduler,
+    encode_prompts,
+    expand_batch,
+    needs_text_encoder,
+)
+from .utils.compile import compile_blocks
+from .utils.cuda_graph import StepGraphCache, pad_context
 from .utils.fm_solvers import (
     FlowDPMSolverMultistepScheduler,
     get_sampling_sigmas,
     retrieve_timesteps,
 )
+from .utils.fm_solvers_device import DeviceFlowScheduler
+from .utils.fm_solvers_ode import FLOW_ODE_SOLVERS, FlowODEScheduler
 from .utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
+from .utils.guidance import GuidanceSchedule
+from .utils.profiler import profile, profile_iter, record_bytes
+from .utils.utils import progress_iter
 
 
 class WanT2V:
@@ -42,6 +58,14 @@ class WanT2V:
         t5_cpu=False,
         init_on_cpu=True,
         convert_model_dtype=False,
+        dit_tp=False,
+        t5_broadcast=False,
+        vae_parallel=False,
+        cuda_graph=False,
+        compile_dit=False,
+        seq_len_buckets=None,
+        dit_quant=None,
+        autotune=False,
     ):
         r"""
         Initializes the Wan text-to-video generation model components.
@@ -68,28 +92,63 @@ class WanT2V:
             convert_model_dtype (`bool`, *optional*, defaults to False):
                 Convert DiT model parameters dtype to 'config.param_dtype'.
                 Only works without FSDP.
+            dit_tp (`bool`, *optional*, defaults to False):
+                Enable tensor parallelism for DiT model. Alternative to dit_fsdp.
+            t5_broadcast (`bool`, *optional*, defaults to False):
+                Load T5 on rank 0 only and broadcast the encoded prompts to the
+                other ranks. Not compatible with t5_fsdp.
+            vae_parallel (`bool`, *optional*, defaults to False):
+                Split VAE decoding across all ranks instead of decoding on rank 0.
+            cuda_graph (`bool`, *optional*, defaults to False):
+                Capture each denoising step into a CUDA graph and replay it.
+                Only works without FSDP, USP and tensor parallelism.
+            compile_dit (`bool`, *optional*, defaults to False):
+                Compile the DiT blocks with torch.compile.
+            seq_len_buckets (`list`, *optional*):
+                Sequence lengths compiled DiT inputs are padded up to, see
+                `wan.utils.compile.get_seq_len_buckets`.
+            dit_quant (`str`, *optional*):
+                Load the weight-only 'int8' or 'fp8' DiT checkpoint written by
+                `tools/quantize_dit.py` instead of the full precision one. Only
+                works without FSDP and tensor parallelism.
+            autotune (`bool`, *optional*, defaults to False):
+                Pick the fastest attention backend per video shape, cached in
+                `autotune.json` under `checkpoint_dir`, see
+                `wan.utils.autotune.Autotuner`.
         """
         self.device = torch.device(f"cuda:{device_id}")
         self.config = config
         self.rank = rank
         self.t5_cpu = t5_cpu
+        self.t5_broadcast = t5_broadcast
+        self.vae_parallel = vae_parallel
+        self.step_graphs = StepGraphCache() if cuda_graph else None
+        self.autotuner = Autotuner(checkpoint_dir, self.device,
+                                   rank) if autotune else None
         self.init_on_cpu = init_on_cpu
 
         self.num_train_timesteps = config.num_train_timesteps
         self.boundary = config.boundary
         self.param_dtype = config.param_dtype
 
-        if t5_fsdp or dit_fsdp or use_sp:
+        if t5_fsdp or dit_fsdp or use_sp or dit_tp:
             self.init_on_cpu = False
 
         shard_fn = partial(shard_model, device_id=device_id)
-        self.text_encoder = T5EncoderModel(
-            text_len=config.text_len,
-            dtype=config.t5_dtype,
-            device=torch.device('cpu'),
-            checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
-            tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
-            shard_fn=shard_fn if t5_fsdp else None)
+        assert not (t5_fsdp and t5_broadcast), \
+            "t5_fsdp and t5_broadcast cannot be used together."
+        assert dit_quant is None or not (dit_fsdp or dit_tp), \
+            "dit_quant cannot be combined with dit_fsdp or dit_tp."
+        if t5_broadcast and rank != 0:
+            self.text_encoder = None
+        else:
+            self.text_encoder = T5EncoderModel(
+                text_len=config.text_len,
+                dtype=config.t5_dtype,
+                device=torch.device('cpu'),
+                checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
+                tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
+                shard_fn=shard_fn if t5_fsdp else None)
 
         self.vae_stride = config.vae_stride
         self.patch_size = config.patch_size
@@ -98,23 +157,42 @@ class WanT2V:
             device=self.device)
 
         logging.info(f"Creating WanModel from {checkpoint_dir}")
-        self.low_noise_model = WanModel.from_pretrained(
-            checkpoint_dir, subfolder=config.low_noise_checkpoint)
+        if dit_quant is not None:
+            self.low_noise_model = load_quantized_model(
+                checkpoint_dir,
+                config.low_noise_checkpoint,
+                dit_quant,
+                device=self.device)
+        else:
+            self.low_noise_model = WanModel.from_pretrained(
+                checkpoint_dir, subfolder=config.low_noise_checkpoint)
         self.low_noise_model = self._configure_model(
             model=self.low_noise_model,
             use_sp=use_sp,
             dit_fsdp=dit_fsdp,
             shard_fn=shard_fn,
-            convert_model_dtype=convert_model_dtype)
-
-        self.high_noise_model = WanModel.from_pretrained(
-            checkpoint_dir, subfolder=config.high_noise_checkpoint)
+            convert_model_dtype=convert_model_dtype,
+            dit_tp=dit_tp)
+
+        if dit_quant is not None:
+            self.high_noise_model = load_quantized_model(
+                checkpoint_dir,
+                config.high_noise_checkpoint,
+                dit_quant,
+                device=self.device)
+        else:
+            self.high_noise_model = WanModel.from_pretrained(
+                checkpoint_dir, subfolder=config.high_noise_checkpoint)
         self.high_noise_model = self._configure_model(
             model=self.high_noise_model,
             use_sp=use_sp,
             dit_fsdp=dit_fsdp,
             shard_fn=shard_fn,
-            convert_model_dtype=convert_model_dtype)
+            convert_model_dtype=convert_model_dtype,
+            dit_tp=dit_tp)
+        if compile_dit:
+            for model in (self.low_noise_model, self.high_noise_model):
+                compile_blocks(model, seq_len_buckets)
         if use_sp:
             self.sp_size = get_world_size()
         else:
@@ -122,8 +200,13 @@ class WanT2V:
 
         self.sample_neg_prompt = config.sample_neg_prompt
 
-    def _configure_model(self, model, use_sp, dit_fsdp, shard_fn,
-                         convert_model_dtype):
+    def _configure_model(self,
+                         model,
+                         use_sp,
+                         dit_fsdp,
+                         shard_fn,
+                         convert_model_dtype,
+                         dit_tp=False):
         """
         Configures a model object. This includes setting evaluation modes,
         applying distributed parallel strategy, and handling device placement.
@@ -140,6 +223,8 @@ class WanT2V:
             convert_model_dtype (`bool`):
                 Convert DiT model parameters dtype to 'config.param_dtype'.
                 Only works without FSDP.
+            dit_tp (`bool`, *optional*, defaults to False):
+                Enable tensor parallelism for DiT model.
 
         Returns:
             torch.nn.Module:
@@ -159,6 +244,8 @@ class WanT2V:
         if dit_fsdp:
             model = shard_fn(model)
         else:
+            if dit_tp:
+                model = tp_shard_model(model)
             if convert_model_dtype:
                 model.to(self.param_dtype)
             if not self.init_on_cpu:
@@ -171,8 +258,8 @@ class WanT2V:
         Prepares and returns the required model for the current timestep.
 
         Args:
-            t (torch.Tensor):
-                current timestep.
+            t (`int`):
+                current timestep, taken from the host-side schedule.
             boundary (`int`):
                 The timestep threshold. If `t` is at or above this value,
                 the `high_noise_model` is considered as the required model.
@@ -183,7 +270,7 @@ class WanT2V:
             torch.nn.Module:
                 The active model on the target device for the current timestep.
         """
-        if t.item() >= boundary:
+        if t >= boundary:
             required_model_name = 'high_noise_model'
             offload_model_name = 'low_noise_model'
         else:
@@ -193,11 +280,15 @@ class WanT2V:
             if next(getattr(
                     self,
                     offload_model_name).parameters()).device.type == 'cuda':
-                getattr(self, offload_model_name).to('cpu')
+                with profile('expert_swap'):
+                    getattr(self, offload_model_name).to('cpu')
+                    record_bytes(getattr(self, offload_model_name))
             if next(getattr(
                     self,
                     required_model_name).parameters()).device.type == 'cpu':
-                getattr(self, required_model_name).to(self.device)
+                with profile('expert_swap'):
+                    getattr(self, required_model_name).to(self.device)
+                    record_bytes(getattr(self, required_model_name))
         return getattr(self, required_model_name)
 
     def generate(self,
@@ -210,7 +301,9 @@ class WanT2V:
                  guide_scale=5.0,
                  n_prompt="",
                  seed=-1,
-                 offload_model=True):
+                 offload_model=True,
+                 guidance_schedule=None,
+                 progress_callback=None):
         r"""
         Generates video frames from text prompt using diffusion process.
 
@@ -224,7 +317,8 @@ class WanT2V:
             shift (`float`, *optional*, defaults to 5.0):
                 Noise schedule shift parameter. Affects temporal dynamics
             sample_solver (`str`, *optional*, defaults to 'unipc'):
-                Solver used to sample the video.
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
             sampling_steps (`int`, *optional*, defaults to 50):
                 Number of diffusion sampling steps. Higher values improve quality but slow generation
             guide_scale (`float` or tuple[`float`], *optional*, defaults 5.0):
@@ -237,6 +331,13 @@ class WanT2V:
                 Random seed for noise generation. If -1, use random seed.
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional prediction is computed,
+                see `wan.utils.guidance.GuidanceSchedule`. Defaults to CFG at
+                every step.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
 
         Returns:
             torch.Tensor:
@@ -257,6 +358,10 @@ class WanT2V:
         seq_len = math.ceil((target_shape[2] * target_shape[3]) /
                             (self.patch_size[1] * self.patch_size[2]) *
                             target_shape[1] / self.sp_size) * self.sp_size
+        if self.autotuner is not None:
+            self.autotuner.apply('t2v', size, F, seq_len,
+                                 self.config.num_heads // self.sp_size,
+                                 self.config.dim // self.config.num_heads)
 
         if n_prompt == "":
             n_prompt = self.sample_neg_prompt
@@ -264,17 +369,29 @@ class WanT2V:
         seed_g = torch.Generator(device=self.device)
         seed_g.manual_seed(seed)
 
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
+        if self.text_encoder is None:
+            context, context_null = None, None
+        elif not self.t5_cpu:
+            encode = needs_text_encoder(self.text_encoder,
+                                        [input_prompt, n_prompt], self.device)
+            if encode:
+                with profile('offload'):
+                    self.text_encoder.model.to(self.device)
+                    record_bytes(self.text_encoder.model)
             context = self.text_encoder([input_prompt], self.device)
             context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
+            if encode and offload_model:
+                with profile('offload'):
+                    self.text_encoder.model.cpu()
+                    record_bytes(self.text_encoder.model)
         else:
             context = self.text_encoder([input_prompt], torch.device('cpu'))
             context_null = self.text_encoder([n_prompt], torch.device('cpu'))
             context = [t.to(self.device) for t in context]
             context_null = [t.to(self.device) for t in context_null]
+        if self.t5_broadcast:
+            context = broadcast_tensor_list(context, self.device)
+            context_null = broadcast_tensor_list(context_null, self.device)
 
         noise = [
             torch.randn(
@@ -323,48 +440,129 @@ class WanT2V:
                     sample_scheduler,
                     device=self.device,
                     sigmas=sampling_sigmas)
+            elif sample_solver in FLOW_ODE_SOLVERS:
+                sample_scheduler = FlowODEScheduler(
+                    num_train_timesteps=self.num_train_timesteps,
+                    solver=sample_solver,
+                    rtol=self.config.sample_rtol,
+                    atol=self.config.sample_atol)
+                sample_scheduler.set_timesteps(
+                    sampling_steps, device=self.device, shift=shift)
+                timesteps = sample_scheduler.timesteps
             else:
                 raise NotImplementedError("Unsupported solver.")
+            if self.step_graphs is not None:
+                sample_scheduler = self.step_graphs.scheduler(
+                    (sample_solver, sampling_steps, shift, target_shape),
+                    sample_scheduler,
+                    guidance_schedule=guidance_schedule)
+                timesteps = sample_scheduler.timesteps
+            elif not isinstance(sample_scheduler, FlowODEScheduler):
+                sample_scheduler = DeviceFlowScheduler(sample_scheduler)
 
             # sample videos
             latents = noise
 
             arg_c = {'context': context, 'seq_len': seq_len}
             arg_null = {'context': context_null, 'seq_len': seq_len}
-
-            for _, t in enumerate(tqdm(timesteps)):
+            guidance = guidance_schedule or GuidanceSchedule(
+                num_train_timesteps=self.num_train_timesteps)
+            guidance.reset()
+
+            if self.step_graphs is not None:
+                graph_context = pad_context([context[0], context_null[0]],
+                                            self.config.text_len)
+
+                def denoise_step(model, guide_scale, latent, timestep, index,
+                                 context, context_null):
+                    noise_pred_cond = model([latent],
+                                            t=timestep,
+                                            context=[context],
+                                            seq_len=seq_len)[0]
+                    noise_pred_uncond = model([latent],
+                                              t=timestep,
+                                              context=[context_null],
+                                              seq_len=seq_len)[0]
+                    noise_pred = noise_pred_uncond + guide_scale * (
+                        noise_pred_cond - noise_pred_uncond)
+                    return sample_scheduler.step(
+                        noise_pred.unsqueeze(0),
+                        timestep,
+                        latent.unsqueeze(0),
+                        return_dict=False,
+                        step_index=index)[0].squeeze(0)
+
+            for i, t in enumerate(
+                    profile_iter(progress_iter(timesteps,
+                                               progress_callback))):
                 latent_model_input = latents
                 timestep = [t]
 
                 timestep = torch.stack(timestep)
 
+                # read from the host-side schedule, no device sync
+                t_host = sample_scheduler.host_timesteps[i]
                 model = self._prepare_model_for_timestep(
-                    t, boundary, offload_model)
-                sample_guide_scale = guide_scale[1] if t.item(
-                ) >= boundary else guide_scale[0]
-
-                noise_pred_cond = model(
-                    latent_model_input, t=timestep, **arg_c)[0]
-                noise_pred_uncond = model(
-                    latent_model_input, t=timestep, **arg_null)[0]
-
-                noise_pred = noise_pred_uncond + sample_guide_scale * (
-                    noise_pred_cond - noise_pred_uncond)
-
-                temp_x0 = sample_scheduler.step(
-                    noise_pred.unsqueeze(0),
-                    t,
-                    latents[0].unsqueeze(0),
-                    return_dict=False,
-                    generator=seed_g)[0]
+                    t_host, boundary, offload_model)
+                sample_guide_scale = guide_scale[
+                    1] if t_host >= boundary else guide_scale[0]
+
+                if self.step_graphs is not None:
+                    latents = [
+                        self.step_graphs(
+                            (id(sample_scheduler), t_host >= boundary,
+                             sample_guide_scale),
+                            partial(denoise_step, model, sample_guide_scale),
+                            latents[0],
+                            timestep,
+                            sample_scheduler.indices[i:i + 1],
+                            *graph_context,
+                            modules=[model])
+                    ]
+                    continue
+
+                with profile('cond'):
+                    noise_pred_cond = model(
+                        latent_model_input,
+                        t=timestep,
+                        timestep=t_host,
+                        **arg_c)[0]
+                noise_pred_uncond = None
+                if guidance.needs_uncond(t_host, key=model):
+                    with profile('uncond'):
+                        noise_pred_uncond = model(
+                            latent_model_input,
+                            t=timestep,
+                            timestep=t_host,
+                            **arg_null)[0]
+
+                with profile('scheduler'):
+                    noise_pred = guidance(noise_pred_cond, noise_pred_uncond,
+                                          sample_guide_scale)
+
+                    temp_x0 = sample_scheduler.step(
+                        noise_pred.unsqueeze(0),
+                        t,
+                        latents[0].unsqueeze(0),
+                        return_dict=False,
+                        generator=seed_g)[0]
                 latents = [temp_x0.squeeze(0)]
 
+            logging.info(
+                f"Sampled with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+            )
+            guidance.log_stats()
+
             x0 = latents
             if offload_model:
-                self.low_noise_model.cpu()
-                self.high_noise_model.cpu()
+                with profile('offload'):
+                    self.low_noise_model.cpu()
+                    self.high_noise_model.cpu()
+                    record_bytes(self.low_noise_model, self.high_noise_model)
                 torch.cuda.empty_cache()
-            if self.rank == 0:
+            if self.vae_parallel:
+                videos = parallel_vae_decode(self.vae, x0)
+            elif self.rank == 0:
                 videos = self.vae.decode(x0)
 
         del noise, latents
@@ -376,3 +574,192 @@ class WanT2V:
             dist.barrier()
 
         return videos[0] if self.rank == 0 else None
+
+    def generate_batch(self,
+                       input_prompts,
+                       seeds,
+                       size=(1280, 720),
+                       frame_num=81,
+                       shift=5.0,
+                       sample_solver='unipc',
+                       sampling_steps=50,
+                       guide_scale=5.0,
+                       n_prompt="",
+                       offload_model=True,
+                       guidance_schedule=None,
+                       progress_callback=None):
+        r"""
+        Generates one video per (prompt, seed) pair in a single sampling loop.
+
+        The latents of all samples, and their unconditional copies, go through
+        the DiT as one batch. The scheduler state is batched as well, so each
+        sample keeps its own solver history. Every distinct prompt is encoded
+        once and the VAE decodes all videos as one batch.
+
+        Args:
+            input_prompts (`str` or List[`str`]):
+                Text prompts, one per sample.
+            seeds (`int` or List[`int`]):
+                Random seeds, one per sample. A single prompt or seed is
+                repeated to match the other, e.g. for a seed sweep. -1 draws
+                a random seed.
+            size (`tuple[int]`, *optional*, defaults to (1280,720)):
+                Controls video resolution, (width,height).
+            frame_num (`int`, *optional*, defaults to 81):
+                How many frames to sample from a video. The number should be 4n+1
+            shift (`float`, *optional*, defaults to 5.0):
+                Noise schedule shift parameter. Affects temporal dynamics
+            sample_solver (`str`, *optional*, defaults to 'unipc'):
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'. The adaptive solver picks one
+                step size for the whole batch.
+            sampling_steps (`int`, *optional*, defaults to 50):
+                Number of diffusion sampling steps. Higher values improve quality but slow generation
+            guide_scale (`float` or tuple[`float`], *optional*, defaults 5.0):
+                Classifier-free guidance scale, as in `generate`.
+            n_prompt (`str`, *optional*, defaults to ""):
+                Negative prompt shared by all samples. If not given, use `config.sample_neg_prompt`
+            offload_model (`bool`, *optional*, defaults to True):
+                If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional predictions are
+                computed, for all samples at once.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
+
+        Returns:
+            List[torch.Tensor]:
+                Generated videos, one per sample with shape (C, N, H, W), on
+                rank 0. None on other ranks.
+        """
+        prompts, seeds = expand_batch(input_prompts, seeds)
+        batch_size = len(prompts)
+        guide_scale = (guide_scale, guide_scale) if isinstance(
+            guide_scale, float) else guide_scale
+        F = frame_num
+        target_shape = (self.vae.model.z_dim, (F - 1) // self.vae_stride[0] + 1,
+                        size[1] // self.vae_stride[1],
+                        size[0] // self.vae_stride[2])
+
+        seq_len = math.ceil((target_shape[2] * target_shape[3]) /
+                            (self.patch_size[1] * self.patch_size[2]) *
+                            target_shape[1] / self.sp_size) * self.sp_size
+        if self.autotuner is not None:
+            self.autotuner.apply('t2v', size, F, seq_len,
+                                 self.config.num_heads // self.sp_size,
+                                 self.config.dim // self.config.num_heads)
+
+        if n_prompt == "":
+            n_prompt = self.sample_neg_prompt
+        contexts = encode_prompts(
+            self.text_encoder,
+            prompts + [n_prompt],
+            self.device,
+            t5_cpu=self.t5_cpu,
+            offload_model=offload_model,
+            t5_broadcast=self.t5_broadcast)
+        context, context_null = contexts[:-1], contexts[-1:] * batch_size
+
+        noise = []
+        for seed in seeds:
+            seed = seed if seed >= 0 else random.randint(0, sys.maxsize)
+            seed_g = torch.Generator(device=self.device)
+            seed_g.manual_seed(seed)
+            noise.append(
+                torch.randn(
+                    *target_shape,
+                    dtype=torch.float32,
+                    device=self.device,
+                    generator=seed_g))
+        noise = torch.stack(noise)
+
+        @contextmanager
+        def noop_no_sync():
+            yield
+
+        no_sync_low_noise = getattr(self.low_noise_model, 'no_sync',
+                                    noop_no_sync)
+        no_sync_high_noise = getattr(self.high_noise_model, 'no_sync',
+                                     noop_no_sync)
+
+        # evaluation mode
+        with (
+                torch.amp.autocast('cuda', dtype=self.param_dtype),
+                torch.no_grad(),
+                no_sync_low_noise(),
+                no_sync_high_noise(),
+        ):
+            boundary = self.boundary * self.num_train_timesteps
+            sample_scheduler, timesteps = build_sample_scheduler(
+                sample_solver, sampling_steps, shift, self.device, self.config)
+            guidance = guidance_schedule or GuidanceSchedule(
+                num_train_timesteps=self.num_train_timesteps)
+            guidance.reset()
+
+            # sample videos
+            latents = noise
+            for i, t in enumerate(
+                    profile_iter(progress_iter(timesteps,
+                                               progress_callback))):
+                # read from the host-side schedule, no device sync
+                t_host = sample_scheduler.host_timesteps[i]
+                model = self._prepare_model_for_timestep(
+                    t_host, boundary, offload_model)
+                sample_guide_scale = guide_scale[
+                    1] if t_host >= boundary else guide_scale[0]
+
+                # cond and uncond inputs of all samples in one forward
+                if guidance.needs_uncond(t_host, key=model):
+                    with profile('cond_uncond'):
+                        noise_pred = model(
+                            list(latents) * 2,
+                            t=t.expand(2 * batch_size),
+                            context=context + context_null,
+                            seq_len=seq_len,
+                            timestep=t_host)
+                    noise_pred_cond, noise_pred_uncond = torch.stack(
+                        noise_pred).chunk(2)
+                else:
+                    with profile('cond'):
+                        noise_pred_cond = torch.stack(
+                            model(
+                                list(latents),
+                                t=t.expand(batch_size),
+                                context=context,
+                                seq_len=seq_len,
+                                timestep=t_host))
+                    noise_pred_uncond = None
+                with profile('scheduler'):
+                    noise_pred = guidance(noise_pred_cond, noise_pred_uncond,
+                                          sample_guide_scale)
+
+                    latents = sample_scheduler.step(
+                        noise_pred, t, latents, return_dict=False)[0]
+
+            logging.info(
+                f"Sampled {batch_size} videos with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+            )
+            guidance.log_stats()
+
+            x0 = list(latents)
+            if offload_model:
+                with profile('offload'):
+                    self.low_noise_model.cpu()
+                    self.high_noise_model.cpu()
+                    record_bytes(self.low_noise_model, self.high_noise_model)
+                torch.cuda.empty_cache()
+            if self.vae_parallel:
+                videos = parallel_vae_decode(self.vae, x0)
+            elif self.rank == 0:
+                videos = self.vae.decode_batch(x0)
+
+        del noise, latents, x0
+        del sample_scheduler
+        if offload_model:
+            gc.collect()
+            torch.cuda.synchronize()
+        if dist.is_initialized():
+            dist.barrier()
+
+        return videos if self.rank == 0 else None
@@ -14,21 +14,36 @@ import torch.cuda.amp as amp
 import torch.distributed as dist
 import torchvision.transforms.functional as TF
 from PIL import Image
-from tqdm import tqdm
 
 from .distributed.fsdp import shard_model
 from .distributed.sequence_parallel import sp_attn_forward, sp_dit_forward
-from .distributed.util import get_world_size
+from .distributed.tensor_parallel import tp_shard_model
+from .distributed.util import broadcast_tensor_list, get_world_size
+from .distributed.vae_parallel import parallel_vae_decode
 from .modules.model import WanModel
+from .modules.quant import load_quantized_model
 from .modules.t5 import T5EncoderModel
 from .modules.vae2_2 import Wan2_2_VAE
+from .utils.autotune import Autotuner
+from .utils.batch import (
+    build_sample_scheduler,
+    encode_prompts,
+    expand_batch,
+    needs_text_encoder,
+)
+from .utils.compile import compile_blocks
+from .utils.cuda_graph import StepGraphCache, pad_context
 from .utils.fm_solvers import (
     FlowDPMSolverMultistepScheduler,
     get_sampling_sigmas,
     retrieve_timesteps,
 )
+from .utils.fm_solvers_device import DeviceFlowScheduler
+from .utils.fm_solvers_ode import FLOW_ODE_SOLVERS, FlowODEScheduler
 from .utils.fm_solvers_unipc import FlowUniPCMultistepScheduler
-from .utils.utils import best_output_size, masks_like
+from .utils.guidance import GuidanceSchedule
+from .utils.profiler import profile, profile_iter, record_bytes
+from .utils.utils import best_output_size, masks_like, progress_iter
 
 
 class WanTI2V:
@@ -45,6 +60,14 @@ class WanTI2V:
         t5_cpu=False,
         init_on_cpu=True,
         convert_model_dtype=False,
+        dit_tp=False,
+        t5_broadcast=False,
+        vae_parallel=False,
+        cuda_graph=False,
+        compile_dit=False,
+        seq_len_buckets=None,
+        dit_quant=None,
+        autotune=False,
     ):
         r"""
         Initializes the Wan text-to-video generation model components.
@@ -71,27 +94,62 @@ class WanTI2V:
             convert_model_dtype (`bool`, *optional*, defaults to False):
                 Convert DiT model parameters dtype to 'config.param_dtype'.
                 Only works without FSDP.
+            dit_tp (`bool`, *optional*, defaults to False):
+                Enable tensor parallelism for DiT model. Alternative to dit_fsdp.
+            t5_broadcast (`bool`, *optional*, defaults to False):
+                Load T5 on rank 0 only and broadcast the encoded prompts to the
+                other ranks. Not compatible with t5_fsdp.
+            vae_parallel (`bool`, *optional*, defaults to False):
+                Split VAE decoding across all ranks instead of decoding on rank 0.
+            cuda_graph (`bool`, *optional*, defaults to False):
+                Capture each denoising step into a CUDA graph and replay it.
+                Only works without FSDP, USP and tensor parallelism.
+            compile_dit (`bool`, *optional*, defaults to False):
+                Compile the DiT blocks with torch.compile.
+            seq_len_buckets (`list`, *optional*):
+                Sequence lengths compiled DiT inputs are padded up to, see
+                `wan.utils.compile.get_seq_len_buckets`.
+            dit_quant (`str`, *optional*):
+                Load the weight-only 'int8' or 'fp8' DiT checkpoint written by
+                `tools/quantize_dit.py` instead of the full precision one. Only
+                works without FSDP and tensor parallelism.
+            autotune (`bool`, *optional*, defaults to False):
+                Pick the fastest attention backend per video shape, cached in
+                `autotune.json` under `checkpoint_dir`, see
+                `wan.utils.autotune.Autotuner`.
         """
         self.device = torch.device(f"cuda:{device_id}")
         self.config = config
         self.rank = rank
         self.t5_cpu = t5_cpu
+        self.t5_broadcast = t5_broadcast
+        self.vae_parallel = vae_parallel
+        self.step_graphs = StepGraphCache() if cuda_graph else None
+        self.autotuner = Autotuner(checkpoint_dir, self.device,
+                                   rank) if autotune else None
         self.init_on_cpu = init_on_cpu
 
         self.num_train_timesteps = config.num_train_timesteps
         self.param_dtype = config.param_dtype
 
-        if t5_fsdp or dit_fsdp or use_sp:
+        if t5_fsdp or dit_fsdp or use_sp or dit_tp:
             self.init_on_cpu = False
 
         shard_fn = partial(shard_model, device_id=device_id)
-        self.text_encoder = T5EncoderModel(
-            text_len=config.text_len,
-            dtype=config.t5_dtype,
-            device=torch.device('cpu'),
-            checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
-            tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
-            shard_fn=shard_fn if t5_fsdp else None)
+        assert not (t5_fsdp and t5_broadcast), \
+            "t5_fsdp and t5_broadcast cannot be used together."
+        assert dit_quant is None or not (dit_fsdp or dit_tp), \
+            "dit_quant cannot be combined with dit_fsdp or dit_tp."
+        if t5_broadcast and rank != 0:
+            self.text_encoder = None
+        else:
+            self.text_encoder = T5EncoderModel(
+                text_len=config.text_len,
+                dtype=config.t5_dtype,
+                device=torch.device('cpu'),
+                checkpoint_path=os.path.join(checkpoint_dir, config.t5_checkpoint),
+                tokenizer_path=os.path.join(checkpoint_dir, config.t5_tokenizer),
+                shard_fn=shard_fn if t5_fsdp else None)
 
         self.vae_stride = config.vae_stride
         self.patch_size = config.patch_size
@@ -100,13 +158,20 @@ class WanTI2V:
             device=self.device)
 
         logging.info(f"Creating WanModel from {checkpoint_dir}")
-        self.model = WanModel.from_pretrained(checkpoint_dir)
+        if dit_quant is not None:
+            self.model = load_quantized_model(
+                checkpoint_dir, qtype=dit_quant, device=self.device)
+        else:
+            self.model = WanModel.from_pretrained(checkpoint_dir)
         self.model = self._configure_model(
             model=self.model,
             use_sp=use_sp,
             dit_fsdp=dit_fsdp,
             shard_fn=shard_fn,
-            convert_model_dtype=convert_model_dtype)
+            convert_model_dtype=convert_model_dtype,
+            dit_tp=dit_tp)
+        if compile_dit:
+            compile_blocks(self.model, seq_len_buckets)
 
         if use_sp:
             self.sp_size = get_world_size()
@@ -115,8 +180,13 @@ class WanTI2V:
 
         self.sample_neg_prompt = config.sample_neg_prompt
 
-    def _configure_model(self, model, use_sp, dit_fsdp, shard_fn,
-                         convert_model_dtype):
+    def _configure_model(self,
+                         model,
+                         use_sp,
+                         dit_fsdp,
+                         shard_fn,
+                         convert_model_dtype,
+                         dit_tp=False):
         """
         Configures a model object. This includes setting evaluation modes,
         applying distributed parallel strategy, and handling device placement.
@@ -133,6 +203,8 @@ class WanTI2V:
             convert_model_dtype (`bool`):
                 Convert DiT model parameters dtype to 'config.param_dtype'.
                 Only works without FSDP.
+            dit_tp (`bool`, *optional*, defaults to False):
+                Enable tensor parallelism for DiT model.
 
         Returns:
             torch.nn.Module:
@@ -152,6 +224,8 @@ class WanTI2V:
         if dit_fsdp:
             model = shard_fn(model)
         else:
+            if dit_tp:
+                model = tp_shard_model(model)
             if convert_model_dtype:
                 model.to(self.param_dtype)
             if not self.init_on_cpu:
@@ -171,7 +245,9 @@ class WanTI2V:
                  guide_scale=5.0,
                  n_prompt="",
                  seed=-1,
-                 offload_model=True):
+                 offload_model=True,
+                 guidance_schedule=None,
+                 progress_callback=None):
         r"""
         Generates video frames from text prompt using diffusion process.
 
@@ -189,7 +265,8 @@ class WanTI2V:
             shift (`float`, *optional*, defaults to 5.0):
                 Noise schedule shift parameter. Affects temporal dynamics
             sample_solver (`str`, *optional*, defaults to 'unipc'):
-                Solver used to sample the video.
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
             sampling_steps (`int`, *optional*, defaults to 50):
                 Number of diffusion sampling steps. Higher values improve quality but slow generation
             guide_scale (`float`, *optional*, defaults 5.0):
@@ -200,6 +277,13 @@ class WanTI2V:
                 Random seed for noise generation. If -1, use random seed.
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional prediction is computed,
+                see `wan.utils.guidance.GuidanceSchedule`. Defaults to CFG at
+                every step.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
 
         Returns:
             torch.Tensor:
@@ -222,7 +306,9 @@ class WanTI2V:
                 guide_scale=guide_scale,
                 n_prompt=n_prompt,
                 seed=seed,
-                offload_model=offload_model)
+                offload_model=offload_model,
+                guidance_schedule=guidance_schedule,
+                progress_callback=progress_callback)
         # t2v
         return self.t2v(
             input_prompt=input_prompt,
@@ -234,7 +320,9 @@ class WanTI2V:
             guide_scale=guide_scale,
             n_prompt=n_prompt,
             seed=seed,
-            offload_model=offload_model)
+            offload_model=offload_model,
+            guidance_schedule=guidance_schedule,
+            progress_callback=progress_callback)
 
     def t2v(self,
             input_prompt,
@@ -246,7 +334,9 @@ class WanTI2V:
             guide_scale=5.0,
             n_prompt="",
             seed=-1,
-            offload_model=True):
+            offload_model=True,
+            guidance_schedule=None,
+            progress_callback=None):
         r"""
         Generates video frames from text prompt using diffusion process.
 
@@ -260,7 +350,8 @@ class WanTI2V:
             shift (`float`, *optional*, defaults to 5.0):
                 Noise schedule shift parameter. Affects temporal dynamics
             sample_solver (`str`, *optional*, defaults to 'unipc'):
-                Solver used to sample the video.
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
             sampling_steps (`int`, *optional*, defaults to 50):
                 Number of diffusion sampling steps. Higher values improve quality but slow generation
             guide_scale (`float`, *optional*, defaults 5.0):
@@ -271,6 +362,13 @@ class WanTI2V:
                 Random seed for noise generation. If -1, use random seed.
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional prediction is computed,
+                see `wan.utils.guidance.GuidanceSchedule`. Defaults to CFG at
+                every step.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
 
         Returns:
             torch.Tensor:
@@ -289,6 +387,10 @@ class WanTI2V:
         seq_len = math.ceil((target_shape[2] * target_shape[3]) /
                             (self.patch_size[1] * self.patch_size[2]) *
                             target_shape[1] / self.sp_size) * self.sp_size
+        if self.autotuner is not None:
+            self.autotuner.apply('ti2v', size, F, seq_len,
+                                 self.config.num_heads // self.sp_size,
+                                 self.config.dim // self.config.num_heads)
 
         if n_prompt == "":
             n_prompt = self.sample_neg_prompt
@@ -296,17 +398,29 @@ class WanTI2V:
         seed_g = torch.Generator(device=self.device)
         seed_g.manual_seed(seed)
 
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
+        if self.text_encoder is None:
+            context, context_null = None, None
+        elif not self.t5_cpu:
+            encode = needs_text_encoder(self.text_encoder,
+                                        [input_prompt, n_prompt], self.device)
+            if encode:
+                with profile('offload'):
+                    self.text_encoder.model.to(self.device)
+                    record_bytes(self.text_encoder.model)
             context = self.text_encoder([input_prompt], self.device)
             context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
+            if encode and offload_model:
+                with profile('offload'):
+                    self.text_encoder.model.cpu()
+                    record_bytes(self.text_encoder.model)
         else:
             context = self.text_encoder([input_prompt], torch.device('cpu'))
             context_null = self.text_encoder([n_prompt], torch.device('cpu'))
             context = [t.to(self.device) for t in context]
             context_null = [t.to(self.device) for t in context_null]
+        if self.t5_broadcast:
+            context = broadcast_tensor_list(context, self.device)
+            context_null = broadcast_tensor_list(context_null, self.device)
 
         noise = [
             torch.randn(
@@ -350,8 +464,25 @@ class WanTI2V:
                     sample_scheduler,
                     device=self.device,
                     sigmas=sampling_sigmas)
+            elif sample_solver in FLOW_ODE_SOLVERS:
+                sample_scheduler = FlowODEScheduler(
+                    num_train_timesteps=self.num_train_timesteps,
+                    solver=sample_solver,
+                    rtol=self.config.sample_rtol,
+                    atol=self.config.sample_atol)
+                sample_scheduler.set_timesteps(
+                    sampling_steps, device=self.device, shift=shift)
+                timesteps = sample_scheduler.timesteps
             else:
                 raise NotImplementedError("Unsupported solver.")
+            if self.step_graphs is not None:
+                sample_scheduler = self.step_graphs.scheduler(
+                    (sample_solver, sampling_steps, shift, target_shape),
+                    sample_scheduler,
+                    guidance_schedule=guidance_schedule)
+                timesteps = sample_scheduler.timesteps
+            elif not isinstance(sample_scheduler, FlowODEScheduler):
+                sample_scheduler = DeviceFlowScheduler(sample_scheduler)
 
             # sample videos
             latents = noise
@@ -359,16 +490,67 @@ class WanTI2V:
 
             arg_c = {'context': context, 'seq_len': seq_len}
             arg_null = {'context': context_null, 'seq_len': seq_len}
+            guidance = guidance_schedule or GuidanceSchedule(
+                num_train_timesteps=self.num_train_timesteps)
+            guidance.reset()
 
             if offload_model or self.init_on_cpu:
-                self.model.to(self.device)
+                with profile('offload'):
+                    self.model.to(self.device)
+                    record_bytes(self.model)
                 torch.cuda.empty_cache()
 
-            for _, t in enumerate(tqdm(timesteps)):
+            if self.step_graphs is not None:
+                graph_context = pad_context([context[0], context_null[0]],
+                                            self.config.text_len)
+
+                def denoise_step(latent, timestep, index, context,
+                                 context_null, mask):
+                    temp_ts = (mask[0][:, ::2, ::2] * timestep).flatten()
+                    temp_ts = torch.cat([
+                        temp_ts,
+                        temp_ts.new_ones(seq_len - temp_ts.size(0)) * timestep
+                    ]).unsqueeze(0)
+                    noise_pred_cond = self.model([latent],
+                                                 t=temp_ts,
+                                                 context=[context],
+                                                 seq_len=seq_len)[0]
+                    noise_pred_uncond = self.model([latent],
+                                                   t=temp_ts,
+                                                   context=[context_null],
+                                                   seq_len=seq_len)[0]
+                    noise_pred = noise_pred_uncond + guide_scale * (
+                        noise_pred_cond - noise_pred_uncond)
+                    return sample_scheduler.step(
+                        noise_pred.unsqueeze(0),
+                        timestep,
+                        latent.unsqueeze(0),
+                        return_dict=False,
+                        step_index=index)[0].squeeze(0)
+
+            for i, t in enumerate(
+                    profile_iter(progress_iter(timesteps,
+                                               progress_callback))):
                 latent_model_input = latents
                 timestep = [t]
 
                 timestep = torch.stack(timestep)
+                # read from the host-side schedule, no device sync
+                t_host = sample_scheduler.host_timesteps[i]
+
+                if self.step_graphs is not None:
+                    latents = [
+                        self.step_graphs(
+                            (id(sample_scheduler), 't2v', guide_scale),
+                            denoise_step,
+                            latents[0],
+                            timestep,
+                            sample_scheduler.indices[i:i + 1],
+                            *graph_context,
+                            mask2[0],
+                            modules=[self.model])
+                    ]
+                    continue
 
                 temp_ts = (mask2[0][0][:, ::2, ::2] * timestep).flatten()
                 temp_ts = torch.cat([
@@ -377,27 +559,47 @@ class WanTI2V:
                 ])
                 timestep = temp_ts.unsqueeze(0)
 
-                noise_pred_cond = self.model(
-                    latent_model_input, t=timestep, **arg_c)[0]
-                noise_pred_uncond = self.model(
-                    latent_model_input, t=timestep, **arg_null)[0]
-
-                noise_pred = noise_pred_uncond + guide_scale * (
-                    noise_pred_cond - noise_pred_uncond)
-
-                temp_x0 = sample_scheduler.step(
-                    noise_pred.unsqueeze(0),
-                    t,
-                    latents[0].unsqueeze(0),
-                    return_dict=False,
-                    generator=seed_g)[0]
+                with profile('cond'):
+                    noise_pred_cond = self.model(
+                        latent_model_input,
+                        t=timestep,
+                        timestep=t_host,
+                        **arg_c)[0]
+                noise_pred_uncond = None
+                if guidance.needs_uncond(t_host):
+                    with profile('uncond'):
+                        noise_pred_uncond = self.model(
+                            latent_model_input,
+                            t=timestep,
+                            timestep=t_host,
+                            **arg_null)[0]
+
+                with profile('scheduler'):
+                    noise_pred = guidance(noise_pred_cond, noise_pred_uncond,
+                                          guide_scale)
+
+                    temp_x0 = sample_scheduler.step(
+                        noise_pred.unsqueeze(0),
+                        t,
+                        latents[0].unsqueeze(0),
+                        return_dict=False,
+                        generator=seed_g)[0]
                 latents = [temp_x0.squeeze(0)]
+
+            logging.info(
+                f"Sampled with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+            )
+            guidance.log_stats()
             x0 = latents
             if offload_model:
-                self.model.cpu()
+                with profile('offload'):
+                    self.model.cpu()
+                    record_bytes(self.model)
                 torch.cuda.synchronize()
                 torch.cuda.empty_cache()
-            if self.rank == 0:
+            if self.vae_parallel:
+                videos = parallel_vae_decode(self.vae, x0)
+            elif self.rank == 0:
                 videos = self.vae.decode(x0)
 
         del noise, latents
@@ -421,7 +623,9 @@ class WanTI2V:
             guide_scale=5.0,
             n_prompt="",
             seed=-1,
-            offload_model=True):
+            offload_model=True,
+            guidance_schedule=None,
+            progress_callback=None):
         r"""
         Generates video frames from input image and text prompt using diffusion process.
 
@@ -438,7 +642,8 @@ class WanTI2V:
                 Noise schedule shift parameter. Affects temporal dynamics
                 [NOTE]: If you want to generate a 480p video, it is recommended to set the shift value to 3.0.
             sample_solver (`str`, *optional*, defaults to 'unipc'):
-                Solver used to sample the video.
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
             sampling_steps (`int`, *optional*, defaults to 40):
                 Number of diffusion sampling steps. Higher values improve quality but slow generation
             guide_scale (`float`, *optional*, defaults 5.0):
@@ -449,6 +654,13 @@ class WanTI2V:
                 Random seed for noise generation. If -1, use random seed
             offload_model (`bool`, *optional*, defaults to True):
                 If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional prediction is computed,
+                see `wan.utils.guidance.GuidanceSchedule`. Defaults to CFG at
+                every step.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
 
         Returns:
             torch.Tensor:
@@ -481,6 +693,10 @@ class WanTI2V:
             oh // self.vae_stride[1]) * (ow // self.vae_stride[2]) // (
                 self.patch_size[1] * self.patch_size[2])
         seq_len = int(math.ceil(seq_len / self.sp_size)) * self.sp_size
+        if self.autotuner is not None:
+            self.autotuner.apply('ti2v', (ow, oh), F, seq_len,
+                                 self.config.num_heads // self.sp_size,
+                                 self.config.dim // self.config.num_heads)
 
         seed = seed if seed >= 0 else random.randint(0, sys.maxsize)
         seed_g = torch.Generator(device=self.device)
@@ -497,17 +713,29 @@ class WanTI2V:
             n_prompt = self.sample_neg_prompt
 
         # preprocess
-        if not self.t5_cpu:
-            self.text_encoder.model.to(self.device)
+        if self.text_encoder is None:
+            context, context_null = None, None
+        elif not self.t5_cpu:
+            encode = needs_text_encoder(self.text_encoder,
+                                        [input_prompt, n_prompt], self.device)
+            if encode:
+                with profile('offload'):
+                    self.text_encoder.model.to(self.device)
+                    record_bytes(self.text_encoder.model)
             context = self.text_encoder([input_prompt], self.device)
             context_null = self.text_encoder([n_prompt], self.device)
-            if offload_model:
-                self.text_encoder.model.cpu()
+            if encode and offload_model:
+                with profile('offload'):
+                    self.text_encoder.model.cpu()
+                    record_bytes(self.text_encoder.model)
         else:
             context = self.text_encoder([input_prompt], torch.device('cpu'))
             context_null = self.text_encoder([n_prompt], torch.device('cpu'))
             context = [t.to(self.device) for t in context]
             context_null = [t.to(self.device) for t in context_null]
+        if self.t5_broadcast:
+            context = broadcast_tensor_list(context, self.device)
+            context_null = broadcast_tensor_list(context_null, self.device)
 
         z = self.vae.encode([img])
 
@@ -542,8 +770,25 @@ class WanTI2V:
                     sample_scheduler,
                     device=self.device,
                     sigmas=sampling_sigmas)
+            elif sample_solver in FLOW_ODE_SOLVERS:
+                sample_scheduler = FlowODEScheduler(
+                    num_train_timesteps=self.num_train_timesteps,
+                    solver=sample_solver,
+                    rtol=self.config.sample_rtol,
+                    atol=self.config.sample_atol)
+                sample_scheduler.set_timesteps(
+                    sampling_steps, device=self.device, shift=shift)
+                timesteps = sample_scheduler.timesteps
             else:
                 raise NotImplementedError("Unsupported solver.")
+            if self.step_graphs is not None:
+                sample_scheduler = self.step_graphs.scheduler(
+                    (sample_solver, sampling_steps, shift, tuple(noise.shape)),
+                    sample_scheduler,
+                    guidance_schedule=guidance_schedule)
+                timesteps = sample_scheduler.timesteps
+            elif not isinstance(sample_scheduler, FlowODEScheduler):
+                sample_scheduler = DeviceFlowScheduler(sample_scheduler)
 
             # sample videos
             latent = noise
@@ -559,16 +804,68 @@ class WanTI2V:
                 'context': context_null,
                 'seq_len': seq_len,
             }
+            guidance = guidance_schedule or GuidanceSchedule(
+                num_train_timesteps=self.num_train_timesteps)
+            guidance.reset()
 
             if offload_model or self.init_on_cpu:
-                self.model.to(self.device)
+                with profile('offload'):
+                    self.model.to(self.device)
+                    record_bytes(self.model)
                 torch.cuda.empty_cache()
 
-            for _, t in enumerate(tqdm(timesteps)):
+            if self.step_graphs is not None:
+                graph_context = pad_context([context[0], context_null[0]],
+                                            self.config.text_len)
+
+                def denoise_step(latent, timestep, index, context,
+                                 context_null, mask, z):
+                    temp_ts = (mask[0][:, ::2, ::2] * timestep).flatten()
+                    temp_ts = torch.cat([
+                        temp_ts,
+                        temp_ts.new_ones(seq_len - temp_ts.size(0)) * timestep
+                    ]).unsqueeze(0)
+                    noise_pred_cond = self.model([latent],
+                                                 t=temp_ts,
+                                                 context=[context],
+                                                 seq_len=seq_len)[0]
+                    noise_pred_uncond = self.model([latent],
+                                                   t=temp_ts,
+                                                   context=[context_null],
+                                                   seq_len=seq_len)[0]
+                    noise_pred = noise_pred_uncond + guide_scale * (
+                        noise_pred_cond - noise_pred_uncond)
+                    latent = sample_scheduler.step(
+                        noise_pred.unsqueeze(0),
+                        timestep,
+                        latent.unsqueeze(0),
+                        return_dict=False,
+                        step_index=index)[0].squeeze(0)
+                    return (1. - mask) * z + mask * latent
+
+            for i, t in enumerate(
+                    profile_iter(progress_iter(timesteps,
+                                               progress_callback))):
                 latent_model_input = [latent.to(self.device)]
                 timestep = [t]
 
                 timestep = torch.stack(timestep).to(self.device)
+                # read from the host-side schedule, no device sync
+                t_host = sample_scheduler.host_timesteps[i]
+
+                if self.step_graphs is not None:
+                    latent = self.step_graphs(
+                        (id(sample_scheduler), 'i2v', guide_scale),
+                        denoise_step,
+                        latent,
+                        timestep,
+                        sample_scheduler.indices[i:i + 1],
+                        *graph_context,
+                        mask2[0],
+                        z[0],
+                        modules=[self.model])
+                    x0 = [latent]
+                    continue
 
                 temp_ts = (mask2[0][0][:, ::2, ::2] * timestep).flatten()
                 temp_ts = torch.cat([
@@ -577,35 +874,55 @@ class WanTI2V:
                 ])
                 timestep = temp_ts.unsqueeze(0)
 
-                noise_pred_cond = self.model(
-                    latent_model_input, t=timestep, **arg_c)[0]
-                if offload_model:
-                    torch.cuda.empty_cache()
-                noise_pred_uncond = self.model(
-                    latent_model_input, t=timestep, **arg_null)[0]
+                with profile('cond'):
+                    noise_pred_cond = self.model(
+                        latent_model_input,
+                        t=timestep,
+                        timestep=t_host,
+                        **arg_c)[0]
                 if offload_model:
                     torch.cuda.empty_cache()
-                noise_pred = noise_pred_uncond + guide_scale * (
-                    noise_pred_cond - noise_pred_uncond)
-
-                temp_x0 = sample_scheduler.step(
-                    noise_pred.unsqueeze(0),
-                    t,
-                    latent.unsqueeze(0),
-                    return_dict=False,
-                    generator=seed_g)[0]
+                noise_pred_uncond = None
+                if guidance.needs_uncond(t_host):
+                    with profile('uncond'):
+                        noise_pred_uncond = self.model(
+                            latent_model_input,
+                            t=timestep,
+                            timestep=t_host,
+                            **arg_null)[0]
+                    if offload_model:
+                        torch.cuda.empty_cache()
+                with profile('scheduler'):
+                    noise_pred = guidance(noise_pred_cond, noise_pred_uncond,
+                                          guide_scale)
+
+                    temp_x0 = sample_scheduler.step(
+                        noise_pred.unsqueeze(0),
+                        t,
+                        latent.unsqueeze(0),
+                        return_dict=False,
+                        generator=seed_g)[0]
                 latent = temp_x0.squeeze(0)
                 latent = (1. - mask2[0]) * z[0] + mask2[0] * latent
 
                 x0 = [latent]
                 del latent_model_input, timestep
 
+            logging.info(
+                f"Sampled with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+            )
+            guidance.log_stats()
+
             if offload_model:
-                self.model.cpu()
+                with profile('offload'):
+                    self.model.cpu()
+                    record_bytes(self.model)
                 torch.cuda.synchronize()
                 torch.cuda.empty_cache()
 
-            if self.rank == 0:
+            if self.vae_parallel:
+                videos = parallel_vae_decode(self.vae, x0)
+            elif self.rank == 0:
                 videos = self.vae.decode(x0)
 
         del noise, latent, x0
@@ -617,3 +934,231 @@ class WanTI2V:
             dist.barrier()
 
         return videos[0] if self.rank == 0 else None
+
+    def generate_batch(self,
+                       input_prompts,
+                       seeds,
+                       imgs=None,
+                       size=(1280, 704),
+                       max_area=704 * 1280,
+                       frame_num=81,
+                       shift=5.0,
+                       sample_solver='unipc',
+                       sampling_steps=50,
+                       guide_scale=5.0,
+                       n_prompt="",
+                       offload_model=True,
+                       guidance_schedule=None,
+                       progress_callback=None):
+        r"""
+        Generates one video per (prompt, seed) pair in a single sampling loop,
+        see `WanT2V.generate_batch`. With `imgs` every sample is conditioned on
+        its first frame as in `i2v`.
+
+        Args:
+            input_prompts (`str` or List[`str`]):
+                Text prompts, one per sample.
+            seeds (`int` or List[`int`]):
+                Random seeds, one per sample. Single values are repeated to
+                the batch size. -1 draws a random seed.
+            imgs (PIL.Image.Image or List[PIL.Image.Image], *optional*):
+                First frames, one per sample. All images must map to the same
+                output size under `max_area`.
+            size (`tuple[int]`, *optional*, defaults to (1280,704)):
+                Controls video resolution, (width,height). Unused with `imgs`.
+            max_area (`int`, *optional*, defaults to 704*1280):
+                Maximum pixel area for latent space calculation. Only used with `imgs`.
+            frame_num (`int`, *optional*, defaults to 81):
+                How many frames to sample from a video. The number should be 4n+1
+            shift (`float`, *optional*, defaults to 5.0):
+                Noise schedule shift parameter. Affects temporal dynamics
+            sample_solver (`str`, *optional*, defaults to 'unipc'):
+                Solver used to sample the video, one of 'unipc', 'dpm++',
+                'euler', 'heun' and 'adaptive'.
+            sampling_steps (`int`, *optional*, defaults to 50):
+                Number of diffusion sampling steps. Higher values improve quality but slow generation
+            guide_scale (`float`, *optional*, defaults 5.0):
+                Classifier-free guidance scale. Controls prompt adherence vs. creativity.
+            n_prompt (`str`, *optional*, defaults to ""):
+                Negative prompt shared by all samples. If not given, use `config.sample_neg_prompt`
+            offload_model (`bool`, *optional*, defaults to True):
+                If True, offloads models to CPU during generation to save VRAM
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                Decides at which steps the unconditional predictions are
+                computed, for all samples at once.
+            progress_callback (`callable`, *optional*):
+                Called with the number of finished and of all denoising steps
+                after each step.
+
+        Returns:
+            List[torch.Tensor]:
+                Generated videos, one per sample with shape (C, N, H, W), on
+                rank 0. None on other ranks.
+        """
+        if imgs is None:
+            prompts, seeds = expand_batch(input_prompts, seeds)
+        else:
+            prompts, seeds, imgs = expand_batch(input_prompts, seeds, imgs)
+        batch_size = len(prompts)
+        F = frame_num
+
+        if imgs is not None:
+            # resize and center-crop as in `i2v`
+            dh, dw = self.patch_size[1] * self.vae_stride[1], self.patch_size[
+                2] * self.vae_stride[2]
+            out_sizes = [
+                best_output_size(img.width, img.height, dw, dh, max_area)
+                for img in imgs
+            ]
+            assert len(set(out_sizes)) == 1, \
+                f"All images of a batch must have the same output size, got {sorted(set(out_sizes))}."
+            ow, oh = out_sizes[0]
+            crops = []
+            for img in imgs:
+                ih, iw = img.height, img.width
+                scale = max(ow / iw, oh / ih)
+                img = img.resize((round(iw * scale), round(ih * scale)),
+                                 Image.LANCZOS)
+                x1 = (img.width - ow) // 2
+                y1 = (img.height - oh) // 2
+                img = img.crop((x1, y1, x1 + ow, y1 + oh))
+                crops.append(
+                    TF.to_tensor(img).sub_(0.5).div_(0.5).to(
+                        self.device).unsqueeze(1))
+            size = (ow, oh)
+
+        target_shape = (self.vae.model.z_dim, (F - 1) // self.vae_stride[0] + 1,
+                        size[1] // self.vae_stride[1],
+                        size[0] // self.vae_stride[2])
+        seq_len = math.ceil((target_shape[2] * target_shape[3]) /
+                            (self.patch_size[1] * self.patch_size[2]) *
+                            target_shape[1] / self.sp_size) * self.sp_size
+        if self.autotuner is not None:
+            self.autotuner.apply('ti2v', size, F, seq_len,
+                                 self.config.num_heads // self.sp_size,
+                                 self.config.dim // self.config.num_heads)
+
+        noise = []
+        for seed in seeds:
+            seed = seed if seed >= 0 else random.randint(0, sys.maxsize)
+            seed_g = torch.Generator(device=self.device)
+            seed_g.manual_seed(seed)
+            noise.append(
+                torch.randn(
+                    *target_shape,
+                    dtype=torch.float32,
+                    device=self.device,
+                    generator=seed_g))
+
+        if n_prompt == "":
+            n_prompt = self.sample_neg_prompt
+        contexts = encode_prompts(
+            self.text_encoder,
+            prompts + [n_prompt],
+            self.device,
+            t5_cpu=self.t5_cpu,
+            offload_model=offload_model,
+            t5_broadcast=self.t5_broadcast)
+        context, context_null = contexts[:-1], contexts[-1:] * batch_size
+
+        z = torch.stack(self.vae.encode(crops)) if imgs is not None else None
+
+        @contextmanager
+        def noop_no_sync():
+            yield
+
+        no_sync = getattr(self.model, 'no_sync', noop_no_sync)
+
+        # evaluation mode
+        with (
+                torch.amp.autocast('cuda', dtype=self.param_dtype),
+                torch.no_grad(),
+                no_sync(),
+        ):
+            sample_scheduler, timesteps = build_sample_scheduler(
+                sample_solver, sampling_steps, shift, self.device, self.config)
+
+            # sample videos, the mask is shared by all samples
+            _, mask2 = masks_like(noise[:1], zero=imgs is not None)
+            mask = mask2[0]
+            latents = torch.stack(noise)
+            if z is not None:
+                latents = (1. - mask) * z + mask * latents
+
+            guidance = guidance_schedule or GuidanceSchedule(
+                num_train_timesteps=self.num_train_timesteps)
+            guidance.reset()
+
+            if offload_model or self.init_on_cpu:
+                with profile('offload'):
+                    self.model.to(self.device)
+                    record_bytes(self.model)
+                torch.cuda.empty_cache()
+
+            for i, t in enumerate(
+                    profile_iter(progress_iter(timesteps,
+                                               progress_callback))):
+                t_host = sample_scheduler.host_timesteps[i]
+                temp_ts = (mask[0][:, ::2, ::2] * t).flatten()
+                temp_ts = torch.cat(
+                    [temp_ts,
+                     temp_ts.new_ones(seq_len - temp_ts.size(0)) * t])
+
+                # cond and uncond inputs of all samples in one forward
+                if guidance.needs_uncond(t_host):
+                    with profile('cond_uncond'):
+                        noise_pred = self.model(
+                            list(latents) * 2,
+                            t=temp_ts.expand(2 * batch_size, -1),
+                            context=context + context_null,
+                            seq_len=seq_len,
+                            timestep=t_host)
+                    noise_pred_cond, noise_pred_uncond = torch.stack(
+                        noise_pred).chunk(2)
+                else:
+                    with profile('cond'):
+                        noise_pred_cond = torch.stack(
+                            self.model(
+                                list(latents),
+                                t=temp_ts.expand(batch_size, -1),
+                                context=context,
+                                seq_len=seq_len,
+                                timestep=t_host))
+                    noise_pred_uncond = None
+                if offload_model:
+                    torch.cuda.empty_cache()
+                with profile('scheduler'):
+                    noise_pred = guidance(noise_pred_cond, noise_pred_uncond,
+                                          guide_scale)
+
+                    latents = sample_scheduler.step(
+                        noise_pred, t, latents, return_dict=False)[0]
+                if z is not None:
+                    latents = (1. - mask) * z + mask * latents
+
+            logging.info(
+                f"Sampled {batch_size} videos with {sample_solver} in {len(sample_scheduler.host_timesteps)} NFEs."
+            )
+            guidance.log_stats()
+
+            x0 = list(latents)
+            if offload_model:
+                with profile('offload'):
+                    self.model.cpu()
+                    record_bytes(self.model)
+                torch.cuda.synchronize()
+                torch.cuda.empty_cache()
+            if self.vae_parallel:
+                videos = parallel_vae_decode(self.vae, x0)
+            elif self.rank == 0:
+                videos = self.vae.decode_batch(x0)
+
+        del noise, latents, x0, z
+        del sample_scheduler
+        if offload_model:
+            gc.collect()
+            torch.cuda.synchronize()
+        if dist.is_initialized():
+            dist.barrier()
+
+        return videos if self.rank == 0 else None
@@ -1,12 +1,25 @@
 # Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
-from .fm_solvers import (
-    FlowDPMSolverMultistepScheduler,
-    get_sampling_sigmas,
-    retrieve_timesteps,
-)
-from .fm_solvers_unipc import FlowUniPCMultistepScheduler
+from .lazy import lazy_module
 
 __all__ = [
     'HuggingfaceTokenizer', 'get_sampling_sigmas', 'retrieve_timesteps',
-    'FlowDPMSolverMultistepScheduler', 'FlowUniPCMultistepScheduler'
+    'FlowDPMSolverMultistepScheduler', 'FlowUniPCMultistepScheduler',
+    'DeviceFlowScheduler', 'FlowODEScheduler', 'StepGraphCache', 'compile_blocks',
+    'get_seq_len_buckets', 'GuidanceSchedule', 'Autotuner'
 ]
+
+__getattr__, __dir__ = lazy_module(
+    __name__, {
+        'HuggingfaceTokenizer': '..modules.tokenizers',
+        'Autotuner': '.autotune',
+        'compile_blocks': '.compile',
+        'get_seq_len_buckets': '.compile',
+        'StepGraphCache': '.cuda_graph',
+        'FlowDPMSolverMultistepScheduler': '.fm_solvers',
+        'get_sampling_sigmas': '.fm_solvers',
+        'retrieve_timesteps': '.fm_solvers',
+        'DeviceFlowScheduler': '.fm_solvers_device',
+        'FlowODEScheduler': '.fm_solvers_ode',
+        'FlowUniPCMultistepScheduler': '.fm_solvers_unipc',
+        'GuidanceSchedule': '.guidance',
+    })
@@ -0,0 +1,213 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import json
+import logging
+import os
+
+import torch
+import torch.distributed as dist
+
+from ..modules.attention import (
+    available_attention_backends,
+    flash_attention,
+    set_attention_backend,
+)
+
+__all__ = ['Autotuner', 'AutotuneCache', 'autotune_key', 'time_candidates']
+
+CACHE_FILE = 'autotune.json'
+
+
+def autotune_key(device, task, size, frame_num):
+    r"""
+    Returns the cache key of a generation shape, e.g.
+    'NVIDIA H100 80GB HBM3/t2v/1280*720/81'.
+
+    Args:
+        device (`torch.device`):
+            The CUDA device the decisions are made for.
+        task (`str`):
+            Generation mode, e.g. 't2v' or 'i2v'.
+        size (`tuple[int]`):
+            (width, height) of the video.
+        frame_num (`int`):
+            Number of frames.
+    """
+    device_name = torch.cuda.get_device_name(
+        device) if device.type == 'cuda' else device.type
+    return f"{device_name}/{task}/{size[0]}*{size[1]}/{frame_num}"
+
+
+class AutotuneCache:
+    r"""
+    Decisions of the autotuner persisted as JSON, one dict of decisions per
+    key of `autotune_key`. Writes go through a temporary file, so concurrent
+    processes never read a partial cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(
+                    f"Ignoring the unreadable autotune cache {path}: {e}")
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, decisions):
+        self.entries[key] = decisions
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            # e.g. a read-only checkpoint dir, the decisions still apply to
+            # this process
+            logging.warning(
+                f"Could not write the autotune cache {self.path}: {e}")
+
+
+def time_candidates(candidates, device, warmup=1, repeat=3):
+    r"""
+    Times each candidate and returns the name of the fastest one with all
+    timings in milliseconds. A candidate that raises, e.g. runs out of
+    memory, is skipped.
+
+    Args:
+        candidates (`dict[str, callable]`):
+            Zero-argument functions by name.
+        device (`torch.device`):
+            The device the candidates run on.
+        warmup (`int`, *optional*, defaults to 1):
+            Untimed calls per candidate.
+        repeat (`int`, *optional*, defaults to 3):
+            Timed calls per candidate, the median is kept.
+    """
+    timings = {}
+    for name, fn in candidates.items():
+        try:
+            for _ in range(warmup):
+                fn()
+            times = []
+            for _ in range(repeat):
+                start = torch.cuda.Event(enable_timing=True)
+                end = torch.cuda.Event(enable_timing=True)
+                start.record()
+                fn()
+                end.record()
+                torch.cuda.synchronize(device)
+                times.append(start.elapsed_time(end))
+        except (RuntimeError, AssertionError) as e:
+            logging.warning(f"Autotune candidate {name} failed: {e}")
+            torch.cuda.empty_cache()
+            continue
+        timings[name] = sorted(times)[len(times) // 2]
+    assert timings, "All autotune candidates failed."
+    return min(timings, key=timings.get), timings
+
+
+def _tune_attention(device, seq_len, num_heads, head_dim, dtype):
+    # self-attention of one DiT block dominates the step time
+    q, k, v = torch.randn(
+        3, 1, seq_len, num_heads, head_dim, dtype=dtype,
+        device=device).unbind(0)
+    candidates = {}
+    for backend in available_attention_backends():
+        candidates[backend] = lambda backend=backend: (set_attention_backend(
+            backend), flash_attention(q, k, v))
+    try:
+        with torch.no_grad():
+            return time_candidates(candidates, device)
+    finally:
+        set_attention_backend(None)
+        del q, k, v
+        torch.cuda.empty_cache()
+
+
+class Autotuner:
+    r"""
+    Picks the fastest attention backend per generation shape and device.
+
+    On first use of a key of `autotune_key` the candidates are benchmarked
+    briefly on the shape of the DiT self-attention and the winner is stored in
+    `autotune.json` under the checkpoint dir, later runs read it from there.
+    Under `torch.distributed` rank 0 decides and broadcasts, so all ranks run
+    the same backend.
+    """
+
+    def __init__(self, checkpoint_dir, device, rank=0):
+        r"""
+        Args:
+            checkpoint_dir (`str`):
+                Directory the decision cache is kept in.
+            device (`torch.device`):
+                The CUDA device to tune on.
+            rank (`int`, *optional*, defaults to 0):
+                Process rank, only rank 0 benchmarks and writes the cache.
+        """
+        self.cache = AutotuneCache(os.path.join(checkpoint_dir, CACHE_FILE))
+        self.device = device
+        self.rank = rank
+
+    def _decide(self, key, seq_len, num_heads, head_dim, dtype):
+        decisions = self.cache.get(key)
+        if decisions is not None and decisions.get(
+                'attention') in available_attention_backends():
+            return decisions
+        backend, timings = _tune_attention(self.device, seq_len, num_heads,
+                                           head_dim, dtype)
+        logging.info(
+            f"Autotuned {key}: attention {backend}, timings {timings}")
+        decisions = {'attention': backend, 'attention_ms': timings}
+        self.cache.set(key, decisions)
+        return decisions
+
+    def apply(self,
+              task,
+              size,
+              frame_num,
+              seq_len,
+              num_heads,
+              head_dim,
+              dtype=torch.bfloat16):
+        r"""
+        Applies the decisions of a generation shape, tuning them first if they
+        are not cached yet.
+
+        Args:
+            task (`str`):
+                Generation mode, e.g. 't2v' or 'i2v'.
+            size (`tuple[int]`):
+                (width, height) of the video.
+            frame_num (`int`):
+                Number of frames.
+            seq_len (`int`):
+                DiT sequence length of the video.
+            num_heads (`int`):
+                Attention heads per rank.
+            head_dim (`int`):
+                Dimension of each head.
+            dtype (`torch.dtype`, *optional*, defaults to torch.bfloat16):
+                Dtype the attention runs in.
+
+        Returns:
+            `dict`:
+                The applied decisions.
+        """
+        key = autotune_key(self.device, task, size, frame_num)
+        if dist.is_initialized():
+            decisions = [None]
+            if self.rank == 0:
+                decisions[0] = self._decide(key, seq_len, num_heads, head_dim,
+                                            dtype)
+            dist.broadcast_object_list(decisions, src=0)
+            decisions = decisions[0]
+        else:
+            decisions = self._decide(key, seq_len, num_heads, head_dim, dtype)
+        set_attention_backend(decisions['attention'])
+        return decisions
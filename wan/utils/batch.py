@@ -0,0 +1,149 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import torch
+
+from ..distributed.util import broadcast_tensor_list
+from .fm_solvers import (
+    FlowDPMSolverMultistepScheduler,
+    get_sampling_sigmas,
+    retrieve_timesteps,
+)
+from .fm_solvers_device import DeviceFlowScheduler
+from .fm_solvers_ode import FLOW_ODE_SOLVERS, FlowODEScheduler
+from .fm_solvers_unipc import FlowUniPCMultistepScheduler
+from .profiler import profile, record_bytes
+
+__all__ = [
+    'expand_batch', 'needs_text_encoder', 'encode_prompts',
+    'build_sample_scheduler'
+]
+
+
+def expand_batch(*values):
+    r"""
+    Broadcasts the arguments of a batched call to a common batch size. Each
+    argument is a single value or a list, single values and one-element lists
+    are repeated.
+
+    Returns:
+        Tuple[List]:
+            One list per argument, all of the same length.
+    """
+    lists = [
+        list(v) if isinstance(v, (list, tuple)) else [v] for v in values
+    ]
+    batch_size = max(len(v) for v in lists)
+    assert all(len(v) in (1, batch_size) for v in lists), \
+        f"Cannot broadcast batch arguments of lengths {[len(v) for v in lists]}."
+    return tuple(v * batch_size if len(v) == 1 else v for v in lists)
+
+
+def needs_text_encoder(text_encoder, texts, device):
+    r"""
+    Whether encoding `texts` on `device` runs the text encoder, False if a
+    cache like `wan.serving.TextEmbeddingCache` holds all of them. The T5
+    model is only moved to the GPU when it is needed.
+    """
+    contains = getattr(text_encoder, 'contains', None)
+    return contains is None or not contains(texts, device)
+
+
+def encode_prompts(text_encoder,
+                   prompts,
+                   device,
+                   t5_cpu=False,
+                   offload_model=True,
+                   t5_broadcast=False):
+    r"""
+    Encodes every distinct prompt once, in one T5 batch.
+
+    Args:
+        text_encoder (T5EncoderModel):
+            The text encoder, None on ranks that receive a broadcast.
+        prompts (List[`str`]):
+            Prompts, duplicates are encoded once.
+        device (`torch.device`):
+            Device of the returned embeddings.
+        t5_cpu (`bool`, *optional*, defaults to False):
+            Whether the text encoder runs on CPU.
+        offload_model (`bool`, *optional*, defaults to True):
+            Whether to move the text encoder back to CPU afterwards.
+        t5_broadcast (`bool`, *optional*, defaults to False):
+            Whether to broadcast the embeddings from rank 0.
+
+    Returns:
+        List[Tensor]:
+            One text embedding with shape [L, C] per prompt.
+    """
+    unique = list(dict.fromkeys(prompts))
+    if text_encoder is None:
+        contexts = None
+    elif not t5_cpu:
+        encode = needs_text_encoder(text_encoder, unique, device)
+        if encode:
+            with profile('offload'):
+                text_encoder.model.to(device)
+                record_bytes(text_encoder.model)
+        contexts = text_encoder(unique, device)
+        if encode and offload_model:
+            with profile('offload'):
+                text_encoder.model.cpu()
+                record_bytes(text_encoder.model)
+    else:
+        contexts = text_encoder(unique, torch.device('cpu'))
+        contexts = [u.to(device) for u in contexts]
+    if t5_broadcast:
+        contexts = broadcast_tensor_list(contexts, device)
+    return [contexts[unique.index(p)] for p in prompts]
+
+
+def build_sample_scheduler(sample_solver, sampling_steps, shift, device,
+                           config):
+    r"""
+    Creates the scheduler of `sample_solver` the way the pipelines do, with
+    multistep solvers wrapped in `DeviceFlowScheduler`.
+
+    Args:
+        sample_solver (`str`):
+            'unipc', 'dpm++' or one of `FLOW_ODE_SOLVERS`.
+        sampling_steps (`int`):
+            Number of sampling steps.
+        shift (`float`):
+            Noise schedule shift.
+        device (`torch.device`):
+            Device of the timesteps.
+        config (EasyDict):
+            Model config, provides `num_train_timesteps` and the tolerances
+            of the adaptive solver.
+
+    Returns:
+        Tuple[scheduler, timesteps]:
+            The scheduler and the timesteps to iterate over.
+    """
+    if sample_solver == 'unipc':
+        sample_scheduler = FlowUniPCMultistepScheduler(
+            num_train_timesteps=config.num_train_timesteps,
+            shift=1,
+            use_dynamic_shifting=False)
+        sample_scheduler.set_timesteps(
+            sampling_steps, device=device, shift=shift)
+    elif sample_solver == 'dpm++':
+        sample_scheduler = FlowDPMSolverMultistepScheduler(
+            num_train_timesteps=config.num_train_timesteps,
+            shift=1,
+            use_dynamic_shifting=False)
+        sampling_sigmas = get_sampling_sigmas(sampling_steps, shift)
+        retrieve_timesteps(
+            sample_scheduler, device=device, sigmas=sampling_sigmas)
+    elif sample_solver in FLOW_ODE_SOLVERS:
+        sample_scheduler = FlowODEScheduler(
+            num_train_timesteps=config.num_train_timesteps,
+            solver=sample_solver,
+            rtol=config.sample_rtol,
+            atol=config.sample_atol)
+        sample_scheduler.set_timesteps(
+            sampling_steps, device=device, shift=shift)
+        return sample_scheduler, sample_scheduler.timesteps
+    else:
+        raise NotImplementedError("Unsupported solver.")
+    sample_scheduler = DeviceFlowScheduler(sample_scheduler)
+    return sample_scheduler, sample_scheduler.timesteps
@@ -0,0 +1,257 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from safetensors.torch import load_file, save_file
+
+__all__ = [
+    'sharded_index_path', 'save_sharded', 'verify_sharded', 'load_sharded',
+    'load_checkpoint', 'check_checkpoint_dir'
+]
+
+GiB = 1 << 30
+
+INDEX_SUFFIX = '.safetensors.index.json'
+# written into the index metadata, diffusers ignores it
+INDEX_FORMAT = 'wan-sharded'
+
+_HASH_CHUNK = 64 << 20
+
+
+def sharded_index_path(path):
+    r"""
+    Returns the index a converted checkpoint of `path` is written to, e.g.
+    `Wan2.1_VAE.safetensors.index.json` for `Wan2.1_VAE.pth`.
+    """
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def _shard_name(stem, i, num_shards):
+    return f"{stem}-{i + 1:05d}-of-{num_shards:05d}.safetensors"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _nbytes(tensor):
+    return tensor.numel() * tensor.element_size()
+
+
+def _balance(sizes, max_shard_size):
+    # longest processing time first: the largest tensors are placed first,
+    # each into the currently smallest shard
+    total = sum(sizes.values())
+    num_shards = max(1, -(-total // max_shard_size))
+    shards = [[] for _ in range(num_shards)]
+    loads = [0] * num_shards
+    for name in sorted(sizes, key=lambda k: (-sizes[k], k)):
+        i = loads.index(min(loads))
+        shards[i].append(name)
+        loads[i] += sizes[name]
+    return [sorted(names) for names in shards if names]
+
+
+def save_sharded(state_dict,
+                 save_dir,
+                 stem,
+                 max_shard_size=5 * GiB,
+                 dtype=None,
+                 sizes=None,
+                 source=None,
+                 num_workers=1):
+    r"""
+    Writes a state dict as safetensors shards of about equal size and an
+    index `<stem>.safetensors.index.json` that maps every tensor to its shard
+    and records the size and sha256 of each shard. The layout is the one of
+    sharded diffusers checkpoints, so DiT folders stay loadable with
+    `from_pretrained`.
+
+    Args:
+        state_dict (`Mapping[str, torch.Tensor]`):
+            The tensors. Values are only read while their shard is written, so
+            a lazily loading mapping keeps host memory at one shard per worker.
+        save_dir (`str`):
+            Directory the shards and the index are written to.
+        stem (`str`):
+            Common prefix of the file names.
+        max_shard_size (`int`, *optional*, defaults to 5 GiB):
+            Upper bound of the mean shard size in bytes.
+        dtype (`torch.dtype`, *optional*):
+            Floating point tensors are cast to this dtype.
+        sizes (`dict[str, int]`, *optional*):
+            Bytes of each tensor, to balance the shards without reading the
+            tensors. Defaults to the sizes of the values of `state_dict`.
+        source (`str`, *optional*):
+            The converted checkpoint, recorded in the index.
+        num_workers (`int`, *optional*, defaults to 1):
+            Shards written in parallel.
+
+    Returns:
+        `str`:
+            Path of the index.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    if sizes is None:
+        sizes = {k: _nbytes(v) for k, v in state_dict.items()}
+    shards = _balance(sizes, max_shard_size)
+
+    def write(i):
+        tensors, seen = {}, set()
+        for name in shards[i]:
+            tensor = state_dict[name]
+            if dtype is not None and tensor.is_floating_point():
+                tensor = tensor.to(dtype)
+            tensor = tensor.contiguous()
+            # safetensors refuses tensors that share memory
+            if tensor.untyped_storage().data_ptr() in seen:
+                tensor = tensor.clone()
+            seen.add(tensor.untyped_storage().data_ptr())
+            tensors[name] = tensor
+        file = _shard_name(stem, i, len(shards))
+        path = os.path.join(save_dir, file)
+        save_file(tensors, path, metadata={'format': 'pt'})
+        total = sum(_nbytes(t) for t in tensors.values())
+        del tensors
+        logging.info(f"Wrote {path}")
+        return file, total, os.path.getsize(path), _sha256(path)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        written = list(pool.map(write, range(len(shards))))
+
+    index = {
+        'metadata': {
+            'format': INDEX_FORMAT,
+            'total_size': sum(total for _, total, _, _ in written),
+            'dtype': str(dtype).replace('torch.', '') if dtype else None,
+            'source': source,
+        },
+        'weight_map': {
+            name: file
+            for (file, _, _, _), names in zip(written, shards)
+            for name in names
+        },
+        'files': {
+            file: {
+                'size': size,
+                'sha256': sha256
+            } for file, _, size, sha256 in written
+        },
+    }
+    index_path = os.path.join(save_dir, stem + INDEX_SUFFIX)
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    return index_path
+
+
+def _read_index(index_path):
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def verify_sharded(index_path, hashes=True, num_workers=8):
+    r"""
+    Checks the shards of an index written by `save_sharded` against their
+    recorded sizes and, with `hashes`, their sha256.
+
+    Returns:
+        List[`str`]:
+            A description of every missing, truncated or corrupted shard,
+            empty if the checkpoint is intact.
+    """
+    index = _read_index(index_path)
+    root = os.path.dirname(index_path)
+
+    def check(item):
+        file, expected = item
+        path = os.path.join(root, file)
+        if not os.path.isfile(path):
+            return f"{path} is missing"
+        size = os.path.getsize(path)
+        if size != expected['size']:
+            return f"{path} has {size} bytes, expected {expected['size']}"
+        if hashes and _sha256(path) != expected['sha256']:
+            return f"{path} does not match its sha256"
+        return None
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        errors = pool.map(check, index.get('files', {}).items())
+    return [e for e in errors if e is not None]
+
+
+def load_sharded(index_path, device='cpu', num_workers=8, verify=False):
+    r"""
+    Loads the state dict of an index written by `save_sharded`. The shards are
+    read in parallel and memory mapped, so tensors are not copied on the host.
+    Shard sizes are always checked first, so a truncated download fails
+    before anything is loaded.
+
+    Args:
+        index_path (`str`):
+            Path of the index.
+        device (`str` or `torch.device`, *optional*, defaults to 'cpu'):
+            The device the tensors are loaded to.
+        num_workers (`int`, *optional*, defaults to 8):
+            Shards read in parallel.
+        verify (`bool`, *optional*, defaults to False):
+            Whether to also check the sha256 of every shard.
+    """
+    errors = verify_sharded(index_path, hashes=verify, num_workers=num_workers)
+    if errors:
+        raise RuntimeError(f"Corrupted checkpoint {index_path}: " +
+                           '; '.join(errors))
+    index = _read_index(index_path)
+    root = os.path.dirname(index_path)
+    files = sorted(set(index['weight_map'].values()))
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        parts = pool.map(
+            lambda file: load_file(
+                os.path.join(root, file), device=str(device)), files)
+        state_dict = {}
+        for part in parts:
+            state_dict.update(part)
+    return state_dict
+
+
+def load_checkpoint(path, map_location='cpu'):
+    r"""
+    Loads the state dict of a `.pth` checkpoint, preferring its sharded
+    safetensors conversion by `tools/convert_checkpoint.py` if it exists.
+
+    Args:
+        path (`str`):
+            Path of the `.pth` file, which may be absent in a converted
+            checkpoint dir.
+        map_location (`str` or `torch.device`, *optional*, defaults to 'cpu'):
+            The device the tensors are loaded to.
+    """
+    index_path = sharded_index_path(path)
+    if os.path.isfile(index_path):
+        return load_sharded(index_path, device=map_location)
+    return torch.load(path, map_location=map_location)
+
+
+def check_checkpoint_dir(path):
+    r"""
+    Checks the shard sizes of a DiT folder converted by
+    `tools/convert_checkpoint.py`, other folders are left alone.
+    """
+    for file in sorted(os.listdir(path)):
+        if not file.endswith(INDEX_SUFFIX):
+            continue
+        index_path = os.path.join(path, file)
+        if _read_index(index_path).get('metadata',
+                                       {}).get('format') != INDEX_FORMAT:
+            continue
+        errors = verify_sharded(index_path, hashes=False)
+        if errors:
+            raise RuntimeError(f"Corrupted checkpoint {index_path}: " +
+                               '; '.join(errors))
@@ -0,0 +1,128 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+import math
+import os
+
+import torch
+
+__all__ = [
+    'compile_blocks', 'get_seq_len_buckets', 'set_compile_cache',
+    'save_compile_cache'
+]
+
+_CACHE_ARTIFACTS = 'cache_artifacts.bin'
+
+
+def get_seq_len_buckets(sizes, frame_num, vae_stride, patch_size, sp_size=1):
+    r"""
+    Returns the DiT sequence lengths of the given sizes, computed the same way
+    as the pipelines do. They are used as compile buckets: inputs of any other
+    size are padded up to the next bucket instead of triggering a recompile.
+
+    Args:
+        sizes (List[Tuple[int, int]]):
+            (width, height) pairs, e.g. from `SIZE_CONFIGS`.
+        frame_num (`int`):
+            Number of frames.
+        vae_stride (`tuple`):
+            VAE stride of (frames, height, width).
+        patch_size (`tuple`):
+            DiT patch size of (frames, height, width).
+        sp_size (`int`, *optional*, defaults to 1):
+            Sequence parallel size, sequence lengths are rounded up to it.
+
+    Returns:
+        List[int]:
+            Sorted, unique sequence lengths.
+    """
+    buckets = set()
+    for w, h in sizes:
+        lat_f = (frame_num - 1) // vae_stride[0] + 1
+        lat_h, lat_w = h // vae_stride[1], w // vae_stride[2]
+        seq_len = math.ceil(
+            (lat_h * lat_w) / (patch_size[1] * patch_size[2]) * lat_f /
+            sp_size) * sp_size
+        buckets.add(seq_len)
+    return sorted(buckets)
+
+
+def compile_blocks(model, seq_len_buckets=None, mode=None):
+    r"""
+    Regional compilation of a `WanModel`: each transformer block is compiled
+    on its own instead of the whole model. Parameters are treated as graph
+    inputs, so all blocks share the compiled graph of a bucket and compile
+    time does not grow with depth.
+
+    Args:
+        model (torch.nn.Module):
+            The model to compile in place. Must expose `blocks`.
+        seq_len_buckets (List[int], *optional*):
+            Sequence lengths to pad inputs up to, see `get_seq_len_buckets`.
+            Without buckets every new sequence length is compiled on its own.
+        mode (`str`, *optional*):
+            Passed to `torch.compile`.
+
+    Returns:
+        torch.nn.Module:
+            The model with compiled blocks.
+    """
+    dynamo_config = torch._dynamo.config
+    if hasattr(dynamo_config, 'inline_inbuilt_nn_modules'):
+        dynamo_config.inline_inbuilt_nn_modules = True
+    # older releases guard on each block instance, leave room for all of them
+    num_shapes = len(seq_len_buckets) if seq_len_buckets else 1
+    dynamo_config.cache_size_limit = max(dynamo_config.cache_size_limit,
+                                         len(model.blocks) * num_shapes)
+
+    model.seq_len_buckets = sorted(
+        seq_len_buckets) if seq_len_buckets else None
+    for block in model.blocks:
+        block.compile(mode=mode, dynamic=False)
+    return model
+
+
+def set_compile_cache(cache_dir):
+    r"""
+    Points the Inductor and Triton caches at `cache_dir`, so compiled kernels
+    persist across runs, and loads the artefacts written by
+    `save_compile_cache` if this version of torch supports them.
+
+    Args:
+        cache_dir (`str`):
+            Directory of the persistent compile cache.
+    """
+    import torch._inductor.config as inductor_config
+
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ['TORCHINDUCTOR_CACHE_DIR'] = cache_dir
+    os.environ['TRITON_CACHE_DIR'] = os.path.join(cache_dir, 'triton')
+    inductor_config.fx_graph_cache = True
+
+    path = os.path.join(cache_dir, _CACHE_ARTIFACTS)
+    if os.path.isfile(path) and hasattr(torch.compiler,
+                                        'load_cache_artifacts'):
+        with open(path, 'rb') as f:
+            torch.compiler.load_cache_artifacts(f.read())
+        logging.info(f"Loaded compile cache artifacts from {path}.")
+
+
+def save_compile_cache(cache_dir):
+    r"""
+    Writes the artefacts compiled in this process to `cache_dir`, so that a
+    later run can skip compilation. A no-op on versions of torch without
+    `torch.compiler.save_cache_artifacts`, where the Inductor cache alone
+    persists the kernels.
+
+    Args:
+        cache_dir (`str`):
+            Directory of the persistent compile cache.
+    """
+    if not hasattr(torch.compiler, 'save_cache_artifacts'):
+        return
+    artifacts = torch.compiler.save_cache_artifacts()
+    if artifacts is None:
+        return
+    path = os.path.join(cache_dir, _CACHE_ARTIFACTS)
+    with open(path, 'wb') as f:
+        f.write(artifacts[0])
+    logging.info(f"Saved compile cache artifacts to {path}.")
@@ -0,0 +1,121 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+
+import torch
+
+from .fm_solvers_device import DeviceFlowScheduler
+from .fm_solvers_ode import FlowODEScheduler
+
+__all__ = ['StepGraphCache', 'pad_context']
+
+
+def pad_context(context, text_len):
+    r"""
+    Zero-pads text embeddings with shape [L, C] to [text_len, C]. WanModel
+    pads the same way internally, padding up front gives the static shapes a
+    captured step needs.
+    """
+    return [
+        torch.cat([u, u.new_zeros(text_len - u.size(0), u.size(1))])
+        for u in context
+    ]
+
+
+class StepGraphCache:
+    r"""
+    Caches CUDA graphs of whole denoising steps, one per key.
+
+    The first call for a key runs the step eagerly, which doubles as the
+    warm-up required before capture. The second call captures the step with
+    static input buffers, every later call copies its inputs into those
+    buffers and replays the graph. All graphs share one memory pool, which is
+    safe as steps never run concurrently.
+
+    A captured step must not synchronize with the host or copy from pageable
+    memory, and every tensor it reads besides its inputs (weights, scheduler
+    state) must keep its address. Parameter addresses of `modules` are
+    recorded, so a graph is captured again after its model has been
+    offloaded and reloaded.
+    """
+
+    def __init__(self):
+        self.graphs = {}
+        self.warm = {}
+        self.schedulers = {}
+        self.pool = None
+
+    def scheduler(self, key, scheduler, guidance_schedule=None):
+        r"""
+        Returns the `DeviceFlowScheduler` kept for `key`, created from
+        `scheduler` on first use. Captured steps point at its table and state,
+        so it is reused and rewound instead of being rebuilt on every call.
+
+        Only fixed-step solvers can be captured, and a captured step always
+        computes the conditional and unconditional predictions, so guidance
+        schedules that skip the latter are rejected as well.
+
+        Args:
+            key (`tuple`):
+                Solver, sampling steps, shift and latent shape.
+            scheduler (FlowUniPCMultistepScheduler | FlowDPMSolverMultistepScheduler):
+                A scheduler on which `set_timesteps` has been called.
+            guidance_schedule (`GuidanceSchedule`, *optional*):
+                The guidance schedule of the sampling loop.
+        """
+        if isinstance(scheduler, FlowODEScheduler):
+            raise NotImplementedError(
+                f"The {scheduler.solver} solver cannot be captured as CUDA "
+                f"graphs, use 'unipc' or 'dpm++'.")
+        if guidance_schedule is not None and guidance_schedule.enabled:
+            raise NotImplementedError(
+                "CUDA graphs cannot be combined with a guidance schedule.")
+        if key not in self.schedulers:
+            self.schedulers[key] = DeviceFlowScheduler(scheduler)
+        device_scheduler = self.schedulers[key]
+        device_scheduler.reset()
+        return device_scheduler
+
+    def __call__(self, key, fn, *inputs, modules=()):
+        r"""
+        Runs `fn(*inputs)` through the graph cached for `key`.
+
+        Args:
+            key (`tuple`):
+                Identifies the captured step. Everything `fn` closes over that
+                is not an input, e.g. the expert and guide scale, belongs here.
+            fn (callable):
+                The step. Takes the input tensors and returns one tensor.
+            inputs (`torch.Tensor`):
+                Inputs with the same shapes on every call for `key`.
+            modules (Iterable[torch.nn.Module], *optional*):
+                Modules whose parameters `fn` reads.
+
+        Returns:
+            torch.Tensor:
+                The output of `fn`, owned by the caller.
+        """
+        fingerprint = tuple(
+            p.data_ptr() for m in modules for p in m.parameters())
+        entry = self.graphs.get(key)
+        if entry is None or entry[0] != fingerprint:
+            if self.warm.get(key) != fingerprint:
+                self.warm[key] = fingerprint
+                return fn(*inputs)
+            entry = self._capture(fn, inputs, fingerprint)
+            self.graphs[key] = entry
+            logging.info(f"Captured CUDA graph for step {key}.")
+
+        _, graph, static_inputs, static_output = entry
+        for buf, x in zip(static_inputs, inputs):
+            buf.copy_(x)
+        graph.replay()
+        return static_output.clone()
+
+    def _capture(self, fn, inputs, fingerprint):
+        static_inputs = [x.clone() for x in inputs]
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self.pool):
+            static_output = fn(*static_inputs)
+        if self.pool is None:
+            self.pool = graph.pool()
+        return fingerprint, graph, static_inputs, static_output
@@ -0,0 +1,160 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+from copy import deepcopy
+from typing import Tuple, Union
+
+import torch
+from diffusers.schedulers.scheduling_utils import SchedulerOutput
+
+__all__ = ['DeviceFlowScheduler']
+
+
+class DeviceFlowScheduler:
+    r"""
+    Device-resident replay of `FlowUniPCMultistepScheduler` and the
+    deterministic `FlowDPMSolverMultistepScheduler`.
+
+    For a fixed sigma schedule every scheduler step is a linear combination of
+    the current sample, the last corrected sample, the stored data predictions
+    and the model output. The coefficients are extracted once by stepping a
+    copy of the wrapped scheduler on basis vectors, and kept in a per-step
+    table on the device. Data predictions live in a ring buffer, so `step`
+    launches a fixed set of kernels without any host-device synchronization.
+
+    Args:
+        scheduler (FlowUniPCMultistepScheduler | FlowDPMSolverMultistepScheduler):
+            A scheduler on which `set_timesteps` has been called.
+        device (`torch.device`, *optional*):
+            Device of the coefficient table. Defaults to the device of
+            `scheduler.timesteps`.
+    """
+
+    def __init__(self, scheduler, device=None):
+        if scheduler.config.get('algorithm_type', '').startswith('sde'):
+            raise NotImplementedError(
+                "Stochastic solvers cannot be replayed on device.")
+        if scheduler.config.get('thresholding', False) or getattr(
+                scheduler, 'solver_p', None) is not None:
+            raise NotImplementedError(
+                "Thresholding and solver_p are not linear in the sample.")
+        self.scheduler = scheduler
+        self.timesteps = scheduler.timesteps
+        self.host_timesteps = scheduler.timesteps.cpu().tolist()
+        self.num_inference_steps = len(self.host_timesteps)
+        self.order = scheduler.config.solver_order
+        device = device or self.timesteps.device
+
+        table, slots = self._build_table(scheduler)
+        self.table = table.to(device=device, dtype=torch.float32)
+        self.slots = slots.to(device)
+        self.indices = torch.arange(
+            self.num_inference_steps, dtype=torch.long, device=device)
+        self.state = None
+        self._step_index = None
+
+    @property
+    def step_index(self):
+        return self._step_index
+
+    def reset(self):
+        r"""
+        Rewinds to the first step, keeping the table and the state buffer in
+        place so that captured graphs stay valid.
+        """
+        self._step_index = None
+        if self.state is not None:
+            self.state.zero_()
+
+    def _build_table(self, scheduler):
+        r"""
+        Steps a copy of `scheduler` on basis vectors laid out as
+        [sample, last_sample, ring_0, ..., ring_{order-1}, model_output].
+
+        Returns:
+            Tuple[Tensor, Tensor]:
+                Coefficients with shape [steps, 3, order + 3], rows holding the
+                data prediction, the corrected sample and the next sample, and
+                the state slot each step writes its data prediction to.
+        """
+        order = self.order
+        basis = torch.eye(order + 3, dtype=torch.float64).unsqueeze(1)
+        sample, last_sample, model_output = basis[0], basis[1], basis[-1]
+
+        probe = deepcopy(scheduler)
+        probe.set_begin_index(0)
+        rows, slots = [], []
+        for i, t in enumerate(self.host_timesteps):
+            # m_{i-1-j} sits in ring slot (i - 1 - j) % order
+            for j in range(order):
+                if probe.model_outputs[-1 - j] is not None:
+                    probe.model_outputs[-1 - j] = basis[2 +
+                                                       (i - 1 - j) % order]
+            if getattr(probe, 'last_sample', None) is not None:
+                probe.last_sample = last_sample
+            prev_sample = probe.step(
+                model_output, t, sample, return_dict=False)[0]
+            corrected = getattr(probe, 'last_sample', None)
+            if corrected is None:
+                corrected = last_sample
+            rows.append(
+                torch.cat([
+                    probe.model_outputs[-1].double(),
+                    corrected.double(),
+                    prev_sample.double()
+                ]))
+            slots.append(2 + i % order)
+        return torch.stack(rows), torch.tensor(slots, dtype=torch.long)
+
+    def step(self,
+             model_output: torch.Tensor,
+             timestep: Union[int, torch.Tensor],
+             sample: torch.Tensor,
+             return_dict: bool = True,
+             generator=None,
+             step_index: Union[int, torch.Tensor] = None
+            ) -> Union[SchedulerOutput, Tuple]:
+        r"""
+        Drop-in replacement for the `step` of the wrapped scheduler. `timestep`
+        is ignored, steps are counted internally unless `step_index` is given.
+
+        Args:
+            model_output (`torch.Tensor`):
+                The direct output from learned diffusion model.
+            timestep (`int` or `torch.Tensor`):
+                Unused, kept for interface compatibility.
+            sample (`torch.Tensor`):
+                A current instance of a sample created by the diffusion process.
+            return_dict (`bool`):
+                Whether or not to return a `SchedulerOutput` or `tuple`.
+            generator (`torch.Generator`, *optional*):
+                Unused, the replayed solvers are deterministic.
+            step_index (`int` or `torch.Tensor`, *optional*):
+                Step to run. A one-element device tensor keeps the call free
+                of Python-side state, e.g. for CUDA graph capture.
+        """
+        if step_index is None:
+            step_index = 0 if self._step_index is None else self._step_index
+        if isinstance(step_index, int):
+            self._step_index = step_index + 1
+            step_index = self.indices[step_index:step_index + 1]
+        if self.state is None:
+            self.state = sample.new_zeros(
+                self.order + 3, *sample.shape, dtype=torch.float32)
+
+        self.state[0].copy_(sample)
+        self.state[-1].copy_(model_output)
+        coef = self.table.index_select(0, step_index)[0]
+        coef = coef.view(*coef.shape, *([1] * sample.dim()))
+        out = coef[:, 0] * self.state[0]
+        for j in range(1, self.state.size(0)):
+            out.addcmul_(coef[:, j], self.state[j])
+        x0, corrected, prev_sample = out.unbind(0)
+
+        self.state[1].copy_(corrected)
+        self.state.index_copy_(0, self.slots.index_select(0, step_index),
+                               x0.unsqueeze(0))
+        prev_sample = prev_sample.to(sample.dtype)
+
+        if not return_dict:
+            return (prev_sample,)
+
+        return SchedulerOutput(prev_sample=prev_sample)
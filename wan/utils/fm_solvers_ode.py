@@ -0,0 +1,206 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+from typing import Tuple, Union
+
+import numpy as np
+import torch
+from diffusers.schedulers.scheduling_utils import SchedulerOutput
+
+__all__ = ['FlowODEScheduler', 'FLOW_ODE_SOLVERS']
+
+FLOW_ODE_SOLVERS = ('euler', 'heun', 'adaptive')
+
+
+class FlowODEScheduler:
+    r"""
+    Explicit solvers for the probability flow ODE dx / dsigma = v(x, sigma) of
+    flow matching, with one model evaluation per call to `step`.
+
+    - `euler`: first order, one evaluation per step.
+    - `heun`: second order, two evaluations per step. As in diffusers'
+      `HeunDiscreteScheduler` every timestep but the first is visited twice,
+      the last step is an Euler step so the model is never run at sigma 0.
+    - `adaptive`: embedded Heun-Euler pair. The difference of the two
+      estimates is the local error, steps are accepted when its weighted RMS
+      is below one and resized towards that target either way. The timesteps
+      are produced while sampling, `sampling_steps` only sets the first step.
+
+    Steps are taken in the unshifted time `u`, which is mapped to sigma with
+    the same shift as `get_sampling_sigmas`. Euler and Heun only use host-side
+    scalars and never synchronize with the device, the adaptive solver reads
+    back one error norm per step.
+
+    Args:
+        num_train_timesteps (`int`, defaults to 1000):
+            The number of diffusion steps to train the model.
+        solver (`str`, defaults to 'euler'):
+            One of `FLOW_ODE_SOLVERS`.
+        rtol (`float`, defaults to 0.05):
+            Relative tolerance of the adaptive solver.
+        atol (`float`, defaults to 0.0078):
+            Absolute tolerance of the adaptive solver.
+        safety (`float`, defaults to 0.9):
+            Safety factor of the adaptive step size controller.
+    """
+
+    def __init__(self,
+                 num_train_timesteps=1000,
+                 solver='euler',
+                 rtol=0.05,
+                 atol=0.0078,
+                 safety=0.9):
+        assert solver in FLOW_ODE_SOLVERS, f"Unsupported solver: {solver}."
+        self.num_train_timesteps = num_train_timesteps
+        self.solver = solver
+        self.rtol = rtol
+        self.atol = atol
+        self.safety = safety
+        self.num_rejected = 0
+
+    @property
+    def nfe(self):
+        r"""
+        Number of model evaluations so far.
+        """
+        return self._step_index
+
+    @property
+    def timesteps(self):
+        if self.solver == 'adaptive':
+            return self._adaptive_timesteps()
+        return self._timesteps
+
+    def _sigma(self, u):
+        return self.shift * u / (1 + (self.shift - 1) * u)
+
+    def set_timesteps(self, num_inference_steps, device=None, shift=1.0):
+        r"""
+        Sets the discrete timesteps used for the diffusion chain.
+
+        Args:
+            num_inference_steps (`int`):
+                The number of steps, the initial step size for `adaptive`.
+            device (`str` or `torch.device`, *optional*):
+                The device of the timesteps.
+            shift (`float`, defaults to 1.0):
+                Shift of the sigma schedule.
+        """
+        self.device = device
+        self.shift = shift
+        self._step_index = 0
+        self.num_rejected = 0
+        self._prev = None
+
+        sigmas = [
+            self._sigma(u) for u in np.linspace(1, 0, num_inference_steps + 1)
+        ]
+        if self.solver == 'euler':
+            self._plan = [('euler', s, s_next)
+                          for s, s_next in zip(sigmas[:-1], sigmas[1:])]
+        elif self.solver == 'heun':
+            self._plan = []
+            for s, s_next in zip(sigmas[:-2], sigmas[1:-1]):
+                self._plan += [('predict', s, s_next), ('correct', s_next, s)]
+            self._plan.append(('euler', sigmas[-2], sigmas[-1]))
+        else:
+            self._u, self._u_next = 1.0, None
+            self._h = 1.0 / num_inference_steps
+            self.host_timesteps = []
+            return
+
+        self.host_timesteps = [
+            s * self.num_train_timesteps for _, s, _ in self._plan
+        ]
+        self._timesteps = torch.tensor(
+            self.host_timesteps, dtype=torch.float32, device=device)
+
+    def _adaptive_timesteps(self):
+        while self._u > 0:
+            u = self._u if self._u_next is None else self._u_next
+            t = self._sigma(u) * self.num_train_timesteps
+            self.host_timesteps.append(t)
+            yield torch.tensor(t, dtype=torch.float32, device=self.device)
+
+    def step(self,
+             model_output: torch.Tensor,
+             timestep: Union[int, torch.Tensor],
+             sample: torch.Tensor,
+             return_dict: bool = True,
+             generator=None) -> Union[SchedulerOutput, Tuple]:
+        r"""
+        Advances `sample` by one model evaluation.
+
+        Args:
+            model_output (`torch.Tensor`):
+                The velocity predicted by the model at `sample`.
+            timestep (`int` or `torch.Tensor`):
+                Unused, the solver tracks its own position.
+            sample (`torch.Tensor`):
+                A current instance of a sample created by the diffusion process.
+            return_dict (`bool`):
+                Whether or not to return a `SchedulerOutput` or `tuple`.
+            generator (`torch.Generator`, *optional*):
+                Unused, all solvers are deterministic.
+
+        Returns:
+            [`SchedulerOutput`] or `tuple`:
+                The sample at which the model is evaluated next, the final
+                sample after the last step.
+        """
+        v = model_output.float()
+        x = sample.float()
+        if self.solver == 'adaptive':
+            prev_sample = self._adaptive_step(v, x)
+        else:
+            kind, sigma, sigma_next = self._plan[self._step_index]
+            if kind == 'euler':
+                prev_sample = x + (sigma_next - sigma) * v
+            elif kind == 'predict':
+                self._prev = (x, v)
+                prev_sample = x + (sigma_next - sigma) * v
+            else:
+                # sigma is where the predictor landed, sigma_next where it started
+                x0, v0 = self._prev
+                self._prev = None
+                prev_sample = x0 + 0.5 * (sigma - sigma_next) * (v0 + v)
+        self._step_index += 1
+        prev_sample = prev_sample.to(sample.dtype)
+
+        if not return_dict:
+            return (prev_sample,)
+
+        return SchedulerOutput(prev_sample=prev_sample)
+
+    def _adaptive_step(self, v, x):
+        if self._u_next is None:
+            # evaluated at an accepted point, propose the next step
+            return self._propose(x, v, self._h)
+
+        # evaluated at the Euler proposal, compare with the Heun estimate
+        x0, v0 = self._prev
+        u, u_next = self._u, self._u_next
+        d_sigma = self._sigma(u_next) - self._sigma(u)
+        x_euler = x0 + d_sigma * v0
+        x_heun = x0 + 0.5 * d_sigma * (v0 + v)
+        scale = self.atol + self.rtol * torch.maximum(x0.abs(), x_heun.abs())
+        error = ((x_heun - x_euler) / scale).pow(2).mean().sqrt().item()
+
+        # local error of the Euler estimate is O(h^2)
+        factor = 5.0 if error == 0 else min(
+            5.0, max(0.2, self.safety * error**-0.5))
+        h = (u - u_next) * factor
+        if error <= 1:
+            self._u, self._u_next, self._h = u_next, None, h
+            self._prev = None
+            return x_heun
+        self.num_rejected += 1
+        return self._propose(x0, v0, h)
+
+    def _propose(self, x, v, h):
+        u = self._u
+        if u - h <= 0:
+            # final Euler step, avoids evaluating the model at sigma 0
+            self._u, self._u_next, self._prev = 0.0, None, None
+            return x - self._sigma(u) * v
+        self._u_next = u - h
+        self._prev = (x, v)
+        return x + (self._sigma(self._u_next) - self._sigma(u)) * v
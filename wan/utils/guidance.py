@@ -0,0 +1,128 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import logging
+
+__all__ = ['GuidanceSchedule']
+
+
+class GuidanceSchedule:
+    r"""
+    Decides per sampling step whether classifier-free guidance needs a fresh
+    unconditional prediction, and combines the predictions.
+
+    Three rules can be combined, the defaults run CFG at every step:
+
+    - `interval`: CFG only runs for timesteps within the window, outside of it
+      the conditional prediction is used as is.
+    - `delta_threshold`: once the norm of `cond - uncond` relative to `cond`
+      drops below the threshold, CFG is switched off for the remaining steps.
+    - `uncond_every`: a fresh unconditional prediction is computed every k
+      steps and reused in between. Switching models forces a fresh one.
+
+    Usage in a sampling loop:
+
+        if guidance.needs_uncond(t_host, key=model):
+            noise_pred_uncond = model(...)
+        else:
+            noise_pred_uncond = None
+        noise_pred = guidance(noise_pred_cond, noise_pred_uncond, guide_scale)
+
+    Args:
+        interval (`tuple`, *optional*):
+            (low, high) timestep window as fractions of `num_train_timesteps`,
+            e.g. (0.0, 0.8) to skip CFG on the noisiest steps.
+        delta_threshold (`float`, *optional*):
+            Relative delta norm below which CFG is truncated. Reads the norm
+            back to the host once per unconditional pass.
+        uncond_every (`int`, *optional*, defaults to 1):
+            Compute the unconditional prediction every k steps.
+        num_train_timesteps (`int`, *optional*, defaults to 1000):
+            Scale of the timesteps passed to `needs_uncond`.
+    """
+
+    def __init__(self,
+                 interval=None,
+                 delta_threshold=None,
+                 uncond_every=1,
+                 num_train_timesteps=1000):
+        assert uncond_every >= 1, f"uncond_every must be positive, got {uncond_every}."
+        self.interval = interval
+        self.delta_threshold = delta_threshold
+        self.uncond_every = uncond_every
+        self.num_train_timesteps = num_train_timesteps
+        self.reset()
+
+    @property
+    def enabled(self):
+        return (self.interval is not None or
+                self.delta_threshold is not None or self.uncond_every > 1)
+
+    def reset(self):
+        r"""
+        Clears the state and counters, called before each sampling run.
+        """
+        self._mode = None
+        self._uncond = None
+        self._key = None
+        self._age = 0
+        self._truncated = False
+        self.num_uncond = 0
+        self.num_skipped = 0
+
+    def needs_uncond(self, t, key=None):
+        r"""
+        Returns whether the unconditional prediction has to be computed for
+        the step at timestep `t`.
+
+        Args:
+            t (`float`):
+                Current timestep, taken from the host-side schedule.
+            key (`object`, *optional*):
+                Identifies the model of this step, a stale unconditional
+                prediction is only reused for the same key.
+        """
+        if self._truncated or (
+                self.interval is not None and
+                not (self.interval[0] * self.num_train_timesteps <= t <=
+                     self.interval[1] * self.num_train_timesteps)):
+            self._mode = 'off'
+        elif (self._uncond is not None and key is self._key and
+              self._age < self.uncond_every - 1):
+            self._mode = 'stale'
+            self._age += 1
+        else:
+            self._mode = 'fresh'
+            self._key = key
+            self._age = 0
+
+        if self._mode == 'fresh':
+            self.num_uncond += 1
+        else:
+            self.num_skipped += 1
+        return self._mode == 'fresh'
+
+    def __call__(self, noise_pred_cond, noise_pred_uncond, guide_scale):
+        r"""
+        Combines the predictions of the step prepared by `needs_uncond`.
+        `noise_pred_uncond` is None unless `needs_uncond` returned True.
+        """
+        if self._mode == 'off':
+            return noise_pred_cond
+        if self._mode == 'stale':
+            noise_pred_uncond = self._uncond
+        else:
+            if self.uncond_every > 1:
+                self._uncond = noise_pred_uncond
+            if self.delta_threshold is not None:
+                delta = (noise_pred_cond - noise_pred_uncond).norm() / \
+                    noise_pred_cond.norm()
+                if delta.item() < self.delta_threshold:
+                    self._truncated = True
+        return noise_pred_uncond + guide_scale * (
+            noise_pred_cond - noise_pred_uncond)
+
+    def log_stats(self):
+        if self.enabled:
+            total = self.num_uncond + self.num_skipped
+            logging.info(
+                f"Guidance schedule skipped {self.num_skipped} of {total} unconditional passes."
+            )
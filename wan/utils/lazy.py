@@ -0,0 +1,44 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import importlib
+
+__all__ = ['lazy_module']
+
+
+def lazy_module(package, attrs, submodules=()):
+    r"""
+    Returns the module level `__getattr__` and `__dir__` (PEP 562) of a
+    package whose names are imported on first access, so that importing the
+    package does not import the heavy dependencies of all its members.
+
+    Args:
+        package (`str`):
+            `__name__` of the package.
+        attrs (`dict`):
+            Maps each public name to the submodule it is defined in, relative
+            to the package.
+        submodules (`tuple`, *optional*):
+            Submodules that are importable as attributes of the package.
+
+    Returns:
+        Tuple[`callable`, `callable`]:
+            `__getattr__` and `__dir__` for the package namespace.
+    """
+    module = importlib.import_module(package)
+
+    def __getattr__(name):
+        if name in attrs:
+            value = getattr(
+                importlib.import_module(attrs[name], package), name)
+        elif name in submodules:
+            value = importlib.import_module(f".{name}", package)
+        else:
+            raise AttributeError(
+                f"module {package!r} has no attribute {name!r}")
+        # cache, later lookups do not reach __getattr__
+        setattr(module, name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(module)) | set(attrs) | set(submodules))
+
+    return __getattr__, __dir__
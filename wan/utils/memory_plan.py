@@ -0,0 +1,297 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import itertools
+import math
+
+__all__ = ['PLANNED_FLAGS', 'estimate_memory', 'plan_memory']
+
+GiB = 1 << 30
+
+# flags the planner decides on, in the order they are enumerated
+PLANNED_FLAGS = ('offload_model', 't5_cpu', 'convert_model_dtype', 'dit_fsdp',
+                 't5_fsdp', 'vae_parallel')
+
+# umt5-xxl encoder, see `wan.modules.t5.umt5_xxl`
+_T5 = dict(
+    vocab=256384,
+    dim=4096,
+    dim_attn=4096,
+    dim_ffn=10240,
+    num_heads=64,
+    num_layers=24,
+    num_buckets=32)
+_T5_TEXT_DIM = 4096
+
+# parameters, latent channels and the channels of the decoder at full
+# resolution (Wan2.2 decodes at half resolution with 4x the channels)
+_VAES = {
+    'Wan2.1_VAE.pth': dict(params=127e6, z_dim=16, decoder_dim=96),
+    'Wan2.2_VAE.pth': dict(params=705e6, z_dim=48, decoder_dim=64),
+}
+# feature maps of one decoded chunk alive at once: input, output, causal
+# cache and padding of a residual block
+_VAE_LIVE_MAPS = 6
+# output frames per decoded latent frame
+_VAE_CHUNK_FRAMES = 4
+# latent pixels of halo per side of a `parallel_vae_decode` tile
+_VAE_HALO = 8
+
+# CUDA context, cuBLAS workspaces and allocator fragmentation
+_OVERHEAD_BYTES = 2 * GiB
+_OVERHEAD_FRACTION = 0.05
+
+# rough throughputs behind the cost of a configuration, only their ratios
+# matter for the ranking
+_HOST_BANDWIDTH = 12e9  # bytes/s, pageable host <-> device copies
+_LINK_BANDWIDTH = 100e9  # bytes/s, all-gathers between GPUs
+_DEVICE_BANDWIDTH = 2e12  # bytes/s, HBM
+_CPU_FLOPS = 2e11  # flop/s of T5 on the host
+_PROMPT_TOKENS = 256  # tokens of a prompt and the negative prompt
+_DECODE_PIXELS = 2e6  # decoded pixels/s of a single GPU
+
+
+def _t5_params():
+    t5 = _T5
+    layer = 4 * t5['dim'] * t5['dim_attn'] + 3 * t5['dim'] * t5[
+        'dim_ffn'] + 2 * t5['dim'] + t5['num_buckets'] * t5['num_heads']
+    return t5['vocab'] * t5['dim'] + t5['num_layers'] * layer + t5['dim']
+
+
+def _dit_params(cfg, in_dim, out_dim):
+    dim, ffn_dim = cfg.dim, cfg.ffn_dim
+    patch = math.prod(cfg.patch_size)
+    attn = 4 * (dim * dim + dim) + 2 * dim
+    block = 2 * attn + 2 * dim + (2 * dim * ffn_dim + ffn_dim +
+                                  dim) + 6 * dim
+    embeddings = (in_dim * patch * dim + dim) + (
+        _T5_TEXT_DIM * dim + dim * dim + 2 * dim) + (
+            cfg.freq_dim * dim + dim * dim + 2 * dim) + (6 * dim * dim + 6 *
+                                                         dim)
+    head = dim * out_dim * patch + out_dim * patch + 2 * dim
+    return cfg.num_layers * block + embeddings + head, block
+
+
+def _seq_len(cfg, size, frame_num, sp_size):
+    lat_f = (frame_num - 1) // cfg.vae_stride[0] + 1
+    lat_h, lat_w = size[1] // cfg.vae_stride[1], size[0] // cfg.vae_stride[2]
+    return math.ceil(lat_h * lat_w / (cfg.patch_size[1] * cfg.patch_size[2]) *
+                     lat_f / sp_size) * sp_size
+
+
+def estimate_memory(cfg,
+                    task,
+                    size,
+                    frame_num,
+                    world_size=1,
+                    ulysses_size=1,
+                    offload_model=True,
+                    t5_cpu=False,
+                    convert_model_dtype=False,
+                    dit_fsdp=False,
+                    t5_fsdp=False,
+                    vae_parallel=False,
+                    dit_tp=False,
+                    dit_quant=None,
+                    batch_size=1):
+    r"""
+    Analytic peak device memory of one rank while generating a video, from
+    parameter bytes of T5, DiT and VAE, DiT activations of one block at the
+    sequence length of `size` and the VAE decoder feature maps of one chunk.
+
+    Args:
+        cfg (EasyDict):
+            A config of `WAN_CONFIGS`.
+        task (`str`):
+            A key of `WAN_CONFIGS`.
+        size (`tuple[int]`):
+            (width, height) of the video.
+        frame_num (`int`):
+            Number of frames.
+        world_size (`int`, *optional*, defaults to 1):
+            Number of ranks the models are sharded over.
+        batch_size (`int`, *optional*, defaults to 1):
+            Videos per DiT forward, 2 when conditional and unconditional
+            predictions are batched.
+        Remaining arguments mirror the flags of `generate.py`.
+
+    Returns:
+        `dict`:
+            Peak bytes of the 'encode', 'denoise' and 'decode' phases and
+            their maximum as 'peak', each including a fixed overhead.
+    """
+    vae = _VAES.get(cfg.vae_checkpoint, _VAES['Wan2.1_VAE.pth'])
+    z_dim = vae['z_dim']
+    # i2v concatenates the image latent and its mask, ti2v does not
+    in_dim = 2 * z_dim + 4 if task.startswith('i2v') else z_dim
+    dit_params, block_params = _dit_params(cfg, in_dim, z_dim)
+    num_experts = 2 if 'low_noise_checkpoint' in cfg else 1
+    sharded = dit_fsdp or dit_tp or ulysses_size > 1
+
+    # parameters
+    t5_bytes = 0 if t5_cpu else _t5_params() * 2 / (
+        world_size if t5_fsdp else 1)
+    if dit_fsdp:
+        # fp32 shards, one block gathered in param_dtype during compute
+        dit_bytes = dit_params * 4 / world_size + block_params * 2
+    else:
+        dit_bytes = dit_params * (1 if dit_quant else
+                                  2 if convert_model_dtype else 4)
+        if dit_tp:
+            dit_bytes /= world_size
+    # without sharding, the models are initialized on the host and only the
+    # expert of the current step is moved to the device
+    dit_resident = dit_bytes * (num_experts if sharded else 1)
+    vae_bytes = vae['params'] * 4
+
+    # DiT activations of one block: the fp32 residual stream, its normed and
+    # modulated copy, q, k and v and the float64 rope of q and k, or the
+    # hidden states of the FFN
+    seq_len = _seq_len(cfg, size, frame_num, ulysses_size) // ulysses_size
+    tokens = seq_len * batch_size
+    activations = tokens * (cfg.dim * 4 * 3 + max(
+        cfg.dim * (3 * 2 + 2 * 8), cfg.ffn_dim * 2 * 2))
+
+    # feature maps of one decoded chunk at full resolution
+    pixels = size[0] * size[1]
+    if vae_parallel and world_size > 1:
+        tile_rows = size[1] / world_size + 2 * _VAE_HALO * cfg.vae_stride[1]
+        pixels = size[0] * min(size[1], tile_rows)
+    decode = vae['decoder_dim'] * _VAE_CHUNK_FRAMES * pixels * 4 * (
+        _VAE_LIVE_MAPS)
+
+    resident_t5 = 0 if offload_model else t5_bytes
+    resident_dit = 0 if offload_model else dit_resident
+    phases = {
+        'encode': t5_bytes + (dit_resident if sharded else 0),
+        'denoise': resident_t5 + dit_resident + activations,
+        'decode': resident_t5 + resident_dit + vae_bytes + decode,
+    }
+    phases = {
+        k: int(v * (1 + _OVERHEAD_FRACTION) + _OVERHEAD_BYTES)
+        for k, v in phases.items()
+    }
+    phases['peak'] = max(phases.values())
+    return phases
+
+
+def _cost(cfg, task, size, frame_num, sample_steps, world_size, flags):
+    # seconds a configuration is estimated to add to a generation
+    vae = _VAES.get(cfg.vae_checkpoint, _VAES['Wan2.1_VAE.pth'])
+    dit_params, _ = _dit_params(cfg, vae['z_dim'], vae['z_dim'])
+    num_experts = 2 if 'low_noise_checkpoint' in cfg else 1
+    dit_bytes = dit_params * (2 if flags['convert_model_dtype'] else 4)
+    t5_bytes = _t5_params() * 2
+    forwards = 2 * sample_steps
+
+    cost = 0.0
+    if flags['offload_model']:
+        moved = num_experts * dit_bytes + (0 if flags['t5_cpu'] else
+                                           t5_bytes)
+        cost += 2 * moved / _HOST_BANDWIDTH
+    if flags['t5_cpu']:
+        cost += 2 * _t5_params() * 2 * _PROMPT_TOKENS / _CPU_FLOPS
+    if flags['dit_fsdp']:
+        cost += forwards * dit_params * 2 * (world_size -
+                                             1) / world_size / _LINK_BANDWIDTH
+    elif not flags['convert_model_dtype']:
+        # fp32 weights are cast to param_dtype by autocast on every forward
+        cost += forwards * dit_params * 6 / _DEVICE_BANDWIDTH
+    if flags['t5_fsdp']:
+        cost += t5_bytes * (world_size - 1) / world_size / _LINK_BANDWIDTH
+    decode = size[0] * size[1] * frame_num / _DECODE_PIXELS
+    cost += decode / world_size if flags['vae_parallel'] else decode
+    return cost
+
+
+def plan_memory(cfg,
+                task,
+                size,
+                frame_num,
+                sample_steps,
+                device_memory,
+                world_size=1,
+                ulysses_size=1,
+                shardable=False,
+                fixed=None,
+                **options):
+    r"""
+    Picks the fastest values of the `PLANNED_FLAGS` that are not fixed and
+    whose estimated peak memory, see `estimate_memory`, fits the device.
+
+    Args:
+        cfg (EasyDict):
+            A config of `WAN_CONFIGS`.
+        task (`str`):
+            A key of `WAN_CONFIGS`.
+        size (`tuple[int]`):
+            (width, height) of the video.
+        frame_num (`int`):
+            Number of frames.
+        sample_steps (`int`):
+            Sampling steps, scales the per-step costs.
+        device_memory (`int`):
+            Bytes of memory of one device.
+        world_size (`int`, *optional*, defaults to 1):
+            Number of ranks.
+        ulysses_size (`int`, *optional*, defaults to 1):
+            Sequence parallel size.
+        shardable (`bool`, *optional*, defaults to False):
+            Whether the ranks cooperate on one video, so that FSDP and a
+            parallel VAE decode may be chosen.
+        fixed (`dict`, *optional*):
+            Flags the user set, they are kept as given.
+        options:
+            Further flags that constrain the choice: `t5_broadcast`, `dit_tp`,
+            `dit_quant`, `cuda_graph`, `compile` and `lora`.
+
+    Returns:
+        `dict`:
+            The chosen 'flags', their 'memory' estimate of `estimate_memory`,
+            the estimated extra seconds as 'cost' and whether it 'fits'. If no
+            configuration fits, the one with the smallest peak is returned.
+    """
+    fixed = {k: v for k, v in (fixed or {}).items() if v is not None}
+    choices = []
+    for flag in PLANNED_FLAGS:
+        if flag in fixed:
+            choices.append((fixed[flag],))
+        elif flag in ('dit_fsdp', 't5_fsdp',
+                      'vae_parallel') and not shardable:
+            choices.append((False,))
+        else:
+            choices.append((False, True))
+
+    candidates = []
+    for values in itertools.product(*choices):
+        flags = dict(zip(PLANNED_FLAGS, values))
+        if flags['t5_fsdp'] and (flags['t5_cpu'] or
+                                 options.get('t5_broadcast')):
+            continue
+        if flags['dit_fsdp'] and (
+                flags['convert_model_dtype'] or options.get('dit_tp') or
+                options.get('dit_quant') or options.get('cuda_graph') or
+                options.get('compile') or options.get('lora')):
+            continue
+        memory = estimate_memory(
+            cfg,
+            task,
+            size,
+            frame_num,
+            world_size=world_size,
+            ulysses_size=ulysses_size,
+            dit_tp=options.get('dit_tp', False),
+            dit_quant=options.get('dit_quant'),
+            **flags)
+        cost = _cost(cfg, task, size, frame_num, sample_steps, world_size,
+                     flags)
+        candidates.append({
+            'flags': flags,
+            'memory': memory,
+            'cost': cost,
+            'fits': memory['peak'] <= device_memory,
+        })
+    assert candidates, f"The flags {fixed} contradict each other."
+
+    fitting = [c for c in candidates if c['fits']]
+    if fitting:
+        return min(fitting, key=lambda c: c['cost'])
+    return min(candidates, key=lambda c: c['memory']['peak'])
@@ -0,0 +1,380 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import nullcontext
+
+import torch
+
+__all__ = [
+    'Profiler', 'enable_profiling', 'disable_profiling', 'get_profiler',
+    'profile', 'profiled', 'profile_iter', 'record_bytes'
+]
+
+_profiler = None
+_NULL = nullcontext()
+
+
+def _nbytes(obj):
+    if isinstance(obj, int):
+        return obj
+    if torch.is_tensor(obj):
+        return obj.numel() * obj.element_size()
+    if isinstance(obj, torch.nn.Module):
+        return sum(_nbytes(p) for p in obj.parameters()) + sum(
+            _nbytes(b) for b in obj.buffers())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(o) for o in obj)
+    return 0
+
+
+def _rss():
+    # peak resident set size of the process, KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _Span:
+
+    __slots__ = ('name', 'args', 'tid', 'depth', 'start', 'wall', 'events',
+                 'peak_memory', 'nbytes')
+
+    def __init__(self, name, args, tid, depth):
+        self.name = name
+        self.args = args
+        self.tid = tid
+        self.depth = depth
+        self.start = 0.0
+        self.wall = 0.0
+        self.events = None
+        self.peak_memory = 0
+        self.nbytes = 0
+
+
+class _Scope:
+
+    __slots__ = ('profiler', 'name', 'args', 'span')
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.span = self.profiler._enter(self.name, self.args)
+        return self.span
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self.span)
+
+
+class Profiler:
+    r"""
+    Records the stages of a generation as nested spans, with their wall
+    time, their CUDA time between events on the current stream, the peak
+    allocated CUDA memory, or the peak RSS of the process without CUDA, and
+    the bytes moved between host and device that the stage reported through
+    `record_bytes`. All values of a span include those of its children.
+
+    Recording does not synchronize the device, so the wall time of a stage
+    that only launches kernels is its launch time and the CUDA time is what
+    the GPU spent on it. CUDA events are resolved in `summary` and
+    `chrome_trace`.
+
+    Args:
+        rank (`int`, *optional*, defaults to 0):
+            Process id of the trace.
+    """
+
+    def __init__(self, rank=0):
+        self.rank = rank
+        self.spans = []
+        self.cuda = torch.cuda.is_available()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._origin_event = None
+        if self.cuda:
+            self._origin_event = torch.cuda.Event(enable_timing=True)
+            self._origin_event.record()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _peak_memory(self):
+        if self.cuda:
+            return torch.cuda.max_memory_allocated()
+        return _rss()
+
+    def _enter(self, name, args):
+        stack = self._stack()
+        span = _Span(name, args, threading.get_ident(), len(stack))
+        if self.cuda:
+            # keep the peak of the enclosing span before restarting the count
+            if stack:
+                stack[-1].peak_memory = max(stack[-1].peak_memory,
+                                            self._peak_memory())
+            torch.cuda.reset_peak_memory_stats()
+            span.events = (torch.cuda.Event(enable_timing=True),
+                           torch.cuda.Event(enable_timing=True))
+            span.events[0].record()
+        stack.append(span)
+        span.start = time.perf_counter()
+        return span
+
+    def _exit(self, span):
+        span.wall = time.perf_counter() - span.start
+        stack = self._stack()
+        # a loop left through an exception closes its `profile_iter` span
+        # late, out of order
+        stack.remove(span)
+        if span.events is not None:
+            span.events[1].record()
+        span.peak_memory = max(span.peak_memory, self._peak_memory())
+        if stack:
+            parent = stack[-1]
+            parent.peak_memory = max(parent.peak_memory, span.peak_memory)
+            parent.nbytes += span.nbytes
+        if self.cuda:
+            torch.cuda.reset_peak_memory_stats()
+        with self._lock:
+            self.spans.append(span)
+
+    def span(self, name, **args):
+        r"""
+        Context manager recording a span `name`, `args` are shown in the
+        trace.
+        """
+        return _Scope(self, name, args)
+
+    def record_bytes(self, nbytes):
+        stack = self._stack()
+        if stack:
+            stack[-1].nbytes += nbytes
+
+    def _cuda_times(self):
+        # (offset from the first event, duration) in seconds per span
+        if not self.cuda:
+            return {}
+        torch.cuda.synchronize()
+        times = {}
+        for span in self.spans:
+            if span.events is not None:
+                start, end = span.events
+                times[id(span)] = (self._origin_event.elapsed_time(start) /
+                                   1e3, start.elapsed_time(end) / 1e3)
+        return times
+
+    def summary(self):
+        r"""
+        Aggregates the spans by name.
+
+        Returns:
+            `dict`:
+                Per stage the number of spans, total, mean and max wall time,
+                total CUDA time, peak memory and bytes moved, and the wall
+                time of all top-level spans.
+        """
+        cuda_times = self._cuda_times()
+        stages = {}
+        total = 0.0
+        for span in sorted(self.spans, key=lambda s: s.start):
+            if span.depth == 0:
+                total += span.wall
+            stage = stages.setdefault(
+                span.name, {
+                    'count': 0,
+                    'wall_seconds': 0.0,
+                    'max_wall_seconds': 0.0,
+                    'cuda_seconds': None,
+                    'peak_memory_bytes': 0,
+                    'bytes_moved': 0,
+                })
+            stage['count'] += 1
+            stage['wall_seconds'] += span.wall
+            stage['max_wall_seconds'] = max(stage['max_wall_seconds'],
+                                            span.wall)
+            if id(span) in cuda_times:
+                stage['cuda_seconds'] = (stage['cuda_seconds'] or
+                                         0.0) + cuda_times[id(span)][1]
+            stage['peak_memory_bytes'] = max(stage['peak_memory_bytes'],
+                                             span.peak_memory)
+            stage['bytes_moved'] += span.nbytes
+        for stage in stages.values():
+            stage['mean_wall_seconds'] = stage['wall_seconds'] / stage['count']
+        return {
+            'rank': self.rank,
+            'device': 'cuda' if self.cuda else 'cpu',
+            'memory': 'max_memory_allocated' if self.cuda else 'max_rss',
+            'total_seconds': total,
+            'stages': stages,
+        }
+
+    def chrome_trace(self):
+        r"""
+        Returns the spans in the Chrome trace event format, which Perfetto
+        and chrome://tracing open. Host spans are listed per thread, their
+        CUDA time on a separate track of the process.
+        """
+        cuda_times = self._cuda_times()
+        pid = self.rank
+        events = [{
+            'name': 'process_name',
+            'ph': 'M',
+            'pid': pid,
+            'args': {
+                'name': f'rank {self.rank}'
+            }
+        }, {
+            'name': 'thread_name',
+            'ph': 'M',
+            'pid': pid,
+            'tid': 0,
+            'args': {
+                'name': 'cuda'
+            }
+        }]
+        for span in self.spans:
+            args = dict(span.args)
+            args.update(peak_memory_bytes=span.peak_memory)
+            if span.nbytes:
+                args['bytes_moved'] = span.nbytes
+            if id(span) in cuda_times:
+                offset, duration = cuda_times[id(span)]
+                args['cuda_ms'] = duration * 1e3
+                events.append({
+                    'name': span.name,
+                    'cat': 'cuda',
+                    'ph': 'X',
+                    'pid': pid,
+                    'tid': 0,
+                    'ts': offset * 1e6,
+                    'dur': duration * 1e6,
+                })
+            events.append({
+                'name': span.name,
+                'cat': 'host',
+                'ph': 'X',
+                'pid': pid,
+                'tid': span.tid,
+                'ts': (span.start - self._origin) * 1e6,
+                'dur': span.wall * 1e6,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def log_summary(self, summary=None):
+        summary = summary or self.summary()
+        logging.info(
+            f"Profiled {summary['total_seconds']:.2f}s on rank {self.rank}:")
+        for name, stage in sorted(
+                summary['stages'].items(), key=lambda x: -x[1]['wall_seconds']):
+            cuda = stage['cuda_seconds']
+            logging.info(
+                f"  {name:16s} x{stage['count']:<5d} wall {stage['wall_seconds']:8.3f}s"
+                f"  cuda {'-' if cuda is None else f'{cuda:.3f}s':>9s}"
+                f"  peak {stage['peak_memory_bytes'] / 2**30:6.2f} GiB"
+                f"  moved {stage['bytes_moved'] / 2**30:6.2f} GiB")
+
+    def save(self, path):
+        r"""
+        Writes `summary` to `path` and `chrome_trace` next to it, with the
+        suffix `.trace.json`.
+
+        Returns:
+            Tuple[`str`, `str`]:
+                The paths of the summary and the trace.
+        """
+        base = path[:-len('.json')] if path.endswith('.json') else path
+        trace_path = f"{base}.trace.json"
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(trace_path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return path, trace_path
+
+
+def enable_profiling(rank=0):
+    r"""
+    Starts recording `profile` spans into a new `Profiler` and returns it.
+    """
+    global _profiler
+    _profiler = Profiler(rank=rank)
+    return _profiler
+
+
+def disable_profiling():
+    r"""
+    Stops recording and returns the last profiler, if any.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def profile(name, **args):
+    r"""
+    Context manager recording the stage `name` if profiling is enabled,
+    otherwise a shared no-op.
+    """
+    if _profiler is None:
+        return _NULL
+    return _Scope(_profiler, name, args)
+
+
+def profiled(name=None):
+    r"""
+    Decorator recording every call of a function as the stage `name`,
+    defaulting to the qualified name of the function.
+    """
+
+    def decorator(fn):
+        stage = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return fn(*args, **kwargs)
+            with _Scope(_profiler, stage, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profile_iter(iterable, name='step'):
+    r"""
+    Records each iteration of a loop over `iterable`, from one item to the
+    next, as the stage `name` with its index.
+    """
+    if _profiler is None:
+        return iterable
+    return _profile_iter(_profiler, iterable, name)
+
+
+def _profile_iter(profiler, iterable, name):
+    for i, item in enumerate(iterable):
+        with _Scope(profiler, name, {'index': i}):
+            yield item
+
+
+def record_bytes(*objs):
+    r"""
+    Adds the size of `objs`, byte counts, tensors or modules, to the bytes
+    moved by the innermost running stage. Sizes are only computed while
+    profiling.
+    """
+    if _profiler is not None:
+        _profiler.record_bytes(sum(_nbytes(o) for o in objs))
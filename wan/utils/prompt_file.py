@@ -0,0 +1,228 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import json
+import os
+import os.path as osp
+import socket
+import threading
+import time
+
+__all__ = ['load_prompt_file', 'FileWorkQueue']
+
+# keys of a JSONL item
+ITEM_KEYS = ('id', 'prompt', 'image', 'seed', 'size', 'save_file')
+
+
+def load_prompt_file(path, save_dir='outputs'):
+    r"""
+    Reads the items of a prompt file.
+
+    A `.jsonl` file holds one JSON object per line with a `prompt` and
+    optionally `id`, `image`, `seed`, `size` and `save_file`. Any other file
+    is read as text with one prompt per line, skipping empty lines and lines
+    starting with '#'.
+
+    Args:
+        path (`str`):
+            The prompt file.
+        save_dir (`str`, *optional*, defaults to 'outputs'):
+            Directory of the videos of items without `save_file`, saved as
+            `<id>.mp4`.
+
+    Returns:
+        List[`dict`]:
+            The items with all keys of `ITEM_KEYS`, missing ones set to None.
+            Ids default to the 1-based position in the file.
+    """
+    items = []
+    with open(path, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    if path.endswith('.jsonl'):
+        for lineno, line in enumerate(lines, 1):
+            if not line:
+                continue
+            item = json.loads(line)
+            if not isinstance(item, dict) or 'prompt' not in item:
+                raise ValueError(
+                    f"{path}:{lineno}: expected an object with a prompt.")
+            unknown = set(item) - set(ITEM_KEYS)
+            if unknown:
+                raise ValueError(
+                    f"{path}:{lineno}: unknown keys {sorted(unknown)}, expected {ITEM_KEYS}."
+                )
+            items.append(item)
+    else:
+        items = [{
+            'prompt': line
+        } for line in lines if line and not line.startswith('#')]
+
+    ids = set()
+    for i, item in enumerate(items):
+        for key in ITEM_KEYS:
+            item.setdefault(key, None)
+        if item['id'] is None:
+            item['id'] = f"{i + 1:04d}"
+        item['id'] = str(item['id'])
+        if item['id'] in ids:
+            raise ValueError(f"{path}: duplicate id {item['id']}.")
+        ids.add(item['id'])
+        if item['save_file'] is None:
+            item['save_file'] = osp.join(save_dir, f"{item['id']}.mp4")
+    return items
+
+
+class FileWorkQueue:
+    r"""
+    Hands out the items of a prompt file to independent workers through
+    claim files in a shared directory, so that no coordination beyond the
+    file system is needed.
+
+    Worker `rank` first works through its own shard, every `world_size`-th
+    item, and then steals the unclaimed items of the other shards from their
+    ends. Items whose `save_file` exists are skipped, so a restarted run
+    resumes where the last one stopped. A claim file records the run of its
+    worker, and a background thread refreshes its mtime every `heartbeat`
+    seconds while the item is generated. Claims of another run, or whose
+    heartbeat is older than `timeout`, are left over from a crashed worker
+    and are taken over. At worst a race on such a claim generates an item
+    twice.
+
+    Args:
+        items (List[`dict`]):
+            Items from `load_prompt_file`.
+        claim_dir (`str`):
+            Directory of the claim files, shared by all workers.
+        rank (`int`, *optional*, defaults to 0):
+            Index of this worker.
+        world_size (`int`, *optional*, defaults to 1):
+            Number of workers.
+        run_id (`str`, *optional*):
+            Id shared by all workers of this run. If None, claims are only
+            taken over once their heartbeat expired.
+        heartbeat (`float`, *optional*, defaults to 30.0):
+            Seconds between the refreshes of the claims of this worker.
+        timeout (`float`, *optional*):
+            Age in seconds of the last heartbeat after which a claim is stale,
+            defaults to 4 heartbeats.
+    """
+
+    def __init__(self,
+                 items,
+                 claim_dir,
+                 rank=0,
+                 world_size=1,
+                 run_id=None,
+                 heartbeat=30.0,
+                 timeout=None):
+        self.items = items
+        self.claim_dir = claim_dir
+        self.rank = rank
+        self.world_size = world_size
+        self.run_id = run_id
+        self.heartbeat = heartbeat
+        self.timeout = 4 * heartbeat if timeout is None else timeout
+        os.makedirs(claim_dir, exist_ok=True)
+
+        # claim files of this worker, refreshed by the heartbeat thread
+        self._held = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _order(self):
+        shards = [
+            list(range(r, len(self.items), self.world_size))
+            for r in range(self.world_size)
+        ]
+        order = shards[self.rank]
+        for r in range(1, self.world_size):
+            order += shards[(self.rank + r) % self.world_size][::-1]
+        return order
+
+    def _claim_file(self, item):
+        return osp.join(self.claim_dir, f"{item['id']}.claim")
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                held = list(self._held)
+            for path in held:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+
+    def _is_stale(self, path):
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path) as f:
+                owner = f.read()
+        except FileNotFoundError:
+            return False
+        try:
+            run_id = json.loads(owner)['run_id']
+        except (ValueError, KeyError, TypeError):
+            # still being written, or of an older version
+            run_id = self.run_id
+        if self.run_id is not None and run_id != self.run_id:
+            return True
+        return time.time() - mtime > self.timeout
+
+    def claim(self, item):
+        r"""
+        Claims `item`, returns False if it is done or claimed by a live
+        worker.
+        """
+        if osp.exists(item['save_file']):
+            return False
+        path = self._claim_file(item)
+        if self._is_stale(path):
+            # left over from a crashed worker
+            stale = f"{path}.{socket.gethostname()}.{os.getpid()}"
+            try:
+                os.replace(path, stale)
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'run_id': self.run_id,
+                'host': socket.gethostname(),
+                'pid': os.getpid(),
+                'rank': self.rank
+            }, f)
+        with self._lock:
+            self._held.add(path)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._beat, daemon=True)
+                self._thread.start()
+        # finished by another worker since the check above
+        if osp.exists(item['save_file']):
+            self.release(item)
+            return False
+        return True
+
+    def release(self, item):
+        r"""
+        Removes the claim of `item`, after it was saved or so that it can be
+        retried.
+        """
+        path = self._claim_file(item)
+        with self._lock:
+            self._held.discard(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def pending(self):
+        return [item for item in self.items if not osp.exists(item['save_file'])]
+
+    def __iter__(self):
+        for index in self._order():
+            item = self.items[index]
+            if self.claim(item):
+                yield item
@@ -7,11 +7,13 @@ import os.path as osp
 import shutil
 import subprocess
 
-import imageio
 import torch
 import torchvision
+from tqdm import tqdm
 
-__all__ = ['save_video', 'save_image', 'str2bool']
+from .video_writer import to_uint8_frames, write_video
+
+__all__ = ['save_video', 'save_image', 'str2bool', 'progress_iter']
 
 
 def rand_name(length=8, suffix=''):
@@ -87,35 +89,41 @@ def merge_video_audio(video_path: str, audio_path: str):
         logging.error(f"merge_video_audio failed with error: {e}")
 
 
+def video_to_frames(tensor, nrow=8, normalize=True, value_range=(-1, 1)):
+    r"""
+    Converts a [B, C, T, H, W] video tensor to [T, H, W, C] uint8 frames on
+    the same device, tiling the batch into a grid.
+    """
+    if tensor.size(0) == 1 and normalize:
+        # a grid of one video is the video itself
+        return to_uint8_frames(tensor[0], value_range)
+    tensor = tensor.clamp(min(value_range), max(value_range))
+    tensor = torch.stack([
+        torchvision.utils.make_grid(
+            u, nrow=nrow, normalize=normalize, value_range=value_range)
+        for u in tensor.unbind(2)
+    ],
+                         dim=1).permute(1, 2, 3, 0)
+    return (tensor * 255).type(torch.uint8)
+
+
 def save_video(tensor,
                save_file=None,
                fps=30,
                suffix='.mp4',
                nrow=8,
                normalize=True,
-               value_range=(-1, 1)):
+               value_range=(-1, 1),
+               audio_path=None):
     # cache file
     cache_file = osp.join('/tmp', rand_name(
         suffix=suffix)) if save_file is None else save_file
 
     # save to cache
     try:
-        # preprocess
-        tensor = tensor.clamp(min(value_range), max(value_range))
-        tensor = torch.stack([
-            torchvision.utils.make_grid(
-                u, nrow=nrow, normalize=normalize, value_range=value_range)
-            for u in tensor.unbind(2)
-        ],
-                             dim=1).permute(1, 2, 3, 0)
-        tensor = (tensor * 255).type(torch.uint8).cpu()
-
-        # write video
-        writer = imageio.get_writer(
-            cache_file, fps=fps, codec='libx264', quality=8)
-        for frame in tensor.numpy():
-            writer.append_data(frame)
-        writer.close()
+        frames = video_to_frames(
+            tensor, nrow=nrow, normalize=normalize, value_range=value_range)
+        write_video(frames, cache_file, fps=fps, audio_path=audio_path)
     except Exception as e:
         logging.info(f'save_video failed, error: {e}')
 
@@ -236,3 +244,20 @@ def download_cosyvoice_repo(repo_path):
 def download_cosyvoice_model(model_name, model_path):
     from modelscope import snapshot_download
     snapshot_download('iic/{}'.format(model_name), local_dir=model_path)
+
+
+def progress_iter(iterable, callback=None):
+    r"""
+    Iterates over `iterable` with a tqdm progress bar and, if given, calls
+    `callback(step, total)` after each finished step.
+    """
+    bar = tqdm(iterable)
+    if callback is None:
+        return bar
+    return _progress_iter(bar, callback)
+
+
+def _progress_iter(bar, callback):
+    for i, item in enumerate(bar):
+        yield item
+        callback(i + 1, bar.total)
@@ -0,0 +1,183 @@
+# Copyright 2024-2025 The Alibaba Wan Team Authors. All rights reserved.
+import queue
+import subprocess
+import threading
+
+import imageio_ffmpeg
+import numpy as np
+import torch
+
+__all__ = ['VideoWriter', 'to_uint8_frames', 'write_video']
+
+
+def to_uint8_frames(video, value_range=(-1, 1)):
+    r"""
+    Converts a [C, T, H, W] video in `value_range` to [T, H, W, C] uint8
+    frames on its device, with the rounding of `save_video`.
+    """
+    low, high = min(value_range), max(value_range)
+    frames = (video.clamp(low, high) - low).div_(max(high - low, 1e-5))
+    frames = frames.mul_(255).to(torch.uint8)
+    return frames.permute(1, 2, 3, 0).contiguous()
+
+
+class VideoWriter:
+    r"""
+    Streams uint8 RGB frames into one ffmpeg process that encodes them with
+    H.264 and, if given, muxes an audio track in the same pass. Frames are
+    piped to ffmpeg from a background thread, so the caller can prepare the
+    next ones meanwhile.
+
+    Args:
+        save_file (`str`):
+            Path of the video.
+        width (`int`):
+            Frame width.
+        height (`int`):
+            Frame height.
+        fps (`int`, *optional*, defaults to 30):
+            Frame rate.
+        audio_path (`str`, *optional*):
+            Audio muxed as AAC, the video is cut to the shorter stream.
+        crf (`int`, *optional*, defaults to 10):
+            x264 constant rate factor, 10 matches `quality=8` of imageio.
+        max_queue (`int`, *optional*, defaults to 4):
+            Chunks buffered for the writer thread.
+    """
+
+    def __init__(self,
+                 save_file,
+                 width,
+                 height,
+                 fps=30,
+                 audio_path=None,
+                 crf=10,
+                 max_queue=4):
+        command = [
+            imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+            '-r', str(fps), '-i', 'pipe:0'
+        ]
+        if audio_path is not None:
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0']
+        command += [
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf',
+            str(crf)
+        ]
+        if audio_path is not None:
+            command += ['-c:a', 'aac', '-b:a', '192k', '-shortest']
+        command.append(save_file)
+
+        self.save_file = save_file
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._queue = queue.Queue(max_queue)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frames, event, done = item
+            try:
+                if event is not None:
+                    event.synchronize()
+                if self._error is None:
+                    self._process.stdin.write(
+                        memoryview(np.ascontiguousarray(frames)).cast('B'))
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+            finally:
+                if done is not None:
+                    done()
+
+    def write(self, frames, event=None, done=None):
+        r"""
+        Queues [T, H, W, C] uint8 frames, a numpy array or a CPU tensor.
+
+        Args:
+            event (`torch.cuda.Event`, *optional*):
+                Waited for before the frames are read, e.g. the end of an
+                asynchronous copy into them.
+            done (`callable`, *optional*):
+                Called once the frames were handed to ffmpeg.
+        """
+        if torch.is_tensor(frames):
+            frames = frames.numpy()
+        self._queue.put((frames, event, done))
+
+    def close(self):
+        r"""
+        Waits for ffmpeg to finish. Raises RuntimeError if it failed.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._process.stdin.close()
+        stderr = self._process.stderr.read().decode(errors='replace')
+        if self._process.wait() != 0 or self._error is not None:
+            raise RuntimeError(
+                f"Writing {self.save_file} failed: {self._error or stderr}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_video(video,
+                save_file,
+                fps=30,
+                audio_path=None,
+                value_range=(-1, 1),
+                chunk_size=16,
+                num_buffers=3):
+    r"""
+    Writes a video through `VideoWriter`.
+
+    A video on the GPU is converted to uint8 there in one op and copied to
+    the host in chunks of `chunk_size` frames, through a ring of pinned
+    buffers, while earlier chunks are encoded.
+
+    Args:
+        video (`torch.Tensor` or `np.ndarray`):
+            A [C, T, H, W] tensor in `value_range`, or [T, H, W, C] uint8
+            frames.
+        save_file (`str`):
+            Path of the video.
+        fps (`int`, *optional*, defaults to 30):
+            Frame rate.
+        audio_path (`str`, *optional*):
+            Audio muxed into the video.
+        value_range (`tuple`, *optional*, defaults to (-1, 1)):
+            Value range of a float video.
+        chunk_size (`int`, *optional*, defaults to 16):
+            Frames per host copy.
+        num_buffers (`int`, *optional*, defaults to 3):
+            Pinned chunk buffers in flight.
+    """
+    if torch.is_tensor(video) and video.dtype != torch.uint8:
+        video = to_uint8_frames(video, value_range)
+    num_frames, height, width = video.shape[:3]
+
+    with VideoWriter(save_file, width, height, fps, audio_path) as writer:
+        if not torch.is_tensor(video) or video.device.type == 'cpu':
+            writer.write(video)
+            return
+
+        free = queue.Queue()
+        for _ in range(min(num_buffers, -(-num_frames // chunk_size))):
+            free.put(
+                torch.empty((chunk_size,) + tuple(video.shape[1:]),
+                            dtype=torch.uint8,
+                            pin_memory=True))
+        for chunk in video.split(chunk_size):
+            buffer = free.get()
+            host = buffer[:len(chunk)]
+            host.copy_(chunk, non_blocking=True)
+            event = torch.cuda.Event()
+            event.record()
+            writer.write(host, event, done=lambda b=buffer: free.put(b))